@@ -25,6 +25,7 @@ from selenium.webdriver.remote.webelement import WebElement
 from ads_ai.browser.selectors import find, exists, find_all
 from ads_ai.browser.waits import ensure_ready_state, wait_dom_stable, wait_url
 from ads_ai.plan.schema import StepType
+from ads_ai.utils.template import has_placeholders
 
 
 # ---------------------------
@@ -42,6 +43,7 @@ class ActionContext:
     # ниже — опциональные объекты; не обязательны, учитываются по duck-typing
     trace: Optional[Any] = None       # ожид.: .write(dict)
     artifacts: Optional[Any] = None   # ожид.: .save_png(driver, name), .save_html(driver, name)
+    render_vars: bool = True          # False — шаги приходят уже отрендеренными (Runtime), повторно не рендерим
 
 
 # ---------------------------
@@ -215,17 +217,15 @@ def _timeout(ctx: ActionContext, step: Dict[str, Any], *, key: str = "timeout",
 
 
 def _render_value(ctx: ActionContext, value: Any) -> Any:
-    """Рендер переменных через var_store.render, если доступно."""
-    if isinstance(value, str) and ctx.var_store and hasattr(ctx.var_store, "render"):
-        try:
-            return ctx.var_store.render(value)
-        except Exception:
-            return value
-    if isinstance(value, list):
-        return [_render_value(ctx, v) for v in value]
-    if isinstance(value, dict):
-        return {k: _render_value(ctx, v) for k, v in value.items()}
-    return value
+    """Рендер переменных через var_store.render (шаг без ${...} возвращается как есть)."""
+    if not ctx.render_vars or not ctx.var_store or not hasattr(ctx.var_store, "render"):
+        return value
+    if not has_placeholders(value):
+        return value
+    try:
+        return ctx.var_store.render(value)
+    except Exception:
+        return value
 
 
 def _redact_step_for_trace(step: Dict[str, Any]) -> Dict[str, Any]:
@@ -8,21 +8,25 @@ import os
 import re
 import socket
 import stat
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple, List
-
-import requests
-from requests import Response
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, List
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 
+from ads_ai.browser.adspower_client import get_adspower_client, is_rate_limited
+from ads_ai.utils.gate import AdaptiveGate
+
 __all__ = [
     "AdsPowerError",
     "start_adspower",
     "stop_adspower",
+    "start_many",
+    "get_start_gate",
     # алиасы для совместимости с рефлексией
     "start",
     "stop",
@@ -92,6 +96,24 @@ def _split_host_port(addr: str) -> Tuple[str, int]:
         return host, 0
 
 
+# Хосты AdsPower, на которых v2 /start уже отработал: v1-фолбэк там не нужен
+_V2_HOSTS: set = set()
+_V2_HOSTS_LOCK = threading.Lock()
+
+
+def _v2_known_ok(base: str) -> bool:
+    with _V2_HOSTS_LOCK:
+        return base in _V2_HOSTS
+
+
+def _mark_v2(base: str, ok: bool) -> None:
+    with _V2_HOSTS_LOCK:
+        if ok:
+            _V2_HOSTS.add(base)
+        else:
+            _V2_HOSTS.discard(base)
+
+
 def _short(obj: Any, limit: int = 500) -> str:
     try:
         s = json.dumps(obj, ensure_ascii=False) if not isinstance(obj, str) else obj
@@ -111,9 +133,12 @@ def _http(
     timeout: float = 30.0,
     retries: int = 2,
     backoff: float = 0.35,
+    use_cache: bool = True,
 ) -> Tuple[int, Dict[str, Any]]:
     """
     Унифицированный HTTP-вызов AdsPower (GET/POST) с ретраями.
+    Идёт через общий keep-alive клиент (browser/adspower_client.py): читающие GET
+    кэшируются на пару секунд, start/stop сбрасывают кэш.
     Возвращает (status_code, dict_body_or_wrapper).
     """
     base = _normalize_base(api_base)
@@ -132,36 +157,34 @@ def _http(
         headers["X-ADSPower-Token"] = tok
         headers["X-API-KEY"] = tok
 
+    client = get_adspower_client()
     last_err = None
     for attempt in range(1, max(1, retries) + 2):
         t0 = time.perf_counter()
         try:
-            r: Response = requests.request(
+            status, body = client.request(
                 method.upper(),
                 url,
                 params=q,
-                json=json_body if method.upper() == "POST" else None,
+                json_body=json_body if method.upper() == "POST" else None,
                 headers=headers,
                 timeout=timeout,
+                use_cache=use_cache,
             )
             ms = int((time.perf_counter() - t0) * 1000)
-            try:
-                body = r.json()
-            except Exception:
-                body = {"raw": r.text}
             # 5xx/599 — повод ретраить
-            if (r.status_code >= 500 or r.status_code == 0) and attempt <= retries:
+            if (status >= 500 or status == 0) and attempt <= retries:
                 log.warning(
                     "adspower http %s %s -> %s (retry %d/%d) %dms",
-                    method.upper(), path, r.status_code, attempt, retries, ms
+                    method.upper(), path, status, attempt, retries, ms
                 )
                 time.sleep(backoff * attempt)
                 continue
             log.debug(
                 "adspower http %s %s -> %s in %dms",
-                method.upper(), path, r.status_code, ms
+                method.upper(), path, status, ms
             )
-            return r.status_code, body
+            return status, body
         except Exception as e:
             last_err = f"{e.__class__.__name__}: {e}"
             log.warning(
@@ -199,7 +222,12 @@ def _parse_start_payload(payload: Dict[str, Any], api_base: str, default_profile
         or data.get("driver_path")
         or data.get("chromedriver")
     )
-    devtools_ws = ws.get("devtools") or data.get("wsEndpoint") or data.get("webSocketDebuggerUrl")
+    devtools_ws = (
+        ws.get("devtools")
+        or ws.get("puppeteer")
+        or data.get("wsEndpoint")
+        or data.get("webSocketDebuggerUrl")
+    )
 
     profile_id = (
         data.get("user_id")
@@ -315,7 +343,8 @@ def _post_start_v2(api_base: str, profile: str, headless: bool, token: Optional[
 
 def _get_active_list(api_base: str, token: Optional[str]) -> Tuple[int, Dict[str, Any]]:
     for path in ("/api/v2/browser-profile/active/list", "/api/v1/browser/active/list"):
-        code, body = _http("GET", api_base, path, token=token, timeout=8.0, retries=0)
+        # перед стартом нужна свежая картина — мимо кэша
+        code, body = _http("GET", api_base, path, token=token, timeout=8.0, retries=0, use_cache=False)
         if code == 200:
             return code, body
     return 404, {}
@@ -395,6 +424,7 @@ def start_adspower(
     # --- 1) Пытаемся стартовать через v2 ---
     meta: Optional[_StartMeta] = None
     start_errors: List[str] = []
+    code_v2 = 0
 
     if not force_v1:
         code_v2, body_v2 = _post_start_v2(base, profile, headless, tok)
@@ -407,9 +437,17 @@ def start_adspower(
 
         if not ok_v2:
             start_errors.append(f"v2 start http={code_v2} body={_short(body_v2)}")
+        if meta is not None:
+            _mark_v2(base, True)
+        elif code_v2 == 404:
+            _mark_v2(base, False)  # эндпоинта v2 нет — снова разрешаем v1
 
     # --- 2) Фолбэк на v1, если нужно ---
-    if meta is None and not force_v2:
+    # Хост уже стартовал через v2: ответ v2 по существу (профиль/лимит), v1 даст то же — не тратим вызов.
+    skip_v1 = meta is None and not force_v1 and code_v2 not in (404, 599) and _v2_known_ok(base)
+    if skip_v1:
+        start_errors.append("v1 skipped: v2 is known to work on this host")
+    if meta is None and not force_v2 and not skip_v1:
         code_v1, body_v1 = _http(
             "GET", base, "/api/v1/browser/start",
             token=tok,
@@ -472,6 +510,13 @@ def start_adspower(
     # Анти‑залипание: оставляем одну вкладку и приводим окно к нужному размеру
     _cleanup_tabs_and_window(drv, headless=headless, window_size=window_size)
 
+    # Постоянный монитор активности DOM/сети для дешёвых wait_dom_stable/ensure_ready_state
+    try:
+        from ads_ai.browser.waits import install_activity_monitor
+        install_activity_monitor(drv)
+    except Exception as e:
+        log.debug("activity monitor install skipped: %s", e)
+
     log.info(
         "AdsPower attached: profile=%s addr=%s driver=%s",
         meta.profile_id or profile, meta.selenium_addr, meta.webdriver_path
@@ -551,7 +596,13 @@ def stop_adspower(
     except Exception as e:
         log.debug("AdsPower stop v1 API error: %s", e)
 
-    # 3) Закрываем драйвер
+    # 3) Закрываем собственное CDP-соединение и драйвер
+    if driver is not None:
+        try:
+            from ads_ai.browser.cdp import close_page_session
+            close_page_session(driver)
+        except Exception:
+            pass
     try:
         if driver and hasattr(driver, "quit"):
             driver.quit()
@@ -560,6 +611,122 @@ def stop_adspower(
         log.debug("Driver quit error: %s", e)
 
 
+# ============================== Пакетный старт ==============================
+
+_START_GATE: Optional[AdaptiveGate] = None
+_START_GATE_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def get_start_gate() -> AdaptiveGate:
+    """
+    Общий на процесс лимитер одновременных стартов профилей.
+    ENV: ADS_AI_ADSPOWER_START_CONCURRENCY (начальный, 3), ADS_AI_ADSPOWER_START_MAX (8).
+    """
+    global _START_GATE
+    if _START_GATE is None:
+        with _START_GATE_LOCK:
+            if _START_GATE is None:
+                hi = max(1, _env_int("ADS_AI_ADSPOWER_START_MAX", 8))
+                _START_GATE = AdaptiveGate(
+                    initial=_env_int("ADS_AI_ADSPOWER_START_CONCURRENCY", 3),
+                    min_limit=1,
+                    max_limit=hi,
+                    relax_every=3,
+                )
+    return _START_GATE
+
+
+def start_many(
+    profiles: Iterable[str],
+    start_fn: Optional[Callable[[str], Any]] = None,
+    *,
+    headless: bool = True,
+    api_base: str = "",
+    token: Optional[str] = None,
+    window_size: str = "1440,900",
+    timeout: float = 30.0,
+    gate: Optional[AdaptiveGate] = None,
+    max_workers: int = 8,
+    retries: int = 2,
+    cleanup: Optional[Callable[[Any], None]] = None,
+) -> Iterator[Tuple[str, Any, Optional[BaseException]]]:
+    """
+    Параллельный старт нескольких профилей. Генератор отдаёт (profile_id, driver, None)
+    по мере готовности каждого браузера (или (profile_id, None, error)).
+
+    Параллелизм ограничен AdaptiveGate (по умолчанию — общий get_start_gate()):
+    успешные старты расширяют лимит, ошибки и rate limit AdsPower — сужают;
+    при rate limit профиль перезапускается (до retries раз) после общего отката клиента API.
+
+    start_fn(profile_id) -> driver заменяет старт по умолчанию (start_adspower с переданными
+    параметрами) — например, аренду из DriverPool. Если потребитель бросил генератор раньше
+    времени, достартовавшие драйверы закрываются через cleanup (по умолчанию stop_adspower).
+    """
+    pids = [str(p) for p in profiles if str(p or "").strip()]
+    if not pids:
+        return
+    g = gate or get_start_gate()
+    client = get_adspower_client()
+    drop = cleanup or stop_adspower
+
+    def _default_start(pid: str) -> Any:
+        return start_adspower(pid, headless, api_base, token, window_size, timeout=timeout)
+
+    fn = start_fn or _default_start
+
+    def _one(pid: str) -> Any:
+        attempt = 0
+        while True:
+            client.await_throttle()
+            try:
+                with g.slot():
+                    drv = fn(pid)
+            except Exception as e:
+                if is_rate_limited(str(e)):
+                    client.note_rate_limit()
+                    g.tighten(2)
+                    if attempt < retries:
+                        attempt += 1
+                        log.info("AdsPower start rate-limited (profile=%s), retry %d/%d", pid, attempt, retries)
+                        continue
+                else:
+                    g.tighten(1)
+                raise
+            g.mark_success()
+            return drv
+
+    ex = ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(pids))), thread_name_prefix="adsp-start")
+    futs: Dict[Future, str] = {ex.submit(_one, pid): pid for pid in pids}
+    pending = set(futs)
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                err = f.exception()
+                yield futs[f], (None if err is not None else f.result()), err
+    finally:
+        # генератор закрыт досрочно: неполученные драйверы не должны остаться висеть
+        def _drop_late(ff: Future) -> None:
+            if ff.cancelled() or ff.exception() is not None or ff.result() is None:
+                return
+            try:
+                drop(ff.result())
+            except Exception as e:
+                log.debug("start_many: cleanup failed: %s", e)
+
+        for f in pending:
+            if not f.cancel():
+                f.add_done_callback(_drop_late)
+        ex.shutdown(wait=False)
+
+
 # Алиасы для совместимости с рефлексией в вызывающем коде
 def start(*args, **kwargs):
     return start_adspower(*args, **kwargs)
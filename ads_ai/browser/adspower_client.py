@@ -0,0 +1,279 @@
+# ads_ai/browser/adspower_client.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Общий HTTP-клиент локального API AdsPower.
+
+  • один requests.Session с пулом keep-alive соединений на процесс
+    (stdlib urllib — фоллбек, если requests не установлен);
+  • короткий TTL-кэш для читающих GET (списки профилей/групп, active):
+    страницы-списки не повторяют одни и те же локальные вызовы;
+  • любой изменяющий вызов (start/stop/close/delete/create/update, любой POST)
+    сбрасывает кэш;
+  • глобальный откат при rate limit AdsPower («too many request per second»):
+    все вызовы выжидают общий штраф (await_throttle) централизованно.
+
+Публичный контракт:
+  - AdsPowerClient: .request(...), .get_json(url, ...), .post_json(url, payload, ...),
+                    .invalidate(), .note_rate_limit(), .await_throttle(), .stats()
+  - get_adspower_client() -> AdsPowerClient   (синглтон процесса)
+  - http_get_json / http_post_json            — совместимые замены локальных копий в web/*
+  - is_rate_limited(message) -> bool
+
+ENV: ADS_AI_ADSPOWER_CACHE_TTL (сек, 3.0; 0 — без кэша),
+     ADS_AI_ADSPOWER_GLOBAL_BACKOFF (сек, 3.0), ADS_AI_ADSPOWER_POOL (соединений, 16).
+"""
+
+import copy
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Optional, Tuple
+
+try:  # опциональная зависимость
+    import requests  # type: ignore
+    from requests.adapters import HTTPAdapter  # type: ignore
+except Exception:  # pragma: no cover
+    requests = None  # type: ignore
+    HTTPAdapter = None  # type: ignore
+
+__all__ = [
+    "AdsPowerClient",
+    "get_adspower_client",
+    "http_get_json",
+    "http_post_json",
+    "is_rate_limited",
+]
+
+log = logging.getLogger(__name__)
+
+# Пути, меняющие состояние профилей: после них кэш чтения недействителен
+_MUTATING_RE = re.compile(r"/(start|stop|close|kill|forcestop|delete|create|update|regroup|add)\b", re.I)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def is_rate_limited(message: Any) -> bool:
+    msg = str(message or "").lower()
+    return (
+        "too many request per second" in msg
+        or "too many requests per second" in msg
+        or ("rate limit" in msg and "adspower" in msg)
+    )
+
+
+def _body_message(body: Any) -> str:
+    if isinstance(body, dict):
+        return str(body.get("msg") or body.get("message") or body.get("error") or "")
+    return ""
+
+
+def _body_ok(body: Any) -> bool:
+    return isinstance(body, dict) and str(body.get("code")) in ("0", "200")
+
+
+class AdsPowerClient:
+    def __init__(
+        self,
+        *,
+        cache_ttl: float = 3.0,
+        global_backoff: float = 3.0,
+        pool_size: int = 16,
+    ) -> None:
+        self.cache_ttl = max(0.0, float(cache_ttl))
+        self.global_backoff = max(0.0, float(global_backoff))
+        self.pool_size = max(1, int(pool_size))
+        self._session: Any = None
+        self._session_lock = threading.Lock()
+        self._cache: Dict[Tuple[str, str], Tuple[float, int, Dict[str, Any]]] = {}
+        self._cache_lock = threading.Lock()
+        self._throttle_lock = threading.Lock()
+        self._throttle_until = 0.0
+        self._stats = {"requests": 0, "cache_hits": 0, "invalidations": 0, "rate_limited": 0, "errors": 0}
+
+    # ---- транспорт -------------------------------------------------------
+
+    def session(self) -> Any:
+        """requests.Session с пулом соединений (None — requests не установлен)."""
+        if requests is None:
+            return None
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    s = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    s.mount("http://", adapter)
+                    s.mount("https://", adapter)
+                    self._session = s
+        return self._session
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]],
+        json_body: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+        timeout: float,
+    ) -> Tuple[int, Dict[str, Any]]:
+        sess = self.session()
+        if sess is not None:
+            r = sess.request(method, url, params=params, json=json_body, headers=headers or {}, timeout=timeout)
+            body: Dict[str, Any] = {}
+            if r.content:
+                try:
+                    body = r.json()
+                except Exception:
+                    body = {"raw": r.text}
+            return int(r.status_code), body if isinstance(body, dict) else {"data": body}
+
+        # stdlib fallback
+        if params:
+            url = url + ("&" if "?" in url else "?") + urllib.parse.urlencode(params)
+        h = dict(headers or {})
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode("utf-8")
+            h.setdefault("Content-Type", "application/json")
+        req = urllib.request.Request(url, data=data, headers=h, method=method)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            raw = resp.read()
+            try:
+                body = json.loads(raw.decode("utf-8")) if raw else {}
+            except Exception:
+                body = {"raw": raw.decode("utf-8", "ignore")}
+            return int(resp.getcode() or 0), body if isinstance(body, dict) else {"data": body}
+
+    # ---- основной вызов --------------------------------------------------
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        json_body: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 6.0,
+        use_cache: bool = True,
+    ) -> Tuple[int, Dict[str, Any]]:
+        """
+        HTTP-вызов AdsPower через общий пул. Сетевые ошибки пробрасываются (ретраи — у вызывающего).
+        Читающие GET обслуживаются из кэша в пределах cache_ttl; изменяющие — сбрасывают кэш.
+        """
+        m = method.upper()
+        full = url
+        if params:
+            full = url + ("&" if "?" in url else "?") + urllib.parse.urlencode(sorted((k, str(v)) for k, v in params.items()))
+        path = urllib.parse.urlsplit(full).path
+        mutating = m != "GET" or bool(_MUTATING_RE.search(path))
+        auth = (headers or {}).get("Authorization") or ""
+        key = (full, auth)
+
+        if not mutating and use_cache and self.cache_ttl > 0:
+            with self._cache_lock:
+                hit = self._cache.get(key)
+            if hit is not None and (time.monotonic() - hit[0]) < self.cache_ttl:
+                self._count("cache_hits")
+                # копия: вызывающие иногда дописывают поля в ответ
+                return hit[1], copy.deepcopy(hit[2])
+
+        self.await_throttle()
+        self._count("requests")
+        try:
+            code, body = self._send(m, url, params=params, json_body=json_body, headers=headers, timeout=timeout)
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            if mutating:
+                self.invalidate()
+
+        if is_rate_limited(_body_message(body)):
+            self.note_rate_limit()
+        elif not mutating and use_cache and self.cache_ttl > 0 and code == 200 and _body_ok(body):
+            with self._cache_lock:
+                self._cache[key] = (time.monotonic(), code, copy.deepcopy(body))
+        return code, body
+
+    def get_json(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 6.0, *, use_cache: bool = True) -> Tuple[int, Dict[str, Any]]:
+        """GET → (status, dict); при сетевой ошибке — (0, {})."""
+        try:
+            return self.request("GET", url, headers=headers, timeout=timeout, use_cache=use_cache)
+        except Exception:
+            return 0, {}
+
+    def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: float = 6.0) -> Tuple[int, Dict[str, Any]]:
+        """POST JSON → (status, dict); при сетевой ошибке — (0, {})."""
+        try:
+            return self.request("POST", url, json_body=payload, headers=headers, timeout=timeout)
+        except Exception:
+            return 0, {}
+
+    # ---- кэш / троттлинг -------------------------------------------------
+
+    def invalidate(self) -> None:
+        with self._cache_lock:
+            if self._cache:
+                self._cache.clear()
+                self._stats["invalidations"] += 1
+
+    def note_rate_limit(self) -> None:
+        """AdsPower ответил rate limit — общий штраф для всех вызовов процесса."""
+        with self._throttle_lock:
+            self._throttle_until = max(self._throttle_until, time.time() + self.global_backoff)
+        self._count("rate_limited")
+
+    def await_throttle(self) -> None:
+        with self._throttle_lock:
+            remain = self._throttle_until - time.time()
+        if remain > 0:
+            time.sleep(min(remain, 2.5) + random.uniform(0.02, 0.14))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cache_lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["cached"] = len(self._cache)
+        return out
+
+    def _count(self, key: str) -> None:
+        with self._cache_lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+
+_client: Optional[AdsPowerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_adspower_client() -> AdsPowerClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AdsPowerClient(
+                    cache_ttl=_env_float("ADS_AI_ADSPOWER_CACHE_TTL", 3.0),
+                    global_backoff=_env_float("ADS_AI_ADSPOWER_GLOBAL_BACKOFF", 3.0),
+                    pool_size=int(_env_float("ADS_AI_ADSPOWER_POOL", 16)),
+                )
+    return _client
+
+
+def http_get_json(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 6.0) -> Tuple[int, Dict[str, Any]]:
+    return get_adspower_client().get_json(url, headers=headers, timeout=timeout)
+
+
+def http_post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: float = 6.0) -> Tuple[int, Dict[str, Any]]:
+    return get_adspower_client().post_json(url, payload, headers=headers, timeout=timeout)
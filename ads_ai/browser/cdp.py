@@ -0,0 +1,459 @@
+# ads_ai/browser/cdp.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Собственное DevTools-соединение (websocket) к браузеру — параллельно chromedriver.
+
+Зачем:
+  • события CDP (навигация, screencast) — chromedriver их наружу не отдаёт;
+  • пакетная (pipelined) отправка команд без HTTP round trip на каждую;
+  • работа, не занимающая WebDriver-канал и его блокировки.
+
+Публичный контракт:
+  - CdpConnection(ws_url)            — одно websocket-соединение, поток-читатель, события
+  - PageSession                      — команды/события конкретной вкладки (flatten sessionId)
+  - devtools_ws_url(driver) -> str|None
+  - get_page_session(driver) -> PageSession|None   (кэшируется на драйвере)
+  - get_side_session(driver) -> PageSession|None   (отдельный websocket для фоновых наблюдателей)
+  - side_evaluate(driver, expression) -> Any       (Runtime.evaluate по фоновой сессии)
+
+Зависимость websocket-client опциональна: без неё get_page_session возвращает None,
+а вызывающий код откатывается на старые пути через WebDriver.
+"""
+
+import itertools
+import json
+import logging
+import threading
+import urllib.request
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:  # опциональная зависимость
+    import websocket  # websocket-client
+except Exception:  # pragma: no cover
+    websocket = None  # type: ignore[assignment]
+
+__all__ = [
+    "CdpError",
+    "CdpConnection",
+    "PageSession",
+    "devtools_ws_url",
+    "get_page_session",
+    "get_side_session",
+    "side_evaluate",
+    "close_page_session",
+]
+
+log = logging.getLogger(__name__)
+
+EventHandler = Callable[[Dict[str, Any], Optional[str]], None]
+
+
+class CdpError(RuntimeError):
+    """Ошибки собственного CDP-соединения."""
+
+
+# ------------------------------ Соединение -----------------------------------
+
+
+class CdpConnection:
+    """
+    Websocket к DevTools (уровень браузера или страницы).
+    Команды отправляются из любых потоков; ответы и события разбирает один поток-читатель.
+    """
+
+    def __init__(self, ws_url: str, *, connect_timeout: float = 5.0) -> None:
+        if websocket is None:
+            raise CdpError("websocket-client is not installed (pip install websocket-client)")
+        self.ws_url = ws_url
+        try:
+            self._ws = websocket.create_connection(
+                ws_url,
+                timeout=connect_timeout,
+                enable_multithread=True,
+                suppress_origin=True,
+            )
+            self._ws.settimeout(None)
+        except Exception as e:
+            raise CdpError(f"devtools connect failed ({ws_url}): {e}") from e
+
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Future] = {}
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        self._reader = threading.Thread(target=self._read_loop, name="cdp-reader", daemon=True)
+        self._reader.start()
+
+    # ---- команды ---------------------------------------------------------
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed.is_set()
+
+    def submit(self, method: str, params: Optional[Dict[str, Any]] = None, *, session_id: Optional[str] = None) -> Future:
+        """Отправить команду без ожидания ответа; результат — Future."""
+        if self._closed.is_set():
+            raise CdpError("devtools connection is closed")
+        cid = next(self._ids)
+        fut: Future = Future()
+        msg: Dict[str, Any] = {"id": cid, "method": method, "params": params or {}}
+        if session_id:
+            msg["sessionId"] = session_id
+        with self._lock:
+            self._pending[cid] = fut
+        try:
+            self._ws.send(json.dumps(msg))
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(cid, None)
+            self.close()
+            raise CdpError(f"devtools send failed: {e}") from e
+        return fut
+
+    def send(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        session_id: Optional[str] = None,
+        timeout: float = 10.0,
+    ) -> Dict[str, Any]:
+        """Отправить команду и дождаться результата."""
+        fut = self.submit(method, params, session_id=session_id)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout as e:
+            raise CdpError(f"devtools timeout: {method}") from e
+
+    def send_many(
+        self,
+        commands: Sequence[Tuple[str, Dict[str, Any]]],
+        *,
+        session_id: Optional[str] = None,
+        timeout: float = 10.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Конвейер: отправляем все команды подряд, затем ждём все ответы.
+        Порядок исполнения в браузере сохраняется (один websocket).
+        """
+        futs = [self.submit(m, p, session_id=session_id) for m, p in commands]
+        out: List[Dict[str, Any]] = []
+        for (m, _), f in zip(commands, futs):
+            try:
+                out.append(f.result(timeout=timeout))
+            except FutureTimeout as e:
+                raise CdpError(f"devtools timeout: {m}") from e
+        return out
+
+    # ---- события ---------------------------------------------------------
+
+    def on(self, event: str, handler: EventHandler) -> None:
+        with self._lock:
+            self._handlers.setdefault(event, []).append(handler)
+
+    def off(self, event: str, handler: EventHandler) -> None:
+        with self._lock:
+            hs = self._handlers.get(event) or []
+            if handler in hs:
+                hs.remove(handler)
+
+    # ---- завершение ------------------------------------------------------
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for f in pending:
+            if not f.done():
+                f.set_exception(CdpError("devtools connection closed"))
+
+    # ---- внутренности ----------------------------------------------------
+
+    def _read_loop(self) -> None:
+        try:
+            while not self._closed.is_set():
+                raw = self._ws.recv()
+                if not raw:
+                    continue
+                try:
+                    msg = json.loads(raw)
+                except Exception:
+                    continue
+                if "id" in msg:
+                    with self._lock:
+                        fut = self._pending.pop(int(msg["id"]), None)
+                    if fut is None or fut.done():
+                        continue
+                    if "error" in msg:
+                        fut.set_exception(CdpError(str(msg.get("error"))))
+                    else:
+                        fut.set_result(msg.get("result") or {})
+                    continue
+                method = msg.get("method")
+                if not method:
+                    continue
+                with self._lock:
+                    hs = list(self._handlers.get(method) or [])
+                for h in hs:
+                    try:
+                        h(msg.get("params") or {}, msg.get("sessionId"))
+                    except Exception as e:
+                        log.debug("cdp handler %s failed: %s", method, e)
+        except Exception as e:
+            if not self._closed.is_set():
+                log.debug("cdp reader stopped: %s", e)
+        finally:
+            self.close()
+
+
+# ------------------------------ Сессия вкладки -------------------------------
+
+
+class PageSession:
+    """
+    Команды/события одной вкладки поверх CdpConnection.
+    Для браузерного websocket — flatten-сессия через Target.attachToTarget;
+    для websocket страницы (/devtools/page/...) — sessionId не нужен.
+    """
+
+    def __init__(self, conn: CdpConnection, target_id: str, session_id: Optional[str]) -> None:
+        self.conn = conn
+        self.target_id = target_id
+        self.session_id = session_id
+        self._wrapped: Dict[Tuple[str, EventHandler], EventHandler] = {}
+        self.attrs: Dict[str, Any] = {}  # подписчики верхнего уровня (навигация, screencast…) кэшируют себя тут
+        self._detached = False
+
+    @property
+    def alive(self) -> bool:
+        return self.conn.alive and not self._detached
+
+    def submit(self, method: str, params: Optional[Dict[str, Any]] = None) -> Future:
+        return self.conn.submit(method, params, session_id=self.session_id)
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None, *, timeout: float = 10.0) -> Dict[str, Any]:
+        return self.conn.send(method, params, session_id=self.session_id, timeout=timeout)
+
+    def send_many(self, commands: Sequence[Tuple[str, Dict[str, Any]]], *, timeout: float = 10.0) -> List[Dict[str, Any]]:
+        return self.conn.send_many(commands, session_id=self.session_id, timeout=timeout)
+
+    def on(self, event: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        """Подписка только на события этой вкладки."""
+        sid = self.session_id
+
+        def _h(params: Dict[str, Any], session_id: Optional[str]) -> None:
+            if session_id == sid:
+                handler(params)
+
+        self._wrapped[(event, handler)] = _h  # type: ignore[index]
+        self.conn.on(event, _h)
+
+    def off(self, event: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+        h = self._wrapped.pop((event, handler), None)  # type: ignore[arg-type]
+        if h is not None:
+            self.conn.off(event, h)
+
+    def close(self) -> None:
+        self._detached = True
+        if self.session_id and self.conn.alive:
+            try:
+                self.conn.submit("Target.detachFromTarget", {"sessionId": self.session_id})
+            except Exception:
+                pass
+
+
+# ------------------------------ Фабрика --------------------------------------
+
+_SESSION_ATTR = "_adsai_cdp"
+_SIDE_ATTR = "_adsai_cdp_side"
+_factory_lock = threading.Lock()
+
+
+def devtools_ws_url(driver: Any) -> Optional[str]:
+    """
+    DevTools websocket браузера:
+      1) driver._adspower["devtools_ws"] (сохраняет start_adspower);
+      2) /json/version по debuggerAddress (selenium_addr или goog:chromeOptions).
+    """
+    meta = getattr(driver, "_adspower", None) or {}
+    ws = meta.get("devtools_ws") if isinstance(meta, dict) else None
+    if ws:
+        return str(ws)
+
+    addr = meta.get("selenium_addr") if isinstance(meta, dict) else None
+    if not addr:
+        try:
+            caps = dict(getattr(driver, "capabilities", None) or {})
+            addr = (caps.get("goog:chromeOptions") or {}).get("debuggerAddress")
+        except Exception:
+            addr = None
+    if not addr:
+        return None
+    try:
+        with urllib.request.urlopen(f"http://{addr}/json/version", timeout=2.0) as r:
+            data = json.loads(r.read().decode("utf-8", "ignore") or "{}")
+        return data.get("webSocketDebuggerUrl") or None
+    except Exception as e:
+        log.debug("devtools /json/version failed (%s): %s", addr, e)
+        return None
+
+
+def _current_target_id(driver: Any) -> str:
+    # chromedriver использует id таргета DevTools как window handle
+    try:
+        return str(driver.current_window_handle or "")
+    except Exception:
+        return ""
+
+
+def get_page_session(driver: Any) -> Optional[PageSession]:
+    """
+    Сессия CDP для текущей вкладки драйвера (кэшируется на драйвере, переподключается при разрыве).
+    None — если websocket-client не установлен или DevTools недоступен.
+    """
+    if websocket is None:
+        return None
+    target_id = _current_target_id(driver)
+    cached: Optional[PageSession] = getattr(driver, _SESSION_ATTR, None)
+    if cached is not None and cached.alive and (not target_id or cached.target_id == target_id):
+        return cached
+
+    with _factory_lock:
+        cached = getattr(driver, _SESSION_ATTR, None)
+        if cached is not None and cached.alive and (not target_id or cached.target_id == target_id):
+            return cached
+
+        conn = cached.conn if (cached is not None and cached.alive) else None
+        try:
+            if conn is None:
+                url = devtools_ws_url(driver)
+                if not url:
+                    return None
+                conn = CdpConnection(url)
+            if "/devtools/page/" in conn.ws_url:
+                sess = PageSession(conn, target_id or conn.ws_url.rsplit("/", 1)[-1], None)
+            else:
+                if not target_id:
+                    return None
+                res = conn.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}, timeout=5.0)
+                sess = PageSession(conn, target_id, str(res.get("sessionId") or "") or None)
+        except Exception as e:
+            log.debug("cdp page session unavailable: %s", e)
+            return None
+
+        if cached is not None and cached is not sess:
+            cached.close()
+        try:
+            setattr(driver, _SESSION_ATTR, sess)
+        except Exception:
+            pass
+        return sess
+
+
+def _pick_page_target(conn: CdpConnection, driver: Any) -> Optional[str]:
+    """
+    Вкладка для фоновой сессии без обращения к WebDriver: target основной CDP-сессии
+    (его выбрала автоматизация), иначе — первая обычная страница из Target.getTargets.
+    """
+    main: Optional[PageSession] = getattr(driver, _SESSION_ATTR, None)
+    if main is not None and main.alive and main.target_id:
+        return main.target_id
+    if "/devtools/page/" in conn.ws_url:
+        return conn.ws_url.rsplit("/", 1)[-1]
+    res = conn.send("Target.getTargets", {}, timeout=5.0)
+    pages = [
+        t for t in (res.get("targetInfos") or [])
+        if t.get("type") == "page" and not str(t.get("url") or "").startswith(("devtools://", "chrome-extension://"))
+    ]
+    pages.sort(key=lambda t: not t.get("attached"))  # вкладка, к которой подключён chromedriver, — первой
+    return str(pages[0].get("targetId")) if pages else None
+
+
+def get_side_session(driver: Any, *, create: bool = True) -> Optional[PageSession]:
+    """
+    Отдельное DevTools-соединение (свой websocket по devtools_ws из driver._adspower)
+    для фоновых наблюдателей — превью, метрики вьюпорта. Не использует ни канал chromedriver,
+    ни блокировки вызывающего кода, ни основную сессию автоматизации: нагрузка превью
+    не влияет на задержки прогона. Следует за вкладкой основной CDP-сессии, если она есть.
+    """
+    if websocket is None:
+        return None
+    cached: Optional[PageSession] = getattr(driver, _SIDE_ATTR, None)
+    main: Optional[PageSession] = getattr(driver, _SESSION_ATTR, None)
+    want = main.target_id if (main is not None and main.alive) else None
+    if cached is not None and cached.alive and (not want or cached.target_id == want):
+        return cached
+    if not create:
+        return cached if (cached is not None and cached.alive) else None
+
+    with _factory_lock:
+        cached = getattr(driver, _SIDE_ATTR, None)
+        if cached is not None and cached.alive and (not want or cached.target_id == want):
+            return cached
+        conn = cached.conn if (cached is not None and cached.alive) else None
+        try:
+            if conn is None:
+                url = devtools_ws_url(driver)
+                if not url:
+                    return None
+                conn = CdpConnection(url)
+            target_id = _pick_page_target(conn, driver)
+            if not target_id:
+                return None
+            if "/devtools/page/" in conn.ws_url:
+                sess = PageSession(conn, target_id, None)
+            else:
+                res = conn.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}, timeout=5.0)
+                sess = PageSession(conn, target_id, str(res.get("sessionId") or "") or None)
+        except Exception as e:
+            log.debug("cdp side session unavailable: %s", e)
+            return None
+
+        if cached is not None and cached is not sess:
+            cached.close()
+        try:
+            setattr(driver, _SIDE_ATTR, sess)
+        except Exception:
+            pass
+        return sess
+
+
+def side_evaluate(driver: Any, expression: str, *, timeout: float = 5.0) -> Any:
+    """
+    Runtime.evaluate (returnByValue) по фоновой сессии — без round trip через chromedriver.
+    CdpError, если сессия недоступна или выражение бросило исключение (вызывающий откатывается на WebDriver).
+    """
+    page = get_side_session(driver)
+    if page is None:
+        raise CdpError("side session unavailable")
+    res = page.send("Runtime.evaluate", {"expression": expression, "returnByValue": True}, timeout=timeout)
+    if res.get("exceptionDetails"):
+        raise CdpError(str((res.get("exceptionDetails") or {}).get("text") or "evaluate failed"))
+    return (res.get("result") or {}).get("value")
+
+
+def close_page_session(driver: Any) -> None:
+    """Закрыть собственные CDP-соединения драйвера (основное и фоновое) перед quit/stop."""
+    for attr in (_SESSION_ATTR, _SIDE_ATTR):
+        sess: Optional[PageSession] = getattr(driver, attr, None)
+        if sess is None:
+            continue
+        try:
+            sess.conn.close()
+        except Exception:
+            pass
+        try:
+            setattr(driver, attr, None)
+        except Exception:
+            pass
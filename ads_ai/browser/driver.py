@@ -86,8 +86,24 @@ def set_window(
 
 def _ensure_ready_state_fallback(d: WebDriver, timeout: float = 10.0) -> None:
     """
-    Простейший локальный поллер readyState, если нет нашей реализованной waits.ensure_ready_state.
+    Локальное ожидание readyState, если нет нашей реализованной waits.ensure_ready_state.
+    При доступном CDP-websocket — ждём событие Page.loadEventFired, иначе поллинг.
     """
+    try:
+        from .nav_events import get_navigation_events
+        nav = get_navigation_events(d)
+    except Exception:  # noqa: BLE001
+        nav = None
+    if nav is not None:
+        mark = nav.snapshot()
+        try:
+            if d.execute_script("return document.readyState") == "complete":
+                return
+        except WebDriverException:
+            pass
+        nav.wait_load(mark[1], timeout)
+        return
+
     deadline = time.time() + timeout
     last_state = None
     while time.time() < deadline:
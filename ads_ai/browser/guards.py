@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import collections
+import json
 from dataclasses import dataclass, field
-from typing import Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from selenium.webdriver.remote.webdriver import WebDriver
 
+from ads_ai.browser.cdp import side_evaluate
 from ads_ai.config.settings import Guards as GuardsCfg, Browser as BrowserCfg
 from ads_ai.utils.ids import sha1
 
@@ -43,6 +45,56 @@ def _viewport_dom(d: WebDriver) -> str:
         return ""
 
 
+# Один проход по странице: хеш DOM (FNV-1a, считается в браузере), ключевые слова капчи,
+# URL/readyState и счётчики. Наружу — маленький dict вместо полного outerHTML.
+_JS_PROBE = """
+(function(keys, viewport){
+  var de = document.documentElement;
+  var html = de ? de.outerHTML : '';
+  var h = 0x811c9dc5;
+  for (var i = 0; i < html.length; i++) { h ^= html.charCodeAt(i); h = Math.imul(h, 0x01000193); }
+  if (viewport) { h ^= Math.round(window.scrollY || 0); h = Math.imul(h, 0x01000193); }
+  var low = html.toLowerCase();
+  var hits = keys.filter(function(k){ return k && low.indexOf(k) >= 0; });
+  var q = function(s){ try { return document.querySelectorAll(s).length; } catch (e) { return 0; } };
+  return {
+    hash: (h >>> 0).toString(16) + ':' + html.length,
+    hits: hits,
+    url: String(location.href || ''),
+    ready: String(document.readyState || ''),
+    len: html.length,
+    nodes: q('*'),
+    inputs: q('input,textarea,select'),
+    buttons: q('button,[role=button]'),
+    dialogs: q('[role=dialog],[role=alertdialog],dialog[open]'),
+    iframes: q('iframe')
+  };
+})(%s, %s)
+"""
+
+
+@dataclass
+class PageProbe:
+    """Сводка страницы после шага (Guards.probe). dom_hash == "" — снять не удалось."""
+    dom_hash: str = ""
+    captcha_hits: List[str] = field(default_factory=list)
+    url: str = ""
+    ready_state: str = ""
+    dom_len: int = 0
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.dom_hash)
+
+    @property
+    def captcha(self) -> bool:
+        return bool(self.captcha_hits)
+
+    def as_trace(self) -> Dict[str, Any]:
+        return {"url": self.url, "ready": self.ready_state, "dom_len": self.dom_len, "counts": self.counts}
+
+
 @dataclass
 class LoopGuardState:
     hashes: collections.deque[str] = field(default_factory=lambda: collections.deque(maxlen=8))
@@ -61,13 +113,44 @@ class Guards:
             return _viewport_dom(self.driver)
         return _full_dom(self.driver)
 
-    def loop_guard_update(self, recent_actions: Iterable[dict]) -> bool:
+    def probe(self, keywords: Optional[List[str]] = None) -> PageProbe:
+        """
+        Один вызов в страницу вместо нескольких выгрузок DOM: хеш, капча, URL, readyState, счётчики.
+        Идёт по фоновой DevTools-сессии, без неё — одним execute_script. Не бросает.
+        """
+        keys = [str(k).lower() for k in (keywords or self.guards_cfg.captcha_keywords or []) if k]
+        viewport = str(self.browser_cfg.dom_scope).lower() == "viewport"
+        expr = _JS_PROBE % (json.dumps(keys), "true" if viewport else "false")
+        raw: Any = None
+        try:
+            raw = side_evaluate(self.driver, expr, timeout=5.0)
+        except Exception:
+            try:
+                raw = self.driver.execute_script("return " + expr.strip())
+            except Exception:
+                raw = None
+        if not isinstance(raw, dict):
+            return PageProbe()
+        return PageProbe(
+            dom_hash=str(raw.get("hash") or ""),
+            captcha_hits=[str(k) for k in (raw.get("hits") or [])],
+            url=str(raw.get("url") or ""),
+            ready_state=str(raw.get("ready") or ""),
+            dom_len=int(raw.get("len") or 0),
+            counts={k: int(raw.get(k) or 0) for k in ("nodes", "inputs", "buttons", "dialogs", "iframes")},
+        )
+
+    def loop_guard_update(self, recent_actions: Iterable[dict], dom_hash: Optional[str] = None) -> bool:
         """
         Добавляет хеш DOM снапшота и проверяет «ступор».
         Возвращает True, если DOM не меняется в окне наблюдения и были действия типа click/input/select.
+        dom_hash — готовый хеш из probe(); без него DOM выгружается и хешируется здесь.
         """
-        html = self.dom_snapshot()
-        h = sha1((html or "")[:50000])  # 50кб достаточно для сигнатуры
+        if dom_hash:
+            h = dom_hash
+        else:
+            html = self.dom_snapshot()
+            h = sha1((html or "")[:50000])  # 50кб достаточно для сигнатуры
         self.state.hashes.append(h)
 
         window = self.guards_cfg.loop_dom_hash_window
@@ -86,13 +169,16 @@ class Guards:
             return True
         return False
 
-    def detect_captcha(self, keywords: Optional[List[str]] = None) -> bool:
+    def detect_captcha(self, keywords: Optional[List[str]] = None, probe: Optional[PageProbe] = None) -> bool:
         """
         Примитивная проверка на капчу: по ключевым словам в HTML.
+        probe — готовая сводка из probe() (ключевые слова уже проверены в странице).
         """
         keys = [k.lower() for k in (keywords or self.guards_cfg.captcha_keywords or [])]
         if not keys:
             return False
+        if probe is not None and probe.ok:
+            return probe.captcha
         try:
             html = (self.driver.page_source or "").lower()
         except Exception:
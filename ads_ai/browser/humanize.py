@@ -17,6 +17,10 @@ from selenium.common.exceptions import (
     MoveTargetOutOfBoundsException,
 )
 
+from ads_ai.browser.cdp import get_page_session
+from ads_ai.browser.keystrokes import build_schedule, replay_cdp, replay_in_page
+from ads_ai.browser.pixel import mouse_path
+from ads_ai.browser.trajectory import rect_path
 from ads_ai.config.settings import Humanize as HumanizeCfg
 from ads_ai.utils.time import jitter_ms
 
@@ -58,6 +62,8 @@ class Humanizer:
     ) -> None:
         """
         Посимвольный ввод текста (без обязательного clear), с небольшими паузами между символами.
+        Расписание пауз считается заранее и проигрывается одним вызовом (cfg.typing_engine:
+        inpage | cdp | keys); остаток, который не удалось ввести, добивается send_keys по символу.
         Устойчив к недавнему clear(): делаем короткую паузу, аккуратно фокусируем элемент.
         Никаких исключений наружу не утекает: максимум — частичное введение текста.
         """
@@ -86,13 +92,28 @@ class Humanizer:
         dmin = max(0.0, dmin)
         dmax = max(dmin, dmax)
 
-        # «дыхание» на границах слов/пунктуации
-        breath_marks = {",", ".", ";", ":", "!", "?", " "}
-        # редкий «перевод духа» раз в N символов
-        long_breath_every = random.randint(25, 45)
+        # 3) расписание (база + «дыхание» на пунктуации + редкий длинный вдох) считаем заранее
+        #    и проигрываем одним вызовом; недобранный остаток — посимвольно, как раньше
+        text = str(text)
+        schedule = build_schedule(
+            text,
+            delay_min=dmin,
+            delay_max=dmax,
+            pause_min_ms=getattr(self.cfg, "jitter_ms_min", 10),
+            pause_max_ms=getattr(self.cfg, "jitter_ms_max", 40),
+        )
+        engine = str(getattr(self.cfg, "typing_engine", "inpage") or "inpage").lower()
+        sent: Optional[int] = 0
+        if engine == "inpage":
+            sent = replay_in_page(self.driver, el, text, schedule)
+        elif engine == "cdp":
+            sent = replay_cdp(self.driver, text, schedule)
+        if sent is None:
+            # сколько ввёл скрипт в странице — неизвестно: повторный ввод задвоит текст
+            self.tiny_pause()
+            return
 
-        sent = 0
-        for idx, ch in enumerate(str(text)):
+        for ch, delay in zip(text[sent:], schedule[sent:]):
             # попытка обычного ввода
             if not self._send_keys_safe(el, ch):
                 # пробуем восстановить фокус и кликнуть по элементу
@@ -106,19 +127,7 @@ class Humanizer:
                     if not self._js_insert_char(el, ch):
                         # выходим, чтобы не зациклиться — лучше частичный ввод, чем падение
                         break
-
-            sent += 1
-
-            # базовая задержка
-            time.sleep(random.uniform(dmin, dmax))
-
-            # редкие микро‑брейки по пунктуации/пробелам
-            if ch in breath_marks and random.random() < 0.08:
-                self.tiny_pause()
-
-            # более длинная пауза раз в N символов
-            if sent % long_breath_every == 0 and random.random() < 0.5:
-                self.tiny_pause()
+            time.sleep(delay)
 
         # финальная микропаузa
         self.tiny_pause()
@@ -147,6 +156,17 @@ class Humanizer:
         steps = max(4, int(steps or getattr(self.cfg, "mouse_steps", 6)))
 
         rect = self._rect(el)
+
+        # Весь путь (вместе с «тремором») — одним пакетом по DevTools-websocket.
+        # Только в верхнем документе: координаты CDP — вьюпорт вкладки, не iframe.
+        if rect.get("top") and get_page_session(self.driver) is not None:
+            try:
+                mouse_path(self.driver, rect_path(rect, steps=steps, dt=0.02, wiggle=wiggle))
+                self.tiny_pause()
+                return
+            except Exception:
+                pass  # ниже — прежний путь через ActionChains
+
         w = max(2.0, rect["w"])
         h = max(2.0, rect["h"])
 
@@ -293,11 +313,11 @@ class Humanizer:
         self.tiny_pause()
 
     def _rect(self, el: WebElement) -> dict:
-        """Безопасно получает {x,y,w,h} через getBoundingClientRect(), с запасным значением."""
+        """Безопасно получает {x,y,w,h,top} через getBoundingClientRect(), с запасным значением (top — верхний документ)."""
         try:
             r = self.driver.execute_script(
                 "const b=arguments[0].getBoundingClientRect();"
-                "return {x:b.left, y:b.top, w:b.width, h:b.height};", el
+                "return {x:b.left, y:b.top, w:b.width, h:b.height, top:window.top===window};", el
             )
             if isinstance(r, dict):
                 return {
@@ -305,6 +325,7 @@ class Humanizer:
                     "y": float(r.get("y", 0.0)),
                     "w": float(r.get("w", 0.0)),
                     "h": float(r.get("h", 0.0)),
+                    "top": bool(r.get("top", False)),
                 }
         except Exception:
             pass
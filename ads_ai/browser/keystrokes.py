@@ -0,0 +1,251 @@
+# ads_ai/browser/keystrokes.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Движок «человеческого» ввода текста одним вызовом.
+
+Расписание задержек (база + «дыхание» на пунктуации + редкий длинный вдох)
+считается в Python заранее, затем проигрывается целиком:
+  • in-page: один execute_async_script на пакет символов; каждый символ —
+    keydown → execCommand('insertText') (нативные beforeinput/input) → keyup;
+    если execCommand не сработал — нативный setter value + InputEvent
+    (React/Angular видят изменение);
+  • cdp: доверенные Input.dispatchKeyEvent через собственный DevTools-websocket
+    (browser/cdp.py) по тому же расписанию, без HTTP round trip на символ.
+
+Вызывающий код (Humanizer.type_text) доигрывает недобранный остаток старым
+посимвольным send_keys. In-page пакет укладывается в script timeout драйвера и сам
+останавливается по дедлайну; если скрипт всё же упал — цепочка в странице гасится
+токеном, а число введённых символов читается из неё же (не удалось — None, остаток
+не доигрываем: поле может уже содержать текст).
+"""
+
+import random
+import secrets
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from ads_ai.browser.cdp import get_page_session
+from ads_ai.utils.time import jitter_ms
+
+__all__ = ["BREATH_MARKS", "build_schedule", "split_schedule", "replay_in_page", "replay_cdp"]
+
+# «дыхание» на границах слов/пунктуации
+BREATH_MARKS = frozenset({",", ".", ";", ":", "!", "?", " "})
+
+# Script timeout драйвера, если его не узнать (минимальный из выставляемых в проекте)
+_DEFAULT_SCRIPT_TIMEOUT_SEC = 15.0
+# Расписание пакета — половина script timeout; дедлайн в странице — с запасом до таймаута
+_CHUNK_SHARE = 0.5
+_DEADLINE_MARGIN_SEC = 2.0
+_CHUNK_BUDGET_SEC = _DEFAULT_SCRIPT_TIMEOUT_SEC * _CHUNK_SHARE
+
+
+def build_schedule(
+    text: str,
+    *,
+    delay_min: float,
+    delay_max: float,
+    pause_min_ms: int,
+    pause_max_ms: int,
+    breath_prob: float = 0.08,
+    long_breath_every: Optional[int] = None,
+    long_breath_prob: float = 0.5,
+) -> List[float]:
+    """
+    Задержка (сек) ПОСЛЕ каждого символа — та же модель, что у посимвольного ввода:
+      база uniform(delay_min, delay_max);
+      + tiny_pause на пунктуации/пробелах с вероятностью breath_prob;
+      + tiny_pause раз в N символов (N ∈ [25, 45]) с вероятностью long_breath_prob.
+    """
+    dmin = max(0.0, float(delay_min))
+    dmax = max(dmin, float(delay_max))
+    every = int(long_breath_every or random.randint(25, 45))
+
+    def tiny() -> float:
+        return jitter_ms(pause_min_ms, pause_max_ms)
+
+    out: List[float] = []
+    for idx, ch in enumerate(str(text), start=1):
+        d = random.uniform(dmin, dmax)
+        if ch in BREATH_MARKS and random.random() < breath_prob:
+            d += tiny()
+        if idx % every == 0 and random.random() < long_breath_prob:
+            d += tiny()
+        out.append(d)
+    return out
+
+
+def split_schedule(text: str, delays: Sequence[float], budget_sec: float = _CHUNK_BUDGET_SEC) -> List[Tuple[str, List[float]]]:
+    """Режем (текст, расписание) на пакеты, каждый укладывается в бюджет одного async-скрипта."""
+    chunks: List[Tuple[str, List[float]]] = []
+    buf_t: List[str] = []
+    buf_d: List[float] = []
+    acc = 0.0
+    for ch, d in zip(str(text), delays):
+        if buf_t and acc + d > budget_sec:
+            chunks.append(("".join(buf_t), buf_d))
+            buf_t, buf_d, acc = [], [], 0.0
+        buf_t.append(ch)
+        buf_d.append(float(d))
+        acc += float(d)
+    if buf_t:
+        chunks.append(("".join(buf_t), buf_d))
+    return chunks
+
+
+_JS_REPLAY = r"""
+const el = arguments[0], text = String(arguments[1] || ''), delays = arguments[2] || [];
+const token = String(arguments[3] || ''), until = Date.now() + Number(arguments[4] || 0);
+const cb = arguments[arguments.length - 1];
+const chars = Array.from(text);
+// состояние на элементе: новый пакет (новый токен) или cancel гасят прежнюю цепочку
+const st = {token: token, typed: 0, stop: false};
+el.__adsAiReplay = st;
+let i = 0;
+
+function focused() {
+  const ae = document.activeElement;
+  return ae === el || (ae && el.contains && el.contains(ae)) || (el.shadowRoot && el.shadowRoot.activeElement);
+}
+function target() {
+  const ae = document.activeElement;
+  return (ae && el.contains && el.contains(ae)) ? ae : el;
+}
+function key(type, ch) {
+  try {
+    const t = target();
+    t.dispatchEvent(new KeyboardEvent(type, {key: ch === '\n' ? 'Enter' : ch, bubbles: true, cancelable: true, composed: true}));
+  } catch (_) {}
+}
+function nativeInsert(t, ch) {
+  const tag = (t.tagName || '').toUpperCase();
+  if (tag !== 'INPUT' && tag !== 'TEXTAREA') return false;
+  const proto = tag === 'INPUT' ? HTMLInputElement.prototype : HTMLTextAreaElement.prototype;
+  const setter = Object.getOwnPropertyDescriptor(proto, 'value').set;
+  const v = t.value || '';
+  let s = v.length, e = v.length;
+  try { if (t.selectionStart != null) { s = t.selectionStart; e = t.selectionEnd; } } catch (_) {}
+  setter.call(t, v.slice(0, s) + ch + v.slice(e));
+  try { t.setSelectionRange(s + ch.length, s + ch.length); } catch (_) {}
+  t.dispatchEvent(new InputEvent('input', {data: ch, inputType: 'insertText', bubbles: true, composed: true}));
+  return true;
+}
+function typeOne(ch) {
+  if (!focused()) { try { el.focus({preventScroll: true}); } catch (_) {} }
+  if (!focused()) return false;
+  key('keydown', ch);
+  let ok = false;
+  try { ok = document.execCommand('insertText', false, ch); } catch (_) { ok = false; }
+  if (!ok) { try { ok = nativeInsert(target(), ch); } catch (_) { ok = false; } }
+  key('keyup', ch);
+  return ok;
+}
+function alive() { return el.__adsAiReplay === st && !st.stop; }
+(function step() {
+  if (!alive()) return;  // скрипт отменён: драйвер уже не ждёт ответа
+  if (i >= chars.length) return cb([i, 'done']);
+  if (Date.now() > until) return cb([i, 'deadline']);  // таймер проспал (фоновая вкладка)
+  if (!typeOne(chars[i])) return cb([i, 'focus']);
+  const d = Math.max(0, Number(delays[i]) || 0) * 1000;
+  i++;
+  st.typed = i;
+  if (i < chars.length && Date.now() + d > until) return cb([i, 'deadline']);
+  setTimeout(step, d);
+})();
+"""
+
+# Отмена цепочки + сколько она успела ввести (синхронно: между шагами цепочки)
+_JS_CANCEL = r"""
+const el = arguments[0], st = el && el.__adsAiReplay;
+if (!st || st.token !== arguments[1]) return null;
+st.stop = true;
+return st.typed;
+"""
+
+
+def script_timeout(driver: Any) -> float:
+    """Script timeout драйвера (сек); не удалось узнать — _DEFAULT_SCRIPT_TIMEOUT_SEC."""
+    try:
+        t = float(driver.timeouts.script)
+        if t > 0:
+            return t
+    except Exception:
+        pass
+    return _DEFAULT_SCRIPT_TIMEOUT_SEC
+
+
+def replay_in_page(driver: Any, el: Any, text: str, delays: Sequence[float]) -> Optional[int]:
+    """
+    Проиграть расписание в странице (один async-скрипт на пакет, в пределах script timeout).
+    Возвращает число реально введённых символов (для доигрывания остатка);
+    None — сколько введено, неизвестно (остаток доигрывать нельзя).
+    """
+    timeout = script_timeout(driver)
+    budget = max(0.5, timeout * _CHUNK_SHARE)
+    deadline_ms = int(max(budget, timeout - _DEADLINE_MARGIN_SEC) * 1000)
+    text = str(text)
+    delays = list(delays)
+    typed = 0
+    while typed < len(text):
+        chunks = split_schedule(text[typed:], delays[typed:], budget)
+        if not chunks:
+            break
+        part, ds = chunks[0]
+        token = secrets.token_hex(8)
+        try:
+            res = driver.execute_async_script(_JS_REPLAY, el, part, list(ds), token, deadline_ms)
+            n, why = int(res[0]), str(res[1])
+        except Exception:
+            got = _cancel(driver, el, token)
+            return None if got is None else typed + min(got, len(part))
+        typed += min(max(0, n), len(part))
+        if why not in ("done", "deadline") or n <= 0:
+            break  # фокус потерян — остаток доиграет вызывающий
+    return typed
+
+
+def _cancel(driver: Any, el: Any, token: str) -> Optional[int]:
+    """Погасить цепочку пакета token; -> сколько символов она ввела (None — не узнать)."""
+    try:
+        got = driver.execute_script(_JS_CANCEL, el, token)
+    except Exception:
+        return None
+    return None if got is None else int(got)
+
+
+def _key_events(ch: str) -> Tuple[dict, dict]:
+    if ch == "\n":
+        down = {"type": "keyDown", "key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13, "text": "\r"}
+        return down, {"type": "keyUp", "key": "Enter", "code": "Enter", "windowsVirtualKeyCode": 13}
+    return {"type": "keyDown", "key": ch, "text": ch, "unmodifiedText": ch}, {"type": "keyUp", "key": ch}
+
+
+def replay_cdp(driver: Any, text: str, delays: Sequence[float]) -> int:
+    """
+    Доверенные Input.dispatchKeyEvent в сфокусированный элемент по расписанию.
+    Команды уходят по DevTools-websocket без ожидания ответа; подтверждения собираем в конце.
+    Возвращает число символов, чей keyDown браузер подтвердил (0 — CDP-websocket недоступен).
+    """
+    page = get_page_session(driver)
+    if page is None:
+        return 0
+    downs = []
+    try:
+        for ch, d in zip(str(text), delays):
+            down, up = _key_events(ch)
+            downs.append(page.submit("Input.dispatchKeyEvent", down))
+            page.submit("Input.dispatchKeyEvent", up)
+            if d > 0:
+                time.sleep(d)
+    except Exception:
+        pass
+    typed = 0
+    for f in downs:
+        try:
+            f.result(timeout=5.0)
+        except Exception:
+            break
+        typed += 1
+    return typed
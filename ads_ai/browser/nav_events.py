@@ -0,0 +1,171 @@
+# ads_ai/browser/nav_events.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Навигационные события вкладки через собственное CDP-соединение (см. browser/cdp.py).
+
+Подписка на Page.frameNavigated / Page.navigatedWithinDocument / Page.loadEventFired
+(+ domContentEventFired, frameStartedLoading) главного фрейма. Ожидающие потоки
+просыпаются в момент прихода события — без поллинга current_url/readyState.
+
+Публичный контракт:
+  - NavigationEvents            — состояние (url, счётчики событий) + ожидания
+  - get_navigation_events(driver) -> NavigationEvents|None
+  - wait_nav_activity(driver, timeout) -> bool  — «умный sleep» для ручных циклов ожидания
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ads_ai.browser.cdp import PageSession, get_page_session
+
+__all__ = ["NavigationEvents", "get_navigation_events", "wait_nav_activity"]
+
+log = logging.getLogger(__name__)
+
+_ATTR_KEY = "nav_events"
+
+
+class NavigationEvents:
+    """
+    Текущее навигационное состояние главного фрейма вкладки.
+
+    Счётчики монотонно растут и позволяют ждать «следующее» событие:
+      nav_seq  — frameNavigated/navigatedWithinDocument главного фрейма;
+      load_seq — loadEventFired;
+      dcl_seq  — domContentEventFired.
+    """
+
+    def __init__(self, page: PageSession) -> None:
+        self.page = page
+        self._cond = threading.Condition()
+        self.url: str = ""
+        self.loading: bool = False
+        self.nav_seq = 0
+        self.load_seq = 0
+        self.dcl_seq = 0
+        self._main_frame: Optional[str] = None
+
+        page.on("Page.frameNavigated", self._on_frame_navigated)
+        page.on("Page.navigatedWithinDocument", self._on_within_document)
+        page.on("Page.frameStartedLoading", self._on_started_loading)
+        page.on("Page.loadEventFired", self._on_load)
+        page.on("Page.domContentEventFired", self._on_dcl)
+        page.send("Page.enable", timeout=5.0)
+        try:
+            tree = page.send("Page.getFrameTree", timeout=5.0).get("frameTree") or {}
+            frame = tree.get("frame") or {}
+            with self._cond:
+                self._main_frame = frame.get("id") or self._main_frame
+                self.url = str(frame.get("url") or self.url)
+        except Exception as e:
+            log.debug("nav events: getFrameTree failed: %s", e)
+
+    # ---- состояние -------------------------------------------------------
+
+    @property
+    def alive(self) -> bool:
+        return self.page.alive
+
+    def snapshot(self) -> Tuple[int, int, str]:
+        """(nav_seq, load_seq, url) — точка отсчёта для последующих ожиданий."""
+        with self._cond:
+            return self.nav_seq, self.load_seq, self.url
+
+    # ---- ожидания --------------------------------------------------------
+
+    def wait_for(self, predicate: Callable[["NavigationEvents"], bool], timeout: float) -> bool:
+        """Ждать выполнения предиката над состоянием; проверка на каждом событии."""
+        end = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while True:
+                if predicate(self):
+                    return True
+                left = end - time.monotonic()
+                if left <= 0 or not self.page.alive:
+                    return bool(predicate(self))
+                self._cond.wait(timeout=left)
+
+    def wait_url(self, match: Callable[[str], bool], timeout: float) -> bool:
+        return self.wait_for(lambda s: bool(s.url) and match(s.url), timeout)
+
+    def wait_load(self, after_seq: int, timeout: float) -> bool:
+        """Ждать loadEventFired, пришедший после снимка after_seq."""
+        return self.wait_for(lambda s: s.load_seq > after_seq, timeout)
+
+    def wait_any(self, after: Tuple[int, int, str], timeout: float) -> bool:
+        """Ждать любое навигационное событие после снимка snapshot()."""
+        nav0, load0, _ = after
+        return self.wait_for(lambda s: s.nav_seq > nav0 or s.load_seq > load0, timeout)
+
+    # ---- обработчики CDP -------------------------------------------------
+
+    def _is_main(self, frame_id: Optional[str]) -> bool:
+        return not self._main_frame or frame_id == self._main_frame
+
+    def _on_frame_navigated(self, params: Dict[str, Any]) -> None:
+        frame = params.get("frame") or {}
+        if frame.get("parentId"):
+            return  # iframe
+        with self._cond:
+            self._main_frame = frame.get("id") or self._main_frame
+            self.url = str(frame.get("url") or "") + str(frame.get("urlFragment") or "")
+            self.nav_seq += 1
+            self._cond.notify_all()
+
+    def _on_within_document(self, params: Dict[str, Any]) -> None:
+        with self._cond:
+            if not self._is_main(params.get("frameId")):
+                return
+            self.url = str(params.get("url") or self.url)
+            self.nav_seq += 1
+            self._cond.notify_all()
+
+    def _on_started_loading(self, params: Dict[str, Any]) -> None:
+        with self._cond:
+            if self._is_main(params.get("frameId")):
+                self.loading = True
+
+    def _on_load(self, params: Dict[str, Any]) -> None:
+        with self._cond:
+            self.loading = False
+            self.load_seq += 1
+            self._cond.notify_all()
+
+    def _on_dcl(self, params: Dict[str, Any]) -> None:
+        with self._cond:
+            self.dcl_seq += 1
+            self._cond.notify_all()
+
+
+def get_navigation_events(driver: Any) -> Optional[NavigationEvents]:
+    """Подписчик навигации для текущей вкладки (кэшируется на CDP-сессии); None — если CDP-websocket недоступен."""
+    page = get_page_session(driver)
+    if page is None:
+        return None
+    nav = page.attrs.get(_ATTR_KEY)
+    if isinstance(nav, NavigationEvents) and nav.alive:
+        return nav
+    try:
+        nav = NavigationEvents(page)
+    except Exception as e:
+        log.debug("nav events unavailable: %s", e)
+        return None
+    page.attrs[_ATTR_KEY] = nav
+    return nav
+
+
+def wait_nav_activity(driver: Any, timeout: float) -> bool:
+    """
+    Замена time.sleep(timeout) в ручных циклах ожидания навигации:
+    возвращается сразу при навигационном событии вкладки (True) или по таймауту (False).
+    Без CDP-websocket — обычная пауза.
+    """
+    nav = get_navigation_events(driver)
+    if nav is None:
+        time.sleep(max(0.0, float(timeout)))
+        return False
+    return nav.wait_any(nav.snapshot(), timeout)
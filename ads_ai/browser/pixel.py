@@ -4,22 +4,32 @@ from __future__ import annotations
 Low‑level pixel interactions via Chrome DevTools Protocol (CDP).
 
 This module provides small helpers to perform coordinate‑based actions:
- - mouse_move / mouse_click / mouse_double_click
+ - mouse_move / mouse_path / mouse_click / mouse_double_click
  - type_text_cdp (text injection independent of focused element behavior)
  - key_press / press_enter
  - highlight_bbox (debug overlay)
 
 CDP is required (Chromium‑based drivers). If CDP is not available, functions
 raise RuntimeError with a clear message so callers can degrade gracefully.
+
+Multi‑event gestures (paths, clicks) are pipelined over the own DevTools
+websocket (browser/cdp.py) when available: one wait for all acknowledgements
+instead of a WebDriver HTTP round trip per event.
 """
 
-from typing import Any, Dict, Optional, Tuple, Union
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 try:  # Optional imports for graceful fallback
     from selenium.webdriver.remote.webdriver import WebDriver
 except Exception:  # pragma: no cover
     WebDriver = Any  # type: ignore
 
+try:
+    from ads_ai.browser.cdp import get_page_session
+except Exception:  # pragma: no cover
+    get_page_session = None  # type: ignore
+
 
 Coord = Union[int, float]
 BBoxLike = Union[Tuple[Coord, Coord, Coord, Coord], Dict[str, Any]]
@@ -36,6 +46,47 @@ def _cdp(d: WebDriver, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
     return d.execute_cdp_cmd(method, params)  # pyright: ignore[reportAttributeAccessIssue]
 
 
+def _cdp_many(d: WebDriver, commands: Sequence[Tuple[str, Dict[str, Any]]], pauses: Optional[Sequence[float]] = None) -> None:
+    """
+    Dispatch a sequence of CDP commands in order, sleeping pauses[i] after command i.
+
+    Over the DevTools websocket commands are sent without waiting for replies and
+    acknowledged once at the end. If the websocket drops mid‑way, the remaining
+    commands continue via execute_cdp_cmd (already sent ones are not repeated).
+    """
+    pauses = list(pauses or [])
+    start = 0
+    page = get_page_session(d) if get_page_session is not None else None
+    if page is not None:
+        futs = []
+        try:
+            for i, (method, params) in enumerate(commands):
+                if method == "Input.dispatchMouseEvent":
+                    params = dict(params, timestamp=time.time())
+                futs.append(page.submit(method, params))
+                start = i + 1
+                if i < len(pauses) and pauses[i] > 0:
+                    time.sleep(pauses[i])
+        except Exception:
+            pass
+        for f in futs:
+            try:
+                f.result(timeout=10.0)
+            except Exception as e:
+                raise RuntimeError(f"CDP dispatch failed: {e}") from e
+        if start >= len(commands):
+            return
+    for i in range(start, len(commands)):
+        method, params = commands[i]
+        _cdp(d, method, params)
+        if i < len(pauses) and pauses[i] > 0:
+            time.sleep(pauses[i])
+
+
+def _mouse_event(kind: str, x: Coord, y: Coord, *, button: str = "none", click_count: int = 0, modifiers: int = 0) -> Dict[str, Any]:
+    return {"type": kind, "x": float(x), "y": float(y), "button": button, "clickCount": int(click_count), "modifiers": int(modifiers)}
+
+
 def mouse_move(d: WebDriver, x: Coord, y: Coord, *, modifiers: int = 0) -> None:
     _cdp(
         d,
@@ -56,20 +107,29 @@ def mouse_click(
     b = button.lower()
     if b not in ("left", "right", "middle"):
         b = "left"
-    _cdp(
+    _cdp_many(
         d,
-        "Input.dispatchMouseEvent",
-        {"type": "mouseMoved", "x": float(x), "y": float(y), "button": "none", "modifiers": int(modifiers), "clickCount": 0},
+        [
+            ("Input.dispatchMouseEvent", _mouse_event("mouseMoved", x, y, modifiers=modifiers)),
+            ("Input.dispatchMouseEvent", _mouse_event("mousePressed", x, y, button=b, click_count=click_count, modifiers=modifiers)),
+            ("Input.dispatchMouseEvent", _mouse_event("mouseReleased", x, y, button=b, click_count=click_count, modifiers=modifiers)),
+        ],
     )
-    _cdp(
-        d,
-        "Input.dispatchMouseEvent",
-        {"type": "mousePressed", "x": float(x), "y": float(y), "button": b, "clickCount": int(click_count), "modifiers": int(modifiers)},
-    )
-    _cdp(
+
+
+def mouse_path(d: WebDriver, points: Sequence[Tuple[Coord, Coord, float]], *, modifiers: int = 0) -> None:
+    """
+    Move the cursor along a precomputed path of (x, y, pause_after_sec) viewport points
+    (see browser/trajectory.py). The whole path is one pipelined batch when the DevTools
+    websocket is available; otherwise one execute_cdp_cmd per point.
+    """
+    pts: List[Tuple[Coord, Coord, float]] = list(points or [])
+    if not pts:
+        return
+    _cdp_many(
         d,
-        "Input.dispatchMouseEvent",
-        {"type": "mouseReleased", "x": float(x), "y": float(y), "button": b, "clickCount": int(click_count), "modifiers": int(modifiers)},
+        [("Input.dispatchMouseEvent", _mouse_event("mouseMoved", x, y, modifiers=modifiers)) for x, y, _ in pts],
+        [float(dt) for _, _, dt in pts],
     )
 
 
@@ -87,10 +147,9 @@ def key_press(d: WebDriver, key: str, *, modifiers: int = 0) -> None:
     """Press a key using CDP (keydown+keyup). Accepts e.g. "Enter", "Tab", "Escape"."""
     k = str(key or "")
     payload: Dict[str, Any] = {"type": "keyDown", "key": k, "modifiers": int(modifiers)}
-    _cdp(d, "Input.dispatchKeyEvent", payload)
     payload_up = dict(payload)
     payload_up["type"] = "keyUp"
-    _cdp(d, "Input.dispatchKeyEvent", payload_up)
+    _cdp_many(d, [("Input.dispatchKeyEvent", payload), ("Input.dispatchKeyEvent", payload_up)])
 
 
 def press_enter(d: WebDriver) -> None:
@@ -154,6 +213,7 @@ def highlight_bbox(
 
 __all__ = [
     "mouse_move",
+    "mouse_path",
     "mouse_click",
     "mouse_double_click",
     "type_text_cdp",
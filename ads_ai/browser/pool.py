@@ -0,0 +1,398 @@
+# ads_ai/browser/pool.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Пул «тёплых» AdsPower-драйверов на процесс, ключ — profile_id.
+
+Старт профиля (active-list, v2/v1 start, ожидание порта, attach chromedriver,
+чистка вкладок) стоит 10–30 с. Веб-модули берут драйвер в аренду и возвращают
+его в пул вместо quit/stop: следующая операция на том же профиле (sync → bulk
+remove → …) получает уже подключённый браузер.
+
+Правила:
+  • один арендатор на профиль одновременно (остальные ждут освобождения);
+  • при выдаче из пула — проверка живости (is_alive) и хук сброса состояния;
+  • простаивающие дольше idle_ttl — закрываются фоновым уборщиком;
+  • не больше max_open открытых браузеров; при нехватке вытесняется самый
+    давно простаивающий.
+
+Публичный контракт:
+  - DriverPool(max_open, idle_ttl, reset, stop)
+      .acquire(profile_id, headless=, start=, prepare=, timeout=) -> driver
+      .release(driver, discard=False)
+      .lease(...)  — контекстный менеджер acquire/release
+      .owns(driver) / .evict(profile_id) / .close_all() / .stats()
+  - get_driver_pool() -> DriverPool  (синглтон, ENV: ADS_AI_DRIVER_POOL_MAX, ADS_AI_DRIVER_POOL_IDLE_SEC)
+  - is_alive(driver) / reset_driver_state(driver)
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+__all__ = [
+    "DriverPoolError",
+    "DriverPool",
+    "get_driver_pool",
+    "is_alive",
+    "reset_driver_state",
+]
+
+log = logging.getLogger(__name__)
+
+
+class DriverPoolError(RuntimeError):
+    """Пул не смог выдать драйвер (таймаут ожидания/лимит открытых браузеров)."""
+
+
+# ------------------------------ Хуки по умолчанию ------------------------------
+
+
+def is_alive(driver: Any) -> bool:
+    """Браузер и сессия chromedriver живы: окна есть, текущее окно доступно (иначе переключаемся на первое)."""
+    if driver is None or not getattr(driver, "session_id", None):
+        return False
+    try:
+        handles = driver.window_handles
+    except Exception:
+        return False
+    if not handles:
+        return False
+    try:
+        driver.current_window_handle
+    except Exception:
+        try:
+            driver.switch_to.window(handles[0])
+        except Exception:
+            return False
+    return True
+
+
+def reset_driver_state(driver: Any) -> None:
+    """
+    Сброс состояния между арендами: одна вкладка, верхний фрейм, без эмуляции метрик.
+    Cookies/localStorage не трогаем — это логин Google в профиле.
+    """
+    try:
+        handles = list(driver.window_handles)
+        if len(handles) > 1:
+            base = handles[0]
+            for h in handles[1:]:
+                try:
+                    driver.switch_to.window(h)
+                    driver.close()
+                except Exception:
+                    pass
+            driver.switch_to.window(base)
+    except Exception:
+        pass
+    try:
+        driver.switch_to.default_content()
+    except Exception:
+        pass
+    try:
+        driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    except Exception:
+        pass
+
+
+def _stop_driver(driver: Any) -> None:
+    """Закрыть драйвер и остановить профиль AdsPower (best-effort); без метаданных AdsPower — просто quit."""
+    if driver is None:
+        return
+    if isinstance(getattr(driver, "_adspower", None), dict):
+        try:
+            from ads_ai.browser.adspower import stop_adspower
+
+            stop_adspower(driver)
+            return
+        except Exception as e:
+            log.debug("pool: stop_adspower failed: %s", e)
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+# ------------------------------ Пул ------------------------------------------
+
+
+@dataclass
+class _Entry:
+    profile_id: str
+    headless: bool
+    driver: Any = None
+    leased: bool = True
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+    leases: int = 0
+
+
+class DriverPool:
+    def __init__(
+        self,
+        *,
+        max_open: int = 4,
+        idle_ttl: float = 300.0,
+        reset: Optional[Callable[[Any], None]] = reset_driver_state,
+        stop: Callable[[Any], None] = _stop_driver,
+    ) -> None:
+        self.max_open = max(1, int(max_open))
+        self.idle_ttl = float(idle_ttl)
+        self._reset = reset
+        self._stop = stop
+        self._cond = threading.Condition()
+        self._entries: Dict[str, _Entry] = {}
+        self._by_driver: Dict[int, str] = {}
+        self._janitor: Optional[threading.Thread] = None
+        self._stats = {"started": 0, "reused": 0, "dead": 0, "evicted": 0, "expired": 0, "discarded": 0}
+
+    # ---- аренда ----------------------------------------------------------
+
+    def acquire(
+        self,
+        profile_id: str,
+        *,
+        headless: bool,
+        start: Callable[[], Any],
+        prepare: Optional[Callable[[Any], None]] = None,
+        timeout: float = 180.0,
+    ) -> Any:
+        """
+        Выдать драйвер профиля: тёплый из пула или новый через start().
+        prepare(driver) вызывается на каждой аренде (таймауты, вьюпорт, загрузки модуля).
+        """
+        pid = str(profile_id)
+        end = time.monotonic() + max(0.0, float(timeout))
+        to_stop: List[Any] = []
+        with self._cond:
+            while True:
+                e = self._entries.get(pid)
+                if e is None:
+                    if len(self._entries) < self.max_open or self._evict_lru_unlocked(to_stop):
+                        e = _Entry(profile_id=pid, headless=bool(headless))
+                        self._entries[pid] = e
+                        break
+                elif not e.leased:
+                    e.leased = True
+                    break
+                left = end - time.monotonic()
+                if left <= 0:
+                    busy = "profile is leased" if pid in self._entries else f"max_open={self.max_open} reached"
+                    raise DriverPoolError(f"driver pool: timeout waiting for {pid} ({busy})")
+                self._cond.wait(timeout=left)
+        for d in to_stop:
+            self._stop_quiet(d)
+
+        drv = e.driver
+        if drv is not None:
+            if e.headless == bool(headless) and is_alive(drv):
+                if self._reset is not None:
+                    try:
+                        self._reset(drv)
+                    except Exception as ex:
+                        log.debug("pool: reset failed for %s: %s", pid, ex)
+                self._count("reused")
+            else:
+                self._count("dead" if e.headless == bool(headless) else "discarded")
+                with self._cond:
+                    self._forget_driver(e)
+                self._stop_quiet(drv)
+                drv = None
+
+        if drv is None:
+            try:
+                drv = start()
+                if drv is None:
+                    raise DriverPoolError(f"driver pool: start returned no driver for {pid}")
+            except BaseException:
+                with self._cond:
+                    self._entries.pop(pid, None)
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                e.driver = drv
+                e.headless = bool(headless)
+                self._by_driver[id(drv)] = pid
+            self._count("started")
+
+        with self._cond:
+            e.leases += 1
+        if prepare is not None:
+            try:
+                prepare(drv)
+            except Exception as ex:
+                log.debug("pool: prepare failed for %s: %s", pid, ex)
+        return drv
+
+    def release(self, driver: Any, *, discard: bool = False) -> None:
+        """Вернуть драйвер в пул (discard=True или idle_ttl<=0 — закрыть). Чужие драйверы просто закрываются."""
+        if driver is None:
+            return
+        stop_it = False
+        with self._cond:
+            pid = self._by_driver.get(id(driver))
+            e = self._entries.get(pid) if pid else None
+            if e is None or e.driver is not driver:
+                stop_it = True
+            elif discard or self.idle_ttl <= 0:
+                self._entries.pop(e.profile_id, None)
+                self._by_driver.pop(id(driver), None)
+                stop_it = True
+            else:
+                e.leased = False
+                e.last_used = time.monotonic()
+                self._ensure_janitor_unlocked()
+            self._cond.notify_all()
+        if stop_it:
+            self._stop_quiet(driver)
+
+    @contextmanager
+    def lease(
+        self,
+        profile_id: str,
+        *,
+        headless: bool,
+        start: Callable[[], Any],
+        prepare: Optional[Callable[[Any], None]] = None,
+        timeout: float = 180.0,
+    ) -> Iterator[Any]:
+        drv = self.acquire(profile_id, headless=headless, start=start, prepare=prepare, timeout=timeout)
+        try:
+            yield drv
+        except BaseException:
+            self.release(drv, discard=not is_alive(drv))
+            raise
+        else:
+            self.release(drv)
+
+    # ---- управление ------------------------------------------------------
+
+    def owns(self, driver: Any) -> bool:
+        """Драйвер выдан этим пулом (его нужно вернуть через release, а не quit/stop)."""
+        with self._cond:
+            return driver is not None and id(driver) in self._by_driver
+
+    def evict(self, profile_id: str) -> bool:
+        """Закрыть простаивающий драйвер профиля (например, перед внешним stop профиля)."""
+        with self._cond:
+            e = self._entries.get(str(profile_id))
+            if e is None or e.leased:
+                return False
+            self._entries.pop(e.profile_id, None)
+            self._forget_driver(e)
+            drv = e.driver
+            self._cond.notify_all()
+        self._count("evicted")
+        self._stop_quiet(drv)
+        return True
+
+    def close_all(self) -> None:
+        with self._cond:
+            drivers = [e.driver for e in self._entries.values() if e.driver is not None]
+            self._entries.clear()
+            self._by_driver.clear()
+            self._cond.notify_all()
+        for d in drivers:
+            self._stop_quiet(d)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = dict(self._stats)
+            out["open"] = len(self._entries)
+            out["leased"] = sum(1 for e in self._entries.values() if e.leased)
+            out["max_open"] = self.max_open
+            out["idle_ttl"] = self.idle_ttl
+        return out
+
+    # ---- внутренности ----------------------------------------------------
+
+    def _count(self, key: str) -> None:
+        with self._cond:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _forget_driver(self, e: _Entry) -> None:
+        if e.driver is not None:
+            self._by_driver.pop(id(e.driver), None)
+        e.driver = None
+
+    def _evict_lru_unlocked(self, to_stop: List[Any]) -> bool:
+        idle = [e for e in self._entries.values() if not e.leased]
+        if not idle:
+            return False
+        victim = min(idle, key=lambda x: x.last_used)
+        self._entries.pop(victim.profile_id, None)
+        if victim.driver is not None:
+            to_stop.append(victim.driver)
+        self._forget_driver(victim)
+        self._stats["evicted"] += 1
+        return True
+
+    def _stop_quiet(self, driver: Any) -> None:
+        try:
+            self._stop(driver)
+        except Exception as e:
+            log.debug("pool: stop failed: %s", e)
+
+    def _ensure_janitor_unlocked(self) -> None:
+        if self._janitor is not None and self._janitor.is_alive():
+            return
+        self._janitor = threading.Thread(target=self._janitor_loop, name="driver-pool-janitor", daemon=True)
+        self._janitor.start()
+
+    def _janitor_loop(self) -> None:
+        period = max(5.0, min(60.0, self.idle_ttl / 4.0))
+        while True:
+            time.sleep(period)
+            expired: List[Any] = []
+            with self._cond:
+                now = time.monotonic()
+                for e in list(self._entries.values()):
+                    if not e.leased and now - e.last_used >= self.idle_ttl:
+                        self._entries.pop(e.profile_id, None)
+                        if e.driver is not None:
+                            expired.append(e.driver)
+                        self._forget_driver(e)
+                        self._stats["expired"] += 1
+                if expired:
+                    self._cond.notify_all()
+                empty = not self._entries
+            for d in expired:
+                self._stop_quiet(d)
+            if empty:
+                with self._cond:
+                    if not self._entries:
+                        self._janitor = None
+                        return
+
+
+_pool: Optional[DriverPool] = None
+_pool_lock = threading.Lock()
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def get_driver_pool() -> DriverPool:
+    """Пул процесса (ленивая инициализация из ENV)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DriverPool(
+                    max_open=int(_env_num("ADS_AI_DRIVER_POOL_MAX", 4)),
+                    idle_ttl=_env_num("ADS_AI_DRIVER_POOL_IDLE_SEC", 300.0),
+                )
+                # тёплые профили не должны пережить процесс
+                atexit.register(_pool.close_all)
+    return _pool
@@ -0,0 +1,276 @@
+# ads_ai/browser/screencast.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Живое превью вкладки через CDP Page.startScreencast (собственное DevTools-соединение, browser/cdp.py).
+
+Chrome сам присылает JPEG-кадр, только когда страница перерисовалась; следующий кадр —
+после Page.screencastFrameAck (естественный backpressure). Работает по фоновой
+DevTools-сессии (cdp.get_side_session): ни канал WebDriver, ни блокировки автоматизации,
+ни её CDP-сессия не заняты — превью не тормозит прогон.
+
+Публичный контракт:
+  - ScreencastFrame                 — кадр (base64) + метаданные вьюпорта
+  - Screencast                      — .start()/.stop(), .latest(), .wait_next(after_seq, timeout),
+                                      .subscribe(cb)/.unsubscribe(cb)
+  - get_screencast(driver, ...) -> Screencast|None   (общий на вкладку, запускается по требованию)
+  - stop_screencast(driver)
+  - capture_screenshot(driver, ...) / viewport_metrics(driver)  — разовые снимок/метрики по той же сессии
+
+ENV по умолчанию: ADS_AI_SCREENCAST_MAX_W (1280), ADS_AI_SCREENCAST_MAX_H (800),
+                  ADS_AI_SCREENCAST_QUALITY (70), ADS_AI_SCREENCAST_EVERY_NTH (1).
+"""
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from ads_ai.browser.cdp import PageSession, get_side_session, side_evaluate
+
+__all__ = [
+    "ScreencastFrame",
+    "Screencast",
+    "get_screencast",
+    "stop_screencast",
+    "capture_screenshot",
+    "viewport_metrics",
+]
+
+log = logging.getLogger(__name__)
+
+_ATTR_KEY = "screencast"
+
+FrameCallback = Callable[["ScreencastFrame"], None]
+
+_factory_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+@dataclass(frozen=True)
+class ScreencastFrame:
+    seq: int
+    data: str          # base64 JPEG/PNG как прислал Chrome
+    fmt: str           # "jpeg" | "png"
+    ts: float          # time.time() получения
+    vw: int            # CSS-ширина вьюпорта (deviceWidth)
+    vh: int            # CSS-высота вьюпорта (deviceHeight)
+    scale: float       # pageScaleFactor
+    scroll_x: float
+    scroll_y: float
+
+
+class Screencast:
+    """Screencast одной вкладки: последний кадр + ожидание следующего + подписчики."""
+
+    def __init__(
+        self,
+        page: PageSession,
+        *,
+        max_width: int = 1280,
+        max_height: int = 800,
+        quality: int = 70,
+        every_nth_frame: int = 1,
+        fmt: str = "jpeg",
+    ) -> None:
+        self.page = page
+        self.params: Dict[str, Any] = {
+            "format": fmt,
+            "quality": max(1, min(100, int(quality))),
+            "maxWidth": max(64, int(max_width)),
+            "maxHeight": max(64, int(max_height)),
+            "everyNthFrame": max(1, int(every_nth_frame)),
+        }
+        self._cond = threading.Condition()
+        self._latest: Optional[ScreencastFrame] = None
+        self._seq = 0
+        self._subs: List[FrameCallback] = []
+        self._running = False
+
+    # ---- управление ------------------------------------------------------
+
+    @property
+    def alive(self) -> bool:
+        return self._running and self.page.alive
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self.page.on("Page.screencastFrame", self._on_frame)
+        try:
+            self.page.send("Page.startScreencast", dict(self.params), timeout=5.0)
+        except Exception:
+            self.page.off("Page.screencastFrame", self._on_frame)
+            with self._cond:
+                self._running = False
+            raise
+
+    def stop(self) -> None:
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        self.page.off("Page.screencastFrame", self._on_frame)
+        if self.page.alive:
+            try:
+                self.page.submit("Page.stopScreencast", {})
+            except Exception:
+                pass
+
+    # ---- кадры -----------------------------------------------------------
+
+    def latest(self) -> Optional[ScreencastFrame]:
+        with self._cond:
+            return self._latest
+
+    def wait_next(self, after_seq: int, timeout: float) -> Optional[ScreencastFrame]:
+        """Кадр новее after_seq (ждём до timeout); None — если новых кадров не было."""
+        end = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while True:
+                fr = self._latest
+                if fr is not None and fr.seq > after_seq:
+                    return fr
+                left = end - time.monotonic()
+                if left <= 0 or not self._running:
+                    return None
+                self._cond.wait(timeout=left)
+
+    def subscribe(self, cb: FrameCallback) -> None:
+        with self._cond:
+            if cb not in self._subs:
+                self._subs.append(cb)
+
+    def unsubscribe(self, cb: FrameCallback) -> None:
+        with self._cond:
+            try:
+                self._subs.remove(cb)
+            except ValueError:
+                pass
+
+    # ---- обработчик CDP --------------------------------------------------
+
+    def _on_frame(self, params: Dict[str, Any]) -> None:
+        # ack сразу — иначе Chrome не пришлёт следующий кадр
+        sid = params.get("sessionId")
+        if sid is not None:
+            try:
+                self.page.submit("Page.screencastFrameAck", {"sessionId": sid})
+            except Exception:
+                pass
+        data = params.get("data")
+        if not data:
+            return
+        meta = params.get("metadata") or {}
+        with self._cond:
+            self._seq += 1
+            fr = ScreencastFrame(
+                seq=self._seq,
+                data=str(data),
+                fmt=str(self.params.get("format") or "jpeg"),
+                ts=time.time(),
+                vw=int(meta.get("deviceWidth") or 0),
+                vh=int(meta.get("deviceHeight") or 0),
+                scale=float(meta.get("pageScaleFactor") or 1.0),
+                scroll_x=float(meta.get("scrollOffsetX") or 0.0),
+                scroll_y=float(meta.get("scrollOffsetY") or 0.0),
+            )
+            self._latest = fr
+            subs = list(self._subs)
+            self._cond.notify_all()
+        for cb in subs:
+            try:
+                cb(fr)
+            except Exception as e:
+                log.debug("screencast subscriber failed: %s", e)
+
+
+def get_screencast(
+    driver: Any,
+    *,
+    max_width: Optional[int] = None,
+    max_height: Optional[int] = None,
+    quality: Optional[int] = None,
+    every_nth_frame: Optional[int] = None,
+) -> Optional[Screencast]:
+    """
+    Запущенный screencast текущей вкладки (общий для всех потребителей, кэшируется на CDP-сессии).
+    Параметры учитываются только при первом запуске. None — CDP-websocket недоступен.
+    """
+    page = get_side_session(driver)
+    if page is None:
+        return None
+    sc = page.attrs.get(_ATTR_KEY)
+    if isinstance(sc, Screencast) and sc.alive:
+        return sc
+    with _factory_lock:
+        sc = page.attrs.get(_ATTR_KEY)
+        if isinstance(sc, Screencast) and sc.alive:
+            return sc
+        sc = Screencast(
+            page,
+            max_width=max_width or _env_int("ADS_AI_SCREENCAST_MAX_W", 1280),
+            max_height=max_height or _env_int("ADS_AI_SCREENCAST_MAX_H", 800),
+            quality=quality or _env_int("ADS_AI_SCREENCAST_QUALITY", 70),
+            every_nth_frame=every_nth_frame or _env_int("ADS_AI_SCREENCAST_EVERY_NTH", 1),
+        )
+        try:
+            sc.start()
+        except Exception as e:
+            log.debug("screencast unavailable: %s", e)
+            return None
+        page.attrs[_ATTR_KEY] = sc
+        return sc
+
+
+def stop_screencast(driver: Any) -> None:
+    """Остановить screencast вкладки (если запущен)."""
+    page = get_side_session(driver, create=False)
+    if page is None:
+        return
+    sc = page.attrs.pop(_ATTR_KEY, None)
+    if isinstance(sc, Screencast):
+        sc.stop()
+
+
+_JS_METRICS = (
+    "({w: window.innerWidth||0, h: window.innerHeight||0, dpr: window.devicePixelRatio||1,"
+    " sx: window.scrollX||0, sy: window.scrollY||0})"
+)
+
+
+def capture_screenshot(driver: Any, *, fmt: str = "jpeg", quality: int = 75) -> Optional[str]:
+    """Page.captureScreenshot по фоновой сессии (base64); None — сессия недоступна."""
+    page = get_side_session(driver)
+    if page is None:
+        return None
+    params: Dict[str, Any] = {"format": fmt}
+    if fmt == "jpeg":
+        params["quality"] = int(quality)
+    try:
+        return page.send("Page.captureScreenshot", params, timeout=10.0).get("data") or None
+    except Exception as e:
+        log.debug("side captureScreenshot failed: %s", e)
+        return None
+
+
+def viewport_metrics(driver: Any) -> Optional[Dict[str, Any]]:
+    """Размер вьюпорта, dpr и скролл по фоновой сессии: {w, h, dpr, sx, sy}; None — недоступно."""
+    try:
+        val = side_evaluate(driver, _JS_METRICS, timeout=3.0)
+        return val if isinstance(val, dict) else None
+    except Exception as e:
+        log.debug("side viewport metrics failed: %s", e)
+        return None
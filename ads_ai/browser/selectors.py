@@ -2,8 +2,9 @@
 from __future__ import annotations
 
 import re
+import threading
 from functools import lru_cache
-from typing import Optional, Tuple, List, Literal
+from typing import Any, Dict, Optional, Tuple, List, Literal
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -23,6 +24,8 @@ __all__ = [
     "find",
     "exists",
     "find_all",
+    "ranking_stats",
+    "reset_ranking_stats",
 ]
 
 # ---------------------------------------------------------------------------
@@ -410,6 +413,147 @@ def _pick_best(candidates: List[WebElement], require_visible: bool) -> Optional[
     return ranked[0][1]
 
 
+# ---------------------------------------------------------------------------
+# In-page ранжирование: одна execute_script вместо N×6 HTTP-запросов
+# ---------------------------------------------------------------------------
+
+# Те же правила, что в _pick_best/_score_clickability, но выполняются в странице:
+#   - видимость (аналог is_displayed: display/visibility/opacity + client rects),
+#   - положительная площадь getBoundingClientRect,
+#   - вес: href +3, role +2, tag +1, enabled +1; при равенстве — первый в порядке DOM.
+_JS_RANK = r"""
+const query = arguments[0], kind = arguments[1];
+const requireVisible = !!arguments[2], collectAll = !!arguments[3];
+let nodes = [];
+try {
+  if (kind === 'xpath') {
+    const snap = document.evaluate(query, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    for (let i = 0; i < snap.snapshotLength; i++) {
+      const n = snap.snapshotItem(i);
+      if (n && n.nodeType === 1) nodes.push(n);
+    }
+  } else {
+    nodes = Array.from(document.querySelectorAll(query));
+  }
+} catch (e) {
+  return {invalid: true, count: 0};
+}
+
+const ROLES = {button:1, link:1, tab:1, menuitem:1, option:1};
+const TAGS = {a:1, button:1, input:1, summary:1, label:1};
+
+function displayed(el) {
+  for (let n = el; n && n.nodeType === 1; n = n.parentElement) {
+    let cs;
+    try { cs = getComputedStyle(n); } catch (_) { return false; }
+    if (cs.display === 'none') return false;
+    if (n === el && (cs.visibility === 'hidden' || cs.visibility === 'collapse')) return false;
+    if (parseFloat(cs.opacity || '1') === 0) return false;
+  }
+  try { if (el.getClientRects().length === 0) return false; } catch (_) {}
+  return true;
+}
+
+function score(el) {
+  let s = 0;
+  const tag = (el.tagName || '').toLowerCase();
+  const role = (el.getAttribute('role') || '').toLowerCase();
+  if (el.getAttribute('href')) s += 3;
+  if (ROLES[role]) s += 2;
+  if (TAGS[tag]) s += 1;
+  if (!el.disabled && el.getAttribute('aria-disabled') !== 'true') s += 1;
+  return s;
+}
+
+let best = null, bestScore = -1, bestRect = null;
+const all = [];
+for (const el of nodes) {
+  try {
+    if (requireVisible && !displayed(el)) continue;
+    if (collectAll) { all.push(el); continue; }
+    const r = el.getBoundingClientRect();
+    if (!(r.width > 0) || !(r.height > 0)) continue;
+    const sc = score(el);
+    if (sc > bestScore) {
+      best = el; bestScore = sc;
+      bestRect = {x: r.left, y: r.top, width: r.width, height: r.height};
+    }
+  } catch (_) {}
+}
+if (collectAll) return {count: nodes.length, all: all};
+return {count: nodes.length, el: best, score: bestScore, rect: bestRect};
+"""
+
+# Сколько WebDriver-запросов стоил бы кандидат на старом пути:
+# is_displayed (при visible), rect, tag_name, role, href, is_enabled.
+_RT_PER_CANDIDATE = 5
+
+_rank_lock = threading.Lock()
+_rank_stats: Dict[str, int] = {
+    "calls": 0,             # успешных in-page ранжирований
+    "candidates": 0,        # сколько кандидатов оценено в странице
+    "roundtrips_saved": 0,  # оценка сэкономленных HTTP-запросов к драйверу
+    "fallbacks": 0,         # откатов на поэлементный _pick_best
+}
+
+
+def _account_rank(candidates: int, visible: bool) -> None:
+    per = _RT_PER_CANDIDATE + (1 if visible else 0)
+    # старый путь: find_elements + per×N запросов; новый — один execute_script
+    saved = per * max(0, int(candidates))
+    with _rank_lock:
+        _rank_stats["calls"] += 1
+        _rank_stats["candidates"] += int(candidates)
+        _rank_stats["roundtrips_saved"] += saved
+
+
+def ranking_stats(since: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """
+    Снимок счётчиков in-page ранжирования (для трейсов/метрик). Счётчики общие для процесса
+    и накопительные: since — прежний снимок, тогда вернётся прирост с того момента.
+    """
+    with _rank_lock:
+        snap = dict(_rank_stats)
+    if since is None:
+        return snap
+    return {k: max(0, v - int(since.get(k, 0))) for k, v in snap.items()}
+
+
+def reset_ranking_stats() -> None:
+    """Обнулить счётчики in-page ранжирования."""
+    with _rank_lock:
+        for k in _rank_stats:
+            _rank_stats[k] = 0
+
+
+def _rank_in_page(
+    driver: WebDriver,
+    query: str,
+    kind: str,
+    *,
+    visible: bool,
+    collect_all: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Один round trip: поиск + фильтрация + ранжирование в странице.
+    Возвращает dict ответа скрипта, {"invalid": True} для битого селектора
+    или None, если JS-путь недоступен (тогда вызывающий откатывается на Python-ранжирование).
+    """
+    try:
+        res = driver.execute_script(_JS_RANK, query, kind, bool(visible), bool(collect_all))
+    except (StaleElementReferenceException, WebDriverException):
+        with _rank_lock:
+            _rank_stats["fallbacks"] += 1
+        return None
+    if not isinstance(res, dict):
+        with _rank_lock:
+            _rank_stats["fallbacks"] += 1
+        return None
+    if not res.get("invalid"):
+        _account_rank(int(res.get("count") or 0), visible)
+    return res
+
+
 def _as_locator(query: str, kind: str) -> tuple[str, str]:
     return (By.CSS_SELECTOR, query) if kind == "css" else (By.XPATH, query)
 
@@ -427,9 +571,21 @@ def _wait_pick_with_locator(
 ) -> Optional[WebElement]:
     """
     Ждём коллекцию и выбираем лучший элемент по эвристикам.
-    Используем пользовательский предикат, чтобы иметь доступ к списку.
+    Основной путь — in-page ранжирование за один execute_script на тик;
+    если JS недоступен — поэлементный _pick_best.
     """
+    by, query = locator
+    kind = "css" if by == By.CSS_SELECTOR else "xpath"
+
     def _predicate(_driver: WebDriver) -> Optional[WebElement] | bool:
+        res = _rank_in_page(_driver, query, kind, visible=visible)
+        if res is not None:
+            if res.get("invalid"):
+                return False
+            el = res.get("el")
+            return el if isinstance(el, WebElement) else False
+
+        # Фоллбек: поэлементное ранжирование через WebDriver
         try:
             els = _driver.find_elements(*locator)
         except InvalidSelectorException:
@@ -490,7 +646,8 @@ def find(
 
     Алгоритм:
       1) normalize_selector → (query, kind ∈ {css|xpath});
-      2) Ждём коллекцию и ранжируем кликабельность (href/role/tag/enabled/площадь);
+      2) Ждём коллекцию и ранжируем кликабельность (href/role/tag/enabled/площадь)
+         в странице — один execute_script на тик ожидания (счётчики: ranking_stats());
       3) Если kind == 'css' и строка похожа на «просто текст» — доп. fallback по ссылкам.
 
     Устойчив к InvalidSelectorException / WebDriverException.
@@ -550,6 +707,11 @@ def find_all(
     if not first:
         return []
 
+    if visible:
+        res = _rank_in_page(driver, q, kind, visible=True, collect_all=True)
+        if res is not None and not res.get("invalid"):
+            return [e for e in (res.get("all") or []) if isinstance(e, WebElement)]
+
     by, term = _as_locator(q, kind)
     try:
         els = driver.find_elements(by, term)
@@ -0,0 +1,96 @@
+# ads_ai/browser/trajectory.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Траектории курсора: строим путь один раз (квадратичная Безье + лёгкий тремор),
+отправляем целиком — pixel.mouse_path() пакетом по DevTools-websocket.
+
+Общий код для browser/humanize.py (наведение на элемент) и vision/executor.py
+(подводка к пиксельной точке). Точка пути — (x, y, dt): координаты во вьюпорте
+и пауза ПОСЛЕ события, сек.
+"""
+
+import random
+from typing import List, Optional, Tuple
+
+__all__ = ["PathPoint", "bezier_path", "wiggle_path", "rect_path"]
+
+PathPoint = Tuple[float, float, float]
+
+
+def bezier_path(
+    start: Tuple[float, float],
+    end: Tuple[float, float],
+    *,
+    steps: int,
+    dt: float = 0.02,
+    control: Optional[Tuple[float, float]] = None,
+    control_jitter: Tuple[float, float] = (0.0, 0.0),
+) -> List[PathPoint]:
+    """
+    Точки квадратичной кривой Безье start → end (start не включается, end — последняя точка).
+    Контрольная точка по умолчанию — середина отрезка ± control_jitter.
+    """
+    sx, sy = float(start[0]), float(start[1])
+    ex, ey = float(end[0]), float(end[1])
+    if control is None:
+        jx, jy = control_jitter
+        kx = (sx + ex) / 2.0 + random.uniform(-jx, jx)
+        ky = (sy + ey) / 2.0 + random.uniform(-jy, jy)
+    else:
+        kx, ky = float(control[0]), float(control[1])
+
+    steps = max(1, int(steps))
+    out: List[PathPoint] = []
+    for i in range(1, steps + 1):
+        t = i / steps
+        x = (1 - t) ** 2 * sx + 2 * (1 - t) * t * kx + t ** 2 * ex
+        y = (1 - t) ** 2 * sy + 2 * (1 - t) * t * ky + t ** 2 * ey
+        out.append((x, y, float(dt)))
+    return out
+
+
+def wiggle_path(x: float, y: float, *, count: int = 2, amp: int = 2, dt: float = 0.03) -> List[PathPoint]:
+    """Лёгкий «тремор» у цели: count случайных смещений в пределах ±amp px (накопительно)."""
+    out: List[PathPoint] = []
+    cx, cy = float(x), float(y)
+    for _ in range(max(0, int(count))):
+        cx += random.randint(-amp, amp)
+        cy += random.randint(-amp, amp)
+        out.append((cx, cy, float(dt)))
+    return out
+
+
+def rect_path(
+    rect: dict,
+    *,
+    steps: int,
+    dt: float = 0.02,
+    wiggle: bool = True,
+) -> List[PathPoint]:
+    """
+    Путь внутри прямоугольника элемента {x, y, w, h} (вьюпорт): от точки у левого верхнего угла
+    к центру с небольшим шумом — та же геометрия, что у прежнего ActionChains-наведения.
+    """
+    ox, oy = float(rect.get("x", 0.0)), float(rect.get("y", 0.0))
+    w = max(2.0, float(rect.get("w", 0.0)))
+    h = max(2.0, float(rect.get("h", 0.0)))
+
+    # Целевая точка — центр с небольшим шумом
+    cx = w * 0.5 + random.uniform(-min(6.0, w * 0.08), min(6.0, w * 0.08))
+    cy = h * 0.5 + random.uniform(-min(6.0, h * 0.08), min(6.0, h * 0.08))
+    # Старт — ближе к углу (внутри прямоугольника)
+    sx = max(1.0, min(w - 1.0, w * 0.2 + random.uniform(-w * 0.05, w * 0.05)))
+    sy = max(1.0, min(h - 1.0, h * 0.2 + random.uniform(-h * 0.05, h * 0.05)))
+
+    pts = [(sx, sy, float(dt))] + bezier_path(
+        (sx, sy), (cx, cy), steps=steps, dt=dt, control_jitter=(w * 0.05, h * 0.05)
+    )
+    out: List[PathPoint] = []
+    for x, y, d in pts:
+        out.append((ox + round(max(1.0, min(w - 1.0, x))), oy + round(max(1.0, min(h - 1.0, y))), d))
+    if wiggle and out:
+        lx, ly, _ = out[-1]
+        out.extend(wiggle_path(lx, ly))
+    return out
@@ -0,0 +1,296 @@
+# ads_ai/browser/ui_map.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+UI-карта страницы для LLM: видимые поля ввода, кнопки, вкладки и «primary»-кнопки
+с устойчивыми селекторами (обход shadow DOM и same-origin iframe) + короткая сводка
+(url, title, заголовки, открытые диалоги).
+
+Публичный контракт:
+  - collect_ui_map(driver) -> dict   {inputs, buttons, tabs, primary, meta}; {} — не удалось
+  - ui_map_js() -> str               (сам сборщик — для вызывающих со своим транспортом)
+"""
+
+import logging
+from typing import Any, Dict
+
+__all__ = ["collect_ui_map", "ui_map_js"]
+
+log = logging.getLogger(__name__)
+
+_JS_UI_MAP = r"""
+    (function(){
+      function txt(s){ return (s==null?'':String(s)).replace(/\s+/g,' ').trim(); }
+      function low(s){ return txt(s).toLowerCase(); }
+      function visible(el){
+        if(!(el instanceof Element)) return false;
+        const st = getComputedStyle(el);
+        if(st.display==='none' || st.visibility==='hidden' || st.opacity==='0') return false;
+        const r = el.getBoundingClientRect();
+        if(r.width<2 || r.height<2) return false;
+        if(r.bottom < -100 || r.top > (innerHeight+2000)) return false;
+        return true;
+      }
+      function inSearchContainer(el){
+        let n=el;
+        for(let i=0; i<6 && n; i++){
+          try{
+            if(n.classList && (n.classList.contains('universal-search-container') || n.classList.contains('search'))) return true;
+          }catch(_){}
+          n = (n.parentNode || (n.host||null));
+        }
+        return false;
+      }
+      function isSearchField(el){
+        if(!el) return false;
+        const t = low(el.getAttribute && el.getAttribute('type') || '');
+        const role = low(el.getAttribute && el.getAttribute('role') || '');
+        const al = low(el.getAttribute && el.getAttribute('aria-label') || '');
+        const ph = low(el.getAttribute && el.getAttribute('placeholder') || '');
+        const idtxt = low(el.id || '');
+        const name = low(el.getAttribute && el.getAttribute('name') || '');
+        const any = al+' '+ph+' '+idtxt+' '+name;
+        if(t==='search') return true;
+        if(role==='combobox' && (any.includes('search')||any.includes('поиск'))) return true;
+        if(any.includes('search') || any.includes('поиск')) return true;
+        if(inSearchContainer(el)) return true;
+        return false;
+      }
+      function isEditable(el){
+        if(!(el instanceof HTMLElement)) return false;
+        const tag = el.tagName;
+        if(tag==='TEXTAREA') return true;
+        if(tag==='SELECT') return true;
+        if(tag==='INPUT'){
+          const t = low(el.getAttribute('type')||'text');
+          if(['hidden','button','submit','reset','checkbox','radio','file','color','range','date','time','datetime-local','month','week'].includes(t)) return false;
+          return true;
+        }
+        const names=['md-outlined-text-field','md-filled-text-field','md-text-field','material-input'];
+        return names.some(n => el.matches && el.matches(n));
+      }
+      function isDisabled(el){
+        if(!el) return true;
+        if(el.disabled===true) return true;
+        const ad = low(el.getAttribute('aria-disabled')||'');
+        if(ad==='true') return true;
+        const cl = low(el.className || '');
+        if(cl.includes('disabled')) return true;
+        return false;
+      }
+      function collectRoots(){
+        const roots=[document.documentElement];
+        let frames = 0;
+        const ifrs = document.querySelectorAll('iframe');
+        for(const fr of ifrs){
+          try{
+            const doc = fr.contentDocument || (fr.contentWindow && fr.contentWindow.document);
+            if(doc && doc.documentElement){
+              roots.push(doc.documentElement);
+              frames++;
+            }
+          }catch(_){}
+        }
+        return {roots, frames};
+      }
+      function deepWalk(){
+        const out=[];
+        const {roots, frames} = collectRoots();
+        const pushChildren = (root)=>{
+          if(!root) return;
+          let kids=[];
+          try{ kids = root.children ? Array.from(root.children) : []; }catch(_){ kids = []; }
+          for(const c of kids){ out.push(c); pushChildren(c); }
+          try{
+            if(root.shadowRoot){
+              const sh = root.shadowRoot;
+              const shKids = sh.children ? Array.from(sh.children) : [];
+              for(const k of shKids){ out.push(k); pushChildren(k); }
+            }
+          }catch(_){}
+        };
+        for(const rt of roots){ pushChildren(rt); }
+        return {nodes: out, frames};
+      }
+      function buildXPath(el){
+        try{
+          if(!el || el.nodeType!==1) return '';
+          const parts=[];
+          while(el && el.nodeType===1 && el!==document.body){
+            let idx=1, sib=el;
+            while((sib=sib.previousElementSibling)!=null){ if(sib.nodeName===el.nodeName) idx++; }
+            parts.unshift(el.nodeName.toLowerCase()+'['+idx+']');
+            el = el.parentElement;
+          }
+          return '//' + parts.join('/');
+        }catch(_){ return ''; }
+      }
+      function uniqueSelector(el){
+        const esc = (s)=> s==null?'':String(s).replace(/\\/g,'\\\\').replace(/"/g,'\\"');
+        const q = (sel)=>{ try{ return document.querySelectorAll(sel).length; }catch(_){ return 0; } };
+        if(!el) return '';
+        const id = el.id;
+        if(id && q('#'+id)===1) return '#'+esc(id);
+        const rl = el.getAttribute('role');
+        const al = el.getAttribute('aria-label');
+        if(rl && al){
+          const sel = `[role="${esc(rl)}"][aria-label="${esc(al)}"]`;
+          if(q(sel)===1) return sel;
+          const sel2 = `${el.tagName.toLowerCase()}${sel}`;
+          if(q(sel2)===1) return sel2;
+        }
+        const dv = el.getAttribute('data-value');
+        if(dv){
+          const s1 = `[data-value="${esc(dv)}"]`;
+          if(q(s1)===1) return s1;
+          if(rl){
+            const s2 = `[role="${esc(rl)}"][data-value="${esc(dv)}"]`;
+            if(q(s2)===1) return s2;
+          }
+        }
+        const name = el.getAttribute('name');
+        if(name && el.tagName==='INPUT' && q(`input[name="${esc(name)}"]`)===1) return `input[name="${esc(name)}"]`;
+        if(al && q(`[aria-label="${esc(al)}"]`)===1) return `[aria-label="${esc(al)}"]`;
+        const cls = (el.className||'').split(/\s+/).filter(c=> c && !c.includes('_ngcontent') && !/^_?ng-/.test(c) && !/^\w+-\w+/.test(c)).slice(0,3);
+        if(cls.length){
+          const sel = el.tagName.toLowerCase()+'.'+cls.map(esc).join('.');
+          if(q(sel)===1) return sel;
+        }
+        const rl2 = el.getAttribute('role');
+        if(rl2 && q(`[role="${esc(rl2)}"]`)===1) return `[role="${esc(rl2)}"]`;
+        let cur = el, built='';
+        for(let i=0;i<3;i++){
+          const p = cur.parentElement;
+          if(!p) break;
+          const idx = Array.prototype.indexOf.call(p.children, cur)+1;
+          built = `${p.tagName.toLowerCase()}>${cur.tagName.toLowerCase()}:nth-child(${idx})`;
+          if(q(built)===1) return built;
+          cur = p;
+        }
+        return buildXPath(el) || '';
+      }
+      function pickLabel(el){
+        if(!el) return '';
+        const aria = el.getAttribute('aria-label');
+        if(aria) return aria;
+        const t = txt(el.innerText || el.textContent || '');
+        if(t) return t;
+        if(el.id){
+          try{
+            const lab = document.querySelector(`label[for="${el.id}"]`);
+            if(lab){ const s=txt(lab.innerText||lab.textContent||''); if(s) return s; }
+          }catch(_){}
+        }
+        return '';
+      }
+      const labelsPrimary = ['continue','next','продолжить','далее','save and continue','сохранить и продолжить','create campaign','создать кампанию','publish','готово','done'];
+      const rolesClickable = new Set(['button','tab','option','menuitem','listitem','checkbox','radio','switch']);
+
+      const {nodes, frames} = deepWalk();
+      const ui = {inputs:[], buttons:[], tabs:[], primary:[], meta:{ignored_search:0, scanned:nodes.length, frames:frames, ts: Date.now(), url: location.href, title: txt(document.title).slice(0,160)}};
+
+      for(const el of nodes){
+        if(!(el instanceof HTMLElement)) continue;
+        try{
+          const st = getComputedStyle(el);
+          if(st.display==='none' || st.visibility==='hidden') continue;
+        }catch(_){}
+
+        // inputs
+        if(visible(el) && isEditable(el) && !isDisabled(el)){
+          let base = el;
+          try{
+            if(el.shadowRoot){
+              const i = el.shadowRoot.querySelector('input,textarea,select');
+              if(i) base = i;
+            }else if(el.matches && el.matches('material-input')){
+              const i = el.querySelector('input,textarea,select');
+              if(i) base = i;
+            }
+          }catch(_){}
+          if(!base) continue;
+          if(isSearchField(base)) { ui.meta.ignored_search++; continue; }
+          ui.inputs.push({
+            tag: (base.tagName||'').toLowerCase(),
+            role: base.getAttribute && base.getAttribute('role') || '',
+            type: (base.getAttribute && (base.getAttribute('type')||'')).toLowerCase(),
+            aria_label: pickLabel(el) || pickLabel(base) || (base.getAttribute && base.getAttribute('aria-label')) || '',
+            placeholder: (base.getAttribute && base.getAttribute('placeholder')) || '',
+            selector: uniqueSelector(base),
+            xpath: buildXPath(base),
+            value: (base.value || '')
+          });
+          continue;
+        }
+
+        // clickable
+        const tag = el.tagName;
+        const role = low(el.getAttribute('role')||'');
+        const txtl = low(el.innerText || el.textContent || '');
+        const isAnchor = (tag==='A' && el.hasAttribute('href'));
+        const isButtonTag = tag==='BUTTON' || (tag==='INPUT' && ['button','submit','reset'].includes(low(el.getAttribute('type')||'')));
+        const hasOnclick = el.getAttribute('onclick') != null;
+        let pointer = false; try{ pointer = getComputedStyle(el).cursor==='pointer'; }catch(_){}
+        const isClickable = isButtonTag || isAnchor || rolesClickable.has(role) || hasOnclick || pointer;
+        if(!isClickable || !visible(el) || isSearchField(el)) continue;
+
+        const cand = {
+          tag: el.tagName.toLowerCase(),
+          role: role,
+          aria_label: el.getAttribute('aria-label')||'',
+          text: txt(el.innerText || el.textContent || ''),
+          data_value: el.getAttribute('data-value')||'',
+          selector: uniqueSelector(el),
+          xpath: buildXPath(el)
+        };
+        if(labelsPrimary.some(w=> txtl.includes(w))) ui.primary.push(cand);
+        else if(role==='tab' || (el.className||'').includes('selection-item')) ui.tabs.push(cand);
+        else ui.buttons.push(cand);
+      }
+
+      function dedup(arr){
+        const seen = new Set(); const out=[];
+        for(const it of arr){
+          const key = (it.selector||'')+'|'+(it.aria_label||'')+'|'+(it.text||'');
+          if(seen.has(key)) continue; seen.add(key); out.push(it);
+        }
+        return out;
+      }
+      ui.inputs = dedup(ui.inputs).slice(0, 60);
+      ui.buttons = dedup(ui.buttons).slice(0, 60);
+      ui.tabs = dedup(ui.tabs).slice(0, 40);
+      ui.primary = dedup(ui.primary).slice(0, 16);
+      ui.meta.counts = {inputs: ui.inputs.length, buttons: ui.buttons.length, tabs: ui.tabs.length, primary: ui.primary.length};
+      // короткая сводка страницы: заголовки и открытые диалоги (для diff-представления)
+      const heads=[];
+      for(const h of document.querySelectorAll('h1,h2,[role=heading]')){
+        if(heads.length>=6) break;
+        const t=txt(h.innerText||h.textContent||''); if(t && visible(h)) heads.push(t.slice(0,120));
+      }
+      const dialogs=[];
+      for(const d of document.querySelectorAll('[role=dialog],[role=alertdialog],dialog[open]')){
+        if(dialogs.length>=3) break;
+        if(!visible(d)) continue;
+        const t=txt(d.getAttribute('aria-label')||'') || txt((d.querySelector('h1,h2,h3,[role=heading]')||{}).textContent||'');
+        dialogs.push(t.slice(0,120) || 'dialog');
+      }
+      ui.meta.headings = heads;
+      ui.meta.dialogs = dialogs;
+      return ui;
+    })();
+"""
+
+
+def ui_map_js() -> str:
+    return _JS_UI_MAP
+
+
+def collect_ui_map(driver: Any) -> Dict[str, Any]:
+    """Одним execute_script собрать UI-карту текущего документа; {} при ошибке."""
+    try:
+        raw = driver.execute_script("return " + _JS_UI_MAP.strip())
+    except Exception as e:
+        log.debug("ui map failed: %s", e)
+        return {}
+    return raw if isinstance(raw, dict) else {}
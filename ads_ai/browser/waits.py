@@ -9,13 +9,18 @@ from __future__ import annotations
   - ensure_ready_state(driver, timeout=...): None
   - wait_url(driver, pattern, timeout_sec=..., regex=False) -> bool
   - wait_dom_stable(driver, idle_ms=..., timeout_sec=...) -> bool
+  - install_activity_monitor(driver) -> bool
 
 Особенности:
   • Не бросают исключения наружу — деградируют мягко.
-  • Опираются на execute_async_script + MutationObserver, с фоллбеком на поллинг.
-  • Учитывают активность: DOM-мутации, события страницы, загрузку ресурсов.
+  • Активность страницы собирает постоянный in-page монитор (window.__adsaiActivity),
+    который ставится один раз на документ через CDP Page.addScriptToEvaluateOnNewDocument;
+    ожидания лишь читают/ждут его состояние одним async-вызовом.
+  • Учитывают активность: DOM-мутации, события страницы, сетевые запросы (fetch/XHR/ресурсы).
+  • wait_url просыпается по CDP-событиям навигации (browser/nav_events.py).
 """
 
+import logging
 import re
 import time
 from urllib.parse import unquote
@@ -23,7 +28,11 @@ from urllib.parse import unquote
 from selenium.common.exceptions import WebDriverException, JavascriptException
 from selenium.webdriver.remote.webdriver import WebDriver
 
-__all__ = ["ensure_ready_state", "wait_url", "wait_dom_stable"]
+from ads_ai.browser.nav_events import get_navigation_events
+
+__all__ = ["ensure_ready_state", "wait_url", "wait_dom_stable", "install_activity_monitor"]
+
+log = logging.getLogger(__name__)
 
 
 # ----------------------------- Вспомогательные --------------------------------
@@ -36,13 +45,118 @@ def _sleep(sec: float) -> None:
         time.sleep(sec)
 
 
+# --------------------------- Монитор активности -------------------------------
+
+# Ставится один раз на документ. Держит:
+#   last      — performance.now() последней активности (мутации/события/сеть),
+#   pending   — стартовавшие и не завершившиеся fetch/XHR (id → время старта),
+#   waiters   — колбэки ожидания готовности readyState.
+# Долгие запросы (long-poll, стримы) старше STALE_MS не считаются активностью.
+_ACTIVITY_MONITOR_JS = r"""
+(function(){
+  if (window.__adsaiActivity) return;
+  const STALE_MS = 10000;
+  const now = () => (window.performance && performance.now) ? performance.now() : Date.now();
+  const A = window.__adsaiActivity = {
+    v: 1, last: now(), seq: 0, pending: {}, waiters: [],
+    mark: function(){ A.last = now(); },
+    inflight: function(){
+      const t = now(); let n = 0;
+      for (const k in A.pending) { if (t - A.pending[k] < STALE_MS) n++; }
+      return n;
+    },
+    ready: function(){
+      const rs = (document.readyState || '').toLowerCase();
+      return rs === 'interactive' || rs === 'complete';
+    },
+    onReady: function(cb){ if (A.ready()) { cb(true); } else { A.waiters.push(cb); } },
+    quietFor: function(){ return now() - A.last; }
+  };
+  const begin = () => { const id = ++A.seq; A.pending[id] = now(); A.mark(); return id; };
+  const end = (id) => { delete A.pending[id]; A.mark(); };
+
+  function flushReady(){
+    if (!A.ready()) return;
+    const ws = A.waiters.splice(0);
+    for (const cb of ws) { try { cb(true); } catch(_){} }
+  }
+  function watchDom(){
+    try {
+      new MutationObserver(A.mark).observe(document, {subtree:true, childList:true, attributes:true, characterData:true});
+    } catch(_){}
+  }
+  watchDom();
+
+  const opt = {passive:true, capture:true};
+  try { document.addEventListener('readystatechange', () => { A.mark(); flushReady(); }, opt); } catch(_){}
+  for (const evt of ['load', 'pageshow', 'hashchange', 'popstate', 'scroll', 'resize']) {
+    try { window.addEventListener(evt, () => { A.mark(); flushReady(); }, opt); } catch(_){}
+  }
+
+  try {
+    new PerformanceObserver(A.mark).observe({type: 'resource', buffered: false});
+  } catch(_){}
+
+  try {
+    const ofetch = window.fetch;
+    if (ofetch) {
+      window.fetch = function(){
+        const id = begin();
+        let p;
+        try { p = ofetch.apply(this, arguments); } catch(e) { end(id); throw e; }
+        return Promise.resolve(p).then(r => { end(id); return r; }, e => { end(id); throw e; });
+      };
+    }
+  } catch(_){}
+
+  try {
+    const XP = window.XMLHttpRequest && XMLHttpRequest.prototype;
+    if (XP && XP.send) {
+      const osend = XP.send;
+      XP.send = function(){
+        const id = begin();
+        try { this.addEventListener('loadend', () => end(id), {once:true}); } catch(_){ end(id); }
+        try { return osend.apply(this, arguments); } catch(e) { end(id); throw e; }
+      };
+    }
+  } catch(_){}
+})();
+"""
+
+_MONITOR_ATTR = "_adsai_activity_monitor"
+
+
+def install_activity_monitor(driver: WebDriver) -> bool:
+    """
+    Ставит постоянный монитор активности:
+      1) через CDP Page.addScriptToEvaluateOnNewDocument — для всех будущих документов вкладки;
+      2) execute_script — в текущий документ (скрипт идемпотентен).
+    Регистрация на новых документах делается один раз на драйвер.
+    Возвращает True, если монитор присутствует в текущем документе.
+    """
+    if not getattr(driver, _MONITOR_ATTR, False) and hasattr(driver, "execute_cdp_cmd"):
+        try:
+            driver.execute_cdp_cmd(  # type: ignore[attr-defined]
+                "Page.addScriptToEvaluateOnNewDocument", {"source": _ACTIVITY_MONITOR_JS}
+            )
+            setattr(driver, _MONITOR_ATTR, True)
+        except Exception as e:
+            log.debug("activity monitor: CDP registration skipped: %s", e)
+    try:
+        driver.execute_script(_ACTIVITY_MONITOR_JS)
+        return True
+    except (WebDriverException, JavascriptException):
+        return False
+
+
 # ----------------------------------- API --------------------------------------
 
 def ensure_ready_state(driver: WebDriver, timeout: float = 10.0) -> None:
     """
     Дожидается, пока document.readyState станет 'interactive' или 'complete'.
 
-    Основной путь — async JS с подпиской на readystatechange/load и мягким поллингом.
+    Основной путь — async JS: ожидание через монитор активности (если установлен),
+    иначе подписка на readystatechange/load и мягкий поллинг.
     Фоллбек — Python-поллинг через execute_script.
     Никогда не бросает исключений наружу.
     """
@@ -63,6 +177,15 @@ def ensure_ready_state(driver: WebDriver, timeout: float = 10.0) -> None:
       };
       if (ok()) return done(true);
 
+      // Монитор активности уже держит подписку на readystatechange/load — просто встаём в очередь.
+      const A = window.__adsaiActivity;
+      if (A && A.onReady) {
+        let fired = false;
+        A.onReady(() => { if (!fired) { fired = true; done(true); } });
+        setTimeout(() => { if (!fired) { fired = true; done(ok()); } }, Math.max(0, deadline - Date.now()));
+        return;
+      }
+
       const onrs = () => { if (ok()) { cleanup(); done(true); } };
       const onload = () => { cleanup(); done(true); };
       function cleanup(){
@@ -107,6 +230,7 @@ def wait_url(driver: WebDriver, pattern: str, *, timeout_sec: int = 12, regex: b
       - regex=False: проверка на подстроку `pattern` в href (а также в unquote-варианте)
       - regex=True: search по регулярному выражению (и по unquote-варианту)
 
+    Ожидание событийное (CDP-websocket, см. nav_events), при его недоступности — поллинг.
     Возвращает True при успехе, иначе False.
     """
     pat = str(pattern or "")
@@ -130,24 +254,39 @@ def wait_url(driver: WebDriver, pattern: str, *, timeout_sec: int = 12, regex: b
             cur = ""
         return js_url or cur
 
-    deadline = _monotonic() + max(0, int(timeout_sec))
-    while _monotonic() < deadline:
-        url = _get_url()
+    def _match(url: str) -> bool:
         try:
             url_u = unquote(url)
         except Exception:
             url_u = url
-
         if use_regex and rx is not None:
             try:
-                if rx.search(url) or rx.search(url_u):
-                    return True
+                return bool(rx.search(url) or rx.search(url_u))
             except re.error:
-                pass
-        else:
-            if pat and (pat in url or pat in url_u):
+                return False
+        return bool(pat) and (pat in url or pat in url_u)
+
+    deadline = _monotonic() + max(0, int(timeout_sec))
+
+    # Основной путь: ждём CDP-события навигации (frameNavigated/navigatedWithinDocument).
+    # Редкая сверка с драйвером страхует от пропущенного события.
+    nav = get_navigation_events(driver)
+    if nav is not None:
+        if _match(_get_url()):
+            return True
+        while True:
+            left = deadline - _monotonic()
+            if left <= 0:
+                return False
+            if nav.wait_url(_match, timeout=min(1.0, left)):
+                return True
+            if _match(_get_url()):
                 return True
 
+    # Фоллбек: поллинг URL
+    while _monotonic() < deadline:
+        if _match(_get_url()):
+            return True
         _sleep(0.15)
 
     return False
@@ -156,15 +295,16 @@ def wait_url(driver: WebDriver, pattern: str, *, timeout_sec: int = 12, regex: b
 def wait_dom_stable(driver: WebDriver, *, idle_ms: int = 1000, timeout_sec: int = 12) -> bool:
     """
     Ждём «тишину» DOM не менее idle_ms миллисекунд.
-    Реализация через MutationObserver внутри async-script + набор событий,
-    которые тоже считаются «активностью».
+    Состояние берём из постоянного монитора активности (install_activity_monitor):
+    один async-вызов, который спит ровно до момента возможной тишины,
+    без поллинга DOM/ресурсов на каждом тике.
 
     Активностью считаем:
       - любые DOM-мутации (attributes/childList/characterData, subtree)
-      - readystatechange/load/pageshow/hashchange
+      - readystatechange/load/pageshow/hashchange/popstate
       - scroll/resize (часто сопровождают lazy-рендер)
-      - прирост количества ресурсов в performance.getEntriesByType('resource')
-      - заметное изменение количества DOM-элементов (cheap-проверка)
+      - старт/завершение fetch/XHR и загрузку ресурсов (PerformanceObserver)
+      - незавершённые «свежие» запросы (не старше 10 с) блокируют тишину
 
     Возвращает True, если тишина наступила до дедлайна; иначе False.
     В случае ошибок JS/драйвера — мягкая деградация (False + безопасная задержка).
@@ -176,103 +316,36 @@ def wait_dom_stable(driver: WebDriver, *, idle_ms: int = 1000, timeout_sec: int
     const cb = arguments[arguments.length - 1];
     const idleMs = Math.max(0, parseInt(arguments[0] || 0, 10));
     const timeoutMs = Math.max(idleMs, parseInt(arguments[1] || 0, 10));
+    const A = window.__adsaiActivity;
+    if (!A) return cb('no_monitor');
 
     const start = Date.now();
-    let last = Date.now();
-
-    function now(){ return Date.now(); }
-    function mark(){ last = now(); }
-    function done(ok){ cleanup(); try { cb(Boolean(ok)); } catch(_){} }
-
-    // -------------------- наблюдатели активности --------------------
-    let obs = null;
-    let listeners = [];
-    let pollTimer = null;
-    let rafId = 0;
-    let lastResCount = 0;
-    let lastDomCount = 0;
-
-    function on(evt, target){
-      const t = target || window;
-      const h = () => mark();
-      try { t.addEventListener(evt, h, {passive:true}); } catch(e){ try{ t.addEventListener(evt, h); }catch(_){} }
-      listeners.push({t, evt, h});
-    }
-
-    function cleanup(){
-      try { if (obs) obs.disconnect(); } catch(_){}
-      try { listeners.forEach(({t,evt,h}) => t.removeEventListener(evt, h)); } catch(_){}
-      try { if (pollTimer) clearInterval(pollTimer); } catch(_){}
-      try { if (rafId) cancelAnimationFrame(rafId); } catch(_){}
-    }
-
-    try {
-      // MutationObserver
-      try {
-        obs = new MutationObserver(mark);
-        obs.observe(document, {subtree:true, childList:true, attributes:true, characterData:true});
-      } catch(e) { obs = null; }
-
-      // базовые события страницы/окна
-      on('readystatechange', document);
-      on('load', window);
-      on('pageshow', window);
-      on('hashchange', window);
-      on('scroll', window);
-      on('resize', window);
-
-      // базовые значения счётчиков
-      try {
-        lastResCount = (performance && performance.getEntriesByType)
-          ? performance.getEntriesByType('resource').length : 0;
-      } catch(e){ lastResCount = 0; }
-      try {
-        lastDomCount = document.getElementsByTagName('*').length;
-      } catch(e){ lastDomCount = 0; }
-
-      // периодический поллинг счётчиков
-      pollTimer = setInterval(() => {
-        try {
-          const curRes = (performance && performance.getEntriesByType)
-            ? performance.getEntriesByType('resource').length : 0;
-          if (curRes > lastResCount) { lastResCount = curRes; mark(); }
-        } catch(_){}
-
-        try {
-          const curDom = document.getElementsByTagName('*').length;
-          if (curDom !== lastDomCount) { lastDomCount = curDom; mark(); }
-        } catch(_){}
-      }, 120);
-
-      // rAF-тик — полезно при батч-рендерах
-      (function rafTick(){
-        rafId = requestAnimationFrame(() => {
-          try { /* без чтения layout; нам важны интервалы между кадрами */ } catch(_){}
-          rafId = 0;
-          setTimeout(rafTick, 120);
-        });
-      })();
-
-      // основной цикл ожидания тишины
-      (function tick(){
-        const t = now();
-        if (t - last >= idleMs) return done(true);
-        if (t - start >= timeoutMs) return done(false);
-        setTimeout(tick, 100);
-      })();
-
-    } catch(e) {
-      // если совсем плохо — ждём idle и выходим
-      setTimeout(() => done(false), Math.min(timeoutMs, Math.max(0, idleMs)));
-    }
+    (function tick(){
+      let quiet = 0, busy = 0;
+      try { quiet = A.quietFor(); busy = A.inflight(); } catch(_) { return cb(false); }
+      if (quiet >= idleMs && busy === 0) return cb(true);
+      const left = timeoutMs - (Date.now() - start);
+      if (left <= 0) return cb(false);
+      // спим до момента, когда тишина может наступить (но не дольше 250 мс — ждём сеть)
+      const wait = busy > 0 ? 100 : Math.max(16, idleMs - quiet);
+      setTimeout(tick, Math.min(left, wait, 250));
+    })();
     """
-    try:
-        res = driver.execute_async_script(js, idle_ms, timeout_ms)
-        return bool(res)
-    except (WebDriverException, JavascriptException):
-        # Деградация: пауза без гарантий «тишины»
+    for _ in range(2):
         try:
-            _sleep(min(timeout_ms, idle_ms) / 1000.0)
-        except Exception:
-            pass
-        return False
+            res = driver.execute_async_script(js, idle_ms, timeout_ms)
+        except (WebDriverException, JavascriptException):
+            break
+        if res == "no_monitor":
+            # Документ сменился до регистрации или CDP недоступен — ставим и повторяем
+            if not install_activity_monitor(driver):
+                break
+            continue
+        return bool(res)
+
+    # Деградация: пауза без гарантий «тишины»
+    try:
+        _sleep(min(timeout_ms, idle_ms) / 1000.0)
+    except Exception:
+        pass
+    return False
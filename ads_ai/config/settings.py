@@ -69,6 +69,8 @@ class Browser:
     """
     dom_scope: str = "full"  # viewport|full
     max_dom_chars: int = 200_000
+    llm_dom_view: str = "delta"  # delta (UI-карта + diff между ходами) | html (сырой DOM, как раньше)
+    dom_token_budget: int = 12_000  # сырой DOM для LLM ужимается по релевантности до ~N токенов (0 — обрезка по max_dom_chars)
     default_wait_sec: int = 12
     step_timeout_sec: int = 35
     headless_default: bool = False
@@ -100,6 +102,8 @@ class Humanize:
     scroll_chunk_px: int = 280
     jitter_ms_min: int = 120
     jitter_ms_max: int = 480
+    # движок ввода: "inpage" (одно расписание в странице), "cdp" (Input.dispatchKeyEvent), "keys" (посимвольный send_keys)
+    typing_engine: str = "inpage"
 
 
 @dataclass
@@ -149,6 +153,7 @@ class Planner:
     outline_max_subgoals: int = 8         # верхняя граница числа подцелей (LLM side)
     max_steps_per_subgoal: int = 6        # сколько шагов генерировать на подцель
     verify_rounds: int = 1                # количество микро-фиксов после подцели
+    pipeline: bool = False                # PE_PIPELINE=1: план следующей подцели — в фоне во время исполнения текущей (доп. вызов LLM)
 
 
 @dataclass
@@ -159,6 +164,10 @@ class Tracing:
     """
     max_bytes: int = 5 * 1024 * 1024      # 5 MB
     max_backups: int = 3                  # хранить .1 .. .N
+    # Артефакты шагов Runtime (скрин + DOM), пишутся фоновым потоком
+    artifacts_policy: str = "all"         # "all" | "failures" | "every_n" | "off"
+    artifacts_every_n: int = 5            # для every_n: каждый N-й успешный шаг
+    artifacts_queue: int = 32             # размер очереди записи (переполнение → drop)
 
 
 # -------------------------------- SETTINGS ----------------------------------- #
@@ -233,12 +242,17 @@ def load_settings(config_path: Optional[Path] = None, logging_yaml: Optional[Pat
 
     # Browser
     s.browser.dom_scope = (getenv("DOM_SCOPE", s.browser.dom_scope) or s.browser.dom_scope).lower()
+    s.browser.llm_dom_view = (getenv("LLM_DOM_VIEW", s.browser.llm_dom_view) or s.browser.llm_dom_view).lower()
     s.browser.max_dom_chars = _clamp_int(getenv_int("MAX_DOM", s.browser.max_dom_chars), lo=50_000, hi=2_000_000)
+    s.browser.dom_token_budget = _clamp_int(getenv_int("DOM_TOKEN_BUDGET", s.browser.dom_token_budget), lo=0, hi=500_000)
     s.browser.default_wait_sec = _clamp_int(getenv_int("DEFAULT_WAIT", s.browser.default_wait_sec), lo=0, hi=120)
     s.browser.step_timeout_sec = _clamp_int(getenv_int("STEP_TIMEOUT_SEC", s.browser.step_timeout_sec), lo=1, hi=300)
     s.browser.headless_default = getenv_bool("HEADLESS_DEFAULT", s.browser.headless_default)
     s.browser.adsp_api_base = getenv("ADSP_API_BASE", s.browser.adsp_api_base) or s.browser.adsp_api_base
 
+    # Humanize
+    s.humanize.typing_engine = (getenv("TYPING_ENGINE", s.humanize.typing_engine) or s.humanize.typing_engine).lower()
+
     # Limits
     s.limits.max_steps_per_task = _clamp_int(getenv_int("MAX_STEPS_PER_TASK", s.limits.max_steps_per_task), lo=1, hi=10_000)
     s.limits.max_same_step = _clamp_int(getenv_int("MAX_SAME_STEP", s.limits.max_same_step), lo=1, hi=100)
@@ -252,6 +266,7 @@ def load_settings(config_path: Optional[Path] = None, logging_yaml: Optional[Pat
     s.planner.outline_max_subgoals = _clamp_int(getenv_int("PE_OUTLINE_MAX_SUBGOALS", s.planner.outline_max_subgoals), lo=1, hi=64)
     s.planner.max_steps_per_subgoal = _clamp_int(getenv_int("PE_MAX_STEPS_PER_SUBGOAL", s.planner.max_steps_per_subgoal), lo=1, hi=50)
     s.planner.verify_rounds = _clamp_int(getenv_int("PE_VERIFY_ROUNDS", s.planner.verify_rounds), lo=0, hi=10)
+    s.planner.pipeline = getenv_bool("PE_PIPELINE", s.planner.pipeline)
 
     # Runware (генерация ассетов)
     s.runware.api_key = getenv("RUNWARE_API_KEY", s.runware.api_key or s.integrations.runware_api_key) or s.runware.api_key
@@ -261,6 +276,9 @@ def load_settings(config_path: Optional[Path] = None, logging_yaml: Optional[Pat
     # Tracing (ротация логов)
     s.tracing.max_bytes = _clamp_int(getenv_int("TRACING_MAX_BYTES", s.tracing.max_bytes), lo=0, hi=1_000_000_000)
     s.tracing.max_backups = _clamp_int(getenv_int("TRACING_MAX_BACKUPS", s.tracing.max_backups), lo=0, hi=100)
+    s.tracing.artifacts_policy = (getenv("TRACING_ARTIFACTS_POLICY", s.tracing.artifacts_policy) or s.tracing.artifacts_policy).lower()
+    s.tracing.artifacts_every_n = _clamp_int(getenv_int("TRACING_ARTIFACTS_EVERY_N", s.tracing.artifacts_every_n), lo=1, hi=1000)
+    s.tracing.artifacts_queue = _clamp_int(getenv_int("TRACING_ARTIFACTS_QUEUE", s.tracing.artifacts_queue), lo=1, hi=1024)
 
     # Пути гарантированно существуют
     s.paths.ensure()
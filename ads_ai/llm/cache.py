@@ -0,0 +1,224 @@
+# ads_ai/llm/cache.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Дисковый кэш ответов LLM (SQLite, WAL), адресация по содержимому:
+ключ = sha256(model, temperature, prompt).
+
+  • TTL на запись; LRU-вытеснение по last_hit при превышении max_entries;
+  • маленький in-process LRU поверх SQLite — повторный хит без обращения к диску;
+  • метрики hits/misses/puts/evictions (в т.ч. по kind вызова).
+
+Какие вызовы кэшировать, решает клиент (GeminiClient: cache_kinds / cache=True на вызове).
+
+Публичный контракт:
+  - LLMCache(path, ttl_sec, max_entries, memory_entries)
+      .key(model, temperature, prompt) -> str
+      .get(key, kind="") -> str|None
+      .put(key, response, *, model="", kind="") -> None
+      .clear() / .stats()
+  - get_llm_cache() -> LLMCache|None   (синглтон; ENV ADS_AI_LLM_CACHE=0 — выключен)
+
+ENV: ADS_AI_LLM_CACHE (1), ADS_AI_LLM_CACHE_PATH (artifacts/llm_cache.db),
+     ADS_AI_LLM_CACHE_TTL (сек, 86400), ADS_AI_LLM_CACHE_MAX (5000).
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ads_ai.utils.paths import project_root
+
+__all__ = ["LLMCache", "get_llm_cache"]
+
+log = logging.getLogger(__name__)
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: Path,
+        *,
+        ttl_sec: float = 86400.0,
+        max_entries: int = 5000,
+        memory_entries: int = 256,
+    ) -> None:
+        self.path = str(path)
+        self.ttl_sec = max(0.0, float(ttl_sec))
+        self.max_entries = max(1, int(max_entries))
+        self.memory_entries = max(0, int(memory_entries))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._migrate()
+        self._mem: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._puts_since_evict = 0
+        self._stats: Dict[str, Any] = {"hits": 0, "memory_hits": 0, "misses": 0, "puts": 0, "evictions": 0, "by_kind": {}}
+
+    def _migrate(self) -> None:
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL DEFAULT '',
+                    kind TEXT NOT NULL DEFAULT '',
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_last_hit ON llm_cache(last_hit);
+                """
+            )
+
+    # ---- публичное API ---------------------------------------------------
+
+    @staticmethod
+    def key(model: str, temperature: float, prompt: str) -> str:
+        h = hashlib.sha256()
+        h.update(f"{model}\x00{float(temperature):.4f}\x00".encode("utf-8"))
+        h.update((prompt or "").encode("utf-8", "ignore"))
+        return h.hexdigest()
+
+    def get(self, key: str, kind: str = "") -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if self.ttl_sec <= 0 or now - hit[0] < self.ttl_sec:
+                    self._mem.move_to_end(key)
+                    self._count("hits", kind)
+                    self._stats["memory_hits"] += 1
+                    return hit[1]
+                self._mem.pop(key, None)
+            try:
+                row = self._conn.execute("SELECT response, created_at FROM llm_cache WHERE key=?;", (key,)).fetchone()
+                if row is not None and self.ttl_sec > 0 and now - float(row[1]) >= self.ttl_sec:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key=?;", (key,))
+                    row = None
+                if row is None:
+                    self._count("misses", kind)
+                    return None
+                self._conn.execute("UPDATE llm_cache SET last_hit=?, hits=hits+1 WHERE key=?;", (now, key))
+            except Exception as e:
+                log.debug("llm cache get failed: %s", e)
+                self._count("misses", kind)
+                return None
+            self._remember(key, float(row[1]), str(row[0]))
+            self._count("hits", kind)
+            return str(row[0])
+
+    def put(self, key: str, response: str, *, model: str = "", kind: str = "") -> None:
+        if not response:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache(key, model, kind, response, created_at, last_hit, hits) VALUES(?,?,?,?,?,?,0);",
+                    (key, model, kind, response, now, now),
+                )
+            except Exception as e:
+                log.debug("llm cache put failed: %s", e)
+                return
+            self._remember(key, now, response)
+            self._count("puts", kind)
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= 32:
+                self._puts_since_evict = 0
+                self._evict_unlocked(now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            try:
+                self._conn.execute("DELETE FROM llm_cache;")
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._stats)
+            out["by_kind"] = {k: dict(v) for k, v in self._stats["by_kind"].items()}
+            try:
+                out["entries"] = int(self._conn.execute("SELECT COUNT(*) FROM llm_cache;").fetchone()[0])
+            except Exception:
+                out["entries"] = -1
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / total, 3) if total else 0.0
+        return out
+
+    # ---- внутренности ----------------------------------------------------
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._mem[key] = (created_at, response)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def _count(self, name: str, kind: str) -> None:
+        self._stats[name] += 1
+        if kind:
+            k = self._stats["by_kind"].setdefault(kind, {"hits": 0, "misses": 0, "puts": 0})
+            k[name] = k.get(name, 0) + 1
+
+    def _evict_unlocked(self, now: float) -> None:
+        try:
+            n = 0
+            if self.ttl_sec > 0:
+                n += self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?;", (now - self.ttl_sec,)).rowcount or 0
+            total = int(self._conn.execute("SELECT COUNT(*) FROM llm_cache;").fetchone()[0])
+            if total > self.max_entries:
+                n += self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_hit ASC LIMIT ?);",
+                    (total - self.max_entries,),
+                ).rowcount or 0
+            self._stats["evictions"] += n
+        except Exception as e:
+            log.debug("llm cache eviction failed: %s", e)
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+_cache_failed = False
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Кэш процесса (ленивая инициализация из ENV); None — выключен или БД недоступна."""
+    global _cache, _cache_failed
+    if _cache is not None or _cache_failed:
+        return _cache
+    if str(os.getenv("ADS_AI_LLM_CACHE", "1")).strip().lower() in {"0", "false", "no", "off"}:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_failed:
+            path = os.getenv("ADS_AI_LLM_CACHE_PATH") or str(project_root() / "artifacts" / "llm_cache.db")
+            try:
+                _cache = LLMCache(
+                    Path(path),
+                    ttl_sec=_env_float("ADS_AI_LLM_CACHE_TTL", 86400.0),
+                    max_entries=int(_env_float("ADS_AI_LLM_CACHE_MAX", 5000)),
+                )
+            except Exception as e:
+                log.warning("LLM cache disabled: %s", e)
+                _cache_failed = True
+    return _cache
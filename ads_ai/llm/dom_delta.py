@@ -0,0 +1,185 @@
+# ads_ai/llm/dom_delta.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Инкрементальное представление страницы для LLM.
+
+Полная UI-карта (browser/ui_map.py) уходит в промпт только на первом ходе, после
+навигации (сменился origin+path) или когда изменилась большая часть контролов.
+В остальных ходах — короткая сводка страницы и diff относительно прошлого хода:
+добавленные / изменённые / исчезнувшие контролы (ключ — устойчивый селектор).
+Вызовы LLM без состояния, поэтому неизменившиеся контролы тоже перечисляются,
+одной короткой строкой «селектор · подпись» (у полей ввода — ещё type и value);
+если их больше unchanged_limit — отдаётся полный вид, чтобы контролы не пропадали из промпта.
+
+Публичный контракт:
+  - DomDelta(full_renderer=None, change_ratio=0.6, unchanged_limit=40)
+      .render(ui) -> (view, meta)    meta: {"mode": "full"|"delta", "added", "changed", "removed", ...}
+      .reset()                       — следующий render отдаст полный вид
+  - ui_diff(prev, cur) -> {"added": [...], "changed": [...], "removed": [...], "unchanged": [...]}
+  - render_full(ui) -> str           — компактный полный вид (по умолчанию)
+"""
+
+import html
+import urllib.parse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+__all__ = ["DomDelta", "ui_diff", "render_full"]
+
+_GROUPS = ("primary", "tabs", "inputs", "buttons")
+
+# поля, изменение которых — «контрол изменился» (xpath не считаем: соседи сдвигают индексы)
+_SIG_FIELDS = ("tag", "role", "type", "aria_label", "placeholder", "text", "data_value", "value")
+
+
+def _esc(s: Any, n: int = 160) -> str:
+    return html.escape("" if s is None else str(s), quote=True)[:n]
+
+
+def _key(group: str, it: Dict[str, Any]) -> str:
+    return f"{group}|{it.get('selector') or it.get('xpath') or ''}"
+
+
+def _sig(it: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(it.get(k) or "") for k in _SIG_FIELDS)
+
+
+def _index(ui: Dict[str, Any]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    out: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for g in _GROUPS:
+        for it in ui.get(g) or []:
+            if isinstance(it, dict) and (it.get("selector") or it.get("xpath")):
+                out.setdefault(_key(g, it), (g, it))
+    return out
+
+
+def _label(it: Dict[str, Any]) -> str:
+    return str(it.get("aria_label") or it.get("text") or it.get("placeholder") or it.get("data_value") or it.get("type") or "")
+
+
+def _line(group: str, it: Dict[str, Any], *, full: bool = True) -> str:
+    sel = _esc(it.get("selector") or it.get("xpath") or "", 300)
+    attrs = [f'g="{group}"', f's="{sel}"']
+    if not full:
+        if group == "inputs":
+            attrs.append(f'type="{_esc(it.get("type") or "text", 24)}"')
+            if it.get("value"):
+                attrs.append(f'value="{_esc(it.get("value"), 80)}"')
+        return f"<c {' '.join(attrs)}>{_esc(_label(it), 40)}</c>"
+    if group == "inputs":
+        attrs.append(f'type="{_esc(it.get("type") or "text", 24)}"')
+        if it.get("value"):
+            attrs.append(f'value="{_esc(it.get("value"), 80)}"')
+    elif it.get("role"):
+        attrs.append(f'role="{_esc(it.get("role"), 24)}"')
+    return f"<c {' '.join(attrs)}>{_esc(_label(it))}</c>"
+
+
+def _summary(ui: Dict[str, Any]) -> str:
+    meta = ui.get("meta") if isinstance(ui.get("meta"), dict) else {}
+    counts = " ".join(f"{g}={len(ui.get(g) or [])}" for g in _GROUPS)
+    parts = [f'url="{_esc(meta.get("url"), 300)}"', f'title="{_esc(meta.get("title"))}"', f'controls="{counts}"']
+    heads = "; ".join(str(h) for h in (meta.get("headings") or [])[:6])
+    if heads:
+        parts.append(f'headings="{_esc(heads, 400)}"')
+    dialogs = "; ".join(str(d) for d in (meta.get("dialogs") or [])[:3])
+    if dialogs:
+        parts.append(f'dialogs="{_esc(dialogs, 300)}"')
+    return f"<page {' '.join(parts)} />"
+
+
+def render_full(ui: Dict[str, Any]) -> str:
+    """Полный вид UI-карты: сводка + по строке на контрол (g — группа, s — селектор для шагов)."""
+    rows = ["<!-- UI-MAP (full): g=group, s=selector to use in steps -->", _summary(ui)]
+    for g in _GROUPS:
+        for it in ui.get(g) or []:
+            if isinstance(it, dict):
+                rows.append(_line(g, it))
+    return "\n".join(rows)
+
+
+def ui_diff(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    """Разница UI-карт по ключу группа+селектор: added/changed (новое состояние), removed (старое), unchanged."""
+    a, b = _index(prev or {}), _index(cur or {})
+    out: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {"added": [], "changed": [], "removed": [], "unchanged": []}
+    for k, (g, it) in b.items():
+        old = a.get(k)
+        if old is None:
+            out["added"].append((g, it))
+        elif _sig(old[1]) != _sig(it):
+            out["changed"].append((g, it))
+        else:
+            out["unchanged"].append((g, it))
+    for k, (g, it) in a.items():
+        if k not in b:
+            out["removed"].append((g, it))
+    return out
+
+
+def _page_key(ui: Dict[str, Any]) -> str:
+    meta = ui.get("meta") if isinstance(ui.get("meta"), dict) else {}
+    u = urllib.parse.urlsplit(str(meta.get("url") or ""))
+    return f"{u.scheme}://{u.netloc}{u.path}"
+
+
+class DomDelta:
+    """Состояние diff-представления одного прогона (предыдущая UI-карта и её страница)."""
+
+    def __init__(
+        self,
+        *,
+        full_renderer: Optional[Callable[[Dict[str, Any]], str]] = None,
+        change_ratio: float = 0.6,
+        unchanged_limit: int = 40,
+    ) -> None:
+        self.full_renderer = full_renderer or render_full
+        self.change_ratio = float(change_ratio)
+        self.unchanged_limit = max(0, int(unchanged_limit))
+        self._prev: Optional[Dict[str, Any]] = None
+
+    def reset(self) -> None:
+        self._prev = None
+
+    def render(self, ui: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        prev, self._prev = self._prev, ui
+        if prev is None or _page_key(ui) != _page_key(prev):
+            return self.full_renderer(ui), {"mode": "full", "why": "first" if prev is None else "navigation"}
+
+        d = ui_diff(prev, ui)
+        moved = len(d["added"]) + len(d["changed"]) + len(d["removed"])
+        total = max(1, moved + len(d["unchanged"]))
+        if moved / total > self.change_ratio:
+            return self.full_renderer(ui), {"mode": "full", "why": "large_change", "changed_ratio": round(moved / total, 2)}
+        if len(d["unchanged"]) > self.unchanged_limit:
+            # LLM без состояния: обрезанный список неизменившихся контролов — потерянные контролы
+            return self.full_renderer(ui), {"mode": "full", "why": "unchanged_overflow", "unchanged": len(d["unchanged"])}
+
+        rows = [
+            "<!-- UI-DELTA: same page as the previous turn; only changes are listed in full. "
+            "g=group, s=selector to use in steps -->",
+            _summary(ui),
+        ]
+        if not moved:
+            rows.append("<no-changes />")
+        for name in ("added", "changed"):
+            if d[name]:
+                rows.append(f"<{name}>")
+                rows.extend(_line(g, it) for g, it in d[name])
+                rows.append(f"</{name}>")
+        if d["removed"]:
+            rows.append("<removed>")
+            rows.extend(_line(g, it, full=False) for g, it in d["removed"])
+            rows.append("</removed>")
+        if d["unchanged"]:
+            rows.append(f'<unchanged total="{len(d["unchanged"])}">')
+            rows.extend(_line(g, it, full=False) for g, it in d["unchanged"])
+            rows.append("</unchanged>")
+        meta = {
+            "mode": "delta",
+            "added": len(d["added"]),
+            "changed": len(d["changed"]),
+            "removed": len(d["removed"]),
+            "unchanged": len(d["unchanged"]),
+        }
+        return "\n".join(rows), meta
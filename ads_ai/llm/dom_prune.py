@@ -0,0 +1,381 @@
+# ads_ai/llm/dom_prune.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Обрезка сырого DOM под бюджет токенов по релевантности (вместо html[:N]).
+
+Грубая обрезка по символам теряет то, что в конце документа (часто — как раз нужную
+форму/диалог), и LLM промахивается, а мы платим за раунд ремонта. Здесь документ
+режется на блоки-поддеревья (крупные контейнеры остаются «скелетом» из тегов), каждый
+блок получает оценку:
+  • видимость — hidden / aria-hidden / display:none / type=hidden / data-ai-hidden → выбрасывается;
+  • интерактивность — input/button/select/a[href]/role=… внутри блока;
+  • лексическое пересечение с запросом (задача, подцель) — по тексту и атрибутам блока
+    и подписям контейнеров над ним;
+  • якоря падающего селектора (id/class/атрибуты/текст) — сильный бонус;
+  • открытый диалог — бонус.
+Лучшие блоки набираются в бюджет, порядок документа сохраняется, выброшенные подряд
+блоки заменяются одним комментарием. Что выброшено — в meta (для трейса).
+
+Публичный контракт:
+  - prune_html(html, budget_tokens, *, query="", selectors=(), chars_per_token=3.5) -> (html, meta)
+      meta: {"pruned": bool, "tokens_in", "tokens_out", "blocks", "kept", "dropped", "dropped_hidden", "dropped_top": [...]}
+  - estimate_tokens(text, chars_per_token=3.5) -> int
+"""
+
+import html as _html
+import math
+import re
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+__all__ = ["prune_html", "estimate_tokens"]
+
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+_SKIP = {"script", "style", "noscript", "template", "svg", "link", "meta"}
+_NOISY_ATTRS = {"style", "jsaction", "jscontroller", "jsmodel", "jslog", "jsdata", "jsshadow"}
+_INTERACTIVE_TAGS = {"input", "textarea", "select", "button", "option", "label"}
+_INTERACTIVE_ROLES = {
+    "button", "link", "tab", "checkbox", "radio", "combobox", "textbox", "menuitem",
+    "option", "switch", "listbox", "searchbox", "spinbutton", "slider",
+}
+_LABEL_ATTRS = ("id", "name", "aria-label", "placeholder", "title", "value", "for", "data-test", "data-testid", "role")
+_STOP = {
+    "the", "and", "for", "with", "from", "into", "this", "that", "page", "click", "button",
+    "что", "для", "как", "это", "или", "при", "надо", "нужно", "нажать", "кнопку",
+}
+_WORD = re.compile(r"[^\W_]{3,}", re.U)
+_SEL_ANCHORS = (
+    re.compile(r"#([\w-]{3,})"),
+    re.compile(r"\.([\w-]{3,})"),
+    re.compile(r"\[[\w:-]+\s*[*^$~|]?=\s*[\"']?([^\"'\]]{3,})"),
+    re.compile(r"@[\w:-]+\s*=\s*[\"']([^\"']{3,})"),
+    re.compile(r"contains\(\s*[^,]+,\s*[\"']([^\"']{3,})"),
+    re.compile(r"text\(\)\s*=\s*[\"']([^\"']{3,})"),
+    re.compile(r":(?:contains|has-text|text)\(\s*[\"']?([^\"')]{3,})"),
+)
+
+
+def estimate_tokens(text: str, chars_per_token: float = 3.5) -> int:
+    return int(math.ceil(len(text or "") / max(1.0, float(chars_per_token))))
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "size")
+
+    def __init__(self, tag: str, attrs: List[Tuple[str, str]]) -> None:
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Any] = []  # _Node | str
+        self.size = 0
+
+    def attr(self, name: str) -> str:
+        for k, v in self.attrs:
+            if k == name:
+                return v
+        return ""
+
+    def open_tag(self) -> str:
+        parts = [self.tag]
+        for k, v in self.attrs:
+            if k in _NOISY_ATTRS:
+                continue
+            parts.append(k if v == "" else f'{k}="{_html.escape(v, quote=True)}"')
+        return "<" + " ".join(parts) + ">"
+
+    def close_tag(self) -> str:
+        return "" if self.tag in _VOID else f"</{self.tag}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#root", [])
+        self._stack: List[_Node] = [self.root]
+        self._skip = 0
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._skip or tag in _SKIP:
+            if tag not in _VOID:
+                self._skip += 1
+            return
+        node = _Node(tag, [(k, v or "") for k, v in attrs])
+        self._stack[-1].children.append(node)
+        if tag not in _VOID:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self._skip or tag in _SKIP:
+            return
+        self._stack[-1].children.append(_Node(tag, [(k, v or "") for k, v in attrs]))
+
+    def handle_endtag(self, tag: str) -> None:
+        if self._skip:
+            if tag not in _VOID:
+                self._skip -= 1
+            return
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data: str) -> None:
+        if self._skip:
+            return
+        text = re.sub(r"\s+", " ", data)
+        if text.strip():
+            self._stack[-1].children.append(text)
+
+
+def _measure(node: _Node) -> int:
+    n = len(node.open_tag()) + len(node.close_tag())
+    for ch in node.children:
+        n += _measure(ch) if isinstance(ch, _Node) else len(ch)
+    node.size = n
+    return n
+
+
+def _render(node: Any) -> str:
+    if isinstance(node, str):
+        return _html.escape(node, quote=False)
+    return node.open_tag() + "".join(_render(ch) for ch in node.children) + node.close_tag()
+
+
+def _hidden(node: _Node) -> bool:
+    if node.attr("data-ai-hidden") == "1" or node.attr("aria-hidden").lower() == "true":
+        return True
+    if any(k == "hidden" for k, _ in node.attrs):
+        return True
+    if node.tag == "input" and node.attr("type").lower() == "hidden":
+        return True
+    style = node.attr("style").replace(" ", "").lower()
+    return "display:none" in style or "visibility:hidden" in style
+
+
+def _label_text(node: _Node) -> str:
+    return " ".join(node.attr(a) for a in _LABEL_ATTRS if node.attr(a)) + " " + node.attr("class")
+
+
+class _Block:
+    __slots__ = ("node", "size", "score", "hidden", "text")
+
+    def __init__(self, node: Any, size: int) -> None:
+        self.node = node
+        self.size = size
+        self.score = 0.0
+        self.hidden = False
+        self.text = ""
+
+
+def _collect(node: Any, parts: List[str], counts: Dict[str, int]) -> None:
+    if isinstance(node, str):
+        parts.append(node)
+        return
+    if _hidden(node):
+        return
+    parts.append(_label_text(node))
+    role = node.attr("role").lower()
+    if (
+        node.tag in _INTERACTIVE_TAGS
+        or (node.tag == "a" and node.attr("href"))
+        or role in _INTERACTIVE_ROLES
+        or any(k == "contenteditable" and v.lower() in ("", "true") for k, v in node.attrs)
+    ):
+        counts["interactive"] += 1
+    if role in ("dialog", "alertdialog") or (node.tag == "dialog" and any(k == "open" for k, _ in node.attrs)):
+        counts["dialog"] += 1
+    for ch in node.children:
+        _collect(ch, parts, counts)
+
+
+def _words(text: str) -> Set[str]:
+    return {w for w in _WORD.findall((text or "").lower()) if w not in _STOP}
+
+
+def _anchors(selectors: Iterable[str]) -> List[str]:
+    out: List[str] = []
+    for sel in selectors or []:
+        for rx in _SEL_ANCHORS:
+            out.extend(m.strip().lower() for m in rx.findall(str(sel or "")) if m.strip())
+    return list(dict.fromkeys(out))
+
+
+def _describe(node: Any) -> str:
+    if isinstance(node, str):
+        return "#text"
+    d = node.tag
+    if node.attr("id"):
+        d += "#" + node.attr("id")[:40]
+    elif node.attr("role"):
+        d += f"[role={node.attr('role')[:20]}]"
+    elif node.attr("aria-label"):
+        d += f"[aria-label={node.attr('aria-label')[:40]}]"
+    return d
+
+
+def prune_html(
+    html: str,
+    budget_tokens: int,
+    *,
+    query: str = "",
+    selectors: Iterable[str] = (),
+    chars_per_token: float = 3.5,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Ужать HTML до ~budget_tokens. Документ, который и так влезает, возвращается как есть
+    (meta["pruned"] = False); budget_tokens <= 0 — без ограничения.
+    """
+    src = html or ""
+    cpt = max(1.0, float(chars_per_token))
+    tokens_in = estimate_tokens(src, cpt)
+    if budget_tokens <= 0 or tokens_in <= budget_tokens:
+        return src, {"pruned": False, "tokens_in": tokens_in, "tokens_out": tokens_in}
+
+    budget_chars = int(budget_tokens * cpt)
+    builder = _TreeBuilder()
+    try:
+        builder.feed(src)
+        builder.close()
+        return _prune_tree(builder.root, budget_tokens, budget_chars, cpt, tokens_in, query, selectors)
+    except RecursionError:
+        # обход рекурсивный: патологически глубокая вложенность — грубая обрезка
+        return _truncate(src, budget_chars, cpt, tokens_in, "truncate_deep")
+    except Exception:
+        return _truncate(src, budget_chars, cpt, tokens_in, "truncate")
+
+
+def _truncate(src: str, budget_chars: int, cpt: float, tokens_in: int, why: str) -> Tuple[str, Dict[str, Any]]:
+    cut = src[:budget_chars] + "\n<!-- TRUNCATED -->"
+    return cut, {"pruned": True, "fallback": why, "tokens_in": tokens_in, "tokens_out": estimate_tokens(cut, cpt)}
+
+
+def _prune_tree(
+    root: _Node,
+    budget_tokens: int,
+    budget_chars: int,
+    cpt: float,
+    tokens_in: int,
+    query: str,
+    selectors: Iterable[str],
+) -> Tuple[str, Dict[str, Any]]:
+    _measure(root)
+
+    q_words = _words(query)
+    anchors = _anchors(selectors)
+    block_max = max(400, budget_chars // 12)
+
+    # Сегментация: маленькие поддеревья — блоки, крупные контейнеры — скелет (теги остаются всегда).
+    blocks: List[_Block] = []
+    layout: Dict[int, List[Any]] = {}  # id(узел скелета) -> [дети: _Block | _Node(скелет)]
+
+    def segment(node: _Node, ctx_words: Set[str], ctx_dialog: bool) -> None:
+        items: List[Any] = []
+        own = _words(_label_text(node)) if node is not root else set()
+        ctx = ctx_words | own
+        dialog = ctx_dialog or node.attr("role").lower() in ("dialog", "alertdialog") or node.tag == "dialog"
+        for ch in node.children:
+            size = ch.size if isinstance(ch, _Node) else len(ch)
+            if isinstance(ch, _Node) and not _hidden(ch) and size > block_max and any(isinstance(g, _Node) for g in ch.children):
+                segment(ch, ctx, dialog)
+                items.append(ch)
+                continue
+            b = _Block(ch, size)
+            if isinstance(ch, _Node) and _hidden(ch):
+                b.hidden = True
+            else:
+                parts: List[str] = []
+                counts = {"interactive": 0, "dialog": 0}
+                _collect(ch, parts, counts)
+                b.text = " ".join(parts)
+                hay = b.text.lower()
+                words = _words(hay)
+                score = 1.0
+                score += min(counts["interactive"], 20) * 2.0
+                score += len(q_words & words) * 3.0 + len(q_words & ctx) * 1.5
+                score += sum(25.0 for a in anchors if a in hay)
+                if counts["dialog"] or dialog:
+                    score += 15.0
+                b.score = score
+            blocks.append(b)
+            items.append(b)
+        layout[id(node)] = items
+
+    segment(root, set(), False)
+
+    # Жадный отбор по оценке (при равенстве — порядок документа).
+    order = sorted(range(len(blocks)), key=lambda i: (-blocks[i].score, i))
+    skeleton_chars = sum(len(n.open_tag()) + len(n.close_tag()) for n in _skeleton_nodes(root, layout))
+    left = budget_chars - skeleton_chars - 200
+    kept: Set[int] = set()
+    for i in order:
+        b = blocks[i]
+        if b.hidden or b.size > left:
+            continue
+        kept.add(id(b))
+        left -= b.size
+
+    dropped = [b for b in blocks if id(b) not in kept]
+
+    def emit(node: _Node) -> Tuple[str, int]:
+        """-> (html, сколько символов выброшено, если внутри ничего не оставлено; иначе -1)."""
+        out: List[str] = []
+        run_size, any_kept, dropped_size = 0, False, 0
+
+        def flush() -> None:
+            nonlocal run_size
+            if run_size:
+                out.append(f"<!-- pruned ~{int(math.ceil(run_size / cpt))} tokens -->")
+                run_size = 0
+
+        for it in layout.get(id(node), []):
+            if isinstance(it, _Block):
+                if id(it) not in kept:
+                    run_size += it.size
+                    dropped_size += it.size
+                    continue
+                flush()
+                out.append(_render(it.node))
+                any_kept = True
+                continue
+            inner, lost = emit(it)
+            if lost >= 0:  # контейнер выброшен целиком — сливаем с соседними выброшенными
+                run_size += lost + len(it.open_tag()) + len(it.close_tag())
+                dropped_size += lost
+                continue
+            flush()
+            out.append(it.open_tag() + inner + it.close_tag())
+            any_kept = True
+        flush()
+        return "".join(out), (-1 if any_kept else dropped_size)
+
+    body, _ = emit(root)
+    header = f"<!-- DOM pruned by relevance to ~{budget_tokens} tokens: kept {len(kept)}/{len(blocks)} blocks -->\n"
+    result = header + body
+    top = sorted((b for b in dropped if not b.hidden), key=lambda b: -b.score)[:5]
+    meta = {
+        "pruned": True,
+        "tokens_in": tokens_in,
+        "tokens_out": estimate_tokens(result, cpt),
+        "blocks": len(blocks),
+        "kept": len(kept),
+        "dropped": len(dropped),
+        "dropped_hidden": sum(1 for b in dropped if b.hidden),
+        "dropped_top": [
+            {"where": _describe(b.node), "score": round(b.score, 1), "chars": b.size, "text": re.sub(r"\s+", " ", b.text).strip()[:80]}
+            for b in top
+        ],
+    }
+    return result, meta
+
+
+def _skeleton_nodes(root: _Node, layout: Dict[int, List[Any]]) -> List[_Node]:
+    out: List[_Node] = []
+    stack = [root]
+    while stack:
+        n = stack.pop()
+        for it in layout.get(id(n), []):
+            if isinstance(it, _Node):
+                out.append(it)
+                stack.append(it)
+    return out
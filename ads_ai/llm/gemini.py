@@ -1,11 +1,17 @@
 # ads_ai/llm/gemini.py
 from __future__ import annotations
 
+import logging
 import os
+import threading
 import time
-from typing import Any, Dict, List, Optional, Union, Tuple, TypedDict, Literal
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Union, Tuple, TypedDict, Literal
 
 from ads_ai.utils.json_tools import extract_first_json, safe_str
+from ads_ai.llm.cache import LLMCache, get_llm_cache
+from ads_ai.llm.dom_prune import prune_html
+from ads_ai.llm.limiter import RateLimitTimeout, get_model_gate, is_quota_error
 from ads_ai.llm.prompts import (
     plan_prompt,
     repair_prompt,
@@ -20,6 +26,21 @@ try:
 except ModuleNotFoundError as e:
     raise RuntimeError("Не найден google-generativeai. Установи: pip install google-generativeai") from e
 
+log = logging.getLogger(__name__)
+
+# Пул для хеджированных вызовов (основной запрос + запасной после перцентиля латентности).
+# Общий на процесс; реальную параллельность к API ограничивает limiter (ModelGate).
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+        return _hedge_pool
+
 
 # ------------------------------ Типы ответов (поддержка IDE/типизации) ------------------------------
 
@@ -50,14 +71,36 @@ class GeminiClient:
     Важные принципы:
       - Возвращаем ТОЛЬКО парснутый JSON (list|dict) либо безопасные дефолты.
       - Любые ошибки LLM/сети => ретраи + fallback_model (если задан).
+      - Все вызовы идут через общий на процесс ограничитель модели (llm/limiter.py):
+        token bucket + потолок параллельности + общий cooldown после ответов «квота исчерпана».
+      - Хеджирование (hedge_pct, ENV ADS_AI_LLM_HEDGE_PCT, по умолчанию выключено): если основной
+        вызов не ответил за перцентиль hedge_pct своей латентности — параллельно идёт запрос к
+        fallback_model (или той же модели), берётся первый ответ.
+      - generate_json_batch(prompts) — пачка независимых промптов параллельно (в пределах лимитов).
       - HTML/Task/History/Vars предварительно нормализуются (safe_str + обрезка).
+      - Опциональный дисковый кэш ответов (llm/cache.py): только для вызовов из cache_kinds
+        (plan_full, plan_outline, plan_subgoal_steps, repair_step, verify_or_adjust, generate_json)
+        или с cache=True на вызове; в кэш попадают только ответы, из которых извлёкся JSON.
     """
 
+    CACHE_KINDS = frozenset({"plan_full", "plan_outline", "plan_subgoal_steps", "repair_step", "verify_or_adjust", "generate_json"})
+
     # внутренние лимиты на размер подсказки (страхуемся от крайне больших DOM)
     _MAX_HTML_CHARS = 200_000  # жёсткий верх на html_view внутри клиента (runtime уже режет, но продублируем)
     _MAX_TASK_CHARS = 8_000    # защита от чрезмерно длинных задач
 
-    def __init__(self, model: str, temperature: float = 0.15, retries: int = 2, fallback_model: Optional[str] = None):
+    def __init__(
+        self,
+        model: str,
+        temperature: float = 0.15,
+        retries: int = 2,
+        fallback_model: Optional[str] = None,
+        *,
+        cache_kinds: Optional[Iterable[str]] = None,
+        cache: Optional[LLMCache] = None,
+        hedge_pct: Optional[float] = None,
+        slot_timeout: float = 120.0,
+    ):
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             # Не валим процесс — кто-то может создавать объект заранее; но без ключа нет смысла дергать API.
@@ -70,40 +113,163 @@ class GeminiClient:
         self.retries = int(retries)
 
         self._primary = genai.GenerativeModel(self.model_name)
+        self._fallback: Optional[Any] = None
         # Параметры генерации: оставляем минимально детерминированную выдачу
         self._cfg = genai.GenerationConfig(temperature=self.temperature)
 
+        # Кэш: виды вызовов — из аргумента или ENV ADS_AI_LLM_CACHE_KINDS (через запятую, по умолчанию пусто)
+        if cache_kinds is None:
+            cache_kinds = [k.strip() for k in (os.getenv("ADS_AI_LLM_CACHE_KINDS") or "").split(",")]
+        self.cache_kinds = frozenset(k for k in cache_kinds if k in self.CACHE_KINDS)
+        self._cache = cache
+
+        # Лимиты/хеджирование: hedge_pct в 0..1 (0 — выключено), перцентиль считается по
+        # латентностям основной модели в процессе, не раньше ADS_AI_LLM_HEDGE_MIN_SAMPLES наблюдений.
+        if hedge_pct is None:
+            try:
+                hedge_pct = float(os.getenv("ADS_AI_LLM_HEDGE_PCT", "") or 0.0)
+            except Exception:
+                hedge_pct = 0.0
+        self.hedge_pct = min(0.99, max(0.0, float(hedge_pct)))
+        try:
+            self.hedge_min_samples = max(1, int(os.getenv("ADS_AI_LLM_HEDGE_MIN_SAMPLES", "") or 20))
+        except Exception:
+            self.hedge_min_samples = 20
+        self.slot_timeout = float(slot_timeout)
+        self._hedge_stats = {"hedged": 0, "hedge_wins": 0}
+
     # ------------------------------ Низкоуровневый вызов ------------------------------
 
-    def _call_llm(self, text: str) -> str:
+    def _cache_store(self, kind: str, cache: Optional[bool]) -> Optional[LLMCache]:
+        if cache is False or not kind or (cache is None and kind not in self.cache_kinds):
+            return None
+        return self._cache or get_llm_cache()
+
+    def _call_llm(self, text: str, kind: str = "", cache: Optional[bool] = None) -> str:
+        """
+        Вызов модели через кэш (если вид вызова kind включён). Промахи — _call_llm_uncached.
+        """
+        store = self._cache_store(kind, cache)
+        if store is None:
+            return self._call_llm_uncached(text)
+        key = store.key(self.model_name, self.temperature, text)
+        hit = store.get(key, kind)
+        if hit is not None:
+            return hit
+        raw = self._call_llm_uncached(text)
+        if extract_first_json(raw) is not None:
+            store.put(key, raw, model=self.model_name, kind=kind)
+        return raw
+
+    def cache_stats(self) -> Dict[str, Any]:
+        store = self._cache or get_llm_cache()
+        return store.stats() if store is not None else {}
+
+    def _call_llm_uncached(self, text: str) -> str:
         """
         Единая точка общения с моделью:
-          - ретраи c backoff,
+          - ретраи c backoff (после квотной ошибки ждём общий cooldown ограничителя),
+          - хеджирование по перцентилю латентности (если включено),
           - fallback модель по необходимости.
         Возвращает сырой текст от LLM (может содержать Markdown — выше по стеку мы парсим JSON).
         """
+        hedge_after = self._hedge_delay()
+        if hedge_after is not None:
+            return self._call_hedged(text, hedge_after)
+
         err: Optional[Exception] = None
-        for attempt in range(self.retries + 1):
+        try:
+            return self._call_primary(text)
+        except Exception as e:
+            err = e
+
+        # fallback-модель (по возможности)
+        if self.fallback_model:
             try:
-                res = self._primary.generate_content([text], generation_config=self._cfg)
-                if res and getattr(res, "text", None):
-                    return res.text
+                return self._call_fallback(text)
             except Exception as e:
                 err = e
-                time.sleep(0.7 * (attempt + 1))  # экспоненциальный backoff (мягкий)
 
-        # fallback-модель (по возможности)
-        if self.fallback_model:
+        raise RuntimeError(f"LLM failed: {err}")
+
+    def _generate(self, model_name: str, model: Any, text: str) -> str:
+        """Один запрос через ограничитель модели; латентность успешных ответов идёт в статистику."""
+        gate = get_model_gate(model_name)
+        with gate.slot(self.slot_timeout):
+            t0 = time.monotonic()
             try:
-                fm = genai.GenerativeModel(self.fallback_model)
-                res = fm.generate_content([text], generation_config=self._cfg)
-                if res and getattr(res, "text", None):
-                    return res.text
+                res = model.generate_content([text], generation_config=self._cfg)
+                out = getattr(res, "text", None) if res else None
             except Exception as e:
+                if is_quota_error(e):
+                    gate.cooldown(5.0)
+                raise
+        if not out:
+            raise RuntimeError("empty LLM response")
+        gate.observe(time.monotonic() - t0)
+        return out
+
+    def _call_primary(self, text: str) -> str:
+        err: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            try:
+                return self._generate(self.model_name, self._primary, text)
+            except RateLimitTimeout as e:
+                err = e
+                break  # слота не дождались — повтор бессмыслен, дальше решает fallback
+            except Exception as e:
+                err = e
+                if not is_quota_error(e):  # после квотной ошибки ждёт ограничитель
+                    time.sleep(0.7 * (attempt + 1))  # экспоненциальный backoff (мягкий)
+        raise err or RuntimeError("LLM failed")
+
+    def _call_fallback(self, text: str) -> str:
+        name = self.fallback_model or self.model_name
+        if self._fallback is None:
+            self._fallback = self._primary if name == self.model_name else genai.GenerativeModel(name)
+        return self._generate(name, self._fallback, text)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_pct <= 0:
+            return None
+        return get_model_gate(self.model_name).latency_pct(self.hedge_pct, min_samples=self.hedge_min_samples)
+
+    def _call_hedged(self, text: str, hedge_after: float) -> str:
+        """Основной вызов; не успел за hedge_after — параллельно запасной, берём первый успешный."""
+        pool = _get_hedge_pool()
+        primary = pool.submit(self._call_primary, text)
+        futures: List[Future] = [primary]
+        done, _ = wait(futures, timeout=max(0.05, hedge_after))
+        if not done:
+            futures.append(pool.submit(self._call_fallback, text))
+            self._hedge_stats["hedged"] += 1
+
+        err: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                e = f.exception()
+                if e is None:
+                    if f is not primary:
+                        self._hedge_stats["hedge_wins"] += 1
+                    return f.result()
                 err = e
 
+        # основной упал быстро (до хеджа) — обычный fallback
+        if len(futures) == 1 and self.fallback_model:
+            try:
+                return self._call_fallback(text)
+            except Exception as e:
+                err = e
         raise RuntimeError(f"LLM failed: {err}")
 
+    def limiter_stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"primary": get_model_gate(self.model_name).stats(), **self._hedge_stats}
+        if self.fallback_model and self.fallback_model != self.model_name:
+            out["fallback"] = get_model_gate(self.fallback_model).stats()
+        return out
+
     # ------------------------------ Вспомогательные утилиты ------------------------------
 
     @staticmethod
@@ -114,6 +280,23 @@ class GeminiClient:
         s = safe_str(s)
         return s[:max_chars]
 
+    @classmethod
+    def _clip_html(cls, html_view: str, query: str = "", selectors: Iterable[str] = ()) -> str:
+        """
+        DOM сверх _MAX_HTML_CHARS ужимается по релевантности к query/селекторам (llm/dom_prune.py),
+        а не отрезается хвостом; UI-карты и небольшие DOM проходят как есть.
+        """
+        s = safe_str(html_view or "")
+        if len(s) <= cls._MAX_HTML_CHARS:
+            return s
+        pruned, meta = prune_html(s, int(cls._MAX_HTML_CHARS / 3.5), query=query, selectors=selectors)
+        log.debug("html_view pruned for prompt: %s", meta)
+        return pruned[: cls._MAX_HTML_CHARS]
+
+    @staticmethod
+    def _sg_text(subgoal: Dict[str, Any]) -> str:
+        return " ".join(str(subgoal.get(k) or "") for k in ("title", "goal", "done_when")) if isinstance(subgoal, dict) else ""
+
     @staticmethod
     def _as_json_array(raw: Any) -> List[Any]:
         """Гарантированно вернуть JSON-массив (или пустой список)."""
@@ -177,13 +360,41 @@ class GeminiClient:
         """Сырой текст из модели (без JSON-гарантий)."""
         return self._call_llm(text)
 
-    def generate_json(self, text: str) -> Optional[Union[List[Any], Dict[str, Any]]]:
+    def generate_json(self, text: str, *, cache: Optional[bool] = None) -> Optional[Union[List[Any], Dict[str, Any]]]:
         """
         Парс JSON из ответа модели. Возвращает list|dict или None (если JSON не смогли извлечь).
+        cache=True/False — принудительно включить/выключить кэш для этого вызова.
         """
-        raw = self._call_llm(text)
+        raw = self._call_llm(text, "generate_json", cache)
         return extract_first_json(raw)
 
+    def generate_json_batch(
+        self,
+        prompts: Iterable[str],
+        *,
+        cache: Optional[bool] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[Optional[Union[List[Any], Dict[str, Any]]]]:
+        """
+        Пачка независимых промптов параллельно; результаты — в порядке промптов.
+        Упавший элемент — None (как generate_json без JSON). Параллельность по умолчанию —
+        потолок ограничителя модели (без лимита — 4); квоту всё равно соблюдает limiter.
+        """
+        items = list(prompts)
+        if not items:
+            return []
+
+        def _one(p: str) -> Optional[Union[List[Any], Dict[str, Any]]]:
+            try:
+                return self.generate_json(p, cache=cache)
+            except Exception as e:
+                log.debug("batch item failed: %s", e)
+                return None
+
+        workers = int(max_workers or get_model_gate(self.model_name).concurrency or 4)
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(items))), thread_name_prefix="llm-batch") as ex:
+            return list(ex.map(_one, items))
+
     # ------------------------------ Визуальные подсказки (скриншоты) ------------------------------
 
     # generate_json_with_image removed per request
@@ -202,12 +413,12 @@ class GeminiClient:
         Возвращает безопасный список шагов (может быть пустым).
         """
         prompt = plan_prompt(
-            self._clip(html_view, self._MAX_HTML_CHARS),
+            self._clip_html(html_view, task),
             self._clip(task, self._MAX_TASK_CHARS),
             done_history,
             vars_map,
         )
-        raw = self._call_llm(prompt)
+        raw = self._call_llm(prompt, "plan_full")
         obj = extract_first_json(raw)
         return self._as_json_array(obj)
 
@@ -223,13 +434,17 @@ class GeminiClient:
         Починить один проблемный шаг. Возвращает валидный объект шага или None.
         """
         prompt = repair_prompt(
-            self._clip(html_view, self._MAX_HTML_CHARS),
+            self._clip_html(
+                html_view,
+                f"{task} {failing_step.get('type') or ''} {failing_step.get('text') or ''}",
+                [str(failing_step.get("selector") or "")],
+            ),
             self._clip(task, self._MAX_TASK_CHARS),
             history,
             failing_step,
             vars_map,
         )
-        raw = self._call_llm(prompt)
+        raw = self._call_llm(prompt, "repair_step")
         obj = extract_first_json(raw)
         data = self._as_json_object(obj)
         return data or None
@@ -242,7 +457,7 @@ class GeminiClient:
         Возвращает объект вида {"subgoals": [...]}, даже если LLM ответила частично.
         """
         prompt = outline_prompt(self._clip(task, self._MAX_TASK_CHARS))
-        raw = self._call_llm(prompt)
+        raw = self._call_llm(prompt, "plan_outline")
         obj = extract_first_json(raw)
         return self._normalize_outline(obj)
 
@@ -263,14 +478,14 @@ class GeminiClient:
         # Небольшая страховка на случай неверного max_steps
         ms = max(1, min(int(max_steps or 6), 12))
         prompt = subgoal_steps_prompt(
-            self._clip(html_view, self._MAX_HTML_CHARS),
+            self._clip_html(html_view, f"{self._sg_text(subgoal)} {task}"),
             self._clip(task, self._MAX_TASK_CHARS),
             subgoal,
             done_history,
             vars_map,
             max_steps=ms,
         )
-        raw = self._call_llm(prompt)
+        raw = self._call_llm(prompt, "plan_subgoal_steps")
         obj = extract_first_json(raw)
         return self._as_json_array(obj)
 
@@ -287,12 +502,12 @@ class GeminiClient:
         Всегда возвращает нормализованный объект (status/reason/fix_steps).
         """
         prompt = verify_or_adjust_prompt(
-            self._clip(html_view, self._MAX_HTML_CHARS),
+            self._clip_html(html_view, f"{self._sg_text(subgoal)} {task}"),
             self._clip(task, self._MAX_TASK_CHARS),
             subgoal,
             last_steps,
             vars_map,
         )
-        raw = self._call_llm(prompt)
+        raw = self._call_llm(prompt, "verify_or_adjust")
         obj = extract_first_json(raw)
         return self._normalize_verify(obj)
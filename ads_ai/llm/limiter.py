@@ -0,0 +1,185 @@
+# ads_ai/llm/limiter.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Общий на процесс ограничитель запросов к LLM (по модели).
+
+Все GeminiClient процесса (TaskManager, шаги кампаний, веб-режим) ходят к одной квоте
+API, поэтому лимит живёт здесь, а не в клиенте:
+  • token bucket: не больше rpm запросов в минуту (всплеск — burst);
+  • потолок одновременных запросов (семафор);
+  • cooldown после ответа «квота исчерпана» (429 / ResourceExhausted) — ждут все потоки,
+    а не каждый вслепую со своим backoff;
+  • скользящее окно латентностей успешных вызовов — для хеджирования (percentile).
+
+Публичный контракт:
+  - ModelGate(model, rpm=0, burst=None, concurrency=0, window=200)   (0 — без лимита)
+      .slot(timeout=...)        — контекст-менеджер: дождаться токена и слота; False-таймаут → RateLimitTimeout
+      .observe(latency_sec) / .latency_pct(pct, min_samples=20) -> float|None
+      .cooldown(sec) / .stats()
+  - RateLimitTimeout(RuntimeError)
+  - is_quota_error(exc) -> bool
+  - get_model_gate(model) -> ModelGate   (одна на модель в процессе)
+
+Лимиты — по желанию (как кэш и хеджирование): без ENV запросы не ограничиваются,
+работают только общий cooldown после 429 и сбор латентностей.
+ENV: ADS_AI_LLM_RPM (не задан/0 — без лимита), ADS_AI_LLM_BURST (= concurrency, иначе 4),
+     ADS_AI_LLM_CONCURRENCY (не задан/0 — без лимита).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+__all__ = ["ModelGate", "RateLimitTimeout", "is_quota_error", "get_model_gate"]
+
+log = logging.getLogger(__name__)
+
+
+class RateLimitTimeout(RuntimeError):
+    """Не дождались токена/слота за отведённое время."""
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    name = type(exc).__name__
+    msg = str(exc).lower()
+    return name in {"ResourceExhausted", "TooManyRequests"} or "429" in msg or "quota" in msg or "rate limit" in msg
+
+
+_DEFAULT_BURST = 4
+
+
+class ModelGate:
+    def __init__(
+        self,
+        model: str,
+        *,
+        rpm: float = 0.0,
+        burst: Optional[int] = None,
+        concurrency: int = 0,
+        window: int = 200,
+    ) -> None:
+        self.model = model
+        self.rate = max(0.0, float(rpm)) / 60.0          # токенов в секунду; 0 — без лимита
+        self.concurrency = max(0, int(concurrency))      # 0 — без лимита
+        self.capacity = float(max(1, int(burst if burst is not None else (self.concurrency or _DEFAULT_BURST))))
+        self._tokens = self.capacity
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._sem = threading.BoundedSemaphore(self.concurrency) if self.concurrency else None
+        self._lat: Deque[float] = deque(maxlen=max(10, int(window)))
+        self._stats = {"calls": 0, "waited_sec": 0.0, "cooldowns": 0, "timeouts": 0, "in_flight": 0}
+
+    # ---- квота -----------------------------------------------------------
+
+    def _take_token(self, deadline: float) -> bool:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return True
+                    self._tokens = min(self.capacity, self._tokens + (now - self._refilled) * self.rate)
+                    self._refilled = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return True
+                    wait = (1.0 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+    @contextmanager
+    def slot(self, timeout: float = 120.0) -> Iterator[None]:
+        t0 = time.monotonic()
+        deadline = t0 + max(0.0, float(timeout))
+        if self._sem is not None and not self._sem.acquire(timeout=max(0.0, deadline - t0)):
+            self._stats["timeouts"] += 1
+            raise RateLimitTimeout(f"LLM concurrency limit for {self.model}")
+        try:
+            if not self._take_token(deadline):
+                self._stats["timeouts"] += 1
+                raise RateLimitTimeout(f"LLM rate limit for {self.model}")
+            with self._lock:
+                self._stats["calls"] += 1
+                self._stats["waited_sec"] += time.monotonic() - t0
+                self._stats["in_flight"] += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+        finally:
+            if self._sem is not None:
+                self._sem.release()
+
+    def cooldown(self, sec: float) -> None:
+        """Квота исчерпана: новые запросы к модели ждут sec (и ведро опустошается)."""
+        with self._lock:
+            until = time.monotonic() + max(0.0, float(sec))
+            if until > self._blocked_until:
+                self._blocked_until = until
+                self._stats["cooldowns"] += 1
+            self._tokens = 0.0
+        log.debug("LLM %s cooldown %.1fs", self.model, sec)
+
+    # ---- латентность -----------------------------------------------------
+
+    def observe(self, latency_sec: float) -> None:
+        with self._lock:
+            self._lat.append(float(latency_sec))
+
+    def latency_pct(self, pct: float, *, min_samples: int = 20) -> Optional[float]:
+        """Перцентиль латентности успешных вызовов (pct в 0..1); None — мало наблюдений."""
+        with self._lock:
+            data = sorted(self._lat)
+        if len(data) < max(1, int(min_samples)):
+            return None
+        i = min(len(data) - 1, max(0, int(round(float(pct) * (len(data) - 1)))))
+        return data[i]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["samples"] = len(self._lat)
+        out["waited_sec"] = round(out["waited_sec"], 3)
+        p50, p90 = self.latency_pct(0.5, min_samples=1), self.latency_pct(0.9, min_samples=1)
+        out["p50"] = round(p50, 3) if p50 is not None else None
+        out["p90"] = round(p90, 3) if p90 is not None else None
+        return out
+
+
+_gates: Dict[str, ModelGate] = {}
+_gates_lock = threading.Lock()
+
+
+def _env_num(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def get_model_gate(model: str) -> ModelGate:
+    """Ограничитель модели (один на процесс, параметры — из ENV при первом обращении)."""
+    key = str(model or "")
+    with _gates_lock:
+        gate = _gates.get(key)
+        if gate is None:
+            conc = int(_env_num("ADS_AI_LLM_CONCURRENCY", 0))
+            burst = os.getenv("ADS_AI_LLM_BURST")
+            gate = ModelGate(
+                key,
+                rpm=_env_num("ADS_AI_LLM_RPM", 0.0),
+                burst=int(_env_num("ADS_AI_LLM_BURST", _DEFAULT_BURST)) if burst else None,
+                concurrency=conc,
+            )
+            _gates[key] = gate
+        return gate
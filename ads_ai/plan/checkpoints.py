@@ -0,0 +1,235 @@
+# ads_ai/plan/checkpoints.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Чекпоинты прогонов (SQLite, WAL): после каждого удачного шага/этапа состояние пишется
+на диск, и упавший воркер продолжает с последнего чекпоинта, а не с шага 1.
+
+Запись — (run_key, kind): kind разделяет состояния разных исполнителей одного запуска
+("runtime" — Runtime.run, "company_steps" / "company_pending" — пайплайн шагов create_companies).
+Состояние — JSON (json_safe: несериализуемое верхнего уровня отбрасывается).
+Перед продолжением экран сверяется с чекпоинтом (verify_screen): маршрут URL совпадает,
+иначе — одна попытка вернуться на сохранённый URL.
+
+Публичный контракт:
+  - Checkpoint (run_key, kind, owner, state, url, status, updated_at)
+  - CheckpointStore(path)
+      .save(run_key, kind, state, *, owner="", url="") / .load(run_key, kind) -> Checkpoint|None
+      .latest(kind, owner) -> Checkpoint|None / .finish(run_key, kind, status="done") / .prune(max_age_sec)
+  - json_safe(mapping) -> dict
+  - verify_screen(driver, url, *, navigate=True, timeout=20) -> bool
+  - get_checkpoint_store(path) -> CheckpointStore|None   (ENV ADS_AI_CHECKPOINTS=0 — выключены)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from ads_ai.plan.repair_memory import route_pattern
+
+__all__ = ["Checkpoint", "CheckpointStore", "json_safe", "verify_screen", "get_checkpoint_store"]
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Checkpoint:
+    run_key: str
+    kind: str
+    owner: str = ""
+    state: Dict[str, Any] = field(default_factory=dict)
+    url: str = ""
+    status: str = "active"  # active | done
+    updated_at: float = 0.0
+
+
+def json_safe(data: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Копия mapping через JSON. Несериализуемое значение верхнего уровня отбрасывается;
+    внутри dict/list такие значения превращаются в строки (структура сохраняется).
+    """
+    out: Dict[str, Any] = {}
+    for k, v in (data or {}).items():
+        try:
+            out[str(k)] = json.loads(json.dumps(v, ensure_ascii=False))
+        except Exception:
+            if isinstance(v, (dict, list, tuple)):
+                try:
+                    out[str(k)] = json.loads(json.dumps(v, ensure_ascii=False, default=str))
+                except Exception:
+                    pass
+    return out
+
+
+class CheckpointStore:
+    def __init__(self, path: Path) -> None:
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._migrate()
+
+    def _migrate(self) -> None:
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    run_key TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    owner TEXT NOT NULL DEFAULT '',
+                    state_json TEXT NOT NULL,
+                    url TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL DEFAULT 'active',
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (run_key, kind)
+                );
+                CREATE INDEX IF NOT EXISTS idx_checkpoints_owner ON checkpoints(kind, owner, updated_at);
+                """
+            )
+
+    def save(self, run_key: str, kind: str, state: Mapping[str, Any], *, owner: str = "", url: str = "") -> bool:
+        try:
+            payload = json.dumps(json_safe(state), ensure_ascii=False)
+        except Exception as e:
+            log.debug("checkpoint serialize failed: %s", e)
+            return False
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO checkpoints(run_key, kind, owner, state_json, url, status, updated_at)
+                    VALUES(?,?,?,?,?,'active',?)
+                    ON CONFLICT(run_key, kind) DO UPDATE SET
+                        owner=excluded.owner, state_json=excluded.state_json, url=excluded.url,
+                        status='active', updated_at=excluded.updated_at;
+                    """,
+                    (run_key, kind, owner, payload, url or "", time.time()),
+                )
+                return True
+            except Exception as e:
+                log.debug("checkpoint save failed: %s", e)
+                return False
+
+    def _row(self, row: Any) -> Optional[Checkpoint]:
+        if not row:
+            return None
+        try:
+            state = json.loads(row[3])
+        except Exception:
+            return None
+        return Checkpoint(
+            run_key=row[0], kind=row[1], owner=row[2], state=state if isinstance(state, dict) else {},
+            url=row[4], status=row[5], updated_at=float(row[6]),
+        )
+
+    def load(self, run_key: str, kind: str) -> Optional[Checkpoint]:
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT run_key, kind, owner, state_json, url, status, updated_at FROM checkpoints WHERE run_key=? AND kind=?;",
+                    (run_key, kind),
+                ).fetchone()
+            except Exception as e:
+                log.debug("checkpoint load failed: %s", e)
+                row = None
+        return self._row(row)
+
+    def latest(self, kind: str, owner: str) -> Optional[Checkpoint]:
+        """Последний незавершённый чекпоинт владельца."""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    """
+                    SELECT run_key, kind, owner, state_json, url, status, updated_at FROM checkpoints
+                    WHERE kind=? AND owner=? AND status='active' ORDER BY updated_at DESC LIMIT 1;
+                    """,
+                    (kind, owner),
+                ).fetchone()
+            except Exception as e:
+                log.debug("checkpoint latest failed: %s", e)
+                row = None
+        return self._row(row)
+
+    def finish(self, run_key: str, kind: str, status: str = "done") -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "UPDATE checkpoints SET status=?, updated_at=? WHERE run_key=? AND kind=?;",
+                    (status, time.time(), run_key, kind),
+                )
+            except Exception as e:
+                log.debug("checkpoint finish failed: %s", e)
+
+    def prune(self, max_age_sec: float = 7 * 86400.0) -> int:
+        with self._lock:
+            try:
+                cur = self._conn.execute("DELETE FROM checkpoints WHERE updated_at < ?;", (time.time() - float(max_age_sec),))
+                return int(cur.rowcount or 0)
+            except Exception as e:
+                log.debug("checkpoint prune failed: %s", e)
+                return 0
+
+
+def verify_screen(driver: Any, url: str, *, navigate: bool = True, timeout: float = 20.0) -> bool:
+    """
+    Текущий экран совпадает с чекпоинтом (маршрут URL: хост + путь без id)?
+    Нет — одна попытка открыть сохранённый URL и сверить снова. Пустой url — сверять нечего (True).
+    """
+    if not url:
+        return True
+    want = route_pattern(url)
+
+    def _here() -> str:
+        try:
+            return route_pattern(str(getattr(driver, "current_url", "") or ""))
+        except Exception:
+            return ""
+
+    if _here() == want:
+        return True
+    if not navigate:
+        return False
+    try:
+        driver.get(url)
+    except Exception as e:
+        log.debug("checkpoint navigate failed: %s", e)
+        return False
+    deadline = time.time() + max(0.0, float(timeout))
+    while time.time() < deadline:
+        try:
+            if driver.execute_script("return document.readyState") == "complete" and _here() == want:
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return _here() == want
+
+
+_stores: Dict[str, CheckpointStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_checkpoint_store(path: Path) -> Optional[CheckpointStore]:
+    """Хранилище на файл БД (одно на процесс); None — выключено (ENV) или БД недоступна."""
+    if str(os.getenv("ADS_AI_CHECKPOINTS", "1")).strip().lower() in {"0", "false", "no", "off"}:
+        return None
+    key = str(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            try:
+                store = CheckpointStore(Path(path))
+            except Exception as e:
+                log.warning("checkpoints disabled: %s", e)
+                return None
+            _stores[key] = store
+        return store
@@ -1,11 +1,17 @@
 # ads_ai/plan/compiler.py
 from __future__ import annotations
 
+import copy
+import hashlib
+import json
+import threading
+from collections import ChainMap, OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
 from ads_ai.plan.schema import StepType, validate_step, validate_plan
 from ads_ai.utils.json_tools import safe_str
+from ads_ai.utils.template import render_mapping, var_names
 
 
 __all__ = [
@@ -15,7 +21,8 @@ __all__ = [
     "MacroRegistry",
     "PlanCompiler",
     "compile_plan",           # удобный шорткат
-    "create_default_registry" # фабрика с базовыми макросами
+    "create_default_registry", # фабрика с базовыми макросами
+    "clear_plan_cache",
 ]
 
 
@@ -23,9 +30,18 @@ __all__ = [
 
 @dataclass
 class CompileContext:
-    """Контекст компиляции (то, что знаем на этапе подготовки плана)."""
+    """
+    Контекст компиляции (то, что знаем на этапе подготовки плана).
+    vars_map — любой Mapping: макросы добавляют свои переменные слоем (scoped), не копируя словарь.
+    """
     task: str = ""
-    vars_map: Dict[str, Any] = field(default_factory=dict)
+    vars_map: Mapping[str, Any] = field(default_factory=dict)
+
+    def scoped(self, local: Dict[str, Any]) -> "CompileContext":
+        """Дочерний контекст: local поверх vars_map (copy-on-write, родитель не меняется)."""
+        base = self.vars_map
+        layered = base.new_child(local) if isinstance(base, ChainMap) else ChainMap(local, base)  # type: ignore[arg-type]
+        return CompileContext(task=self.task, vars_map=layered)
 
 
 @dataclass
@@ -35,6 +51,7 @@ class CompileOptions:
     expand_macros: bool = True
     normalize_aliases: bool = True
     render_strings_with_vars: bool = False  # подставлять ${var} прямо в компиляторе (обычно False: рендерит рантайм)
+    cache: bool = True            # кэш compile(): ключ — хеш сырого плана + значения переменных, на которые он ссылается
 
 
 @dataclass
@@ -49,23 +66,47 @@ class CompileResult:
 
 # --------------------------------- утилиты -----------------------------------
 
-def _render_value(val: Any, vars_map: Dict[str, Any]) -> Any:
-    """Лёгкий рендер ${var} и ${name:-fallback} для compile-time подстановок."""
-    if not isinstance(val, str):
-        if isinstance(val, dict):
-            return {k: _render_value(v, vars_map) for k, v in val.items()}
-        if isinstance(val, list):
-            return [_render_value(v, vars_map) for v in val]
-        return val
-
-    import re
-    pat = re.compile(r"\$\{([A-Za-z0-9_]+)(?::-(.*?))?\}")
-    def repl(m: "re.Match[str]") -> str:
-        key = m.group(1)
-        fallback = m.group(2)
-        got = vars_map.get(key, fallback if fallback is not None else "")
-        return "" if got is None else str(got)
-    return pat.sub(repl, val)
+def _referenced_vars(node: Any, out: Optional[set] = None) -> set:
+    """Имена переменных, от которых зависит результат компиляции (${...}, foreach.list, if_var.name)."""
+    out = set() if out is None else out
+    if isinstance(node, str):
+        var_names(node, out)
+    elif isinstance(node, list):
+        for v in node:
+            _referenced_vars(v, out)
+    elif isinstance(node, dict):
+        mname = str(node.get("macro") or "").lower()
+        if mname == "foreach" and isinstance(node.get("list"), str):
+            out.add(node["list"])
+        elif mname == "if_var" and node.get("name"):
+            out.add(str(node["name"]).strip())
+        for v in node.values():
+            _referenced_vars(v, out)
+    return out
+
+
+def _macro_names(node: Any, out: Optional[set] = None) -> set:
+    out = set() if out is None else out
+    if isinstance(node, list):
+        for v in node:
+            _macro_names(v, out)
+    elif isinstance(node, dict):
+        if node.get("macro"):
+            out.add(str(node["macro"]).lower())
+        for v in node.values():
+            _macro_names(v, out)
+    return out
+
+
+# Кэш скомпилированных планов (на процесс): ключ -> CompileResult
+_PLAN_CACHE: "OrderedDict[str, CompileResult]" = OrderedDict()
+_PLAN_CACHE_LOCK = threading.Lock()
+_PLAN_CACHE_MAX = 128
+
+
+def clear_plan_cache() -> None:
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE.clear()
 
 
 ALIASES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]] | None]] = {
@@ -83,7 +124,8 @@ ALIASES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]] | None]
 
 # ------------------------------ Macro Registry -------------------------------
 
-MacroFn = Callable[[Dict[str, Any], CompileContext], List[Dict[str, Any]]]
+# Макрос возвращает список или итератор (ленивое развёртывание) узлов — шагов/вложенных макросов
+MacroFn = Callable[[Dict[str, Any], CompileContext], Iterable[Dict[str, Any]]]
 
 
 class MacroRegistry:
@@ -96,7 +138,11 @@ class MacroRegistry:
     def has(self, name: str) -> bool:
         return str(name).lower() in self._macros
 
-    def expand(self, name: str, node: Dict[str, Any], ctx: CompileContext) -> List[Dict[str, Any]]:
+    def is_builtin(self, name: str) -> bool:
+        """Макрос — один из базовых (их зависимости от переменных известны кэшу компилятора)."""
+        return self._macros.get(str(name).lower()) in _BUILTIN_MACROS
+
+    def expand(self, name: str, node: Dict[str, Any], ctx: CompileContext) -> Iterable[Dict[str, Any]]:
         fn = self._macros.get(str(name).lower())
         if not fn:
             raise KeyError(f"macro not found: {name}")
@@ -141,11 +187,12 @@ def _m_if_var(node: Dict[str, Any], ctx: CompileContext) -> List[Dict[str, Any]]
     return steps if cond else []
 
 
-def _m_foreach(node: Dict[str, Any], ctx: CompileContext) -> List[Dict[str, Any]]:
+def _m_foreach(node: Dict[str, Any], ctx: CompileContext) -> Iterator[Dict[str, Any]]:
     """
     { "macro":"foreach", "list":"items" | [...], "as":"item", "steps":[...] }
     Если list — строка, трактуем как имя переменной в ctx.vars_map. Иначе — используем массив как есть.
     Внутри steps доступна подстановка ${item} или ${item.field} (когда элемент — dict).
+    Лениво: шаги итерации рендерятся по мере потребления, переменные элемента — слоем поверх vars_map.
     """
     raw_list = node.get("list")
     alias = str(node.get("as") or "item").strip()
@@ -159,23 +206,22 @@ def _m_foreach(node: Dict[str, Any], ctx: CompileContext) -> List[Dict[str, Any]
     else:
         seq = raw_list
     if not isinstance(seq, list):
-        return []
+        return
 
-    out: List[Dict[str, Any]] = []
     for it in seq:
-        # формируем локальный vars_map для итерации
-        local_vars = dict(ctx.vars_map)
+        # локальные переменные итерации — слоем поверх vars_map (без копии словаря)
+        local: Dict[str, Any] = {alias: it}
         if isinstance(it, dict):
             # ${item} -> json, ${item.foo} -> значение
-            local_vars[alias] = it
             for k, v in it.items():
-                local_vars[f"{alias}.{k}"] = v
-        else:
-            local_vars[alias] = it
+                local[f"{alias}.{k}"] = v
+        scope = ctx.scoped(local).vars_map
         # рендерим шаги итерации compile-time (чтобы в рантайме не разруливать ${item})
-        rendered = _render_value({"steps": steps}, local_vars).get("steps", [])
-        out.extend(rendered if isinstance(rendered, list) else [])
-    return out
+        for st in steps:
+            yield render_mapping(st, scope)
+
+
+_BUILTIN_MACROS = (_m_group, _m_if_var, _m_foreach)
 
 
 def create_default_registry() -> MacroRegistry:
@@ -196,41 +242,70 @@ class PlanCompiler:
     # -- публичный API --
 
     def compile(self, raw_plan: Any, ctx: CompileContext) -> CompileResult:
+        """Полный список шагов (через iter_steps); повторная компиляция того же плана — из кэша."""
+        key = self._cache_key(raw_plan, ctx) if self.options.cache else None
+        if key is not None:
+            with _PLAN_CACHE_LOCK:
+                hit = _PLAN_CACHE.get(key)
+                if hit is not None:
+                    _PLAN_CACHE.move_to_end(key)
+            if hit is not None:
+                return CompileResult(steps=copy.deepcopy(hit.steps), warnings=list(hit.warnings), errors=[])
+
         res = CompileResult()
+        steps = list(self.iter_steps(raw_plan, ctx, result=res))
+        res.steps = [] if res.errors else steps
+        if key is not None and res.ok():
+            with _PLAN_CACHE_LOCK:
+                _PLAN_CACHE[key] = CompileResult(steps=copy.deepcopy(steps), warnings=list(res.warnings))
+                while len(_PLAN_CACHE) > _PLAN_CACHE_MAX:
+                    _PLAN_CACHE.popitem(last=False)
+        return res
+
+    def iter_steps(self, raw_plan: Any, ctx: CompileContext, *, result: Optional[CompileResult] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивая компиляция: валидированные шаги по одному, по мере потребления (Runtime.set_plan
+        принимает такой итератор). Предупреждения/ошибки копятся в result. В strict-режиме
+        ошибка останавливает поток (шаги до неё уже отданы).
+        """
+        res = result if result is not None else CompileResult()
         items = self._as_list(raw_plan)
         if items is None:
             res.errors.append("План должен быть массивом шагов/макросов")
-            return res
+            return
 
-        # 1) нормализация / алиасы / макропроход
-        flat: List[Dict[str, Any]] = []
+        i = 0
         for idx, node in enumerate(items):
-            try:
-                flat.extend(self._expand_node(node, ctx))
-            except Exception as e:
-                msg = f"Ошибка макрорасширения на шаге {idx}: {safe_str(repr(e))[:180]}"
-                if self.options.strict:
-                    res.errors.append(msg)
-                    return res
-                res.warnings.append(msg)
-
-        # 2) финальная валидация
-        validated: List[Dict[str, Any]] = []
-        for i, st in enumerate(flat):
-            try:
-                if self.options.render_strings_with_vars:
-                    st = _render_value(st, ctx.vars_map)
-                v = validate_step(self._normalize_alias(st) if self.options.normalize_aliases else st)
-                validated.append(v)
-            except Exception as e:
-                msg = f"Шаг {i} отброшен валидатором: {safe_str(str(e))[:200]}"
-                if self.options.strict:
-                    res.errors.append(msg)
-                    return res
-                res.warnings.append(msg)
-
-        res.steps = validated
-        return res
+            stream = self._iter_node(node, ctx)
+            while True:
+                # 1) нормализация / алиасы / макропроход
+                try:
+                    st = next(stream)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    msg = f"Ошибка макрорасширения на шаге {idx}: {safe_str(repr(e))[:180]}"
+                    if self.options.strict:
+                        res.errors.append(msg)
+                        return
+                    res.warnings.append(msg)
+                    break
+
+                # 2) финальная валидация
+                try:
+                    if self.options.render_strings_with_vars:
+                        st = render_mapping(st, ctx.vars_map)
+                    v = validate_step(self._normalize_alias(st) if self.options.normalize_aliases else st)
+                except Exception as e:
+                    msg = f"Шаг {i} отброшен валидатором: {safe_str(str(e))[:200]}"
+                    if self.options.strict:
+                        res.errors.append(msg)
+                        return
+                    res.warnings.append(msg)
+                    i += 1
+                    continue
+                i += 1
+                yield v
 
     # -- внутренности --
 
@@ -259,10 +334,33 @@ class PlanCompiler:
         # если в ноде не type, а macro — пусть останется как macro (до расширения)
         return step
 
+    def _cache_key(self, raw_plan: Any, ctx: CompileContext) -> Optional[str]:
+        """
+        (хеш сырого плана, значения переменных, на которые он ссылается, опции). None — не кэшируем:
+        в плане есть пользовательские макросы (их зависимости неизвестны) или что-то не сериализуется.
+        """
+        if not isinstance(raw_plan, list):
+            return None
+        if any(not self.registry.is_builtin(m) for m in _macro_names(raw_plan)):
+            return None
+        opts = self.options
+        try:
+            raw = json.dumps(raw_plan, sort_keys=True, ensure_ascii=False)
+            names = sorted(_referenced_vars(raw_plan)) if (opts.expand_macros or opts.render_strings_with_vars) else []
+            used = json.dumps({n: ctx.vars_map.get(n) for n in names}, sort_keys=True, ensure_ascii=False)
+        except Exception:
+            return None
+        flags = f"{opts.strict}|{opts.expand_macros}|{opts.normalize_aliases}|{opts.render_strings_with_vars}"
+        return hashlib.sha1(f"{raw}\x00{used}\x00{flags}".encode("utf-8", "ignore")).hexdigest()
+
     def _expand_node(self, node: Any, ctx: CompileContext) -> List[Dict[str, Any]]:
         """Возвращает плоский список шагов (макросы развёрнуты)."""
+        return list(self._iter_node(node, ctx))
+
+    def _iter_node(self, node: Any, ctx: CompileContext) -> Iterator[Dict[str, Any]]:
+        """Шаги узла по одному (макросы разворачиваются по мере потребления)."""
         if not isinstance(node, dict):
-            return []
+            return
         # 1) алиасы сразу нормализуем (может превратить macro->type)
         node = self._normalize_alias(node)
 
@@ -272,22 +370,20 @@ class PlanCompiler:
             if not self.options.expand_macros:
                 # Оставим как есть — но валидатор позже всё равно отфутболит;
                 # логичнее здесь игнорировать, а не класть в финальный план.
-                return []
+                return
             if not self.registry.has(mname):
                 # неизвестный макрос — варним и выкидываем
                 raise KeyError(f"unknown macro: {mname}")
-            expanded = self.registry.expand(mname, node, ctx) or []
-            flat: List[Dict[str, Any]] = []
-            for ch in expanded:
-                flat.extend(self._expand_node(ch, ctx))  # рекурсия (вложенные макросы)
-            return flat
+            for ch in self.registry.expand(mname, node, ctx) or []:
+                yield from self._iter_node(ch, ctx)  # рекурсия (вложенные макросы)
+            return
 
         # 3) это обычный шаг: потенциально подрендерим строки на compile-time (если опция включена)
         if self.options.render_strings_with_vars:
-            node = _render_value(node, ctx.vars_map)
+            node = render_mapping(node, ctx.vars_map)
 
         # 4) отдаём как единичный шаг
-        return [node]
+        yield node
 
 
 # -------------------------------- шорткаты -----------------------------------
@@ -0,0 +1,115 @@
+# ads_ai/plan/pipeline.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Конвейер Plan-and-Execute: пока браузер исполняет подцель N, LLM уже планирует N+1.
+
+Спекулятивный план строится по DOM на старте подцели N и истории «как если бы N
+прошла по плану». Он используется, только если подцель N прошла чисто (verify без
+retry/blocked, без скипов/переплана) и первый шаг с селектором виден на текущей
+странице; иначе выбрасывается и план строится заново — как в последовательном режиме.
+
+Публичный контракт:
+  - SpeculativePlanner(max_workers=1)
+      .prefetch(key, fn)                    — запустить fn() в фоне под ключом (idx подцели)
+      .take(key, accept=None, timeout=...) -> list|None
+      .discard(key=None, reason="")         / .close() / .stats()
+  - plan_looks_applicable(driver, steps, render=None) -> bool
+"""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from ads_ai.browser.selectors import exists
+
+__all__ = ["SpeculativePlanner", "plan_looks_applicable"]
+
+log = logging.getLogger(__name__)
+
+_SELECTOR_STEPS = {"click", "input", "hover", "select", "check", "scroll_to_element", "double_click", "context_click"}
+
+
+def plan_looks_applicable(driver: Any, steps: List[Dict[str, Any]], render: Optional[Callable[[Any], Any]] = None) -> bool:
+    """Первый шаг с селектором находится на текущей странице (план без селекторов — применим)."""
+    for st in steps or []:
+        if str(st.get("type") or "").lower() in _SELECTOR_STEPS and st.get("selector"):
+            sel = st.get("selector")
+            if render is not None:
+                sel = render(sel)
+            try:
+                return bool(exists(driver, sel, visible=False, timeout_sec=1))
+            except Exception:
+                return False
+    return True
+
+
+class SpeculativePlanner:
+    """Фоновые LLM-запросы планов следующих подцелей (по одному на ключ)."""
+
+    def __init__(self, *, max_workers: int = 1) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="pe-prefetch")
+        self._futures: Dict[Any, Future] = {}
+        self._stats = {"prefetched": 0, "used": 0, "discarded": 0, "errors": 0}
+
+    def prefetch(self, key: Any, fn: Callable[[], Any]) -> None:
+        self.discard(key)
+        self._futures[key] = self._pool.submit(fn)
+        self._stats["prefetched"] += 1
+
+    def take(
+        self,
+        key: Any,
+        accept: Optional[Callable[[List[Dict[str, Any]]], bool]] = None,
+        *,
+        timeout: float = 120.0,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Дождаться спекулятивного плана (запрос уже в полёте — это быстрее нового) и проверить accept.
+        None — плана нет, LLM упала, план пуст или не принят (тогда вызывающий планирует заново).
+        """
+        fut = self._futures.pop(key, None)
+        if fut is None:
+            return None
+        try:
+            plan = fut.result(timeout=max(0.0, float(timeout)))
+        except FutureTimeout:
+            fut.cancel()
+            self._stats["discarded"] += 1
+            return None
+        except Exception as e:
+            log.debug("speculative plan %s failed: %s", key, e)
+            self._stats["errors"] += 1
+            return None
+        if not isinstance(plan, list) or not plan:
+            self._stats["discarded"] += 1
+            return None
+        if accept is not None:
+            try:
+                ok = bool(accept(plan))
+            except Exception:
+                ok = False
+            if not ok:
+                self._stats["discarded"] += 1
+                return None
+        self._stats["used"] += 1
+        return plan
+
+    def discard(self, key: Any = None, reason: str = "") -> None:
+        """Выбросить спекулятивный план (key=None — все). Запрос в полёте доработает вхолостую."""
+        keys = list(self._futures) if key is None else [key]
+        for k in keys:
+            fut = self._futures.pop(k, None)
+            if fut is not None:
+                fut.cancel()
+                self._stats["discarded"] += 1
+                if reason:
+                    log.debug("speculative plan %s discarded: %s", k, reason)
+
+    def close(self) -> None:
+        self.discard()
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
@@ -0,0 +1,215 @@
+# ads_ai/plan/repair_memory.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Память удачных ремонтов шагов (SQLite, общая для прогонов и профилей).
+
+Одно и то же изменение UI Google Ads ломает один и тот же селектор в каждом прогоне.
+Удачный ремонт запоминается по ключу
+    (маршрут URL, тип шага, исходный селектор, отпечаток структуры страницы)
+и в следующий раз применяется без LLM. Хранится только локатор (новый селектор и тип, если
+ремонт его сменил) — данные шага (text/value) принадлежат прогону и берутся из текущего шага.
+У записи — счётчики успехов/провалов;
+перестала работать (провалов не меньше успехов и >= max_failures) — удаляется.
+
+Публичный контракт:
+  - RepairKey (route, step_type, selector, fingerprint)
+  - RepairMemory(path, max_failures=2)
+      .lookup(key) -> dict|None (поля локатора) / .record_success(key, step) / .record_failure(key) / .stats()
+  - locator_patch(key, step) -> dict
+  - route_pattern(url) -> str
+  - page_fingerprint(driver) -> (route, fingerprint)
+  - get_repair_memory(path) -> RepairMemory|None   (ENV ADS_AI_REPAIR_MEMORY=0 — выключена)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+__all__ = ["RepairKey", "RepairMemory", "locator_patch", "route_pattern", "page_fingerprint", "get_repair_memory"]
+
+log = logging.getLogger(__name__)
+
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8,}|[0-9a-f-]{36})$", re.I)
+
+# Отпечаток «версии» UI: набор кастомных элементов (material-*, md-*, …) и ролей-ориентиров.
+# От данных страницы не зависит, от выкладки нового интерфейса — зависит.
+_JS_FINGERPRINT = r"""
+return (function(){
+  var tags = {};
+  var all = document.getElementsByTagName('*');
+  for (var i = 0; i < all.length && i < 20000; i++) {
+    var t = all[i].tagName.toLowerCase();
+    if (t.indexOf('-') > 0) tags[t] = 1;
+  }
+  var roles = {};
+  var rs = document.querySelectorAll('[role=main],[role=navigation],[role=dialog],[role=tablist],[role=form]');
+  for (var j = 0; j < rs.length; j++) roles[rs[j].getAttribute('role')] = 1;
+  return {url: String(location.href || ''), tags: Object.keys(tags).sort(), roles: Object.keys(roles).sort()};
+})();
+"""
+
+
+class RepairKey(NamedTuple):
+    route: str
+    step_type: str
+    selector: str
+    fingerprint: str
+
+    def digest(self) -> str:
+        return hashlib.sha1("\x00".join(self).encode("utf-8", "ignore")).hexdigest()
+
+
+def locator_patch(key: RepairKey, step: Dict[str, Any]) -> Dict[str, Any]:
+    """Поля локатора из отремонтированного шага: selector, плюс type — если ремонт его сменил."""
+    patch: Dict[str, Any] = {}
+    sel = str(step.get("selector") or "").strip()
+    if sel:
+        patch["selector"] = sel
+    stype = str(step.get("type") or "").lower()
+    if stype and stype != key.step_type:
+        patch["type"] = stype
+    return patch
+
+
+def route_pattern(url: str) -> str:
+    """host + путь, где id-сегменты заменены на :id; query/fragment отбрасываются."""
+    u = urllib.parse.urlsplit(str(url or ""))
+    parts = [(":id" if _ID_SEGMENT.match(p) else p) for p in u.path.split("/") if p]
+    return f"{u.netloc.lower()}/" + "/".join(parts)
+
+
+def page_fingerprint(driver: Any) -> Tuple[str, str]:
+    """(маршрут, отпечаток структуры) текущей страницы; ("", "") — не удалось снять."""
+    try:
+        raw = driver.execute_script(_JS_FINGERPRINT)
+    except Exception as e:
+        log.debug("page fingerprint failed: %s", e)
+        return "", ""
+    if not isinstance(raw, dict):
+        return "", ""
+    sig = json.dumps([raw.get("tags") or [], raw.get("roles") or []], separators=(",", ":"))
+    return route_pattern(str(raw.get("url") or "")), hashlib.sha1(sig.encode("utf-8")).hexdigest()[:16]
+
+
+class RepairMemory:
+    def __init__(self, path: Path, *, max_failures: int = 2) -> None:
+        self.path = str(path)
+        self.max_failures = max(1, int(max_failures))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("PRAGMA synchronous=NORMAL;")
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "failures": 0, "evicted": 0}
+        self._migrate()
+
+    def _migrate(self) -> None:
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS repairs (
+                    key TEXT PRIMARY KEY,
+                    route TEXT NOT NULL,
+                    step_type TEXT NOT NULL,
+                    selector TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    step_json TEXT NOT NULL,
+                    successes INTEGER NOT NULL DEFAULT 0,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_repairs_route ON repairs(route, step_type);
+                """
+            )
+
+    def lookup(self, key: RepairKey) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT step_json FROM repairs WHERE key=?;", (key.digest(),)).fetchone()
+            except Exception as e:
+                log.debug("repair memory lookup failed: %s", e)
+                row = None
+            self._stats["hits" if row else "misses"] += 1
+        if not row:
+            return None
+        try:
+            step = json.loads(row[0])
+        except Exception:
+            return None
+        # старые записи хранили шаг целиком — отдаём только локатор
+        return (locator_patch(key, step) or None) if isinstance(step, dict) else None
+
+    def record_success(self, key: RepairKey, step: Dict[str, Any]) -> None:
+        """Ремонт сработал: сохранить (или обновить) локатор шага, successes += 1."""
+        patch = locator_patch(key, step)
+        if not patch:
+            return
+        try:
+            payload = json.dumps(patch, ensure_ascii=False, sort_keys=True)
+        except Exception:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO repairs(key, route, step_type, selector, fingerprint, step_json, successes, failures, updated_at)
+                    VALUES(?,?,?,?,?,?,1,0,?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        step_json=excluded.step_json, successes=repairs.successes+1, updated_at=excluded.updated_at;
+                    """,
+                    (key.digest(), key.route, key.step_type, key.selector, key.fingerprint, payload, time.time()),
+                )
+                self._stats["stored"] += 1
+            except Exception as e:
+                log.debug("repair memory store failed: %s", e)
+
+    def record_failure(self, key: RepairKey) -> None:
+        """Запомненный ремонт не сработал: failures += 1; перестал работать — удалить."""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "UPDATE repairs SET failures=failures+1, updated_at=? WHERE key=?;", (time.time(), key.digest())
+                )
+                cur = self._conn.execute(
+                    "DELETE FROM repairs WHERE key=? AND failures>=? AND failures>=successes;",
+                    (key.digest(), self.max_failures),
+                )
+                self._stats["failures"] += 1
+                self._stats["evicted"] += cur.rowcount or 0
+            except Exception as e:
+                log.debug("repair memory failure update failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_memories: Dict[str, RepairMemory] = {}
+_memories_lock = threading.Lock()
+
+
+def get_repair_memory(path: Path) -> Optional[RepairMemory]:
+    """Память на файл БД (одна на процесс); None — выключена (ENV) или БД недоступна."""
+    if str(os.getenv("ADS_AI_REPAIR_MEMORY", "1")).strip().lower() in {"0", "false", "no", "off"}:
+        return None
+    key = str(path)
+    with _memories_lock:
+        mem = _memories.get(key)
+        if mem is None:
+            try:
+                mem = RepairMemory(Path(path))
+            except Exception as e:
+                log.warning("repair memory disabled: %s", e)
+                return None
+            _memories[key] = mem
+        return mem
@@ -1,24 +1,33 @@
 # ads_ai/plan/runtime.py
 from __future__ import annotations
 
+import base64
 import json
 import time
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 
 from ads_ai.config.settings import Settings
 from ads_ai.plan.schema import StepType, validate_step, validate_plan
+from ads_ai.plan.checkpoints import get_checkpoint_store, verify_screen
+from ads_ai.plan.pipeline import SpeculativePlanner, plan_looks_applicable
+from ads_ai.plan.repair_memory import RepairKey, get_repair_memory, page_fingerprint
 from ads_ai.browser.actions import ACTIONS, ActionContext
-from ads_ai.browser.selectors import find, exists
+from ads_ai.browser.selectors import find, exists, ranking_stats
 from ads_ai.browser.waits import ensure_ready_state
 from ads_ai.browser.humanize import Humanizer
-from ads_ai.browser.guards import Guards
+from ads_ai.browser.guards import Guards, PageProbe
 from ads_ai.tracing.trace import JsonlTrace
-from ads_ai.tracing.artifacts import Artifacts, take_screenshot, save_html_snapshot
+from ads_ai.browser.screencast import capture_screenshot
+from ads_ai.browser.ui_map import collect_ui_map
+from ads_ai.llm.dom_delta import DomDelta
+from ads_ai.llm.dom_prune import prune_html
+from ads_ai.tracing.artifacts import Artifacts, ArtifactPolicy, ArtifactWriter
 from ads_ai.utils.json_tools import safe_str
+from ads_ai.utils.template import TemplateCache
 
 
 # ---- Вспомогательные сущности ------------------------------------------------
@@ -43,37 +52,37 @@ class RunResult:
 
 
 class _VarRenderer:
-    """Рендерит ${var} в шагах на основе var_store.get(name, default)."""
+    """
+    Рендерит ${var} / ${name:-fallback} в шагах на основе var_store.get(name, default).
+    Шаблон шага компилируется один раз (кэш по объекту шага), дальше — только подстановка.
+    """
     def __init__(self, var_store: Optional[Any]):
         self._store = var_store
+        self._templates = TemplateCache()
 
-    def _get(self, key: str) -> str:
+    def _get(self, key: str, default: Any = "") -> Any:
         if not self._store:
-            return ""
+            return default
         getter = getattr(self._store, "get", None)
         if callable(getter):
             try:
-                v = getter(key, "")
-                return "" if v is None else str(v)
+                return getter(key, default)
             except Exception:
-                return ""
+                return default
         # допускаем .vars dict
         try:
-            return str(getattr(self._store, "vars", {}).get(key, ""))
+            return getattr(self._store, "vars", {}).get(key, default)
         except Exception:
-            return ""
+            return default
 
     def render(self, val: Any) -> Any:
-        import re
-        if isinstance(val, str):
-            def repl(m):
-                return self._get(m.group(1))
-            return re.sub(r"\$\{([A-Za-z0-9_]+)\}", repl, val)
-        if isinstance(val, dict):
-            return {k: self.render(v) for k, v in val.items()}
-        if isinstance(val, list):
-            return [self.render(v) for v in val]
-        return val
+        return self._templates.get(val).render(self._get)
+
+    def render_over(self, val: Any, overlay: Dict[str, Any]) -> Any:
+        """Как render, но сначала ищем в overlay (переменные, ещё не записанные в var_store)."""
+        def lookup(key: str, default: Any = "") -> Any:
+            return overlay[key] if key in overlay else self._get(key, default)
+        return self._templates.get(val).render(lookup)
 
 
 # ---- Runtime -----------------------------------------------------------------
@@ -104,6 +113,9 @@ class Runtime:
         self.d = driver
         self.s = settings
         self.art = artifacts
+        self.art_policy = ArtifactPolicy.from_settings(self.s.tracing)
+        self.art_writer = ArtifactWriter(artifacts, max_queue=self.s.tracing.artifacts_queue)
+        self._ok_seen = 0
         self.trace = trace
         self.run_id = run_id
 
@@ -111,36 +123,107 @@ class Runtime:
         self.varr = _VarRenderer(var_store)
         self.repairer = repairer
         self.on_replan = on_replan
+        # память удачных ремонтов (между прогонами): сначала она, потом repairer (LLM/эвристики)
+        self.repair_memory = get_repair_memory(self.s.paths.artifacts_root / "repair_memory.db")
+        # проактивно починенные шаги: idx -> (ключ, источник, шаг); исход узнаём при исполнении
+        self._pending_repairs: Dict[int, Tuple[Optional[RepairKey], str, Dict[str, Any]]] = {}
+        # чекпоинты после удачных шагов (resume() продолжает прерванный run() с них)
+        self.checkpoints = get_checkpoint_store(self.s.paths.artifacts_root / "checkpoints.db")
+        self.checkpoint_key: str = run_id
+        self.checkpoint_owner: str = ""
 
         self.hum = Humanizer(driver=self.d, cfg=self.s.humanize)
         self.guards = Guards(driver=self.d, guards_cfg=self.s.guards, browser_cfg=self.s.browser)
+        # LLM-вид страницы: "delta" — UI-карта с diff к прошлому ходу, "html" — сырой DOM
+        self.dom_delta: Optional[DomDelta] = (
+            DomDelta() if str(getattr(self.s.browser, "llm_dom_view", "delta")).lower() == "delta" else None
+        )
+        # сводка страницы после последнего верхнеуровневого шага (капча/loop guard/трейс)
+        self._last_probe: Optional[PageProbe] = None
 
         self.ctx = ActionContext(
             driver=self.d,
             default_wait_sec=self.s.browser.default_wait_sec,
             step_timeout_sec=self.s.browser.step_timeout_sec,
             var_store=self.var_store,
+            render_vars=False,  # шаг уже отрендерен в _execute_step
         )
 
         self.history_done: List[Dict[str, Any]] = []
         self.plan: List[Dict[str, Any]] = []
+        self._plan_feed: Optional[Iterator[Dict[str, Any]]] = None  # ленивый хвост плана (PlanCompiler.iter_steps)
         self.task: str = ""
         self.step_idx: int = 0
         self.stats = ExecStats()
 
     # ---- Вспомогательные методы ---------------------------------------------
 
-    def _dom_view(self) -> str:
+    def _dom_html(self) -> str:
         html = self.guards.dom_snapshot()
         return safe_str(html)[: int(self.s.browser.max_dom_chars)]
 
+    def _dom_view(self, focus: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Вид страницы для промпта LLM: UI-карта (полная или diff), иначе — сырой DOM,
+        ужатый по релевантности к задаче и селектору шага focus (llm/dom_prune.py).
+        """
+        if self.dom_delta is not None:
+            ui = collect_ui_map(self.d)
+            if any(ui.get(g) for g in ("inputs", "buttons", "tabs", "primary")):
+                view, meta = self.dom_delta.render(ui)
+                self.trace.write({"event": "llm_dom_view", "chars": len(view), **meta})
+                return view[: int(self.s.browser.max_dom_chars)]
+            self.dom_delta.reset()
+        budget = int(getattr(self.s.browser, "dom_token_budget", 0) or 0)
+        if budget <= 0:
+            return self._dom_html()
+        sel = str((focus or {}).get("selector") or "")
+        view, meta = prune_html(
+            safe_str(self.guards.dom_snapshot()),
+            budget,
+            query=f"{self.task} {(focus or {}).get('type') or ''} {(focus or {}).get('text') or ''}",
+            selectors=[sel] if sel else (),
+        )
+        if meta.get("pruned"):
+            self.trace.write({"event": "llm_dom_pruned", **meta})
+        return view[: int(self.s.browser.max_dom_chars)]
+
+    def _screenshot_png(self) -> Optional[bytes]:
+        """PNG вкладки: фоновая DevTools-сессия (не занимает WebDriver), иначе — через драйвер."""
+        data = capture_screenshot(self.d, fmt="png")
+        if data:
+            try:
+                return base64.b64decode(data)
+            except Exception:
+                pass
+        try:
+            return self.d.get_screenshot_as_png()
+        except Exception:
+            return None
+
+    def _shot(self, label: str) -> Optional[str]:
+        """Скрин события (снимаем сейчас, пишем в фоне); None — запись отброшена."""
+        p = self.art_writer.screenshot(label, self._screenshot_png())
+        return str(p) if p else None
+
     def _trace_step_result(self, ok: bool, err: Optional[str], step: Dict[str, Any], tsec: float, nested: bool) -> None:
         rec: Dict[str, Any] = {"event": "step_result", "ok": ok, "err": err, "t": round(tsec, 3), "step": step}
         if not nested:
-            label = ("after_" if ok else "fail_") + str(step.get("type"))
-            rec["screenshot"] = str(take_screenshot(self.d, self.art, label))
-            snap_path = save_html_snapshot(self._dom_view(), self.art)
-            rec["dom_snap"] = str(snap_path)
+            probe = self.guards.probe()
+            self._last_probe = probe
+            if probe.ok:
+                rec["page"] = probe.as_trace()
+            if ok:
+                self._ok_seen += 1
+            if self.art_policy.wants(ok, self._ok_seen):
+                label = ("after_" if ok else "fail_") + str(step.get("type"))
+                # состояние фиксируем сейчас (до следующего шага/ремонта), на диск — в фоне
+                shot = self.art_writer.screenshot(label, self._screenshot_png())
+                snap = self.art_writer.html(self._dom_html())
+                if shot:
+                    rec["screenshot"] = str(shot)
+                if snap:
+                    rec["dom_snap"] = str(snap)
         self.trace.write(rec)
 
     def _execute_input_humanized(self, step: Dict[str, Any]) -> bool:
@@ -174,6 +257,8 @@ class Runtime:
         # Переменные в полях шага
         act = self.varr.render(step)
         tname = str(act.get("type")).lower()
+        if not nested:
+            self._last_probe = None
 
         started = time.time()
         ok = False
@@ -211,14 +296,15 @@ class Runtime:
 
     def _captcha_guard(self) -> None:
         try:
-            if self.guards.detect_captcha():
-                shot = str(take_screenshot(self.d, self.art, "captcha_detected"))
+            if self.guards.detect_captcha(probe=self._last_probe):
+                shot = self._shot("captcha_detected")
                 self.trace.write({"event": "captcha_detected", "screenshot": shot})
         except Exception:
             pass
 
     def _maybe_loop_guard(self) -> bool:
-        tripped = self.guards.loop_guard_update(self.history_done[-self.s.guards.loop_dom_hash_window :])
+        dom_hash = self._last_probe.dom_hash if self._last_probe is not None else None
+        tripped = self.guards.loop_guard_update(self.history_done[-self.s.guards.loop_dom_hash_window :], dom_hash=dom_hash)
         if tripped:
             self.stats.loops_guard_trips += 1
             self.trace.write({"event": "loop_guard_tripped"})
@@ -232,6 +318,65 @@ class Runtime:
         except Exception:
             return None
 
+    def _repair_key(self, step: Dict[str, Any]) -> Optional[RepairKey]:
+        if self.repair_memory is None:
+            return None
+        sel = str(step.get("selector") or "").strip()
+        if not sel:
+            return None
+        route, fp = page_fingerprint(self.d)
+        if not route:
+            return None
+        return RepairKey(route, str(step.get("type") or "").lower(), sel, fp)
+
+    def _repair(self, step: Dict[str, Any], *, use_memory: bool = True) -> Tuple[Optional[Dict[str, Any]], Optional[RepairKey], str]:
+        """Ремонт шага: память ремонтов, иначе repairer. -> (шаг|None, ключ памяти, "memory"|"repairer")."""
+        key = self._repair_key(step)
+        if key is not None and use_memory and self.repair_memory is not None:
+            patch = self.repair_memory.lookup(key)
+            remembered = self._validate_or_none({**step, **patch}) if patch else None
+            if remembered:
+                self.trace.write({"event": "repair_memory_hit", "step": step, "new": remembered, "route": key.route})
+                return remembered, key, "memory"
+        repaired = self._validate_or_none(
+            self.repairer.repair_step(self._dom_view(step), self.task, self.history_done, step, self._known_vars_for_prompt())
+        )
+        return repaired, key, "repairer"
+
+    def _note_repair(self, key: Optional[RepairKey], source: str, repaired: Dict[str, Any], ok: bool) -> None:
+        """Исход ремонта → память: удачный запоминаем, не сработавший из памяти — штрафуем."""
+        if key is None or self.repair_memory is None:
+            return
+        if ok:
+            self.repair_memory.record_success(key, repaired)
+        elif source == "memory":
+            self.repair_memory.record_failure(key)
+
+    def _checkpoint(self) -> None:
+        """После удачного шага: план, индекс, история, статистика и переменные — на диск."""
+        if self.checkpoints is None or not self.checkpoint_key:
+            return
+        try:
+            url = str(self.d.current_url or "")
+        except Exception:
+            url = ""
+        snap = getattr(self.var_store, "vars", None)
+        self.checkpoints.save(
+            self.checkpoint_key,
+            "runtime",
+            {
+                "task": self.task,
+                "plan": self.plan,
+                "plan_complete": self._plan_feed is None,
+                "step_idx": self.step_idx,
+                "history_done": self.history_done,
+                "stats": dict(self.stats.__dict__),
+                "vars": dict(snap) if isinstance(snap, dict) else {},
+            },
+            owner=self.checkpoint_owner,
+            url=url,
+        )
+
     def _known_vars_for_prompt(self) -> Dict[str, Any]:
         vs = getattr(self.var_store, "vars", None)
         if isinstance(vs, dict):
@@ -244,21 +389,96 @@ class Runtime:
 
     # ---- Публичные методы -----------------------------------------------------
 
-    def set_plan(self, plan: List[Dict[str, Any]], task: str) -> None:
-        """Перед запуском: валидируем и сохраняем план/задачу."""
-        self.plan = validate_plan(plan)
+    def set_plan(self, plan: Union[List[Dict[str, Any]], Iterable[Dict[str, Any]]], task: str) -> None:
+        """
+        Перед запуском: валидируем и сохраняем план/задачу. Не-список (итератор шагов,
+        например PlanCompiler.iter_steps) читается лениво — шаг подтягивается, когда до него дошли.
+        """
+        if isinstance(plan, list):
+            self.plan = validate_plan(plan)
+            self._plan_feed = None
+        else:
+            self.plan = []
+            self._plan_feed = iter(plan)
         self.task = task or ""
         self.history_done.clear()
         self.step_idx = 0
         self.stats = ExecStats()
+        self._pending_repairs.clear()
+
+    def resume(self, run_key: Optional[str] = None, *, verify: bool = True) -> bool:
+        """
+        Продолжить прерванный run() с последнего чекпоинта (вместо set_plan): план, индекс,
+        историю, статистику и переменные. verify — сверить экран: маршрут URL чекпоинта
+        (с одной попыткой вернуться на него) и наличие селектора следующего шага.
+        True — состояние восстановлено, дальше обычный run().
+        """
+        key = run_key or self.checkpoint_key
+        cp = self.checkpoints.load(key, "runtime") if (self.checkpoints is not None and key) else None
+        if cp is None or cp.status != "active":
+            self.trace.write({"event": "resume_skipped", "run_key": key, "reason": "no_checkpoint"})
+            return False
+        st = cp.state
+        if st.get("plan_complete") is False:
+            # ленивый план сохранён только до текущего шага — хвост не восстановить
+            self.trace.write({"event": "resume_skipped", "run_key": key, "reason": "lazy_plan"})
+            return False
+        plan = validate_plan(st.get("plan") or [])
+        idx = int(st.get("step_idx") or 0)
+        if idx >= len(plan):
+            self.trace.write({"event": "resume_skipped", "run_key": key, "reason": "completed"})
+            return False
+
+        saved_vars = st.get("vars") if isinstance(st.get("vars"), dict) else {}
+        # сверяем экран с переменными чекпоинта, но в var_store они попадают только после проверки
+        render = lambda v: self.varr.render_over(v, saved_vars)  # noqa: E731
+        if verify and not (verify_screen(self.d, cp.url) and plan_looks_applicable(self.d, plan[idx:], render)):
+            self.trace.write({"event": "resume_skipped", "run_key": key, "reason": "screen_mismatch", "url": cp.url})
+            return False
+        if saved_vars and callable(getattr(self.var_store, "update", None)):
+            try:
+                self.var_store.update(saved_vars)
+            except Exception:
+                pass
+
+        self.plan = plan
+        self._plan_feed = None
+        self.task = str(st.get("task") or "")
+        self.history_done[:] = [h for h in (st.get("history_done") or []) if isinstance(h, dict)]
+        self.step_idx = idx
+        fields = ExecStats.__dataclass_fields__
+        self.stats = ExecStats(**{k: int(v) for k, v in (st.get("stats") or {}).items() if k in fields})
+        self._pending_repairs.clear()
+        self.checkpoint_key = key
+        self.trace.write({"event": "resume", "run_key": key, "step_idx": idx, "planned_total": len(plan), "url": cp.url})
+        return True
+
+    def _has_step(self, idx: int) -> bool:
+        """Шаг idx есть в плане (ленивый план дочитывается из итератора по мере надобности)."""
+        while idx >= len(self.plan) and self._plan_feed is not None:
+            try:
+                raw = next(self._plan_feed)
+            except StopIteration:
+                self._plan_feed = None
+                break
+            except Exception as e:
+                self.trace.write({"event": "plan_feed_error", "error": safe_str(repr(e))[:300]})
+                self._plan_feed = None
+                break
+            try:
+                self.plan.append(validate_step(raw))
+            except Exception as e:
+                self.trace.write({"event": "plan_feed_step_dropped", "error": safe_str(str(e))[:200]})
+        return idx < len(self.plan)
 
     def run(self) -> RunResult:
-        """Выполняем ранее заданный план (через set_plan)."""
-        if not self.plan:
+        """Выполняем ранее заданный план (через set_plan или resume)."""
+        if not self._has_step(0):
             self.trace.write({"event": "run_empty_plan"})
             return RunResult(done_steps=[], planned_total=0, stats=self.stats)
 
         self.trace.write({"event": "run_start", "planned_total": len(self.plan), "task": self.task})
+        rank_base = ranking_stats()  # счётчики общие для процесса — в run_done идёт прирост за прогон
 
         same_step_counter = 0
         last_step_sig: Optional[str] = None
@@ -272,7 +492,7 @@ class Runtime:
         except Exception:
             pass
 
-        while self.step_idx < len(self.plan):
+        while self._has_step(self.step_idx):
             # Лимит шагов
             if self.stats.total_steps >= self.s.limits.max_steps_per_task:
                 self.trace.write({"event": "limit_reached", "limit": self.s.limits.max_steps_per_task})
@@ -294,6 +514,9 @@ class Runtime:
             self.trace.write({"event": "step_start", "idx": self.step_idx, "step": step})
             ok = self._execute_step(step)
             self.stats.total_steps += 1
+            pending = self._pending_repairs.pop(self.step_idx, None)
+            if pending is not None and pending[2] is step:
+                self._note_repair(pending[0], pending[1], step, ok)
             self._captcha_guard()
 
             if ok:
@@ -304,7 +527,7 @@ class Runtime:
                 consecutive_skips = 0
 
                 # proactive repair: проверяем следующий шаг
-                if self.repairer and self.step_idx < len(self.plan):
+                if self.repairer and self._has_step(self.step_idx):
                     nxt = self.plan[self.step_idx]
                     nxt_sel = nxt.get("selector") or ""
                     nxt_type = (nxt.get("type") or "").lower()
@@ -316,17 +539,14 @@ class Runtime:
                         vis = nxt_type in {StepType.CLICK.value, StepType.HOVER.value}
                         if not exists(self.d, self.varr.render(nxt_sel), visible=vis, timeout_sec=2):
                             self.trace.write({"event": "next_step_looks_broken", "next_idx": self.step_idx, "step": nxt})
-                            repaired = self._validate_or_none(
-                                self.repairer.repair_step(
-                                    self._dom_view(), self.task, self.history_done, nxt, self._known_vars_for_prompt()
-                                )
-                            )
+                            repaired, rkey, rsrc = self._repair(nxt)
                             if repaired:
                                 self.plan[self.step_idx] = repaired
+                                self._pending_repairs[self.step_idx] = (rkey, rsrc, repaired)
                                 self.trace.write({"event": "repair_applied_proactive", "idx": self.step_idx, "new": repaired})
                             else:
                                 # пропускаем этот следующий шаг как мусорный
-                                shot = str(take_screenshot(self.d, self.art, "skip_proactive"))
+                                shot = self._shot("skip_proactive")
                                 self.trace.write({"event": "step_skip", "idx": self.step_idx, "reason": "proactive_repair_failed", "screenshot": shot})
                                 self.step_idx += 1
                                 self.stats.skips += 1
@@ -340,6 +560,7 @@ class Runtime:
                             # валидация хвоста
                             tail_valid = validate_plan(tail)
                             self.plan = self.history_done + tail_valid
+                            self._plan_feed = None
                             self.step_idx = len(self.history_done)
                             self.stats.replans += 1
                             self.trace.write({"event": "replan_applied", "new_tail": len(tail_valid)})
@@ -349,6 +570,7 @@ class Runtime:
                     else:
                         replan_suggested = True
                         self.trace.write({"event": "replan_suggested"})
+                self._checkpoint()
                 continue
 
             # --- Ремонт текущего шага ---
@@ -357,29 +579,30 @@ class Runtime:
                 self.stats.repairs += 1
                 repairs = 0
                 backoff = 0.4
+                memory_tried = False
                 while repairs < self.s.limits.max_repairs_per_step and not repaired_success:
                     repairs += 1
                     self.trace.write({"event": "repair_try", "idx": self.step_idx, "nth": repairs})
-                    repaired = self._validate_or_none(
-                        self.repairer.repair_step(
-                            self._dom_view(), self.task, self.history_done, step, self._known_vars_for_prompt()
-                        )
-                    )
+                    repaired, rkey, rsrc = self._repair(step, use_memory=not memory_tried)
+                    memory_tried = memory_tried or rsrc == "memory"
                     if repaired:
-                        self.trace.write({"event": "repair_candidate", "idx": self.step_idx, "new": repaired})
-                        if self._execute_step(repaired):
+                        self.trace.write({"event": "repair_candidate", "idx": self.step_idx, "new": repaired, "source": rsrc})
+                        done = self._execute_step(repaired)
+                        self._note_repair(rkey, rsrc, repaired, done)
+                        if done:
                             self.history_done.append(repaired)
                             self.plan[self.step_idx] = repaired
                             self.step_idx += 1
                             repaired_success = True
                             consecutive_repairs += 1
                             consecutive_skips = 0
+                            self._checkpoint()
                             break
                     time.sleep(backoff)
                     backoff = min(backoff * 1.8, 3.0)
 
             if not repaired_success:
-                shot = str(take_screenshot(self.d, self.art, "skip_step"))
+                shot = self._shot("skip_step")
                 self.trace.write({"event": "step_skip", "idx": self.step_idx, "step": step, "screenshot": shot})
                 self.step_idx += 1
                 self.stats.skips += 1
@@ -393,6 +616,7 @@ class Runtime:
                     if tail:
                         tail_valid = validate_plan(tail)
                         self.plan = self.history_done + tail_valid
+                        self._plan_feed = None
                         self.step_idx = len(self.history_done)
                         self.stats.replans += 1
                         self.trace.write({"event": "replan_applied", "new_tail": len(tail_valid)})
@@ -405,13 +629,25 @@ class Runtime:
                     replan_suggested = True
                     self.trace.write({"event": "replan_suggested"})
 
+        # план пройден до конца — чекпоинт больше не нужен для resume
+        if self.checkpoints is not None and self._plan_feed is None and self.step_idx >= len(self.plan):
+            self.checkpoints.finish(self.checkpoint_key, "runtime")
+        # пути из трейса должны существовать к моменту отчёта о прогоне
+        self.art_writer.flush(timeout=15.0)
         self.trace.write({
             "event": "run_done",
             "stats": self.stats.__dict__,
+            "artifacts": self.art_writer.stats(),
             "done_count": len(self.history_done),
             "planned_total": len(self.plan),
             "replan_suggested": replan_suggested,
+            "selector_ranking": ranking_stats(since=rank_base),
+            "repair_memory": self.repair_memory.stats() if self.repair_memory is not None else None,
         })
+        try:
+            self.trace.flush(timeout=5.0)  # трейс пишется фоновым потоком — к отчёту он должен быть на диске
+        except Exception:
+            pass
         return RunResult(
             done_steps=list(self.history_done),
             planned_total=len(self.plan),
@@ -428,6 +664,7 @@ class Runtime:
         *,
         max_steps_per_subgoal: int = 6,
         verify_rounds: int = 1,
+        pipeline: Optional[bool] = None,
     ) -> RunResult:
         """
         Инкрементальный режим:
@@ -436,6 +673,9 @@ class Runtime:
           3) исполнить стандартным run(),
           4) проверить достижение (ai.verify_or_adjust), при необходимости доиграть fix_steps.
 
+        pipeline (по умолчанию settings.planner.pipeline): пока исполняется подцель N, план N+1
+        запрашивается в фоне (plan/pipeline.py); если N прошла не по плану — спекулятивный план выбрасывается.
+
         Безопасность:
           - Если у ai нет нужных методов, делаем fallback на единый plan_full + run().
           - Любые ответы LLM дополнительно валидируются validate_plan.
@@ -529,27 +769,52 @@ class Runtime:
             return RunResult(done_steps=agg_done, planned_total=agg_planned_total, stats=agg_stats, replan_suggested=any_replan_suggested)
 
         # 2) Проходим по подцелям
+        if pipeline is None:
+            pipeline = bool(getattr(self.s.planner, "pipeline", False))
+        spec = SpeculativePlanner() if (pipeline and len(subgoals) > 1) else None
+
+        def _applicable(plan: List[Dict[str, Any]]) -> bool:
+            return plan_looks_applicable(self.d, validate_plan(plan), self.varr.render)
+
         for idx, sg in enumerate(subgoals, start=1):
             sg_title = str(sg.get("title") or sg.get("goal") or f"Subgoal {idx}")
             self.trace.write({"event": "subgoal_start", "idx": idx, "title": sg_title, "sg": sg})
 
-            # Сгенерируем короткий список шагов для подцели
+            # Сгенерируем короткий список шагов для подцели (или возьмём спекулятивный, если он ещё годен)
             steps_for_sg: List[Dict[str, Any]] = []
-            try:
-                steps_for_sg = ai.plan_subgoal_steps(
-                    self._dom_view(),
-                    task,
-                    sg,
-                    agg_done,  # Важно: HISTORY_DONE = уже выполненные ранее
-                    self._known_vars_for_prompt(),
-                    max_steps=max_steps_per_subgoal,
-                ) or []
-            except Exception as e:
-                self.trace.write({"event": "llm_error", "where": "plan_subgoal_steps", "err": repr(e), "sg": sg_title})
+            html_view: Optional[str] = None
+            prefetched = spec.take(idx, accept=_applicable) if spec is not None else None
+            if prefetched is not None:
+                steps_for_sg = prefetched
+                self.trace.write({"event": "subgoal_plan_prefetched", "idx": idx, "title": sg_title})
+            else:
+                html_view = self._dom_view()
+                try:
+                    steps_for_sg = ai.plan_subgoal_steps(
+                        html_view,
+                        task,
+                        sg,
+                        agg_done,  # Важно: HISTORY_DONE = уже выполненные ранее
+                        self._known_vars_for_prompt(),
+                        max_steps=max_steps_per_subgoal,
+                    ) or []
+                except Exception as e:
+                    self.trace.write({"event": "llm_error", "where": "plan_subgoal_steps", "err": repr(e), "sg": sg_title})
 
             steps_valid = validate_plan(steps_for_sg)
             self.trace.write({"event": "subgoal_plan", "idx": idx, "title": sg_title, "count": len(steps_valid)})
 
+            # Конвейер: план следующей подцели — в фоне, пока браузер исполняет эту.
+            # DOM — на старте текущей подцели, история — «как если бы она прошла по плану».
+            if spec is not None and steps_valid and idx < len(subgoals):
+                spec.prefetch(
+                    idx + 1,
+                    lambda v=(html_view if html_view is not None else self._dom_view()), g=subgoals[idx],
+                    h=list(agg_done) + list(steps_valid), kv=dict(self._known_vars_for_prompt()): (
+                        ai.plan_subgoal_steps(v, task, g, h, kv, max_steps=max_steps_per_subgoal) or []
+                    ),
+                )
+
             # Если план пуст — попробуем верификацию (вдруг подцель уже выполнена)
             if not steps_valid and has_verify:
                 try:
@@ -578,6 +843,7 @@ class Runtime:
             _accumulate(agg_stats, res.stats)
             agg_planned_total += len(steps_valid)
             any_replan_suggested = any_replan_suggested or res.replan_suggested
+            course_changed = res.replan_suggested or res.stats.skips > 0 or res.stats.replans > 0
 
             # 3) Верификация/коррекция (опционально)
             if has_verify and verify_rounds > 0:
@@ -587,6 +853,8 @@ class Runtime:
                     vr = {}
                     self.trace.write({"event": "llm_error", "where": "verify_or_adjust", "err": repr(e), "sg": sg_title})
                 self.trace.write({"event": "verify_result", "idx": idx, "title": sg_title, "result": vr})
+                if not isinstance(vr, dict) or vr.get("status") in ("retry", "blocked"):
+                    course_changed = True
 
                 rounds_left = int(verify_rounds)
                 while rounds_left > 0 and isinstance(vr, dict) and vr.get("status") == "retry":
@@ -609,11 +877,17 @@ class Runtime:
                         self.trace.write({"event": "llm_error", "where": "verify_or_adjust", "err": repr(e), "sg": sg_title})
                     self.trace.write({"event": "verify_result", "idx": idx, "title": sg_title, "result": vr})
 
+            if spec is not None and course_changed:
+                spec.discard(idx + 1, reason="course_changed")
+                self.trace.write({"event": "subgoal_prefetch_discarded", "idx": idx + 1})
             self.trace.write({"event": "subgoal_done", "idx": idx, "title": sg_title})
 
         # 4) Завершение инкрементального режима
+        if spec is not None:
+            spec.close()
         self.trace.write({
             "event": "incremental_done",
+            "pipeline": spec.stats() if spec is not None else None,
             "stats": agg_stats.__dict__,
             "done_count": len(agg_done),
             "planned_total": agg_planned_total,
@@ -2,17 +2,21 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
-import re
 import threading
 import time
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, Mapping, MutableMapping, Optional
+from typing import IO, Any, Dict, Iterable, Iterator, Mapping, MutableMapping, Optional, Set
+
+from ads_ai.utils.template import render as render_template
 
 
 __all__ = ["VarStore", "NamespacedVarStore"]
 
+log = logging.getLogger(__name__)
+
 
 def _ensure_parent_dir(path: Path) -> None:
     try:
@@ -36,6 +40,22 @@ def _now_ts() -> float:
     return float(time.time())
 
 
+# Общие экземпляры VarStore.shared() и счётчик открытых дескрипторов журнала по пути:
+# журнал, который держит другой экземпляр, не переименовываем и не удаляем. _journal_peers —
+# журналы, куда писали несколько экземпляров: перед снимком их нужно проиграть в память.
+_shared: Dict[str, "VarStore"] = {}
+_journal_fds: Dict[str, int] = {}
+_journal_peers: Set[str] = set()
+_registry_lock = threading.Lock()
+
+
+def _path_key(path: Path) -> str:
+    try:
+        return str(path.resolve())
+    except Exception:
+        return str(path.absolute())
+
+
 class VarStore:
     """
     Персистентная память для переменных агента.
@@ -44,19 +64,71 @@ class VarStore:
       "_meta": {"version": 1, "created": 1710000000.0, "updated": 1710001111.0},
       "vars": { "last_url": "...", "token": "..." }
     }
+
+    Журнальный режим (journal=True, по умолчанию; ENV ADS_AI_VARS_JOURNAL=0 — выключить):
+    при autosave каждое изменение — одна строка JSON в <file>.journal (append, без перезаписи
+    всего файла); память — источник истины. Снимок (сам файл) пересобирается в фоне каждые
+    compact_every записей или compact_interval секунд: журнал переименовывается в
+    <file>.journal.1, снимок пишется атомарно, .journal.1 удаляется. При загрузке
+    снимок + .journal.1 + .journal проигрываются по порядку (повтор операций идемпотентен,
+    оборванная последняя строка пропускается) и сразу сворачиваются в новый снимок.
+
+    Долгоживущие потребители одного файла берут общий экземпляр через VarStore.shared(path)
+    и отдают его через close() (счётчик ссылок). Если журнал держит другой экземпляр,
+    он не переименовывается и не удаляется; подменённый/удалённый журнал переоткрывается.
     """
 
     VERSION = 1
 
-    def __init__(self, path: os.PathLike | str, *, autosave: bool = True) -> None:
+    def __init__(
+        self,
+        path: os.PathLike | str,
+        *,
+        autosave: bool = True,
+        journal: Optional[bool] = None,
+        compact_every: int = 200,
+        compact_interval: float = 30.0,
+    ) -> None:
         self.path = Path(path)
         self.autosave = bool(autosave)
+        if journal is None:
+            journal = str(os.getenv("ADS_AI_VARS_JOURNAL", "1")).strip().lower() not in {"0", "false", "no", "off"}
+        self.journal = bool(journal)
+        self.compact_every = max(1, int(compact_every))
+        self.compact_interval = max(0.5, float(compact_interval))
+        self._journal_path = self.path.with_suffix(self.path.suffix + ".journal")
+        self._rotated_path = self.path.with_suffix(self.path.suffix + ".journal.1")
         self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._write_lock = threading.Lock()  # запись снимка; поколения не дают старому снимку затереть новый
+        self._snap_gen = 0
+        self._written_gen = 0
         self._meta: Dict[str, Any] = {"version": self.VERSION, "created": _now_ts(), "updated": _now_ts()}
         self._vars: Dict[str, Any] = {}
         self._dirty = False
+        self._jf: Optional[IO[str]] = None
+        self._jentries = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._jkey = _path_key(self._journal_path)
+        self._shared_key: Optional[str] = None
+        self._refs = 0
         self._load_if_exists()
 
+    @classmethod
+    def shared(cls, path: os.PathLike | str, **kwargs: Any) -> "VarStore":
+        """Общий экземпляр на файл (в пределах процесса); каждый вызов парный с close()."""
+        key = _path_key(Path(path))
+        with _registry_lock:
+            store = _shared.get(key)
+            if store is None:
+                store = cls(path, **kwargs)
+                store._shared_key = key
+                _shared[key] = store
+            store._refs += 1
+            return store
+
     # -------------------------- базовое API --------------------------
 
     @property
@@ -71,8 +143,7 @@ class VarStore:
     def set(self, key: str, value: Any) -> None:
         with self._lock:
             self._vars[key] = value
-            self._touch()
-            self._maybe_save()
+            self._changed({"op": "set", "k": key, "v": value})
 
     def has(self, key: str) -> bool:
         with self._lock:
@@ -81,39 +152,65 @@ class VarStore:
     def pop(self, key: str, default: Any = None) -> Any:
         with self._lock:
             val = self._vars.pop(key, default)
-            self._touch()
-            self._maybe_save()
+            self._changed({"op": "pop", "k": key})
             return val
 
     def update(self, mapping: Mapping[str, Any] | None = None, **kwargs: Any) -> None:
         if not mapping and not kwargs:
             return
         with self._lock:
+            changes: Dict[str, Any] = {}
             if mapping:
                 for k, v in mapping.items():
                     self._vars[k] = v
+                    changes[k] = v
             if kwargs:
                 for k, v in kwargs.items():
                     self._vars[k] = v
-            self._touch()
-            self._maybe_save()
+                    changes[k] = v
+            self._changed({"op": "update", "m": changes})
 
     def clear(self) -> None:
         with self._lock:
             self._vars.clear()
-            self._touch()
-            self._maybe_save()
+            self._changed({"op": "clear"})
 
     def save(self) -> None:
+        """Полный снимок на диск (журнал после него не нужен)."""
         with self._lock:
+            self._merge_peer_journal()
             payload = {"_meta": dict(self._meta), "vars": self._vars}
-            _atomic_write_json(self.path, payload)
+            self._write_snapshot(payload, self._next_gen())
             self._dirty = False
+            self._drop_journal()
 
     def load(self) -> None:
         with self._lock:
             self._load_if_exists()
 
+    def close(self) -> None:
+        """Остановить фоновое сжатие и свернуть журнал в снимок (общий экземпляр — по последней ссылке)."""
+        if self._shared_key is not None:
+            with _registry_lock:
+                self._refs -= 1
+                if self._refs > 0:
+                    return
+                if _shared.get(self._shared_key) is self:
+                    _shared.pop(self._shared_key, None)
+                self._shared_key = None
+        self._stop.set()
+        self._wake.set()
+        worker = self._worker
+        if worker is not None and worker is not threading.current_thread():
+            worker.join(timeout=5.0)
+        with self._lock:
+            if self._jentries or self._rotated_path.exists():
+                try:
+                    self.save()
+                except Exception:
+                    pass
+            self._close_journal()
+
     # -------------------------- утилиты --------------------------
 
     def render(self, val: Any) -> Any:
@@ -121,19 +218,7 @@ class VarStore:
         Рендерит ${var} в строках. Для dict/list — рекурсивно.
         Поддержка дефолта: ${name:-fallback}
         """
-        if isinstance(val, str):
-            pat = re.compile(r"\$\{([A-Za-z0-9_]+)(?::-(.*?))?\}")
-            def repl(m: re.Match[str]) -> str:
-                key = m.group(1)
-                fallback = m.group(2)
-                got = self.get(key, fallback if fallback is not None else "")
-                return "" if got is None else str(got)
-            return pat.sub(repl, val)
-        if isinstance(val, dict):
-            return {k: self.render(v) for k, v in val.items()}
-        if isinstance(val, list):
-            return [self.render(v) for v in val]
-        return val
+        return render_template(val, self.get)
 
     @contextmanager
     def batch(self) -> Iterator[None]:
@@ -157,6 +242,13 @@ class VarStore:
 
     # -------------------------- внутренности --------------------------
 
+    def _changed(self, entry: Dict[str, Any]) -> None:
+        self._touch()
+        if self.journal and self.autosave:
+            self._append(entry)
+        else:
+            self._maybe_save()
+
     def _maybe_save(self) -> None:
         if self.autosave and self._dirty:
             self.save()
@@ -165,9 +257,184 @@ class VarStore:
         self._dirty = True
         self._meta["updated"] = _now_ts()
 
+    # ---- журнал ----
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        entry["ts"] = self._meta["updated"]
+        line = json.dumps(entry, ensure_ascii=False)
+        if self._jf is not None and self._journal_replaced():
+            # другой экземпляр свернул/удалил журнал — пишем в актуальный файл
+            self._close_journal()
+        if self._jf is None:
+            _ensure_parent_dir(self._journal_path)
+            self._jf = self._journal_path.open("a", encoding="utf-8")
+            with _registry_lock:
+                n = _journal_fds.get(self._jkey, 0) + 1
+                _journal_fds[self._jkey] = n
+                if n > 1:
+                    _journal_peers.add(self._jkey)
+        self._jf.write(line + "\n")
+        self._jf.flush()
+        self._jentries += 1
+        self._ensure_worker()
+        if self._jentries >= self.compact_every:
+            self._wake.set()
+
+    def _journal_replaced(self) -> bool:
+        """Открытый дескриптор указывает не на текущий <file>.journal (удалён или подменён)."""
+        try:
+            return os.fstat(self._jf.fileno()).st_ino != os.stat(self._journal_path).st_ino
+        except FileNotFoundError:
+            return True
+        except Exception:
+            return False
+
+    def _journal_shared(self) -> bool:
+        """Журнал открыт другим экземпляром этого процесса."""
+        own = 1 if self._jf is not None else 0
+        with _registry_lock:
+            return _journal_fds.get(self._jkey, 0) > own
+
+    def _merge_peer_journal(self) -> None:
+        """В журнал писали и другие экземпляры — подтянуть их записи до снимка (по последнему владельцу)."""
+        with _registry_lock:
+            if self._jkey not in _journal_peers:
+                return
+        if self._journal_shared():
+            return
+        self._replay(self._rotated_path)
+        self._replay(self._journal_path)
+        with _registry_lock:
+            _journal_peers.discard(self._jkey)
+
+    def _close_journal(self) -> None:
+        if self._jf is not None:
+            try:
+                self._jf.close()
+            except Exception:
+                pass
+            self._jf = None
+            with _registry_lock:
+                left = _journal_fds.get(self._jkey, 0) - 1
+                if left > 0:
+                    _journal_fds[self._jkey] = left
+                else:
+                    _journal_fds.pop(self._jkey, None)
+
+    def _drop_journal(self) -> None:
+        """Снимок только что записан: журналы больше не нужны (если их не держит другой экземпляр)."""
+        self._close_journal()
+        self._jentries = 0
+        if self._journal_shared():
+            # повтор журнала поверх свежего снимка идемпотентен — оставляем его владельцам
+            return
+        for p in (self._journal_path, self._rotated_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            except Exception:
+                pass
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._compact_loop, name="vars-compact", daemon=True)
+        self._worker.start()
+
+    def _compact_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(timeout=self.compact_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.compact()
+            except Exception as e:
+                log.debug("vars compaction failed: %s", e)
+
+    def compact(self) -> None:
+        """Свернуть журнал в снимок (снимок сериализуется и пишется вне основной блокировки)."""
+        with self._compact_lock:
+            with self._lock:
+                if not self._jentries or self._journal_shared():
+                    return  # журнал держит другой экземпляр — его свернёт последний владелец
+                self._merge_peer_journal()
+                self._close_journal()
+                if not self._journal_path.exists():
+                    log.debug("vars journal %s vanished before compaction", self._journal_path)
+                elif self._rotated_path.exists():
+                    # прошлое сжатие не дописало снимок — дописываем текущий журнал к повёрнутому
+                    with self._journal_path.open("r", encoding="utf-8") as src, \
+                            self._rotated_path.open("a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    self._journal_path.unlink()
+                else:
+                    os.replace(self._journal_path, self._rotated_path)
+                self._jentries = 0
+                payload = {"_meta": dict(self._meta), "vars": dict(self._vars)}
+                gen = self._next_gen()
+                self._dirty = False
+            self._write_snapshot(payload, gen)
+            try:
+                self._rotated_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _next_gen(self) -> int:
+        self._snap_gen += 1
+        return self._snap_gen
+
+    def _write_snapshot(self, payload: dict, gen: int) -> None:
+        with self._write_lock:
+            if gen <= self._written_gen:
+                return  # уже записан более свежий снимок
+            _atomic_write_json(self.path, payload)
+            self._written_gen = gen
+
+    def _replay(self, path: Path) -> int:
+        """Проиграть журнал поверх памяти; оборванные/битые строки пропускаются."""
+        if not path.exists():
+            return 0
+        n = 0
+        with path.open("r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except Exception:
+                    continue
+                if not isinstance(e, dict):
+                    continue
+                op = e.get("op")
+                if op == "set":
+                    self._vars[str(e.get("k"))] = e.get("v")
+                elif op == "pop":
+                    self._vars.pop(str(e.get("k")), None)
+                elif op == "update" and isinstance(e.get("m"), dict):
+                    self._vars.update(e["m"])
+                elif op == "clear":
+                    self._vars.clear()
+                else:
+                    continue
+                try:
+                    self._meta["updated"] = float(e.get("ts") or self._meta["updated"])
+                except Exception:
+                    pass
+                n += 1
+        return n
+
     def _load_if_exists(self) -> None:
+        self._close_journal()
+        self._jentries = 0
+        has_journal = self._journal_path.exists() or self._rotated_path.exists()
         if not self.path.exists():
             _ensure_parent_dir(self.path)
+            if has_journal:
+                self._replay(self._rotated_path)
+                self._replay(self._journal_path)
             # первый сейв — чтобы создать файл и каталог аккуратно
             self.save()
             return
@@ -195,7 +462,16 @@ class VarStore:
             self._vars = {}
             self._meta = {"version": self.VERSION, "created": _now_ts(), "updated": _now_ts()}
             self._dirty = True
-            self._maybe_save()
+        if has_journal:
+            # восстановление после падения: снимок + журналы → новый снимок
+            replayed = self._replay(self._rotated_path) + self._replay(self._journal_path)
+            self._dirty = self._dirty or replayed > 0
+            if self._dirty:
+                self.save()
+            else:
+                self._drop_journal()
+            return
+        self._maybe_save()
 
 
 class NamespacedVarStore:
@@ -247,18 +523,7 @@ class NamespacedVarStore:
         Рендер через базовый, но с поддержкой локальных ключей:
         сначала ищем ${key} в своём неймспейсе, если пусто — глобал.
         """
-        if isinstance(val, str):
-            pat = re.compile(r"\$\{([A-Za-z0-9_]+)(?::-(.*?))?\}")
-            def repl(m: re.Match[str]) -> str:
-                key = m.group(1)
-                fallback = m.group(2)
-                got = self.get(key, None)
-                if got is None:
-                    got = self.base.get(key, fallback if fallback is not None else "")
-                return "" if got is None else str(got)
-            return pat.sub(repl, val)
-        if isinstance(val, dict):
-            return {k: self.render(v) for k, v in val.items()}
-        if isinstance(val, list):
-            return [self.render(v) for v in val]
-        return val
+        def lookup(key: str, default: Any) -> Any:
+            got = self.get(key, None)
+            return self.base.get(key, default) if got is None else got
+        return render_template(val, lookup)
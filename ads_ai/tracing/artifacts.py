@@ -1,13 +1,18 @@
 # ads_ai/tracing/artifacts.py
 from __future__ import annotations
 
+import logging
+import queue
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple, Union
 
 from ads_ai.utils.ids import now_id
 from ads_ai.utils.paths import ensure_dir
 
+log = logging.getLogger(__name__)
+
 
 @dataclass
 class Artifacts:
@@ -48,3 +53,146 @@ def take_screenshot(driver, artifacts: Artifacts, label: str) -> Path:
     except Exception:
         pass
     return path
+
+
+# ------------------------------ Асинхронная запись ------------------------------
+
+Payload = Union[bytes, str]
+
+
+@dataclass
+class ArtifactPolicy:
+    """
+    Какие шаги сохраняют скрин+DOM:
+      "all"      — каждый шаг;
+      "failures" — только неуспешные;
+      "every_n"  — неуспешные + каждый every_n-й успешный;
+      "off"      — ничего (события captcha/skip пишутся всегда).
+    """
+    mode: str = "all"
+    every_n: int = 5
+
+    def wants(self, ok: bool, nth_ok: int) -> bool:
+        m = (self.mode or "all").lower()
+        if m == "off":
+            return False
+        if not ok or m == "all":
+            return True
+        if m == "every_n":
+            return nth_ok % max(1, int(self.every_n)) == 0
+        return False
+
+    @classmethod
+    def from_settings(cls, tracing_cfg: Any) -> "ArtifactPolicy":
+        return cls(
+            mode=str(getattr(tracing_cfg, "artifacts_policy", "all") or "all").lower(),
+            every_n=int(getattr(tracing_cfg, "artifacts_every_n", 5) or 5),
+        )
+
+
+class ArtifactWriter:
+    """
+    Фоновая запись артефактов рантайма.
+
+    Данные снимает вызывающий (состояние страницы — на момент шага), путь
+    резервируется сразу (его пишем в трейс), запись на диск выполняет фоновый
+    поток. Нет данных — нет и пути (трейс не ссылается на несуществующий файл).
+    Очередь ограничена:
+    при переполнении ждём до backpressure_sec, затем задание отбрасывается
+    (submit → None, счётчик dropped). Поток запускается по требованию и
+    завершается после idle_sec простоя.
+    """
+
+    def __init__(
+        self,
+        artifacts: Artifacts,
+        *,
+        max_queue: int = 32,
+        backpressure_sec: float = 0.25,
+        idle_sec: float = 5.0,
+    ) -> None:
+        self.art = artifacts
+        self.backpressure_sec = max(0.0, float(backpressure_sec))
+        self.idle_sec = max(0.5, float(idle_sec))
+        self._q: "queue.Queue[Tuple[Path, Payload]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"queued": 0, "written": 0, "dropped": 0, "errors": 0}
+
+    # ---- публичное API ---------------------------------------------------
+
+    def screenshot(self, label: str, data: Optional[bytes]) -> Optional[Path]:
+        """PNG bytes → зарезервированный путь; None — снять не удалось или запись отброшена."""
+        if data is None:
+            return None
+        return self._submit(self.art.screenshot_path(label), data)
+
+    def html(self, data: Optional[str]) -> Optional[Path]:
+        """DOM-снапшот → зарезервированный путь; None — снять не удалось или запись отброшена."""
+        if data is None:
+            return None
+        return self._submit(self.art.html_snap_path(), data)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Дождаться записи всего, что в очереди (True — успели)."""
+        done = threading.Event()
+        t = threading.Thread(target=lambda: (self._q.join(), done.set()), daemon=True)
+        t.start()
+        return done.wait(timeout=max(0.0, float(timeout)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["pending"] = self._q.qsize()
+        return out
+
+    # ---- внутренности ----------------------------------------------------
+
+    def _submit(self, path: Path, data: Payload) -> Optional[Path]:
+        try:
+            self._q.put((path, data), timeout=self.backpressure_sec)
+        except queue.Full:
+            self._count("dropped")
+            return None
+        self._count("queued")
+        self._ensure_thread()
+        return path
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="artifact-writer", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                path, data = self._q.get(timeout=self.idle_sec)
+            except queue.Empty:
+                with self._lock:
+                    # задание могло прийти между таймаутом и блокировкой — тогда не выходим
+                    if self._q.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                self._write(path, data)
+                self._count("written")
+            except Exception as e:
+                self._count("errors")
+                log.debug("artifact %s failed: %s", path, e)
+            finally:
+                self._q.task_done()
+
+    @staticmethod
+    def _write(path: Path, data: Payload) -> None:
+        if isinstance(data, bytes):
+            path.write_bytes(data)
+        else:
+            with path.open("w", encoding="utf-8") as f:
+                f.write(data or "")
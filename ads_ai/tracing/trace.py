@@ -1,25 +1,134 @@
 # ads_ai/tracing/trace.py
 from __future__ import annotations
 
+import atexit
 import json
+import logging
 import os
+import queue
 import threading
 import time
+import weakref
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import IO, Any, Dict, List, Optional, Tuple
 
 from ads_ai.utils.paths import ensure_dir
 
+log = logging.getLogger(__name__)
+
+
+class _TraceWriter:
+    """
+    Общий на процесс фоновый писатель трейсов.
+
+    Строки (уже сериализованные) идут в ограниченную очередь; поток забирает их пачками,
+    группирует по трейсу и пишет в открытые файлы с одним flush на пачку. Переполнение —
+    вызывающий ждёт до backpressure_sec, затем строка отбрасывается (счётчик dropped).
+    Поток запускается по требованию и после idle_sec простоя закрывает файлы и выходит.
+    При выходе процесса очередь дописывается (atexit).
+    """
+
+    def __init__(self, *, max_queue: int = 10000, batch: int = 512, backpressure_sec: float = 2.0, idle_sec: float = 5.0) -> None:
+        self.batch = max(1, int(batch))
+        self.backpressure_sec = max(0.0, float(backpressure_sec))
+        self.idle_sec = max(0.5, float(idle_sec))
+        self._q: "queue.Queue[Tuple[JsonlTrace, str]]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._open: "weakref.WeakSet[JsonlTrace]" = weakref.WeakSet()
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "dropped": 0}
+
+    def submit(self, trace: "JsonlTrace", line: str) -> None:
+        try:
+            self._q.put((trace, line), timeout=self.backpressure_sec)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+        with self._lock:
+            self._stats["queued"] += 1
+        self._ensure_thread()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи всего, что в очереди (True — успели)."""
+        if self._q.unfinished_tasks == 0:
+            return True
+        done = threading.Event()
+        t = threading.Thread(target=lambda: (self._q.join(), done.set()), daemon=True)
+        t.start()
+        return done.wait(timeout=max(0.0, float(timeout)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+        out["pending"] = self._q.qsize()
+        return out
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="trace-writer", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                first = self._q.get(timeout=self.idle_sec)
+            except queue.Empty:
+                with self._lock:
+                    # строка могла прийти между таймаутом и блокировкой — тогда не выходим
+                    if self._q.empty():
+                        self._thread = None
+                        break
+                continue
+            items = [first]
+            while len(items) < self.batch:
+                try:
+                    items.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            groups: Dict[int, Tuple[JsonlTrace, List[str]]] = {}
+            for trace, line in items:
+                groups.setdefault(id(trace), (trace, []))[1].append(line)
+            for trace, lines in groups.values():
+                trace._write_lines(lines)
+                self._open.add(trace)
+            with self._lock:
+                self._stats["written"] += len(items)
+                self._stats["batches"] += 1
+            for _ in items:
+                self._q.task_done()
+        # простой: файлы закрываем, чтобы не держать дескрипторы завершённых прогонов
+        for trace in list(self._open):
+            trace._close_file()
+        self._open.clear()
+
+
+_writer: Optional[_TraceWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> _TraceWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _TraceWriter()
+            atexit.register(_writer.flush, 5.0)
+        return _writer
+
 
 class JsonlTrace:
     """
     Потокобезопасный JSONL-трейс.
 
     Особенности:
-      - Безопасная сериализация: несерилизуемые объекты превращаются в строки.
+      - Безопасная сериализация: несерилизуемые объекты превращаются в строки (один раз на запись).
       - Автоматическое добавление поля "ts" (unix time, float).
-      - Мягкая ротация по размеру (ENV: TRACING_MAX_BYTES, TRACING_MAX_BACKUPS).
+      - Мягкая ротация по размеру (ENV: TRACING_MAX_BYTES, TRACING_MAX_BACKUPS); размер считается в памяти.
+      - Запись — общим фоновым потоком пачками в открытый файл (ENV TRACING_ASYNC=0 — синхронно).
+        flush() — дождаться записи; при выходе процесса очередь дописывается.
       - Если path=None — трейс в /dev/null (no-op).
 
     Формат строки: одна JSON-запись на строку (UTF-8, без ASCII-экранирования).
@@ -36,6 +145,10 @@ class JsonlTrace:
         # Настройки ротации читаем один раз при инициализации.
         self._max_bytes = self._read_env_int("TRACING_MAX_BYTES", self._DEFAULT_MAX_BYTES)
         self._max_backups = max(0, self._read_env_int("TRACING_MAX_BACKUPS", self._DEFAULT_BACKUPS))
+        self._async = str(os.getenv("TRACING_ASYNC", "1")).strip().lower() not in {"0", "false", "no", "off"}
+
+        self._fh: Optional[IO[str]] = None
+        self._size = 0
 
         if self.path:
             ensure_dir(self.path.parent)
@@ -55,22 +168,44 @@ class JsonlTrace:
             return
 
         try:
-            payload = dict(rec) if isinstance(rec, dict) else {"event": "log", "payload": str(rec)}
-            payload.setdefault("ts", time.time())
-
-            line = self._safe_dumps(payload) + "\n"
-
-            with self._lock:
-                self._rotate_if_needed_unlocked()
-                # NB: режим "a" гарантирует дозапись в конец даже при множестве процессов.
-                with self.path.open("a", encoding="utf-8") as f:  # type: ignore[union-attr]
-                    f.write(line)
-                    # Явный flush не обязателен (файл закрывается), но оставим на будущее:
-                    # f.flush()
+            _, line = self.encode(rec)
+            self.write_line(line)
         except Exception:
             # Никогда не валим рабочий процесс из-за логирования
             return
 
+    def encode(self, rec: Any) -> Tuple[Dict[str, Any], str]:
+        """Запись с "ts" и её JSON-строка (без перевода строки) — сериализация ровно один раз."""
+        payload = dict(rec) if isinstance(rec, dict) else {"event": "log", "payload": str(rec)}
+        payload.setdefault("ts", time.time())
+        return payload, self._safe_dumps(payload)
+
+    def write_line(self, line: str) -> None:
+        """Записать уже сериализованную строку (из encode)."""
+        if not self.path:
+            return
+        if self._async:
+            _get_writer().submit(self, line)
+        else:
+            self._write_lines([line])
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Дождаться записи очереди на диск (True — успели)."""
+        if not self.path:
+            return True
+        ok = _get_writer().flush(timeout) if self._async else True
+        with self._lock:
+            if self._fh is not None:
+                try:
+                    self._fh.flush()
+                except Exception:
+                    pass
+        return ok
+
+    def close(self) -> None:
+        self.flush()
+        self._close_file()
+
     # --------------------------- Внутренние утилиты ---------------------- #
 
     @staticmethod
@@ -113,6 +248,36 @@ class JsonlTrace:
             except Exception:
                 return '{"event":"trace_error","payload":"<unserializable>"}'
 
+    def _write_lines(self, lines: List[str]) -> None:
+        """Дописать строки в открытый файл (ротация — по размеру, отслеживаемому в памяти)."""
+        with self._lock:
+            try:
+                for line in lines:
+                    self._rotate_if_needed_unlocked()
+                    if self._fh is None:
+                        # NB: режим "a" гарантирует дозапись в конец даже при множестве процессов.
+                        self._fh = self.path.open("a", encoding="utf-8")  # type: ignore[union-attr]
+                        self._size = self._fh.tell()
+                    self._fh.write(line + "\n")
+                    self._size += len(line.encode("utf-8", "ignore")) + 1
+                if self._fh is not None:
+                    self._fh.flush()
+            except Exception as e:
+                log.debug("trace write failed: %s", e)
+                self._close_file_unlocked()
+
+    def _close_file(self) -> None:
+        with self._lock:
+            self._close_file_unlocked()
+
+    def _close_file_unlocked(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
     def _rotate_if_needed_unlocked(self) -> None:
         """
         Ротация по размеру файла. Вызывать ТОЛЬКО под self._lock.
@@ -124,11 +289,15 @@ class JsonlTrace:
             return
 
         try:
-            if not self.path.exists():
-                return
-            size = self.path.stat().st_size
-            if size <= self._max_bytes:
+            if self._fh is None:
+                if not self.path.exists():
+                    return
+                self._size = self.path.stat().st_size
+            if self._size <= self._max_bytes:
                 return
+            # файл переименовывается/обрезается — дескриптор закрываем, следующая запись откроет новый
+            self._close_file_unlocked()
+            self._size = 0
 
             # Если бэкапы выключены — просто обрезаем файл.
             if self._max_backups == 0:
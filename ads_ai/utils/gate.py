@@ -0,0 +1,79 @@
+# ads_ai/utils/gate.py
+from __future__ import annotations
+
+"""
+AdaptiveGate — динамический лимитер параллелизма.
+
+Лимит сужается (tighten) на ошибках/rate limit внешнего сервиса и сам
+расширяется (mark_success) после серии успехов. Используется для фетчей
+к Google (web/accounts_list.py) и пакетного старта профилей AdsPower
+(browser/adspower.start_many).
+"""
+
+import threading
+from contextlib import contextmanager
+
+__all__ = ["AdaptiveGate"]
+
+
+class AdaptiveGate:
+    def __init__(self, initial: int, min_limit: int, max_limit: int, relax_every: int = 10):
+        self._limit = max(min_limit, min(initial, max_limit))
+        self._min = max(1, min_limit)
+        self._max = max(self._min, max_limit)
+        self._active = 0
+        self._cv = threading.Condition()
+        self._success = 0
+        self._relax_every = max(1, relax_every)
+
+    def acquire(self):
+        with self._cv:
+            while self._active >= self._limit:
+                self._cv.wait(0.2)
+            self._active += 1
+
+    def release(self):
+        with self._cv:
+            self._active -= 1
+            if self._active < 0:
+                self._active = 0
+            self._cv.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def tighten(self, step: int = 1):
+        with self._cv:
+            new_limit = max(self._min, self._limit - max(1, step))
+            if new_limit != self._limit:
+                self._limit = new_limit
+                print(f"[gate] tighten → {self._limit}", flush=True)
+                self._cv.notify_all()
+
+    def relax(self, step: int = 1):
+        with self._cv:
+            new_limit = min(self._max, self._limit + max(1, step))
+            if new_limit != self._limit:
+                self._limit = new_limit
+                print(f"[gate] relax → {self._limit}", flush=True)
+                self._cv.notify_all()
+
+    def mark_success(self):
+        with self._cv:
+            self._success += 1
+            if self._success >= self._relax_every:
+                self._success = 0
+                if self._limit < self._max:
+                    self._limit += 1
+                    print(f"[gate] auto-relax → {self._limit}", flush=True)
+                    self._cv.notify_all()
+
+    @property
+    def limit(self) -> int:
+        with self._cv:
+            return self._limit
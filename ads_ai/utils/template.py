@@ -0,0 +1,180 @@
+# ads_ai/utils/template.py
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+"""
+Подстановка ${var} — один движок на проект (VarStore, Runtime, PlanCompiler, экшены).
+
+Строка разбирается один раз (кэш разборов) в части: литералы и плейсхолдеры (имя, fallback).
+Значение (шаг: dict/list/str) компилируется в дерево шаблона; поддеревья без плейсхолдеров —
+константы: при рендере отдаются как есть, без обхода и копирования. Шаг без плейсхолдеров
+целиком возвращается тем же объектом.
+
+Семантика везде одна:
+  ${name}            — lookup(name, "")
+  ${name:-fallback}  — lookup(name, "fallback") (fallback — только если имени нет)
+  имя — [A-Za-z0-9_.] (точка: поля элемента foreach, ключи неймспейсов); None → "", иначе str().
+
+Публичный контракт:
+  - PLACEHOLDER_RE
+  - Template(value).render(lookup) / .static
+  - TemplateCache(max_items=512).get(value) -> Template   (по идентичности объекта: шаги плана)
+  - compile_template(value) -> Template
+  - render(value, lookup) / render_mapping(value, mapping)
+  - has_placeholders(value) -> bool / var_names(value) -> set
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, Mapping, Optional, Set, Tuple, Union
+
+__all__ = [
+    "PLACEHOLDER_RE",
+    "Template",
+    "TemplateCache",
+    "compile_template",
+    "render",
+    "render_mapping",
+    "has_placeholders",
+    "var_names",
+]
+
+PLACEHOLDER_RE = re.compile(r"\$\{([A-Za-z0-9_.]+)(?::-(.*?))?\}")
+
+Lookup = Callable[[str, Any], Any]
+# часть строки: литерал или (имя, fallback)
+_Part = Union[str, Tuple[str, Optional[str]]]
+
+
+@lru_cache(maxsize=4096)
+def _parse(s: str) -> Optional[Tuple[_Part, ...]]:
+    """Части строки; None — плейсхолдеров нет."""
+    if "${" not in s:
+        return None
+    parts = []
+    pos = 0
+    for m in PLACEHOLDER_RE.finditer(s):
+        if m.start() > pos:
+            parts.append(s[pos:m.start()])
+        parts.append((m.group(1), m.group(2)))
+        pos = m.end()
+    if not parts:
+        return None
+    if pos < len(s):
+        parts.append(s[pos:])
+    return tuple(parts)
+
+
+def _compile(value: Any) -> Any:
+    """Узел дерева шаблона; None — значение константно."""
+    if isinstance(value, str):
+        parts = _parse(value)
+        return None if parts is None else ("s", parts)
+    if isinstance(value, dict):
+        items = tuple((k, _compile(v), v) for k, v in value.items())
+        return ("d", items) if any(n is not None for _, n, _ in items) else None
+    if isinstance(value, list):
+        items = tuple((_compile(v), v) for v in value)
+        return ("l", items) if any(n is not None for n, _ in items) else None
+    return None
+
+
+def _subst(lookup: Lookup, name: str, fallback: Optional[str]) -> str:
+    try:
+        got = lookup(name, fallback if fallback is not None else "")
+    except Exception:
+        got = fallback if fallback is not None else ""
+    return "" if got is None else str(got)
+
+
+def _render(node: Any, lookup: Lookup) -> Any:
+    kind, items = node
+    if kind == "s":
+        return "".join(p if isinstance(p, str) else _subst(lookup, p[0], p[1]) for p in items)
+    if kind == "d":
+        return {k: (v if n is None else _render(n, lookup)) for k, n, v in items}
+    return [v if n is None else _render(n, lookup) for n, v in items]
+
+
+class Template:
+    """Скомпилированное значение: render(lookup) подставляет переменные, ничего не разбирая заново."""
+
+    __slots__ = ("source", "_node")
+
+    def __init__(self, value: Any) -> None:
+        self.source = value
+        self._node = _compile(value)
+
+    @property
+    def static(self) -> bool:
+        return self._node is None
+
+    def render(self, lookup: Lookup) -> Any:
+        if self._node is None:
+            return self.source
+        return _render(self._node, lookup)
+
+
+class TemplateCache:
+    """
+    Шаблоны по идентичности объекта (id + ссылка на сам объект, чтобы id не переиспользовался).
+    Для шагов плана, которые рендерятся многократно и не мутируются. Переполнение — сброс.
+    """
+
+    def __init__(self, max_items: int = 512) -> None:
+        self.max_items = max(1, int(max_items))
+        self._items: Dict[int, Tuple[Any, Template]] = {}
+
+    def get(self, value: Any) -> Template:
+        if isinstance(value, str):
+            return compile_template(value)
+        hit = self._items.get(id(value))
+        if hit is not None and hit[0] is value:
+            return hit[1]
+        tpl = Template(value)
+        if len(self._items) >= self.max_items:
+            self._items.clear()
+        self._items[id(value)] = (value, tpl)
+        return tpl
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+@lru_cache(maxsize=4096)
+def _compile_str(s: str) -> Template:
+    return Template(s)
+
+
+def compile_template(value: Any) -> Template:
+    if isinstance(value, str):
+        return _compile_str(value)
+    return Template(value)
+
+
+def render(value: Any, lookup: Lookup) -> Any:
+    return compile_template(value).render(lookup)
+
+
+def render_mapping(value: Any, mapping: Mapping[str, Any]) -> Any:
+    return compile_template(value).render(mapping.get)
+
+
+def has_placeholders(value: Any) -> bool:
+    return _compile(value) is not None
+
+
+def var_names(value: Any, out: Optional[Set[str]] = None) -> Set[str]:
+    """Имена переменных во всех строках значения."""
+    out = set() if out is None else out
+    if isinstance(value, str):
+        for p in _parse(value) or ():
+            if not isinstance(p, str):
+                out.add(p[0])
+    elif isinstance(value, dict):
+        for v in value.values():
+            var_names(v, out)
+    elif isinstance(value, list):
+        for v in value:
+            var_names(v, out)
+    return out
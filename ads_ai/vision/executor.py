@@ -47,8 +47,9 @@ from ads_ai.browser.pixel import (
     move_and_focus,
     press_enter,
     highlight_bbox,
-    mouse_move,
+    mouse_path,
 )
+from ads_ai.browser.trajectory import bezier_path
 
 
 # ---------- утилиты координат/вьюпорта ----------
@@ -80,22 +81,11 @@ def _scroll_into_view_center(driver, px: float, py: float) -> None:
 
 
 def _animate_mouse(driver, tx: float, ty: float, *, steps: int = 10) -> None:
-    """Плавное движение курсора вдоль квадратичной кривой из центра вьюпорта к (tx, ty)."""
+    """Плавное движение курсора вдоль квадратичной кривой из центра вьюпорта к (tx, ty) — одним пакетом CDP."""
     try:
         sx, sy, vw, vh = _get_viewport_state(driver)
-        cx, cy = vw / 2.0, vh / 2.0
         vx, vy = tx - sx, ty - sy  # координаты цели во вьюпорте
-        kx, ky = (cx + vx) / 2.0, (cy + vy) / 2.0
-        steps = max(4, int(steps))
-        for i in range(1, steps + 1):
-            t = i / steps
-            x = (1 - t) ** 2 * cx + 2 * (1 - t) * t * kx + t ** 2 * vx
-            y = (1 - t) ** 2 * cy + 2 * (1 - t) * t * ky + t ** 2 * vy
-            try:
-                mouse_move(driver, x, y)
-            except Exception:
-                break
-            time.sleep(0.018)
+        mouse_path(driver, bezier_path((vw / 2.0, vh / 2.0), (vx, vy), steps=max(4, int(steps)), dt=0.018))
     except Exception:
         pass
 
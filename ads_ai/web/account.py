@@ -40,6 +40,8 @@ from selenium.webdriver.chrome.service import Service as ChromeService
 
 # Единый надёжный старт AdsPower
 from ads_ai.browser.adspower import start_adspower, AdsPowerError
+from ads_ai.browser.pool import get_driver_pool
+from ads_ai.browser.adspower_client import http_get_json as _http_get_json, http_post_json as _http_post_json
 
 # Мягкие импорты для вспомогательных функций
 try:
@@ -206,60 +208,15 @@ def _get_adspower_env() -> tuple[bool, str, str]:
     return headless, api_base, token
 
 
-def _http_get_json(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 2.0) -> tuple[int, Dict[str, Any]]:
-    try:
-        if requests:
-            r = requests.get(url, headers=headers or {}, timeout=timeout)  # type: ignore
-            j = {}
-            try:
-                j = r.json() if r.content else {}
-            except Exception:
-                j = {}
-            return int(r.status_code), j or {}
-    except Exception:
-        pass
-    try:
-        req = urllib.request.Request(url, headers=headers or {})
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = resp.read()
-            try:
-                j = json.loads(data.decode("utf-8")) if data else {}
-            except Exception:
-                j = {}
-            return int(resp.getcode() or 0), j or {}
-    except Exception:
-        return 0, {}
-
-
-def _http_post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: float = 3.0) -> tuple[int, Dict[str, Any]]:
-    body = json.dumps(payload).encode("utf-8")
-    h = {"Content-Type": "application/json"}
-    if headers:
-        h.update(headers)
-    try:
-        if requests:
-            r = requests.post(url, headers=h, data=body, timeout=timeout)  # type: ignore
-            try:
-                return int(r.status_code), (r.json() if r.content else {})
-            except Exception:
-                return int(r.status_code), {}
-    except Exception:
-        pass
-    try:
-        req = urllib.request.Request(url, data=body, headers=h, method="POST")
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = resp.read()
-            try:
-                return int(resp.getcode() or 0), (json.loads(data.decode("utf-8")) if data else {})
-            except Exception:
-                return int(resp.getcode() or 0), {}
-    except Exception:
-        return 0, {}
-
-
 def _stop_adspower_driver(driver: Any) -> None:
     if driver is None:
         return
+    # драйвер из общего пула — возвращаем (пул сам закроет по простою/лимиту)
+    pool = get_driver_pool()
+    if pool.owns(driver):
+        pool.release(driver)
+        _console("pool:release", {}, None)
+        return
     _headless, api_base, token = _get_adspower_env()
     for fn_name in ("stop_adspower", "stop"):
         try:
@@ -426,7 +383,7 @@ def _delete_adspower_profile(profile_id: str) -> bool:
         f"{api_base}/v1/api/user/delete?user_id={urllib.parse.quote(profile_id)}",
     ]
     for u in urls:
-        code, body = _http_get_json(u, headers=headers)
+        code, body = _http_get_json(u, headers=headers, timeout=2.0)
         if code and code < 500 and isinstance(body, dict) and (body.get("code") in (0, "0")):
             return True
     posts = [
@@ -435,7 +392,7 @@ def _delete_adspower_profile(profile_id: str) -> bool:
         (f"{api_base}/api/v1/user/batch_delete", {"user_ids": [profile_id]}),
     ]
     for u, payload in posts:
-        code, body = _http_post_json(u, payload, headers=headers)
+        code, body = _http_post_json(u, payload, headers=headers, timeout=3.0)
         if code and code < 500 and isinstance(body, dict) and (body.get("code") in (0, "0")):
             return True
     return False
@@ -1270,22 +1227,32 @@ def init_account_module(app, settings, db: Any, tm: Any) -> None:
             # 4) Старт драйвера — основной путь: start_adspower
             t0 = time.perf_counter()
             _wiz_log(wiz, "→ Запуск браузера через AdsPower API (start_adspower)…")
-            try:
-                wiz.driver = start_adspower(
-                    profile=wiz.profile_id,
-                    headless=False,          # мастер всегда видимый
-                    api_base=api_base,
-                    token=token,
-                    window_size="1600,900",
-                    timeout=45.0,
-                )
-                _wiz_log(wiz, f"✓ Драйвер готов ({int((time.perf_counter()-t0)*1000)} ms)")
-            except AdsPowerError as e:
-                _wiz_log(wiz, f"⚠ start_adspower не удался: {e}. Пробуем fallback v2…")
-                # --- Fallback v2 ---
-                t1 = time.perf_counter()
-                wiz.driver = _start_driver_v2_fallback(wiz, wiz.profile_id)
-                _wiz_log(wiz, f"✓ Драйвер готов через fallback v2 ({int((time.perf_counter()-t1)*1000)} ms)")
+
+            def _start_wizard_driver() -> Any:
+                try:
+                    drv = start_adspower(
+                        profile=wiz.profile_id,
+                        headless=False,          # мастер всегда видимый
+                        api_base=api_base,
+                        token=token,
+                        window_size="1600,900",
+                        timeout=45.0,
+                    )
+                    _wiz_log(wiz, f"✓ Драйвер готов ({int((time.perf_counter()-t0)*1000)} ms)")
+                    return drv
+                except AdsPowerError as e:
+                    _wiz_log(wiz, f"⚠ start_adspower не удался: {e}. Пробуем fallback v2…")
+                    # --- Fallback v2 ---
+                    t1 = time.perf_counter()
+                    drv = _start_driver_v2_fallback(wiz, wiz.profile_id)
+                    _wiz_log(wiz, f"✓ Драйвер готов через fallback v2 ({int((time.perf_counter()-t1)*1000)} ms)")
+                    return drv
+
+            # через общий пул: тёплый видимый браузер профиля переиспользуется,
+            # headless-экземпляр (после sync и т.п.) пул закроет сам перед стартом
+            wiz.driver = get_driver_pool().acquire(
+                wiz.profile_id, headless=False, start=_start_wizard_driver, timeout=60.0
+            )
 
             # 5) Навигация
             try:
@@ -2301,9 +2268,13 @@ def init_account_module(app, settings, db: Any, tm: Any) -> None:
         else:
             os.environ.pop("ADS_AI_HEADLESS", None)
 
-        # Закрыть драйвер
+        # Закрыть драйвер (мастер интерактивный — в пуле видимое окно не оставляем)
         try:
-            _stop_adspower_driver(wiz.driver)
+            pool = get_driver_pool()
+            if pool.owns(wiz.driver):
+                pool.release(wiz.driver, discard=True)
+            else:
+                _stop_adspower_driver(wiz.driver)
             _wiz_log(wiz, "Драйвер закрыт.")
         except Exception:
             pass
@@ -24,6 +24,10 @@ from ads_ai.config.settings import Settings
 # Общие объекты/БД как в campaigns.py
 from ads_ai.web.campaigns import CampaignDB, _start_adspower_driver
 
+# Общий keep-alive клиент локального API AdsPower (пул соединений, кэш чтений, глобальный откат)
+from ads_ai.browser.adspower_client import get_adspower_client, http_get_json as _http_get_json, is_rate_limited
+from ads_ai.utils.gate import AdaptiveGate
+
 # Лейаут/защита/аутентификация/утилиты
 from ads_ai.web.account import (
     _require_user,   # проверка логина
@@ -36,43 +40,6 @@ from ads_ai.web.account import (
 
 # ============================ Вспомогательные парсеры/HTTP ============================
 
-def _http_get_json(
-    url: str,
-    headers: Optional[Dict[str, str]] = None,
-    timeout: float = 6.0,
-) -> Tuple[int, Dict[str, Any]]:
-    try:
-        import requests  # type: ignore
-    except Exception:
-        requests = None  # type: ignore
-
-    if requests:
-        try:
-            resp = requests.get(url, headers=headers or {}, timeout=timeout)  # type: ignore
-            body: Dict[str, Any] = {}
-            try:
-                body = resp.json() if resp.content else {}
-            except Exception:
-                body = {"raw": resp.text}
-            return int(resp.status_code), body
-        except Exception:
-            return 0, {}
-
-    import urllib.request
-    req = urllib.request.Request(url, headers=headers or {})
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:  # type: ignore
-            data = resp.read()
-            if data:
-                try:
-                    return int(resp.getcode() or 0), json.loads(data.decode("utf-8"))
-                except Exception:
-                    return int(resp.getcode() or 0), {"raw": data.decode("utf-8", "ignore")}
-            return int(resp.getcode() or 0), {}
-    except Exception:
-        return 0, {}
-
-
 def _safe_timestamp(value: Any) -> float:
     try:
         if value is None:
@@ -328,9 +295,6 @@ _ADSP_RATE_LIMIT_MAX_RETRIES = _parse_int_env("ADS_AI_ADSPOWER_RETRIES", 4)
 _ADSP_RATE_LIMIT_BASE_DELAY = _parse_float_env("ADS_AI_ADSPOWER_BACKOFF", 1.0)
 _ADSP_PROFILE_FETCH_THROTTLE = max(0.0, _parse_float_env("ADS_AI_ADSPOWER_THROTTLE", 0.25))
 _ADSP_DRIVER_SEMAPHORE = threading.BoundedSemaphore(max(1, _ADSP_MAX_CONCURRENT_DRIVERS))
-_ADSP_RATE_LIMIT_GLOBAL_BACKOFF = _parse_float_env("ADS_AI_ADSPOWER_GLOBAL_BACKOFF", 3.0)
-_ADSP_THROTTLE_LOCK = threading.RLock()
-_ADSP_THROTTLE_UNTIL = 0.0
 
 # Batch/лимиты
 _EMAIL_RECENT_LIMIT = 25
@@ -369,15 +333,11 @@ def _await_ga_throttle():
         time.sleep(min(remain, 1.5) + random.uniform(0.01, 0.12))
 
 def _note_adspower_rate_limit():
-    global _ADSP_THROTTLE_UNTIL
-    with _ADSP_THROTTLE_LOCK:
-        _ADSP_THROTTLE_UNTIL = max(_ADSP_THROTTLE_UNTIL, time.time() + _ADSP_RATE_LIMIT_GLOBAL_BACKOFF)
+    # общий штраф живёт в клиенте AdsPower: его видят все модули процесса
+    get_adspower_client().note_rate_limit()
 
 def _await_adspower_throttle():
-    with _ADSP_THROTTLE_LOCK:
-        remain = _ADSP_THROTTLE_UNTIL - time.time()
-    if remain > 0:
-        time.sleep(min(remain, 2.5) + random.uniform(0.02, 0.14))
+    get_adspower_client().await_throttle()
 
 def _await_email_rate_slot():
     global _EMAIL_RATE_NEXT_TS
@@ -478,64 +438,7 @@ def _mirror_otp_secret_to_paths(paths: List[str], user_email: str, profile_id: s
                 print(f"[accounts] mirror otp_secret failed path={path} err={exc}", flush=True)
                 _LEGACY_DB_WARNED.add(cache_key)
 
-# -------- AdaptiveGate: динамический лимитер параллельных фетчей к Google --------
-class AdaptiveGate:
-    def __init__(self, initial: int, min_limit: int, max_limit: int, relax_every: int = 10):
-        self._limit = max(min_limit, min(initial, max_limit))
-        self._min = max(1, min_limit)
-        self._max = max(self._min, max_limit)
-        self._active = 0
-        self._cv = threading.Condition()
-        self._success = 0
-        self._relax_every = max(1, relax_every)
-
-    def acquire(self):
-        with self._cv:
-            while self._active >= self._limit:
-                self._cv.wait(0.2)
-            self._active += 1
-
-    def release(self):
-        with self._cv:
-            self._active -= 1
-            if self._active < 0:
-                self._active = 0
-            self._cv.notify()
-
-    @contextmanager
-    def slot(self):
-        self.acquire()
-        try:
-            yield
-        finally:
-            self.release()
-
-    def tighten(self, step: int = 1):
-        with self._cv:
-            new_limit = max(self._min, self._limit - max(1, step))
-            if new_limit != self._limit:
-                self._limit = new_limit
-                print(f"[gate] tighten → {self._limit}", flush=True)
-                self._cv.notify_all()
-
-    def relax(self, step: int = 1):
-        with self._cv:
-            new_limit = min(self._max, self._limit + max(1, step))
-            if new_limit != self._limit:
-                self._limit = new_limit
-                print(f"[gate] relax → {self._limit}", flush=True)
-                self._cv.notify_all()
-
-    def mark_success(self):
-        with self._cv:
-            self._success += 1
-            if self._success >= self._relax_every:
-                self._success = 0
-                if self._limit < self._max:
-                    self._limit += 1
-                    print(f"[gate] auto-relax → {self._limit}", flush=True)
-                    self._cv.notify_all()
-
+# -------- AdaptiveGate (ads_ai/utils/gate.py): динамический лимитер параллельных фетчей к Google --------
 _GOOGLE_GATE = AdaptiveGate(
     initial=min(_GOOGLE_CONCURRENCY_TARGET, _ADSP_MAX_CONCURRENT_DRIVERS * 2),
     min_limit=_GOOGLE_CONCURRENCY_MIN,
@@ -589,12 +492,7 @@ def _start_email_enrich_job(db: CampaignDB, user_email: str, accounts: List[Dict
 # ============================ Selenium/driver helpers ============================
 
 def _is_adspower_rate_limited(message: str) -> bool:
-    msg = (message or "").lower()
-    return (
-        "too many request per second" in msg
-        or "too many requests per second" in msg
-        or ("rate limit" in msg and "adspower" in msg)
-    )
+    return is_rate_limited(message)
 
 @contextmanager
 def _adspower_driver_slot() -> Iterator[None]:
@@ -19,12 +19,14 @@ from ads_ai.config.settings import load_settings, Settings
 from ads_ai.browser.adspower import start_adspower
 from ads_ai.llm.gemini import GeminiClient
 from ads_ai.plan.runtime import Runtime
+from ads_ai.plan.pipeline import SpeculativePlanner, plan_looks_applicable
 from ads_ai.plan.repair import make_default_repairer
 from ads_ai.tracing.trace import make_trace, JsonlTrace
 from ads_ai.tracing.artifacts import Artifacts, take_screenshot, save_html_snapshot
 from ads_ai.storage.vars import VarStore
 from ads_ai.utils.ids import now_id
 from ads_ai.web.home import HOME_HTML
+from ads_ai.web.preview_hub import MJPEG_MIMETYPE, get_preview_hub, mjpeg_stream
 from ads_ai.web.auth import init_auth
 from ads_ai.web.profile import init_profile
 from ads_ai.web.gads_sync import init_gads_sync
@@ -55,7 +57,9 @@ class AppState:
 
     # live-screenshot cache
     last_shot_png: Optional[bytes] = None
-    last_shot_src: str = "none"             # 'cdp' | 'driver' | 'none'
+    last_shot_src: str = "none"             # 'cdp' | 'driver' | 'screencast' | 'none'
+    last_shot_mime: str = "image/png"       # screencast шлёт JPEG
+    last_view_ts: float = 0.0               # последний запрос кадра из UI (захват только при зрителях)
     last_shot_ts: float = 0.0               # unix time (sec)
     etag: str = "0"                         # для клиентского сравнения
 
@@ -1192,49 +1196,84 @@ def _screenshot_png(driver) -> tuple[bytes, str]:
     return driver.get_screenshot_as_png(), "driver"
 
 
-def _update_shot_cache(state: AppState, data: bytes, src: str) -> None:
+def _update_shot_cache(state: AppState, data: bytes, src: str, mime: str = "image/png") -> None:
     state.last_shot_png = data
     state.last_shot_src = src
+    state.last_shot_mime = mime
     state.last_shot_ts = time.time()
     state.etag = str(int(state.last_shot_ts * 1000))
 
 
+def _shot_watched(state: AppState) -> bool:
+    """UI недавно запрашивал /api/screenshot — есть смысл держать захват."""
+    idle = float(os.getenv("ADS_AI_SHOT_IDLE_SEC", "15") or 15)
+    return (time.time() - state.last_view_ts) < idle
+
+
+def _apply_viewport_metrics(state: AppState, m: Any) -> None:
+    if isinstance(m, dict):
+        state.last_vp_w = int(m.get("w", 0) or 0)
+        state.last_vp_h = int(m.get("h", 0) or 0)
+        state.last_dpr = float(m.get("dpr", 1) or 1)
+        state.last_scroll_x = float(m.get("sx", 0) or 0.0)
+        state.last_scroll_y = float(m.get("sy", 0) or 0.0)
+
+
+def _refresh_viewport_metrics(state: AppState) -> None:
+    """
+    Метрики вьюпорта по фоновой DevTools-сессии (без state.lock и канала WebDriver).
+    Без неё — прежний execute_script под коротким захватом state.lock.
+    """
+    try:
+        from ads_ai.browser.screencast import viewport_metrics
+        m = viewport_metrics(state.driver)
+    except Exception:
+        m = None
+    if m is not None:
+        _apply_viewport_metrics(state, m)
+        return
+    acquired = state.lock.acquire(timeout=0.1)
+    if not acquired:
+        return
+    try:
+        _apply_viewport_metrics(state, state.driver.execute_script(
+            "return {w:window.innerWidth||0,h:window.innerHeight||0,dpr:window.devicePixelRatio||1,"
+            "sx:window.scrollX||0,sy:window.scrollY||0};"
+        ))
+    except Exception:
+        pass
+    finally:
+        try:
+            state.lock.release()
+        except Exception:
+            pass
+
+
 def _start_shot_worker(state: AppState, interval_sec: float = 1.0) -> None:
-    """Фоновый воркер, который периодически обновляет кадр и метрики без блокировок UI."""
+    """
+    Фоновый воркер: пока UI смотрит, держит подписку на общий хаб превью (web/preview_hub.py)
+    и кэширует последний кадр + метрики. Никто не смотрит — захвата нет.
+    """
     def _loop() -> None:
         while not state.worker_stop.is_set():
-            t0 = time.time()
-            acquired = state.lock.acquire(timeout=0.1)
-            try:
-                if acquired:
-                    try:
-                        data, src = _screenshot_png(state.driver)
-                        _update_shot_cache(state, data, src)
-                    except Exception:
-                        pass
-                    # viewport metrics
-                    try:
-                        m = state.driver.execute_script(
-                            "return {w:window.innerWidth||0,h:window.innerHeight||0,dpr:window.devicePixelRatio||1,"
-                            "sx:window.scrollX||0,sy:window.scrollY||0};"
-                        )
-                        if isinstance(m, dict):
-                            state.last_vp_w = int(m.get("w", 0) or 0)
-                            state.last_vp_h = int(m.get("h", 0) or 0)
-                            state.last_dpr = float(m.get("dpr", 1) or 1)
-                            state.last_scroll_x = float(m.get("sx", 0) or 0.0)
-                            state.last_scroll_y = float(m.get("sy", 0) or 0.0)
-                    except Exception:
-                        pass
-            finally:
-                if acquired:
-                    try:
-                        state.lock.release()
-                    except Exception:
-                        pass
-            dt = time.time() - t0
-            delay = max(0.15, interval_sec - dt)
-            state.worker_stop.wait(delay)
+            if not _shot_watched(state):
+                state.worker_stop.wait(0.5)
+                continue
+            ch = get_preview_hub().channel(state.driver)
+            metrics_ts = 0.0
+            stop = lambda: state.worker_stop.is_set() or not _shot_watched(state)  # noqa: E731
+            for fr in ch.frames(timeout=1.0, stop=stop):
+                if fr is not None:
+                    _update_shot_cache(state, fr.raw, ch.source, fr.mime)
+                    if fr.vw and fr.vh:
+                        state.last_vp_w, state.last_vp_h = fr.vw, fr.vh
+                    if fr.scroll_x is not None:
+                        state.last_scroll_x = float(fr.scroll_x)
+                        state.last_scroll_y = float(fr.scroll_y or 0.0)
+                # скролл/dpr без screencast — прежним execute_script, не чаще interval_sec
+                if (fr is None or fr.scroll_x is None) and time.time() - metrics_ts >= interval_sec:
+                    _refresh_viewport_metrics(state)
+                    metrics_ts = time.time()
 
     th = threading.Thread(target=_loop, name="shot-worker", daemon=True)
     state.worker_thread = th
@@ -1243,6 +1282,11 @@ def _start_shot_worker(state: AppState, interval_sec: float = 1.0) -> None:
 
 # --------- StreamTrace: обёртка, прокидывающая события в SSE очередь ----------
 
+class _TraceEvent(dict):
+    """Событие трейса вместе с его JSON: сериализуется один раз — и для файла, и для SSE."""
+    json_line: str = ""
+
+
 class _StreamTrace:
     """Оборачивает JsonlTrace и дублирует все .write(...) в очередь событий."""
     def __init__(self, base: JsonlTrace, q: "queue.Queue[dict]"):
@@ -1250,15 +1294,17 @@ class _StreamTrace:
         self._q = q
 
     def write(self, data: Dict[str, Any]) -> None:
-        # Не допускаем не-JSON сериализуемых полей
         try:
-            _ = json.dumps(data, ensure_ascii=False)
+            payload, line = self._base.encode(data)
         except Exception:
             # мягкая деградация: обернём в строку
-            data = {"event": "trace_error", "payload": str(data)[:500]}
-        self._base.write(data)
+            payload = {"event": "trace_error", "payload": str(data)[:500]}
+            line = json.dumps(payload, ensure_ascii=False)
+        self._base.write_line(line)
+        ev = _TraceEvent(payload)
+        ev.json_line = line
         try:
-            self._q.put_nowait(data)
+            self._q.put_nowait(ev)
         except Exception:
             pass
 
@@ -1300,7 +1346,7 @@ def create_app(
 
     # vars → артефакты
     vars_path = s.paths.artifacts_root / "vars.json"
-    vstore = VarStore(vars_path)
+    vstore = VarStore.shared(vars_path)
 
     # LLM
     ai = GeminiClient(
@@ -1411,16 +1457,17 @@ def create_app(
             src = "cache"
             etag = "0"
             try:
+                _state.last_view_ts = time.time()  # type: ignore[union-attr]
                 data = _state.last_shot_png  # type: ignore[union-attr]
                 etag = _state.etag           # type: ignore[union-attr]
                 if data is None:
-                    if _state.lock.acquire(timeout=0.1):  # type: ignore[union-attr]
-                        try:
-                            data, src = _screenshot_png(_state.driver)  # type: ignore[union-attr]
-                            _update_shot_cache(_state, data, src)       # type: ignore[union-attr]
-                            etag = _state.etag                          # type: ignore[union-attr]
-                        finally:
-                            _state.lock.release()  # type: ignore[union-attr]
+                    # холодный старт: разовый кадр через хаб превью (фоновая CDP-сессия, без state.lock)
+                    ch = get_preview_hub().channel(_state.driver)  # type: ignore[union-attr]
+                    fr = ch.snapshot(timeout=2.0)
+                    if fr is not None:
+                        _update_shot_cache(_state, fr.raw, ch.source, fr.mime)  # type: ignore[arg-type]
+                        data, src = fr.raw, ch.source
+                        etag = _state.etag  # type: ignore[union-attr]
             except Exception:
                 pass
 
@@ -1428,7 +1475,7 @@ def create_app(
                 return make_response("no screenshot", 503)
 
             resp = make_response(data)
-            resp.headers["Content-Type"] = "image/png"
+            resp.headers["Content-Type"] = _state.last_shot_mime  # type: ignore[union-attr]
             resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
             resp.headers["Pragma"] = "no-cache"
             resp.headers["Expires"] = "0"
@@ -1438,6 +1485,18 @@ def create_app(
         except Exception as e:
             return make_response(f"no screenshot: {e}", 500)
 
+    @app.route("/api/screenshot.mjpeg", methods=["GET"])
+    def screenshot_mjpeg() -> Response:
+        """Живое превью бинарным multipart MJPEG: один захват на драйвер для всех зрителей."""
+        drv = getattr(_state, "driver", None)
+        if drv is None:
+            return make_response("no driver", 503)
+        ch = get_preview_hub().channel(drv)
+        resp = Response(mjpeg_stream(ch), mimetype=MJPEG_MIMETYPE)
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
+
     @app.route("/api/scroll", methods=["POST"])
     def scroll() -> Response:
         """Скролл страницы из Web UI. Если драйвер занят — 409 (тихо)."""
@@ -1571,44 +1630,79 @@ def create_app(
     def run_stream() -> Response:
         task = (request.args.get("task") or "").strip()
         mode = (request.args.get("mode") or "pe").strip().lower()
-        if not task:
+        resume_key = (request.args.get("resume") or "").strip()  # run_id прерванного legacy-прогона
+        if resume_key:
+            mode = "legacy"
+        if not task and not resume_key:
             return Response('data: {"event":"error","error":"empty task"}\n\n', mimetype="text/event-stream", status=400)
 
         def _yield(data: Dict[str, Any]) -> str:
-            # единая точка сериализации (на случай не-ASCII)
+            # единая точка сериализации (на случай не-ASCII); события трейса уже сериализованы
+            line = getattr(data, "json_line", "")
+            if line:
+                return "data: " + line + "\n\n"
             try:
                 return "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
             except Exception:
                 return "data: " + json.dumps({"event": "error", "error": "serialization_failed"}) + "\n\n"
 
         def generate_legacy() -> Any:
-            """Старый режим: единый план → run(). Оставлен без изменений."""
+            """
+            Старый режим: единый план → run().
+            resume=<run_id>: продолжить прерванный прогон с чекпоинта (экран сверяется);
+            не вышло — событие resume_failed и обычный запуск, если задан task.
+            """
+            resumed = False
             with _state.lock:  # type: ignore[union-attr]
                 rt, trace, artifacts, run_id = _new_runtime(_state)  # type: ignore[arg-type]
                 q: "queue.Queue[dict]" = queue.Queue(maxsize=1000)
                 strace = _StreamTrace(trace, q)
                 rt.trace = strace
 
-                html_view = rt.guards.dom_snapshot()
-                known_vars = _state.vars.vars
-                plan: List[Dict[str, Any]] = _state.ai.plan_full(html_view, task, [], known_vars)  # type: ignore[union-attr]
+            plan_norm: List[Dict[str, Any]] = []
+            if resume_key:
+                # сверка экрана (навигация, до ~20 с) — вне _state.lock; busy держит UI-действия в стороне
+                _state.busy = True  # type: ignore[union-attr]
+                _state.busy_since = time.time()  # type: ignore[union-attr]
                 try:
-                    cur = (_state.driver.current_url or "")  # type: ignore[union-attr]
-                except Exception:
-                    cur = ""
-                plan_norm = _normalize_plan_steps(plan if isinstance(plan, list) else [], cur)
-                strace.write({"event": "plan_full", "steps": plan})
-                strace.write({"event": "plan_normalized", "steps": plan_norm})
+                    resumed = rt.resume(resume_key)
+                finally:
+                    _state.busy = False  # type: ignore[union-attr]
+                    _state.busy_since = 0.0  # type: ignore[union-attr]
+                if resumed:
+                    plan_norm = list(rt.plan)
+            if not resumed and task:
+                with _state.lock:  # type: ignore[union-attr]
+                    html_view = rt.guards.dom_snapshot()
+                    known_vars = _state.vars.vars
+                    plan: List[Dict[str, Any]] = _state.ai.plan_full(html_view, task, [], known_vars)  # type: ignore[union-attr]
+                    try:
+                        cur = (_state.driver.current_url or "")  # type: ignore[union-attr]
+                    except Exception:
+                        cur = ""
+                    plan_norm = _normalize_plan_steps(plan if isinstance(plan, list) else [], cur)
+                    strace.write({"event": "plan_full", "steps": plan})
+                    strace.write({"event": "plan_normalized", "steps": plan_norm})
+
+            if resume_key and not resumed:
+                yield _yield({"event": "resume_failed", "run_id": resume_key})
+                if not task:
+                    yield _yield({"event": "end"})
+                    return
 
             # стартовая пачка чипов
-            yield _yield({"event": "start", "run_id": run_id, "plan": plan_norm})
+            start_ev: Dict[str, Any] = {"event": "start", "run_id": run_id, "plan": plan_norm}
+            if resumed:
+                start_ev.update({"resumed_from": resume_key, "resume_idx": rt.step_idx})
+            yield _yield(start_ev)
 
             # задний поток
             def _runner() -> None:
                 _state.busy = True  # type: ignore[union-attr]
                 _state.busy_since = time.time()  # type: ignore[union-attr]
                 try:
-                    rt.set_plan(plan_norm, task)
+                    if not resumed:
+                        rt.set_plan(plan_norm, task)
                     res = rt.run()
                     if _state.lock.acquire(timeout=0.5):  # type: ignore[union-attr]
                         try:
@@ -1667,6 +1761,8 @@ def create_app(
               - для первой подцели отправить 'start', для остальных — 'plan_chunk' (append),
               - запустить run() в отдельном потоке и проксировать его события (step_result/ok/fail/run_done),
               - (опционально) один раунд verify_or_adjust с fix_steps (также чанк).
+            Пока исполняется подцель N, план N+1 запрашивается в фоне (settings.planner.pipeline);
+            если N ушла с курса (verify=retry, скипы, переплан) — спекулятивный план выбрасывается.
             """
             with _state.lock:  # type: ignore[union-attr]
                 rt, trace, _art, run_id = _new_runtime(_state)  # type: ignore[arg-type]
@@ -1733,6 +1829,7 @@ def create_app(
             # --- основной цикл по подцелям
             first_chunk = True
             history_done: List[Dict[str, Any]] = []
+            spec = SpeculativePlanner() if (getattr(_state.settings.planner, "pipeline", False) and len(subgoals) > 1) else None  # type: ignore[union-attr]
             for idx, sg in enumerate(subgoals, start=1):
                 # 1) план шагов подцели
                 with _state.lock:  # безопасно берём актуальный DOM/URL
@@ -1744,13 +1841,34 @@ def create_app(
                 known_vars = _state.vars.vars
 
                 plan_for_sg: List[Dict[str, Any]] = []
-                try:
-                    plan_for_sg = _state.ai.plan_subgoal_steps(html_view, task, sg, history_done, known_vars, max_steps=6)  # type: ignore[union-attr]
-                except Exception as e:
-                    strace.write({"event": "llm_error", "where": "plan_subgoal_steps", "err": repr(e), "sg": sg})
+                prefetched = None
+                if spec is not None:
+                    prefetched = spec.take(
+                        idx,
+                        accept=lambda p: plan_looks_applicable(
+                            _state.driver, _normalize_plan_steps(p, cur_url), _state.vars.render  # type: ignore[union-attr]
+                        ),
+                    )
+                if prefetched is not None:
+                    plan_for_sg = prefetched
+                    strace.write({"event": "subgoal_plan_prefetched", "idx": idx})
+                else:
+                    try:
+                        plan_for_sg = _state.ai.plan_subgoal_steps(html_view, task, sg, history_done, known_vars, max_steps=6)  # type: ignore[union-attr]
+                    except Exception as e:
+                        strace.write({"event": "llm_error", "where": "plan_subgoal_steps", "err": repr(e), "sg": sg})
                 plan_norm = _normalize_plan_steps(plan_for_sg if isinstance(plan_for_sg, list) else [], cur_url)
                 strace.write({"event": "subgoal_plan", "idx": idx, "count": len(plan_norm), "title": (sg.get('title') or sg.get('goal') or f'Subgoal {idx}')})
 
+                # конвейер: план следующей подцели — в фоне, пока исполняется эта
+                if spec is not None and plan_norm and idx < len(subgoals):
+                    spec.prefetch(
+                        idx + 1,
+                        lambda v=html_view, g=subgoals[idx], h=list(history_done) + list(plan_norm), kv=dict(known_vars): (
+                            _state.ai.plan_subgoal_steps(v, task, g, h, kv, max_steps=6) or []  # type: ignore[union-attr]
+                        ),
+                    )
+
                 # выдаём чипы в UI: стартовая пачка или догрузка
                 if first_chunk:
                     first_chunk = False
@@ -1759,6 +1877,8 @@ def create_app(
                     yield _yield({"event": "plan_chunk", "plan": plan_norm})  # append
 
                 # 2) запускаем run() этой пачки в отдельном потоке; стримим события
+                off_course = {"v": False}
+
                 def _runner_chunk(steps: List[Dict[str, Any]], title: str) -> None:
                     _state.busy = True  # type: ignore[union-attr]
                     _state.busy_since = time.time()  # type: ignore[union-attr]
@@ -1767,7 +1887,9 @@ def create_app(
                         res = rt.run()
                         # накапливаем историю в замыкании (без гонок на driver)
                         history_done.extend(res.done_steps)
+                        off_course["v"] = bool(res.replan_suggested or res.stats.skips or res.stats.replans)
                     except Exception as e:
+                        off_course["v"] = True
                         strace.write({"event": "run_error", "error": repr(e)})
                     finally:
                         _state.busy = False  # type: ignore[union-attr]
@@ -1799,6 +1921,10 @@ def create_app(
                     vr = {}
                     strace.write({"event": "llm_error", "where": "verify_or_adjust", "err": repr(e), "sg": sg})
 
+                if spec is not None and (off_course["v"] or not isinstance(vr, dict) or vr.get("status") in ("retry", "blocked")):
+                    spec.discard(idx + 1, reason="course_changed")
+                    strace.write({"event": "subgoal_prefetch_discarded", "idx": idx + 1})
+
                 if isinstance(vr, dict) and vr.get("status") == "retry":
                     fix = vr.get("fix_steps") or []
                     try:
@@ -1840,6 +1966,9 @@ def create_app(
                             yield _yield(ev)
 
             # завершение
+            if spec is not None:
+                spec.close()
+                strace.write({"event": "pipeline_stats", **spec.stats()})
             yield _yield({"event": "end"})
 
         # Выбор режима
@@ -48,6 +48,8 @@ except Exception:  # pragma: no cover
 from selenium.webdriver.remote.webdriver import WebDriver, WebElement
 from selenium.webdriver.common.by import By
 
+from ads_ai.browser.pool import get_driver_pool
+
 
 # =============================================================================
 #                           HEADLESS SWITCH (1/0)
@@ -297,53 +299,50 @@ def _start_driver(profile_id: str, *, headless: bool) -> Any:
     return drv
 
 
+def _prepare_driver(drv: Any) -> None:
+    """Настройки модуля — на каждой аренде из пула."""
+    try:
+        drv.set_page_load_timeout(25)
+        drv.set_script_timeout(15)
+    except Exception:
+        pass
+    _ensure_big_viewport(drv)
+
+
 def _get_or_create_driver(profile_id: str, *, headless: bool) -> Any:
     """
     Возвращает драйвер, гарантированно привязанный к данному profile_id/headless.
+    Берётся в аренду из общего пула (тёплый, если профиль уже открыт другим модулем);
+    вернуть — _close_local_driver(driver).
     """
-    d = _local.driver
-    if d is not None and _local.profile_id == profile_id and _local.headless == headless:
-        _ensure_big_viewport(d)
-        return d
+    def _start() -> Any:
+        drv = _start_driver(profile_id, headless=headless)
+        try:
+            drv.get("https://ads.google.com/aw/overview")
+        except Exception:
+            pass
+        return drv
 
+    drv = get_driver_pool().acquire(profile_id, headless=headless, start=_start, prepare=_prepare_driver)
     with _local.lock:
-        # закрыть предыдущий, если другой профиль/режим
-        if _local.driver is not None and (_local.profile_id != profile_id or _local.headless != headless):
-            try:
-                _local.driver.quit()
-            except Exception:
-                pass
-            _local.driver = None
-            _local.profile_id = None
-
-        if _local.driver is None:
-            drv = _start_driver(profile_id, headless=headless)
-            _local.driver = drv
-            _local.profile_id = profile_id
-            _local.headless = headless
-            try:
-                drv.get("https://ads.google.com/aw/overview")
-            except Exception:
-                pass
-            _ensure_big_viewport(drv)
-
-    return _local.driver
+        _local.driver = drv
+        _local.profile_id = profile_id
+        _local.headless = headless
+    return drv
 
 
-def _close_local_driver() -> None:
+def _close_local_driver(driver: Optional[Any] = None) -> None:
     """
-    Мягко закрывает локальный драйвер (ветка profile_id/company_id) и очищает состояние.
+    Возвращает локальный драйвер (ветка profile_id/company_id) в общий пул и очищает состояние.
     Общий драйвер из /console сюда не попадает.
     """
     with _local.lock:
-        drv = _local.driver
-        _local.driver = None
-        _local.profile_id = None
-        try:
-            if drv is not None:
-                drv.quit()
-        except Exception:
-            pass
+        drv = driver if driver is not None else _local.driver
+        if drv is _local.driver:
+            _local.driver = None
+            _local.profile_id = None
+    if drv is not None:
+        get_driver_pool().release(drv)
 
 
 # =============================================================================
@@ -942,9 +941,9 @@ def init_bulk_remove(app: Flask, settings: Settings) -> None:
                 _release_shared_driver(holder)
 
         # ИНАЧЕ — гарантированно работаем в нужном профиле (headless по умолчанию из тумблера/запроса)
+        driver = None
         try:
             driver = _get_or_create_driver(pid, headless=headless)
-            _ensure_big_viewport(driver)
             result = remove_campaigns_by_names(
                 driver, names, open_url=open_url, timeout=timeout, emit=_log
             )
@@ -963,5 +962,6 @@ def init_bulk_remove(app: Flask, settings: Settings) -> None:
                 "bulk_remove_logs": logs,
             }), 500
         finally:
-            # ВАЖНО: локальный драйвер закрываем автоматически после операции
-            _close_local_driver()
+            # ВАЖНО: локальный драйвер после операции возвращаем в пул (браузер остаётся тёплым)
+            if driver is not None:
+                _close_local_driver(driver)
@@ -31,7 +31,7 @@ import time
 import uuid
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from flask import (
     Flask, Response, abort, jsonify, make_response, redirect, request, send_file,
@@ -48,6 +48,10 @@ if not log.handlers:
 
 # =============================== МЯГКИЕ ИМПОРТЫ ============================
 
+from ads_ai.browser.pool import get_driver_pool
+from ads_ai.browser.ui_map import collect_ui_map
+from ads_ai.llm.dom_delta import DomDelta
+from ads_ai.llm.dom_prune import prune_html
 from ads_ai.config.settings import Settings
 from ads_ai.storage.vars import VarStore
 
@@ -570,9 +574,8 @@ class ControlState:
     paused: bool = False
     abort: bool = False
     manual_actions: "queue.Queue[Dict[str, Any]]" = field(default_factory=queue.Queue)
-    preview_q: "queue.Queue[str]" = field(default_factory=lambda: queue.Queue(maxsize=12))
     preview_stop: threading.Event = field(default_factory=threading.Event)
-    preview_thread: Optional[threading.Thread] = None
+    preview_driver: Any = None   # драйвер задачи для хаба превью (web/preview_hub.py)
 
 class TaskManager:
     def __init__(self, settings: Settings, db: CampaignDB, paths: _Paths):
@@ -689,9 +692,10 @@ class TaskManager:
         stage("profile:lock", "acquired", profile_id=spec.profile_id)
 
         driver = None
+        vstore: Optional[VarStore] = None
         try:
             # 0) опц. LLM (ad texts)
-            vstore = VarStore(self.paths.vars_file)
+            vstore = VarStore.shared(self.paths.vars_file)
             g = _make_gemini_safe(self.settings)
             ai_texts = {"headlines": [], "descriptions": [], "keywords": []}
             if g is not None:
@@ -792,6 +796,11 @@ class TaskManager:
             except Exception:
                 pass
         finally:
+            if vstore is not None:
+                try:
+                    vstore.close()
+                except Exception:
+                    pass
             if _clear_confirm_totp_secret:
                 try:
                     _clear_confirm_totp_secret()
@@ -804,9 +813,8 @@ class TaskManager:
                     pass
             try:
                 ctrl.preview_stop.set()
-                th = ctrl.preview_thread
-                if th and th.is_alive():
-                    th.join(timeout=1.2)
+                from ads_ai.web.preview_hub import get_preview_hub
+                get_preview_hub().forget(driver)
             except Exception:
                 pass
             try:
@@ -976,6 +984,8 @@ class CampaignEngine:
         self.pause_between_batches: float = float(getattr(getattr(settings, "humanize", object()), "micro_pause", 0.4) or 0.4)
 
         self.history_done: List[Dict[str, Any]] = []
+        # прошлая UI-карта прогона: на той же странице LLM получает diff, а не всю карту
+        self.dom_delta = DomDelta(full_renderer=lambda ui: _build_llm_ui_html(ui, {"goal": spec.goal}))
 
     # ------------------------- публичный запуск ---------------------------
 
@@ -1009,11 +1019,11 @@ class CampaignEngine:
                 self.emit("log", {"msg": "Автопилот: исключение", "error": str(e)})
 
             # 2) LLM планирование следующего микро-батча
-            html_view, ui_meta = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal})
+            html_view, ui_meta = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal}, delta=self.dom_delta)
             self.emit("ui:scan", {"batch": batch_idx, **ui_meta})
             if not (isinstance(html_view, str) and html_view.strip()):
                 self.emit("info", {"msg": "LLM UI-view пуст — фоллбек на полный DOM"})
-                html_view = _get_visible_dom(self.driver)
+                html_view = self._visible_dom()
 
             steps: List[Dict[str, Any]] = []
             if self.llm is not None and self.llm_prompts is not None:
@@ -1042,7 +1052,7 @@ class CampaignEngine:
             if not steps:
                 empty_steps_in_row += 1
                 # проверим статус
-                hv = html_view if isinstance(html_view, str) and html_view.strip() else _get_visible_dom(self.driver)
+                hv = html_view if isinstance(html_view, str) and html_view.strip() else self._visible_dom()
                 check = self._completion_status(hv, when="before", batch_idx=batch_idx)
                 self.emit("status", {"batch": batch_idx, "check": check})
 
@@ -1075,10 +1085,10 @@ class CampaignEngine:
             self._pair_artifacts(f"batch_{batch_idx:02d}")
 
             # 4) Проверка статуса после действия
-            html_view_after, ui_meta_after = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal})
+            html_view_after, ui_meta_after = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal}, delta=self.dom_delta)
             self.emit("ui:scan", {"batch": batch_idx, "when": "after", **ui_meta_after})
             if not (isinstance(html_view_after, str) and html_view_after.strip()):
-                html_view_after = _get_visible_dom(self.driver)
+                html_view_after = self._visible_dom()
 
             check = self._completion_status(html_view_after, when="after", batch_idx=batch_idx)
             self.emit("status", {"batch": batch_idx, "check": check})
@@ -1093,9 +1103,9 @@ class CampaignEngine:
                     _execute_steps_with_runner(fin, self.settings, self.arts, self.vstore, self.trace, on_cooperate=cooperate)
                     self.history_done.extend(fin)
                     self._pair_artifacts(f"batch_{batch_idx:02d}_final")
-                    hv_final, _ = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal})
+                    hv_final, _ = _get_llm_dom_view(self.driver, ctx={"goal": self.spec.goal}, delta=self.dom_delta)
                     if not (isinstance(hv_final, str) and hv_final.strip()):
-                        hv_final = _get_visible_dom(self.driver)
+                        hv_final = self._visible_dom()
                     check2 = self._completion_status(hv_final, when="after", batch_idx=batch_idx)
                     if (check2.get("status") or "").lower() == "published":
                         published = True
@@ -1109,6 +1119,15 @@ class CampaignEngine:
 
     # ------------------------- вспомогательные ---------------------------
 
+    def _visible_dom(self) -> str:
+        """Фоллбек-вид страницы для LLM: полный DOM, ужатый по релевантности к задаче."""
+        return _get_visible_dom(
+            self.driver,
+            query=self._task_text(),
+            budget_tokens=int(getattr(getattr(self.settings, "browser", None), "dom_token_budget", 0) or 0) or None,
+            on_prune=lambda meta: self.emit("dom:pruned", meta),
+        )
+
     def _task_text(self) -> str:
         return (
             f"Мы создаём рекламную кампанию Google Ads: тип={self.spec.campaign_type}, цель={self.spec.goal}, "
@@ -1283,13 +1302,38 @@ def _ensure_ready_state_local(driver: Any, timeout: float = 8.0) -> None:
             break
         time.sleep(0.15)
 
-def _get_visible_dom(driver: Any, limit: int = 140_000) -> str:
+def _get_visible_dom(
+    driver: Any,
+    limit: int = 140_000,
+    query: str = "",
+    budget_tokens: Optional[int] = None,
+    on_prune: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> str:
+    """
+    Полный DOM (без script/style); невидимые поддеревья помечены data-ai-hidden="1".
+    Сверх лимита — ужимается по релевантности к query (llm/dom_prune.py), а не отрезается хвостом;
+    budget_tokens по умолчанию ≈ limit/3.5. on_prune получает meta (что выброшено).
+    """
     _switch_to_default_content_safe(driver)
     _ensure_ready_state_local(driver, timeout=6.0)
     js = r"""
-    (function(){
+    return (function(){
       try{
+        const src = document.documentElement.querySelectorAll('*');
         const clone = document.documentElement.cloneNode(true);
+        const dst = clone.querySelectorAll('*');
+        const SKIP = {HEAD:1, TITLE:1, META:1, LINK:1, SCRIPT:1, STYLE:1, OPTION:1, OPTGROUP:1, BR:1};
+        if (src.length === dst.length) {
+          for (let i = 0; i < src.length && i < 60000; i++) {
+            const e = src[i];
+            if (SKIP[e.tagName] || e.getClientRects().length) continue;
+            const p = dst[i].parentElement;
+            if (p && p.getAttribute('data-ai-hidden') === '1') continue;
+            let st = null; try { st = getComputedStyle(e); } catch(_) {}
+            if (st && st.display === 'contents') continue;
+            dst[i].setAttribute('data-ai-hidden', '1');
+          }
+        }
         clone.querySelectorAll('script,style,link[rel="stylesheet"]').forEach(el=>el.remove());
         return '<!doctype html>\n'+clone.outerHTML;
       }catch(e){
@@ -1311,268 +1355,32 @@ def _get_visible_dom(driver: Any, limit: int = 140_000) -> str:
         except Exception:
             html_view = ""
     if len(html_view) > limit:
-        html_view = html_view[:limit] + "\n<!-- TRUNCATED -->"
+        budget = int(budget_tokens) if budget_tokens else int(limit / 3.5)
+        html_view, meta = prune_html(html_view, budget, query=query)
+        if on_prune is not None and meta.get("pruned"):
+            try:
+                on_prune(meta)
+            except Exception:
+                pass
+        if len(html_view) > limit:
+            html_view = html_view[:limit] + "\n<!-- TRUNCATED -->"
     return html_view
 
-def _get_llm_dom_view(driver: Any, ctx: Optional[Dict[str, Any]] = None, limit: int = 60_000) -> Tuple[str, Dict[str, Any]]:
+def _get_llm_dom_view(
+    driver: Any,
+    ctx: Optional[Dict[str, Any]] = None,
+    limit: int = 60_000,
+    delta: Optional[DomDelta] = None,
+) -> Tuple[str, Dict[str, Any]]:
     """
     Компактная UI‑карта: inputs/buttons/tabs/primary с устойчивыми селекторами.
+    С delta — на той же странице отдаётся только diff к прошлому ходу (llm/dom_delta.py).
     Если пусто — вызывающий код сделает фоллбек на _get_visible_dom().
     """
     _switch_to_default_content_safe(driver)
     _ensure_ready_state_local(driver, timeout=6.0)
-    js = r"""
-    (function(){
-      function txt(s){ return (s==null?'':String(s)).replace(/\s+/g,' ').trim(); }
-      function low(s){ return txt(s).toLowerCase(); }
-      function visible(el){
-        if(!(el instanceof Element)) return false;
-        const st = getComputedStyle(el);
-        if(st.display==='none' || st.visibility==='hidden' || st.opacity==='0') return false;
-        const r = el.getBoundingClientRect();
-        if(r.width<2 || r.height<2) return false;
-        if(r.bottom < -100 || r.top > (innerHeight+2000)) return false;
-        return true;
-      }
-      function inSearchContainer(el){
-        let n=el;
-        for(let i=0; i<6 && n; i++){
-          try{
-            if(n.classList && (n.classList.contains('universal-search-container') || n.classList.contains('search'))) return true;
-          }catch(_){}
-          n = (n.parentNode || (n.host||null));
-        }
-        return false;
-      }
-      function isSearchField(el){
-        if(!el) return false;
-        const t = low(el.getAttribute && el.getAttribute('type') || '');
-        const role = low(el.getAttribute && el.getAttribute('role') || '');
-        const al = low(el.getAttribute && el.getAttribute('aria-label') || '');
-        const ph = low(el.getAttribute && el.getAttribute('placeholder') || '');
-        const idtxt = low(el.id || '');
-        const name = low(el.getAttribute && el.getAttribute('name') || '');
-        const any = al+' '+ph+' '+idtxt+' '+name;
-        if(t==='search') return true;
-        if(role==='combobox' && (any.includes('search')||any.includes('поиск'))) return true;
-        if(any.includes('search') || any.includes('поиск')) return true;
-        if(inSearchContainer(el)) return true;
-        return false;
-      }
-      function isEditable(el){
-        if(!(el instanceof HTMLElement)) return false;
-        const tag = el.tagName;
-        if(tag==='TEXTAREA') return true;
-        if(tag==='SELECT') return true;
-        if(tag==='INPUT'){
-          const t = low(el.getAttribute('type')||'text');
-          if(['hidden','button','submit','reset','checkbox','radio','file','color','range','date','time','datetime-local','month','week'].includes(t)) return false;
-          return true;
-        }
-        const names=['md-outlined-text-field','md-filled-text-field','md-text-field','material-input'];
-        return names.some(n => el.matches && el.matches(n));
-      }
-      function isDisabled(el){
-        if(!el) return true;
-        if(el.disabled===true) return true;
-        const ad = low(el.getAttribute('aria-disabled')||'');
-        if(ad==='true') return true;
-        const cl = low(el.className || '');
-        if(cl.includes('disabled')) return true;
-        return false;
-      }
-      function collectRoots(){
-        const roots=[document.documentElement];
-        let frames = 0;
-        const ifrs = document.querySelectorAll('iframe');
-        for(const fr of ifrs){
-          try{
-            const doc = fr.contentDocument || (fr.contentWindow && fr.contentWindow.document);
-            if(doc && doc.documentElement){
-              roots.push(doc.documentElement);
-              frames++;
-            }
-          }catch(_){}
-        }
-        return {roots, frames};
-      }
-      function deepWalk(){
-        const out=[];
-        const {roots, frames} = collectRoots();
-        const pushChildren = (root)=>{
-          if(!root) return;
-          let kids=[];
-          try{ kids = root.children ? Array.from(root.children) : []; }catch(_){ kids = []; }
-          for(const c of kids){ out.push(c); pushChildren(c); }
-          try{
-            if(root.shadowRoot){
-              const sh = root.shadowRoot;
-              const shKids = sh.children ? Array.from(sh.children) : [];
-              for(const k of shKids){ out.push(k); pushChildren(k); }
-            }
-          }catch(_){}
-        };
-        for(const rt of roots){ pushChildren(rt); }
-        return {nodes: out, frames};
-      }
-      function buildXPath(el){
-        try{
-          if(!el || el.nodeType!==1) return '';
-          const parts=[];
-          while(el && el.nodeType===1 && el!==document.body){
-            let idx=1, sib=el;
-            while((sib=sib.previousElementSibling)!=null){ if(sib.nodeName===el.nodeName) idx++; }
-            parts.unshift(el.nodeName.toLowerCase()+'['+idx+']');
-            el = el.parentElement;
-          }
-          return '//' + parts.join('/');
-        }catch(_){ return ''; }
-      }
-      function uniqueSelector(el){
-        const esc = (s)=> s==null?'':String(s).replace(/\\/g,'\\\\').replace(/"/g,'\\"');
-        const q = (sel)=>{ try{ return document.querySelectorAll(sel).length; }catch(_){ return 0; } };
-        if(!el) return '';
-        const id = el.id;
-        if(id && q('#'+id)===1) return '#'+esc(id);
-        const rl = el.getAttribute('role');
-        const al = el.getAttribute('aria-label');
-        if(rl && al){
-          const sel = `[role="${esc(rl)}"][aria-label="${esc(al)}"]`;
-          if(q(sel)===1) return sel;
-          const sel2 = `${el.tagName.toLowerCase()}${sel}`;
-          if(q(sel2)===1) return sel2;
-        }
-        const dv = el.getAttribute('data-value');
-        if(dv){
-          const s1 = `[data-value="${esc(dv)}"]`;
-          if(q(s1)===1) return s1;
-          if(rl){
-            const s2 = `[role="${esc(rl)}"][data-value="${esc(dv)}"]`;
-            if(q(s2)===1) return s2;
-          }
-        }
-        const name = el.getAttribute('name');
-        if(name && el.tagName==='INPUT' && q(`input[name="${esc(name)}"]`)===1) return `input[name="${esc(name)}"]`;
-        if(al && q(`[aria-label="${esc(al)}"]`)===1) return `[aria-label="${esc(al)}"]`;
-        const cls = (el.className||'').split(/\s+/).filter(c=> c && !c.includes('_ngcontent') && !/^_?ng-/.test(c) && !/^\w+-\w+/.test(c)).slice(0,3);
-        if(cls.length){
-          const sel = el.tagName.toLowerCase()+'.'+cls.map(esc).join('.');
-          if(q(sel)===1) return sel;
-        }
-        const rl2 = el.getAttribute('role');
-        if(rl2 && q(`[role="${esc(rl2)}"]`)===1) return `[role="${esc(rl2)}"]`;
-        let cur = el, built='';
-        for(let i=0;i<3;i++){
-          const p = cur.parentElement;
-          if(!p) break;
-          const idx = Array.prototype.indexOf.call(p.children, cur)+1;
-          built = `${p.tagName.toLowerCase()}>${cur.tagName.toLowerCase()}:nth-child(${idx})`;
-          if(q(built)===1) return built;
-          cur = p;
-        }
-        return buildXPath(el) || '';
-      }
-      function pickLabel(el){
-        if(!el) return '';
-        const aria = el.getAttribute('aria-label');
-        if(aria) return aria;
-        const t = txt(el.innerText || el.textContent || '');
-        if(t) return t;
-        if(el.id){
-          try{
-            const lab = document.querySelector(`label[for="${el.id}"]`);
-            if(lab){ const s=txt(lab.innerText||lab.textContent||''); if(s) return s; }
-          }catch(_){}
-        }
-        return '';
-      }
-      const labelsPrimary = ['continue','next','продолжить','далее','save and continue','сохранить и продолжить','create campaign','создать кампанию','publish','готово','done'];
-      const rolesClickable = new Set(['button','tab','option','menuitem','listitem','checkbox','radio','switch']);
-
-      const {nodes, frames} = deepWalk();
-      const ui = {inputs:[], buttons:[], tabs:[], primary:[], meta:{ignored_search:0, scanned:nodes.length, frames:frames, ts: Date.now(), url: location.href}};
-
-      for(const el of nodes){
-        if(!(el instanceof HTMLElement)) continue;
-        try{
-          const st = getComputedStyle(el);
-          if(st.display==='none' || st.visibility==='hidden') continue;
-        }catch(_){}
-
-        // inputs
-        if(visible(el) && isEditable(el) && !isDisabled(el)){
-          let base = el;
-          try{
-            if(el.shadowRoot){
-              const i = el.shadowRoot.querySelector('input,textarea,select');
-              if(i) base = i;
-            }else if(el.matches && el.matches('material-input')){
-              const i = el.querySelector('input,textarea,select');
-              if(i) base = i;
-            }
-          }catch(_){}
-          if(!base) continue;
-          if(isSearchField(base)) { ui.meta.ignored_search++; continue; }
-          ui.inputs.push({
-            tag: (base.tagName||'').toLowerCase(),
-            role: base.getAttribute && base.getAttribute('role') || '',
-            type: (base.getAttribute && (base.getAttribute('type')||'')).toLowerCase(),
-            aria_label: pickLabel(el) || pickLabel(base) || (base.getAttribute && base.getAttribute('aria-label')) || '',
-            placeholder: (base.getAttribute && base.getAttribute('placeholder')) || '',
-            selector: uniqueSelector(base),
-            xpath: buildXPath(base),
-            value: (base.value || '')
-          });
-          continue;
-        }
-
-        // clickable
-        const tag = el.tagName;
-        const role = low(el.getAttribute('role')||'');
-        const txtl = low(el.innerText || el.textContent || '');
-        const isAnchor = (tag==='A' && el.hasAttribute('href'));
-        const isButtonTag = tag==='BUTTON' || (tag==='INPUT' && ['button','submit','reset'].includes(low(el.getAttribute('type')||'')));
-        const hasOnclick = el.getAttribute('onclick') != null;
-        let pointer = false; try{ pointer = getComputedStyle(el).cursor==='pointer'; }catch(_){}
-        const isClickable = isButtonTag || isAnchor || rolesClickable.has(role) || hasOnclick || pointer;
-        if(!isClickable || !visible(el) || isSearchField(el)) continue;
-
-        const cand = {
-          tag: el.tagName.toLowerCase(),
-          role: role,
-          aria_label: el.getAttribute('aria-label')||'',
-          text: txt(el.innerText || el.textContent || ''),
-          data_value: el.getAttribute('data-value')||'',
-          selector: uniqueSelector(el),
-          xpath: buildXPath(el)
-        };
-        if(labelsPrimary.some(w=> txtl.includes(w))) ui.primary.push(cand);
-        else if(role==='tab' || (el.className||'').includes('selection-item')) ui.tabs.push(cand);
-        else ui.buttons.push(cand);
-      }
-
-      function dedup(arr){
-        const seen = new Set(); const out=[];
-        for(const it of arr){
-          const key = (it.selector||'')+'|'+(it.aria_label||'')+'|'+(it.text||'');
-          if(seen.has(key)) continue; seen.add(key); out.push(it);
-        }
-        return out;
-      }
-      ui.inputs = dedup(ui.inputs).slice(0, 60);
-      ui.buttons = dedup(ui.buttons).slice(0, 60);
-      ui.tabs = dedup(ui.tabs).slice(0, 40);
-      ui.primary = dedup(ui.primary).slice(0, 16);
-      ui.meta.counts = {inputs: ui.inputs.length, buttons: ui.buttons.length, tabs: ui.tabs.length, primary: ui.primary.length};
-      return ui;
-    })();
-    """
-    ui: Dict[str, Any] = {}
-    try:
-        raw = driver.execute_script(js)
-        if isinstance(raw, dict):
-            ui = raw
-    except Exception:
+    ui = collect_ui_map(driver)
+    if not ui:
         return "", {"error": "js_exec_failed"}
 
     meta = ui.get("meta", {}) if isinstance(ui.get("meta", {}), dict) else {}
@@ -1580,18 +1388,24 @@ def _get_llm_dom_view(driver: Any, ctx: Optional[Dict[str, Any]] = None, limit:
     scanned = int(meta.get("scanned", 0) or 0)
     frames = int(meta.get("frames", 0) or 0)
 
+    view_meta: Dict[str, Any] = {}
     try:
-        html_view = _build_llm_ui_html(ui, ctx or {})
+        if delta is not None:
+            html_view, view_meta = delta.render(ui)
+        else:
+            html_view = _build_llm_ui_html(ui, ctx or {})
     except Exception:
         html_view = ""
 
     nothing_to_show = (scanned < 10) and all(int(counts.get(k, 0) or 0) == 0 for k in ("inputs", "buttons", "tabs", "primary"))
     if not html_view or nothing_to_show:
+        if delta is not None:
+            delta.reset()  # вызывающий уйдёт в полный DOM — следующий ход снова с полной карты
         return "", {"scanned": scanned, "frames": frames, "counts": counts, "why": "empty_ui_map"}
 
     if limit > 0 and len(html_view) > limit:
         html_view = html_view[:limit] + "\n<!-- TRUNCATED UI-VIEW -->"
-    return html_view, {"scanned": scanned, "frames": frames, "counts": counts}
+    return html_view, {"scanned": scanned, "frames": frames, "counts": counts, "chars": len(html_view), **view_meta}
 
 def _build_llm_ui_html(ui: Dict[str, Any], ctx: Dict[str, Any]) -> str:
     def esc(s: Any) -> str:
@@ -1934,6 +1748,13 @@ def _get_adspower_env() -> Tuple[bool, str, str]:
     return headless, api_base, token
 
 def _start_adspower_driver(profile_id: str):
+    """Драйвер профиля из общего пула (тёплый, если профиль уже открыт); вернуть — _stop_adspower_driver."""
+    headless, _api_base, _token = _get_adspower_env()
+    return get_driver_pool().acquire(
+        str(profile_id), headless=headless, start=lambda: _launch_adspower_driver(profile_id)
+    )
+
+def _launch_adspower_driver(profile_id: str):
     if not adspower_mod:
         raise RuntimeError("ads_ai.browser.adspower недоступен")
 
@@ -2025,6 +1846,10 @@ def _start_adspower_driver(profile_id: str):
 def _stop_adspower_driver(driver: Any) -> None:
     if driver is None:
         return
+    pool = get_driver_pool()
+    if pool.owns(driver):
+        pool.release(driver)
+        return
     try:
         if hasattr(driver, "quit") and callable(getattr(driver, "quit")):
             driver.quit()
@@ -2214,45 +2039,40 @@ def _emit_live_preview(driver, emit: Callable[[str, Dict[str, Any]], None]) -> N
         pass
 
 def _start_preview_stream(driver, ctrl: ControlState, fps: int = 20) -> None:
-    if ctrl.preview_thread and ctrl.preview_thread.is_alive():
-        return
-    try:
-        fps = max(5, min(30, int(fps)))
-    except Exception:
-        fps = 20
-    interval = 1.0 / float(fps)
+    """
+    Публикуем драйвер задачи для хаба превью. Захват (screencast/поллинг) хаб ведёт сам,
+    один на драйвер и только пока есть зрители; fps — темп фолбэк-поллинга.
+    """
     ctrl.preview_stop.clear()
+    ctrl.preview_driver = driver
 
-    def _loop():
-        last = ""
-        while not ctrl.preview_stop.is_set():
-            t0 = time.time()
-            try:
-                png = driver.get_screenshot_as_png()
-            except Exception:
-                break
-            b64 = ""
-            try:
-                b64 = base64.b64encode(png).decode("ascii") if png else ""
-            except Exception:
-                b64 = ""
-            if b64 and b64 != last:
-                try:
-                    if ctrl.preview_q.full():
-                        try:
-                            ctrl.preview_q.get_nowait()
-                        except Exception:
-                            pass
-                    ctrl.preview_q.put_nowait(b64)
-                    last = b64
-                except Exception:
-                    pass
-            dt = time.time() - t0
-            time.sleep(max(0.0, interval - dt))
 
-    th = threading.Thread(target=_loop, name=f"preview-{id(driver)}", daemon=True)
-    ctrl.preview_thread = th
-    th.start()
+def _preview_stream(ctrl: ControlState, transport: str = "sse") -> Iterator[Any]:
+    """Поток превью задачи для одного зрителя: SSE (preview:image) или multipart MJPEG."""
+    from ads_ai.web.preview_hub import get_preview_hub, mjpeg_stream, sse_stream
+
+    # задача ещё не дошла до браузера — держим соединение heartbeat'ами
+    while ctrl.preview_driver is None:
+        if ctrl.preview_stop.is_set():
+            return
+        if transport == "sse":
+            yield ":hb\n\n"
+        time.sleep(1.0)
+    ch = get_preview_hub().channel(ctrl.preview_driver)
+    if transport == "mjpeg":
+        yield from mjpeg_stream(ch, stop=ctrl.preview_stop.is_set)
+    else:
+        yield from sse_stream(ch, "preview:image", retry_ms=40, stop=ctrl.preview_stop.is_set)
+
+
+def _preview_response(ctrl: ControlState, transport: str = "sse") -> Response:
+    from ads_ai.web.preview_hub import MJPEG_MIMETYPE
+
+    mimetype = MJPEG_MIMETYPE if transport == "mjpeg" else "text/event-stream"
+    resp = Response(_preview_stream(ctrl, transport), mimetype=mimetype)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 # =============================== RUNNER ======================================
 
@@ -2458,7 +2278,7 @@ es.addEventListener('log', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}
 es.addEventListener('artifact', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}catch(_){{}}; if(j.kind==='screenshot' && j.url){{ $prev.src=j.url+'?r='+Date.now(); }} }});
 es.addEventListener('vision:image', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}catch(_){{}}; if(j && j.data) $prev.src='data:image/png;base64,'+j.data; }});
 es.addEventListener('ui:scan', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}catch(_){{}}; if(j && j.counts) line('ui', 'UI-scan: '+JSON.stringify(j)); }});
-if(esPrev) esPrev.addEventListener('preview:image', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}catch(_){{}}; if(j && j.data) $prev.src='data:image/png;base64,'+j.data; }});
+if(esPrev) esPrev.addEventListener('preview:image', e=>{{ let j={{}}; try{{j=JSON.parse(e.data||'{{}}')}}catch(_){{}}; if(j && j.data) $prev.src='data:'+(j.mime||'image/png')+';base64,'+j.data; }});
 async function post(op, data){{ return fetch('/campaigns/{task_id}/control', {{ method:'POST', headers: {{'Content-Type':'application/json','X-CSRF':{json.dumps(csrf)} }}, body: JSON.stringify(Object.assign({{op}}, data||{{}})) }}); }}
 document.getElementById('pause').onclick=()=>post('pause',{{}});
 document.getElementById('resume').onclick=()=>post('resume',{{}});
@@ -2774,29 +2594,16 @@ es.addEventListener('ui:scan', e=>{ let j={}; try{j=JSON.parse(e.data||'{}')}cat
             _ = _require_user()
         except Exception:
             return jsonify({"ok": False, "error": "unauthorized"}), 401
-        st = tm.control(task_id)
-
-        def gen():
-            yield "retry: 40\n\n"
-            i = 1
-            while True:
-                try:
-                    b64 = st.preview_q.get(timeout=2.0)
-                except queue.Empty:
-                    if st.preview_stop.is_set():
-                        break
-                    yield ":hb\n\n"
-                    continue
-                payload = json.dumps({"data": b64}, ensure_ascii=False)
-                yield f"id: {i}\n"
-                yield "event: preview:image\n"
-                yield f"data: {payload}\n\n"
-                i += 1
+        return _preview_response(tm.control(task_id), "sse")
 
-        resp = Response(gen(), mimetype="text/event-stream")
-        resp.headers["Cache-Control"] = "no-cache"
-        resp.headers["X-Accel-Buffering"] = "no"
-        return resp
+    # ---- MJPEG preview (бинарные кадры для <img>, без base64/JSON) ----
+    @app.get("/campaigns/<task_id>/preview.mjpeg")
+    def campaign_preview_mjpeg(task_id: str) -> Response:
+        try:
+            _ = _require_user()
+        except Exception:
+            return jsonify({"ok": False, "error": "unauthorized"}), 401
+        return _preview_response(tm.control(task_id), "mjpeg")
 
     # ---- Артефакты ----
     @app.get("/campaigns/artifact/<path:rel>")
@@ -3045,27 +2852,15 @@ def init_campaigns_module(
             _ = require_user()
         except Exception:
             return jsonify({"ok": False, "error": "unauthorized"}), 401
-        st = tm.control(task_id)
-        def gen():
-            yield "retry: 40\n\n"
-            i = 1
-            while True:
-                try:
-                    b64 = st.preview_q.get(timeout=2.0)
-                except queue.Empty:
-                    if st.preview_stop.is_set():
-                        break
-                    yield ":hb\n\n"
-                    continue
-                payload = json.dumps({"data": b64}, ensure_ascii=False)
-                yield f"id: {i}\n"
-                yield "event: preview:image\n"
-                yield f"data: {payload}\n\n"
-                i += 1
-        resp = Response(gen(), mimetype="text/event-stream")
-        resp.headers["Cache-Control"] = "no-cache"
-        resp.headers["X-Accel-Buffering"] = "no"
-        return resp
+        return _preview_response(tm.control(task_id), "sse")
+
+    @app.get("/campaigns/<task_id>/preview.mjpeg")
+    def _cc_campaign_preview_mjpeg(task_id: str) -> Response:
+        try:
+            _ = require_user()
+        except Exception:
+            return jsonify({"ok": False, "error": "unauthorized"}), 401
+        return _preview_response(tm.control(task_id), "mjpeg")
 
     @app.get("/campaigns/artifact/<path:rel>")
     def _cc_artifact_serve(rel: str) -> Response:
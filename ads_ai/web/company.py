@@ -15,6 +15,9 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from flask import Flask, Response, jsonify, make_response, request, session
 
+# Общий keep-alive клиент локального API AdsPower
+from ads_ai.browser.adspower_client import http_get_json as _http_get_json
+
 # Мягкие зависимости на проектные Settings
 try:
     from ads_ai.config.settings import Settings  # noqa: F401
@@ -149,41 +152,6 @@ def _adsp_env() -> Tuple[str, str]:
     return base, token
 
 
-def _http_get_json(
-    url: str,
-    headers: Optional[Dict[str, str]] = None,
-    timeout: float = 4.5,
-) -> Tuple[int, Dict[str, Any]]:
-    try:
-        import requests  # type: ignore
-    except Exception:
-        requests = None  # type: ignore
-    if requests:
-        try:
-            r = requests.get(url, headers=headers or {}, timeout=timeout)  # type: ignore
-            j = {}
-            try:
-                j = r.json() if r.content else {}
-            except Exception:
-                j = {}
-            return int(r.status_code), j or {}
-        except Exception:
-            return 0, {}
-    # stdlib fallback
-    import urllib.request  # type: ignore
-    req = urllib.request.Request(url, headers=headers or {})
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:  # type: ignore
-            data = resp.read()
-            try:
-                j = json.loads(data.decode("utf-8")) if data else {}
-            except Exception:
-                j = {}
-            return int(resp.getcode() or 0), j or {}
-    except Exception:
-        return 0, {}
-
-
 def _get_adspower_profile(profile_id: str) -> Dict[str, Any]:
     """Возвращает краткую инфу по профилю AdsPower (name, group)."""
     if not profile_id:
@@ -749,7 +717,8 @@ def _ai_insight_for_company(row: CompanyRow, raw: Dict[str, Any], stats: Dict[st
             fallback_model = _resolve_llm_fallback(None)
             client = GeminiClient(model=model, temperature=0.6, retries=1, fallback_model=fallback_model)  # type: ignore
         prompt = instruction + "\n\n---\nINPUT JSON:\n" + json.dumps(payload, ensure_ascii=False)
-        raw_resp = client.generate_json(prompt)  # type: ignore
+        # тот же payload (компания + агрегаты) — тот же ответ: кэшируем, чтобы не ходить в LLM на каждый просмотр
+        raw_resp = client.generate_json(prompt, cache=True)  # type: ignore
         print("[company.ai] Gemini raw response:", raw_resp)
         data = raw_resp if isinstance(raw_resp, dict) else {}
         if not data:
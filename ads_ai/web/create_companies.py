@@ -20,9 +20,9 @@ import time
 import queue
 import urllib.parse
 import uuid
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, fields
 from io import BytesIO
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from flask import (
     Flask, Response, jsonify, make_response, request, session,
@@ -30,6 +30,11 @@ from flask import (
 )
 from werkzeug.utils import secure_filename
 
+from ads_ai.browser.pool import get_driver_pool
+from ads_ai.plan.checkpoints import CheckpointStore, get_checkpoint_store, verify_screen
+from ads_ai.web.preview_hub import MJPEG_IDLE_SEC, MJPEG_MIMETYPE, get_preview_hub
+from ads_ai.browser.adspower_client import http_get_json as _http_get_json
+
 try:
     from examples.steps.code_for_confrim import (  # type: ignore
         normalize_totp_secret as _cf_normalize_totp_secret,
@@ -130,15 +135,54 @@ def _campaign_variants_for_ui() -> List[Dict[str, str]]:
 
 
 class _LocalState:
-    """Один активный драйвер на профиль (сохраняем headless-флаг)."""
-    def __init__(self):
+    """Драйвер одного (profile_id, headless): свой лок на шаги/публикацию/ручное управление."""
+    def __init__(self, profile_id: Optional[str] = None, headless: bool = True):
         self.driver: Any = None
-        self.profile_id: Optional[str] = None
-        self.headless: bool = True
+        self.profile_id: Optional[str] = profile_id
+        self.headless: bool = headless
         self.user_email: Optional[str] = None
         self.lock = threading.Lock()
+        self.touched_at: float = time.time()
+        self.starting: Optional[threading.Event] = None  # драйвер берётся из пула (вне lock)
+
+
+class _DriverRegistry:
+    """
+    Реестр драйверов по (profile_id, headless): параллельные запуски на разных профилях
+    не мешают друг другу. Лимит одновременно открытых браузеров — у общего пула
+    (ENV ADS_AI_DRIVER_POOL_MAX).
+    """
+    def __init__(self) -> None:
+        self._slots: Dict[Tuple[str, bool], _LocalState] = {}
+        self._lock = threading.Lock()
+
+    def slot(self, profile_id: str, headless: bool) -> _LocalState:
+        """Слот (создаётся пустым при первом обращении; лок слота — на всё время жизни процесса)."""
+        key = (str(profile_id), bool(headless))
+        with self._lock:
+            st = self._slots.get(key)
+            if st is None:
+                st = _LocalState(profile_id=key[0], headless=key[1])
+                self._slots[key] = st
+            return st
+
+    def get(self, profile_id: str, headless: bool) -> Optional[_LocalState]:
+        with self._lock:
+            st = self._slots.get((str(profile_id), bool(headless)))
+        return st if st is not None and st.driver is not None else None
 
-_local = _LocalState()
+    def other_mode(self, profile_id: str, headless: bool) -> Optional[_LocalState]:
+        """Слот того же профиля в другом режиме (AdsPower не запускает профиль дважды)."""
+        return self.get(profile_id, not headless)
+
+    def latest_for(self, user_email: Optional[str]) -> Optional[_LocalState]:
+        with self._lock:
+            live = [s for s in self._slots.values()
+                    if s.driver is not None and (s.user_email == user_email or s.user_email is None)]
+        return max(live, key=lambda s: s.touched_at) if live else None
+
+
+_drivers = _DriverRegistry()
 
 
 @dataclass
@@ -162,30 +206,58 @@ _PENDING_RUNS: Dict[str, _PendingRun] = {}
 _PENDING_RUNS_LOCK = threading.Lock()
 
 
+def _run_checkpoints() -> Optional[CheckpointStore]:
+    """Чекпоинты шагов и ожидающих публикации запусков (рядом с БД компаний), переживают рестарт воркера."""
+    return get_checkpoint_store(os.path.join(os.path.dirname(_db_path()), "run_checkpoints.sqlite3"))  # type: ignore[arg-type]
+
+
 def _pending_run_prune(max_age: float = 3600.0) -> None:
     now = time.time()
     with _PENDING_RUNS_LOCK:
         stale_keys = [k for k, v in _PENDING_RUNS.items() if (now - v.created_at) > max_age]
         for key in stale_keys:
             _PENDING_RUNS.pop(key, None)
+    store = _run_checkpoints()
+    if store is not None:
+        store.prune()  # чекпоинты старше недели
 
 
 def _pending_run_store(item: _PendingRun) -> None:
-    """Saves pending company run info until publish."""
+    """Saves pending company run info until publish (in memory + durable checkpoint)."""
     _pending_run_prune()
     with _PENDING_RUNS_LOCK:
         _PENDING_RUNS[item.run_id] = item
+    store = _run_checkpoints()
+    if store is not None:
+        store.save(item.run_id, "company_pending", asdict(item), owner=item.user_email)
 
 
-def _pending_run_get(run_id: str, user_email: str) -> Optional[_PendingRun]:
+def _pending_run_get(run_id: str, user_email: str, max_age: float = 3600.0) -> Optional[_PendingRun]:
     with _PENDING_RUNS_LOCK:
         item = _PENDING_RUNS.get(run_id)
         if item and item.user_email == user_email:
             return item
+    # после рестарта воркера — из чекпоинта
+    store = _run_checkpoints()
+    cp = store.load(run_id, "company_pending") if store is not None else None
+    if cp is None or cp.status != "active" or cp.owner != user_email:
+        return None
+    names = {f.name for f in fields(_PendingRun)}
+    try:
+        item = _PendingRun(**{k: v for k, v in cp.state.items() if k in names})
+    except Exception:
+        return None
+    if (time.time() - item.created_at) > max_age:
         return None
+    with _PENDING_RUNS_LOCK:
+        _PENDING_RUNS.setdefault(run_id, item)
+    return item
 
 
 def _pending_run_pop(run_id: str) -> Optional[_PendingRun]:
+    store = _run_checkpoints()
+    if store is not None:
+        store.finish(run_id, "company_pending")
     with _PENDING_RUNS_LOCK:
         return _PENDING_RUNS.pop(run_id, None)
 
@@ -664,7 +736,24 @@ def _maximize_and_focus(driver: Any) -> None:
         pass
 
 
+def _prepare_driver(driver: Any, headless: bool) -> None:
+    """Настройки модуля — на каждой аренде из пула (драйвер мог готовить другой модуль)."""
+    try:
+        driver.set_page_load_timeout(25)
+        driver.set_script_timeout(15)
+    except Exception:
+        pass
+    _ensure_big_viewport(driver)
+    if not headless:
+        _maximize_and_focus(driver)
+
+
 def _close_driver_safely(driver: Any) -> None:
+    # драйвер из общего пула возвращаем туда (браузер остаётся тёплым)
+    pool = get_driver_pool()
+    if pool.owns(driver):
+        pool.release(driver)
+        return
     try:
         if hasattr(driver, "quit"):
             driver.quit()
@@ -672,35 +761,32 @@ def _close_driver_safely(driver: Any) -> None:
         pass
 
 
-def _shutdown_driver(reason: str = "") -> None:
+def _shutdown_driver(profile_id: str, headless: bool, reason: str = "", *, user_email: Optional[str] = None) -> None:
     """
-    Полностью закрывает текущий драйвер и профиль AdsPower, очищает локальное состояние.
-    Вызывать после любого завершения/остановки запуска.
+    Освобождает драйвер слота (profile_id, headless): возвращает его в пул
+    (или закрывает вместе с профилем AdsPower, если он не из пула), очищает слот.
+    Вызывать после любого завершения/остановки запуска. user_email задан — чужой слот не трогаем.
     """
-    drv = None
-    pid = None
-    with _local.lock:
-        try:
-            drv = _local.driver
-            pid = _local.profile_id
-        except Exception:
-            drv = None
-            pid = None
-        finally:
-            _local.driver = None
-            _local.profile_id = None
-            _local.user_email = None
-            # headless оставим как есть — его установит следующий запуск
+    st = _drivers.slot(profile_id, headless)
+    with st.lock:
+        if user_email is not None and st.user_email not in (None, user_email):
+            return
+        drv = st.driver
+        pid = st.profile_id
+        st.driver = None
+        st.user_email = None
 
-    # Сначала закрываем Selenium-окно
+    # Сначала закрываем Selenium-окно (драйвер из пула — возвращаем в пул)
+    pooled = drv is not None and get_driver_pool().owns(drv)
     if drv is not None:
+        get_preview_hub().forget(drv)
         try:
             _close_driver_safely(drv)
         except Exception:
             pass
 
-    # Затем отдельно просим AdsPower остановить профиль (если это именно он)
-    if pid:
+    # Затем отдельно просим AdsPower остановить профиль (если это именно он и он не в пуле)
+    if drv is not None and pid and not pooled:
         try:
             _stop_adspower_profile(pid)
         except Exception:
@@ -717,37 +803,6 @@ def _adsp_env() -> tuple[str, str]:
     return base, token
 
 
-def _http_get_json(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 4.0) -> tuple[int, Dict[str, Any]]:
-    try:
-        import requests  # type: ignore
-    except Exception:
-        requests = None  # type: ignore
-    if requests:
-        try:
-            r = requests.get(url, headers=headers or {}, timeout=timeout)  # type: ignore
-            j = {}
-            try:
-                j = r.json() if r.content else {}
-            except Exception:
-                j = {}
-            return int(r.status_code), j or {}
-        except Exception:
-            return 0, {}
-    # stdlib fallback
-    import urllib.request
-    req = urllib.request.Request(url, headers=headers or {})
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = resp.read()
-            try:
-                j = json.loads(data.decode("utf-8")) if data else {}
-            except Exception:
-                j = {}
-            return int(resp.getcode() or 0), j or {}
-    except Exception:
-        return 0, {}
-
-
 def _stop_adspower_profile(profile_id: Optional[str]) -> None:
     """
     Аккуратно останавливает профиль AdsPower (если доступен SDK — через него,
@@ -830,21 +885,17 @@ def _maybe_get_driver(
     user_email: Optional[str],
 ) -> Any:
     """
-    Возвращает текущий драйвер, если:
-      • requested_profile_id пуст и есть локальный — вернёт локальный;
-      • requested_profile_id совпадает с локальным и headless совпадает — вернёт его;
+    Возвращает уже запущенный драйвер (никогда не создаёт):
+      • requested_profile_id задан — драйвер слота (profile_id, headless) этого пользователя;
+      • requested_profile_id пуст — последний использованный драйвер пользователя;
       • иначе — None.
     Также проверяем внешний driver из app._state (если профиль совпадает).
     """
     user_email = str(user_email or "").strip() or None
     if requested_profile_id:
-        if (
-            _local.driver is not None
-            and _local.profile_id == requested_profile_id
-            and _local.headless == headless
-            and (_local.user_email == user_email or _local.user_email is None)
-        ):
-            return _local.driver
+        st = _drivers.get(requested_profile_id, headless)
+        if st is not None and (st.user_email == user_email or st.user_email is None):
+            return st.driver
         ext = _get_state_from_app()
         try:
             if ext and getattr(ext, "driver", None) is not None:
@@ -856,150 +907,148 @@ def _maybe_get_driver(
         except Exception:
             pass
         return None
-    if _local.driver is not None and (_local.user_email == user_email or _local.user_email is None):
-        return _local.driver
-    return None
+    st = _drivers.latest_for(user_email)
+    return st.driver if st is not None else None
+
+
+def _check_slot_owner(st: _LocalState, user_email: str) -> None:
+    """Слот занят другим пользователем — отказ (чужой браузер не перехватываем)."""
+    if st.user_email not in (None, user_email):
+        raise RuntimeError(f"profile_in_use ({st.profile_id})")
 
 
 def _get_or_create_driver(profile_id: str, headless: bool, user_email: str) -> Any:
     """
-    Возвращает driver для данного профиля/режима:
-      • если локальный driver уже для этого профиля и того же headless — вернёт его;
-      • если локальный driver отличается — закрывает и поднимает новый;
-      • если драйвера нет — поднимает новый.
+    Возвращает driver слота (profile_id, headless):
+      • если драйвер слота уже поднят этим пользователем — вернёт его;
+      • слот (или профиль в другом режиме headless) занят другим пользователем — RuntimeError;
+      • если профиль открыт в другом режиме headless — тот экземпляр освобождается;
+      • иначе берёт драйвер из пула (лимит браузеров — у пула; ожидание — без лока слота).
+    Драйверы других профилей не трогаем.
     """
-    d = _local.driver
-    if (
-        d is not None
-        and _local.profile_id == profile_id
-        and _local.headless == headless
-        and (_local.user_email == user_email or _local.user_email is None)
-    ):
+    st = _drivers.slot(profile_id, headless)
+    with st.lock:
+        _check_slot_owner(st, user_email)
+        d = st.driver
+        if d is not None:
+            st.user_email = user_email
+            st.touched_at = time.time()
+    if d is not None:
         _ensure_big_viewport(d)
         return d
 
-    with _local.lock:
-        if _local.driver is not None and (
-            _local.profile_id != profile_id
-            or _local.headless != headless
-            or (_local.user_email not in (None, user_email))
-        ):
-            # аккуратно гасим старый экземпляр + профиль AdsPower
-            old_pid = _local.profile_id
-            try:
-                _close_driver_safely(_local.driver)
-            finally:
-                _local.driver = None
-                _local.profile_id = None
-                _local.user_email = None
-            try:
-                _stop_adspower_profile(old_pid)
-            except Exception:
-                pass
-            _local.headless = headless
-
-        if _local.driver is None:
-            drv = _start_driver(profile_id, headless=headless)
-            _local.driver = drv
-            _local.profile_id = profile_id
-            _local.headless = headless
-            _local.user_email = user_email
-            try:
-                setattr(drv, "_ads_ai_owner", user_email)
-            except Exception:
-                pass
-            try:
-                drv.get("https://ads.google.com/aw/overview")
-                _ensure_big_viewport(drv)
-            except Exception:
-                pass
-        else:
-            try:
-                setattr(_local.driver, "_ads_ai_owner", user_email)
-            except Exception:
-                pass
-
-    return _local.driver
-
-
-# =============================================================================
-#                         ПРИМИТИВЫ ПРЕВЬЮ (SSE-кадр)
-# =============================================================================
-
-class _PreviewHub:
-    """Хаб, который по запросу отдаёт кадр + мета для управления."""
-    def __init__(self):
-        self._lock = threading.Lock()
-        self._last_minimize_ts = 0.0
-        self._last_enable_ts = 0.0  # периодический Page.enable для надёжности
-
-    def _warm_cdp(self, driver: Any) -> None:
-        now = time.time()
-        if (now - self._last_enable_ts) < 5.0:
-            return
-        self._last_enable_ts = now
+    other = _drivers.other_mode(profile_id, headless)
+    if other is not None:
+        _check_slot_owner(other, user_email)
+        _shutdown_driver(profile_id, not headless, "headless_switch", user_email=user_email)
+
+    while True:
+        with st.lock:
+            _check_slot_owner(st, user_email)
+            if st.driver is not None:
+                st.touched_at = time.time()
+                return st.driver
+            starting = st.starting
+            if starting is None:
+                # слот наш: держим владельца на время старта, чтобы другой пользователь не вклинился
+                starting = st.starting = threading.Event()
+                st.user_email = user_email
+                break
+        starting.wait(timeout=5.0)  # драйвер для слота уже берёт другой поток
+
+    def _start() -> Any:
+        d0 = _start_driver(profile_id, headless=headless)
         try:
-            driver.execute_cdp_cmd("Page.enable", {})
+            d0.get("https://ads.google.com/aw/overview")
         except Exception:
             pass
+        return d0
+
+    drv = None
+    try:
+        drv = get_driver_pool().acquire(
+            profile_id, headless=headless, start=_start,
+            prepare=lambda d0: _prepare_driver(d0, headless),
+        )
         try:
-            driver.execute_cdp_cmd("Runtime.runIfWaitingForDebugger", {})
+            setattr(drv, "_ads_ai_owner", user_email)
         except Exception:
             pass
+    finally:
+        with st.lock:
+            st.driver = drv
+            st.starting = None
+            if drv is None:
+                st.user_email = None
+            st.touched_at = time.time()
+        starting.set()
+    return drv
 
-    def capture_frame(self, driver: Any, headless: bool) -> Optional[Dict[str, Any]]:
-        with self._lock:
-            now = time.time()
-
-            if headless and os.getenv("ADS_AI_PREVIEW_MINIMIZE", "0") in ("1", "true", "yes"):
-                if (now - self._last_minimize_ts) > 1.0:
-                    try:
-                        _try_minimize_cdp(driver)
-                    finally:
-                        self._last_minimize_ts = now
-
-            _ensure_big_viewport(driver)
-            self._warm_cdp(driver)
-
-            # 1) CDP JPEG
-            data_b64: Optional[str] = None
-            fmt = "jpeg"
-            try:
-                params = {"format": "jpeg", "quality": 82, "fromSurface": True}
-                try:
-                    params["captureBeyondViewport"] = True  # type: ignore
-                except Exception:
-                    pass
-                res = driver.execute_cdp_cmd("Page.captureScreenshot", params)
-                data_b64 = (res or {}).get("data")
-            except Exception:
-                data_b64 = None
 
-            # 2) Фолбэк — обычный PNG (надёжно на удалённых драйверах)
-            if not data_b64:
-                try:
-                    png = driver.get_screenshot_as_png()
-                    data_b64 = base64.b64encode(png).decode("ascii")
-                    fmt = "png"
-                except Exception:
-                    return None
-
-            # 3) Вьюпорт
-            vw = vh = dpr = 0
-            try:
-                dims = driver.execute_script(
-                    "return {vw: window.innerWidth||0, vh: window.innerHeight||0, dpr: window.devicePixelRatio||1}"
-                )
-                vw = int(dims.get("vw") or 0)
-                vh = int(dims.get("vh") or 0)
-                dpr = float(dims.get("dpr") or 1.0)
-            except Exception:
-                pass
+# =============================================================================
+#                         ПРИМИТИВЫ ПРЕВЬЮ (SSE-кадр)
+# =============================================================================
 
-            return {"data": data_b64, "vw": vw, "vh": vh, "dpr": dpr, "fmt": fmt}
+def _preview_stream(pid: str, *, headless: bool, user_email: str, transport: str = "sse") -> Iterator[Any]:
+    """
+    Поток превью одного зрителя поверх общего хаба (один захват на драйвер для всех зрителей).
+    Драйвер не создаём — ждём, пока его поднимет запуск; при смене/закрытии драйвера переподключаемся.
+    MJPEG: без новых кадров повторяем последний (раз в ~2 с); нечего повторить дольше
+    MJPEG_IDLE_SEC — поток завершается (иначе отключившийся клиент не обнаружить).
+    """
+    if transport == "sse":
+        yield "retry: 600\n\n"
+    last = None
+    sent_at = time.monotonic()
+
+    def _idle_part() -> Optional[bytes]:
+        nonlocal sent_at
+        if last is None:
+            return None
+        sent_at = time.monotonic()
+        return last.mjpeg_part()
+
+    while True:
+        drv = _maybe_get_driver(pid, headless=headless, user_email=user_email)  # ← не создаём!
+        if not drv:
+            if transport == "sse":
+                yield ":hb\n\n"
+            elif time.monotonic() - sent_at >= 2.0:
+                part = _idle_part()
+                if part is None and time.monotonic() - sent_at >= MJPEG_IDLE_SEC:
+                    return
+                if part is not None:
+                    yield part
+            time.sleep(0.25)
+            continue
+        _prepare_preview_driver(drv, headless)
+        for fr in get_preview_hub().channel(drv).frames(timeout=2.0):
+            if fr is None:
+                if _maybe_get_driver(pid, headless=headless, user_email=user_email) is not drv:
+                    break
+                if transport == "sse":
+                    yield ":hb\n\n"
+                    continue
+                part = _idle_part()
+                if part is None and time.monotonic() - sent_at >= MJPEG_IDLE_SEC:
+                    return
+                if part is not None:
+                    yield part
+                continue
+            last = fr
+            sent_at = time.monotonic()
+            yield fr.sse("image") if transport == "sse" else fr.mjpeg_part()
 
 
-_preview = _PreviewHub()
+def _prepare_preview_driver(driver: Any, headless: bool) -> None:
+    """Разово при подключении зрителя: крупный вьюпорт (+ свёрнутое окно в headless по ENV)."""
+    if headless and os.getenv("ADS_AI_PREVIEW_MINIMIZE", "0") in ("1", "true", "yes"):
+        _try_minimize_cdp(driver)
+    _ensure_big_viewport(driver)
+    try:
+        driver.execute_cdp_cmd("Page.enable", {})
+    except Exception:
+        pass
 
 
 # =============================================================================
@@ -3771,8 +3820,10 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         pid = (request.args.get("profile_id") or "").strip()
         headless = (request.args.get("headless") or "").strip() in ("1", "true", "yes", "on")
         if not pid:
-            if _local.profile_id and _local.user_email == email:
-                pid = _local.profile_id
+            st = _drivers.latest_for(email)
+            if st is not None and st.user_email == email:
+                pid = st.profile_id or ""
+                headless = st.headless
             else:
                 return jsonify({"ok": True, "url": "", "title": "", "profile_id": ""})
         if not _profile_allowed(email, pid):
@@ -3793,7 +3844,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
     @app.route("/api/preview", methods=["GET"])
     def api_preview() -> Response:
         """
-        Стримим частые кадры (стремимся к 10–15 fps).
+        Стримим кадры общего хаба превью (screencast — по перерисовке страницы).
         Параметры: profile_id (обязательно), headless=1|0
         Отправляем также мета: vw, vh, dpr, fmt — для маппинга кликов и отрисовки.
         Важно: этот эндпоинт НИКОГДА сам не поднимает браузер — только «подключается»,
@@ -3815,29 +3866,34 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         if not _profile_allowed(email, pid):
             return Response("forbidden\n", status=403, mimetype="text/plain")
 
-        def gen():
-            yield "retry: 600\n\n"
-            while True:
-                try:
-                    drv = _maybe_get_driver(pid, headless=headless, user_email=email)  # ← не создаём!
-                    if not drv:
-                        yield ":hb\n\n"
-                        time.sleep(0.25)
-                        continue
-                    _ensure_big_viewport(drv)
-                    frame = _preview.capture_frame(drv, headless=headless)
-                    if frame:
-                        payload = json.dumps(frame)
-                        yield "event: image\n"
-                        yield f"data: {payload}\n\n"
-                    else:
-                        yield ":hb\n\n"
-                    time.sleep(0.09)  # ~11 fps
-                except GeneratorExit:
-                    break
-                except Exception:
-                    time.sleep(0.15)
-        resp = Response(stream_with_context(gen()), mimetype="text/event-stream")
+        resp = Response(
+            stream_with_context(_preview_stream(pid, headless=headless, user_email=email, transport="sse")),
+            mimetype="text/event-stream",
+        )
+        resp.headers["Cache-Control"] = "no-cache, no-transform"
+        resp.headers["X-Accel-Buffering"] = "no"
+        return resp
+
+    @app.route("/api/preview.mjpeg", methods=["GET"])
+    def api_preview_mjpeg() -> Response:
+        """
+        То же превью бинарным multipart MJPEG (для <img src>): без base64/JSON на кадр.
+        Параметры: profile_id (обязательно), headless=1|0. Мета кадра — в /api/preview.
+        """
+        try:
+            email = _require_user_email()
+        except PermissionError:
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        pid = (request.args.get("profile_id") or "").strip()
+        headless = (request.args.get("headless") or "").strip() in ("1", "true", "yes", "on")
+        if not pid:
+            return Response("profile_id required\n", status=400, mimetype="text/plain")
+        if not _profile_allowed(email, pid):
+            return Response("forbidden\n", status=403, mimetype="text/plain")
+        resp = Response(
+            stream_with_context(_preview_stream(pid, headless=headless, user_email=email, transport="mjpeg")),
+            mimetype=MJPEG_MIMETYPE,
+        )
         resp.headers["Cache-Control"] = "no-cache, no-transform"
         resp.headers["X-Accel-Buffering"] = "no"
         return resp
@@ -3848,7 +3904,10 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         """
         Исполняет ТОЛЬКО шаги 1..9 (step<N>, N<10) на выбранном профиле.
         Параметры (query): profile_id*, url*, budget*, usp*, locations, languages, n_ads, headless,
-        variant?, type?
+        variant?, type?, resume?
+        resume=<run_id>|last — продолжить упавший запуск с последнего чекпоинта (после каждого
+        удачного шага): контекст и результаты шагов восстанавливаются, экран сверяется, пройденные
+        шаги пропускаются; остальные параметры берутся из чекпоинта. Экран не совпал — запуск с шага 1.
         ВАЖНО: драйвер ПОСЛЕ запуска НЕ закрывается автоматически — для шага публикации.
         """
         profile_id = (request.args.get("profile_id") or "").strip()
@@ -3872,6 +3931,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         creative_mode_raw = (request.args.get("creative_mode") or "").strip().lower()
         creative_seed_raw = request.args.get("creative_seed") or ""
         creative_manual_raw = request.args.get("creative_manual") or ""
+        resume_raw = (request.args.get("resume") or "").strip()
 
         def _parse_json_arg(raw: str) -> Any:
             if not raw:
@@ -3940,7 +4000,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         if creative_mode_norm not in {"manual"}:
             creative_manual_payload = None
 
-        if not profile_id or not url or not usp or not budget_min or not budget_max:
+        if not profile_id or (not resume_raw and (not url or not usp or not budget_min or not budget_max)):
             msg = {"event": "error", "error": "Fields 'profile_id', 'url', 'budget_min', 'budget_max', 'usp' are required"}
             return Response("data: " + json.dumps(msg, ensure_ascii=False) + "\n\n",
                             mimetype="text/event-stream", status=400)
@@ -3957,6 +4017,32 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
             return Response("data: " + json.dumps(msg, ensure_ascii=False) + "\n\n",
                             mimetype="text/event-stream", status=403)
 
+        # Чекпоинт для продолжения (владелец — пользователь + профиль)
+        ckpt_store = _run_checkpoints()
+        ckpt_owner = f"{user_email}|{profile_id}"
+        resume_cp = None
+        if resume_raw and ckpt_store is not None:
+            if resume_raw.lower() in ("1", "true", "last"):
+                resume_cp = ckpt_store.latest("company_steps", ckpt_owner)
+            else:
+                resume_cp = ckpt_store.load(resume_raw, "company_steps")
+            if resume_cp is not None and (resume_cp.owner != ckpt_owner or resume_cp.status != "active"):
+                resume_cp = None
+        if resume_raw and resume_cp is None:
+            msg = {"event": "error", "error": "checkpoint_not_found"}
+            return Response("data: " + json.dumps(msg, ensure_ascii=False) + "\n\n",
+                            mimetype="text/event-stream", status=404)
+        if resume_cp is not None:
+            variant_conf = _resolve_campaign_variant(
+                variant_id=str(resume_cp.state.get("variant_id") or ""),
+                choose_type=str(resume_cp.state.get("choose_type") or ""),
+            )
+            steps_package = str(resume_cp.state.get("steps_package") or variant_conf.steps_package)
+            variant_id = variant_conf.variant_id
+            choose_type = str(resume_cp.state.get("choose_type") or variant_conf.choose_type)
+            if isinstance(resume_cp.state.get("headless"), bool):
+                headless = resume_cp.state["headless"]  # тот же режим браузера, что у прерванного запуска
+
         try:
             n_ads_int = int(n_ads) if n_ads else 3
             if n_ads_int < 1:
@@ -3985,6 +4071,8 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
             cli_inputs["creative_seed_assets"] = creative_seed_payload
         if creative_manual_payload:
             cli_inputs["creative_provided_assets"] = creative_manual_payload
+        if resume_cp is not None and isinstance(resume_cp.state.get("cli_inputs"), dict):
+            cli_inputs = dict(resume_cp.state["cli_inputs"])
 
         def _yield(data: Dict[str, Any]) -> str:
             try:
@@ -3996,7 +4084,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         account_meta = dict(account_meta_raw)
 
         # === run_id для текущего запуска (нужен для 2FA-модалки) ===
-        run_id = f"run-{int(time.time()*1000)}-{os.getpid()}-{threading.get_ident()}"
+        run_id = resume_cp.run_key if resume_cp is not None else f"run-{int(time.time()*1000)}-{os.getpid()}-{threading.get_ident()}"
 
         _run_meta_set(run_id, {
             "user_email": user_email,
@@ -4005,8 +4093,9 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
         })
 
         def generate() -> Any:
-            # Принудительно перезапускаем драйвер — предыдущие сессии могли оставить его в странном состоянии.
-            _shutdown_driver("restart_before_run")
+            # Отпускаем прежний драйвер — пул выдаст его заново после проверки живости и сброса состояния
+            # (предыдущие сессии могли оставить лишние вкладки/фреймы/эмуляцию).
+            _shutdown_driver(profile_id, headless, "restart_before_run", user_email=user_email)
 
             # Гарантируем драйвер
             try:
@@ -4077,7 +4166,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
             # Лок на driver (если консоль тоже может работать с ним)
             ext_state = _get_state_from_app()
             ext_lock = getattr(ext_state, "lock", None)
-            primary_lock = _local.lock
+            primary_lock = _drivers.slot(profile_id, headless).lock
             secondary_lock = ext_lock if ext_lock and ext_lock is not primary_lock else None
 
             all_ok = True
@@ -4086,8 +4175,57 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
             # заранее создадим слот ожидания кода
             _broker_get_or_create(run_id)
 
+            def _checkpoint_steps() -> None:
+                """Чекпоинт после удачного шага: контекст, результаты, пройденные шаги, URL экрана."""
+                if ckpt_store is None:
+                    return
+                try:
+                    cur = getattr(drv, "current_url", "") or ""
+                except Exception:
+                    cur = ""
+                ckpt_store.save(
+                    run_id,
+                    "company_steps",
+                    {
+                        "headless": headless,
+                        "cli_inputs": cli_inputs,
+                        "context": {k: v for k, v in context.items() if k != "_active_step"},
+                        "steps_results": steps_results,
+                        "done_steps": [r.get("step") for r in steps_results if r.get("ok")],
+                        "variant_id": variant_id,
+                        "choose_type": choose_type,
+                        "steps_package": steps_package,
+                    },
+                    owner=ckpt_owner,
+                    url=str(cur),
+                )
+
+            # Продолжение с чекпоинта: экран должен совпасть, иначе — с шага 1
+            done_numbers: set = set()
+            if resume_cp is not None:
+                if verify_screen(drv, resume_cp.url):
+                    context.clear()
+                    context.update(resume_cp.state.get("context") or {})
+                    steps_results.extend(r for r in (resume_cp.state.get("steps_results") or []) if isinstance(r, dict))
+                    done_numbers = {int(n) for n in (resume_cp.state.get("done_steps") or []) if str(n).isdigit()}
+                    yield _yield({"event": "resume", "run_id": run_id, "done_steps": sorted(done_numbers)})
+                    yield _yield({"event": "comment", "text": f"Продолжаю с чекпоинта: пройдено шагов {len(done_numbers)}."})
+                else:
+                    # входные параметры запуска — из чекпоинта (в запросе на продолжение их может не быть)
+                    saved_ctx = resume_cp.state.get("context") or {}
+                    for k in (
+                        "campaign_variant", "campaign_variant_label", "campaign_type", "budget_min", "budget_max",
+                        "locations", "languages", "creative_mode", "creative_seed_assets", "creative_provided_assets",
+                    ):
+                        if k in saved_ctx:
+                            context[k] = saved_ctx[k]
+                    yield _yield({"event": "comment", "text": "Экран не совпадает с чекпоинтом — запускаю с первого шага."})
+
             try:
                 for spec in steps:
+                    if int(spec.number) in done_numbers:
+                        yield _yield({"event": "step_ok", "number": spec.number, "resumed": True})
+                        continue
                     yield _yield({"event": "step_start", "number": spec.number, "module": spec.module_name, "label": spec.label})
                     context["_active_step"] = spec.number
 
@@ -4187,6 +4325,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
                                     yield _yield({"event": "comment", "text": "Вернулся в Google Ads, продолжаю."})
                                 else:
                                     yield _yield({"event": "comment", "text": "Не удалось автоматически вернуться в Google Ads (продолжу)."})
+                            _checkpoint_steps()
                             yield _yield({"event": "step_ok", "number": spec.number})
                         else:
                             err = result_holder.get("err")
@@ -4270,6 +4409,8 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
                             steps_package=steps_package,
                         )
                         _pending_run_store(pending)
+                        if ckpt_store is not None:
+                            ckpt_store.finish(run_id, "company_steps")
                         yield _yield({"event": "ready", "run_id": run_id})
                     except Exception as e:
                         yield _yield({"event": "comment", "text": f"Не удалось подготовить данные к публикации: {e!s}"})
@@ -4553,7 +4694,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
 
             ext_state = _get_state_from_app()
             ext_lock = getattr(ext_state, "lock", None)
-            primary_lock = _local.lock
+            primary_lock = _drivers.slot(profile_id, headless).lock
             secondary_lock = ext_lock if ext_lock and ext_lock is not primary_lock else None
 
             primary_acquired = False
@@ -4660,7 +4801,7 @@ def init_create_companies(app: Flask, settings: Settings) -> None:
                     _run_meta_clear(run_id)
                     yield _yield({"event": "end"})
                 finally:
-                    _shutdown_driver("publish_end")
+                    _shutdown_driver(profile_id, headless, "publish_end", user_email=user_email)
 
         return Response(stream_with_context(generate()), mimetype="text/event-stream")
 
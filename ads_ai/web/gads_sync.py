@@ -13,12 +13,15 @@ import mimetypes
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 from urllib.parse import urlparse, unquote
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from flask import Flask, jsonify, request, Response, session
 
+from ads_ai.browser.pool import get_driver_pool
+from ads_ai.browser.adspower import start_many
+
 # Мягкий импорт Settings
 try:
     from ads_ai.config.settings import Settings  # noqa: F401
@@ -1056,15 +1059,6 @@ def _start_driver(profile_id: str, *, headless: bool, logs: List[str]):
             token=token,
             window_size="1600,1000",
         )
-        try:
-            drv.set_page_load_timeout(35)
-            drv.set_script_timeout(20)
-            # Понижаем частоту CDP-перерисовок (в headless это дешевле)
-            drv.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
-                "mobile": False, "width": 1600, "height": 1000, "deviceScaleFactor": 1
-            })
-        except Exception as e:
-            _log(logs, f"Предупреждение: не удалось применить CDP-метрики: {e!r}")
         _log(logs, "Драйвер готов")
         return drv
     except Exception as e:  # pragma: no cover
@@ -1072,6 +1066,37 @@ def _start_driver(profile_id: str, *, headless: bool, logs: List[str]):
         raise RuntimeError(f"AdsPower driver failed: {e}")
 
 
+def _prepare_driver(drv, logs: List[str]) -> None:
+    """Настройки модуля — на каждой аренде (драйвер из пула мог готовить другой модуль)."""
+    try:
+        drv.set_page_load_timeout(35)
+        drv.set_script_timeout(20)
+        # Понижаем частоту CDP-перерисовок (в headless это дешевле)
+        drv.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+            "mobile": False, "width": 1600, "height": 1000, "deviceScaleFactor": 1
+        })
+    except Exception as e:
+        _log(logs, f"Предупреждение: не удалось применить CDP-метрики: {e!r}")
+
+
+def _lease_driver(profile_id: str, *, headless: bool, logs: List[str], started: Optional[Set[str]] = None):
+    """
+    Драйвер профиля из общего пула (тёплый, если профиль уже открыт другим модулем).
+    started — сюда попадает profile_id, если профиль стартовал именно этот вызов.
+    """
+    def _start():
+        if started is not None:
+            started.add(str(profile_id))
+        return _start_driver(profile_id, headless=headless, logs=logs)
+
+    return get_driver_pool().acquire(
+        str(profile_id),
+        headless=headless,
+        start=_start,
+        prepare=lambda d: _prepare_driver(d, logs),
+    )
+
+
 def _stop_profile_safely(profile_id: str, logs: List[str]) -> None:
     try:
         import importlib  # noqa: WPS433
@@ -1087,6 +1112,15 @@ def _stop_profile_safely(profile_id: str, logs: List[str]) -> None:
         _log(logs, f"Предупреждение: не удалось остановить профиль AdsPower: {e!r}")
 
 
+def _nav_pause(drv, sec: float) -> None:
+    """Пауза цикла ожидания; просыпается сразу при навигационном событии вкладки (CDP)."""
+    try:
+        from ads_ai.browser.nav_events import wait_nav_activity
+        wait_nav_activity(drv, sec)
+    except Exception:
+        time.sleep(sec)
+
+
 def _close_driver_safely(drv, logs: List[str]) -> None:
     try:
         if drv:
@@ -1096,6 +1130,23 @@ def _close_driver_safely(drv, logs: List[str]) -> None:
         _log(logs, f"Предупреждение: ошибка при закрытии драйвера: {e!r}")
 
 
+def _release_driver(drv, profile_id: str, logs: List[str], *, started: bool = False) -> None:
+    """
+    Вернуть драйвер в пул. Если драйвера нет, профиль останавливаем только когда его
+    стартовал этот вызов (неудачная аренда — профиль может держать другой модуль).
+    """
+    if drv is None:
+        if started:
+            _stop_profile_safely(profile_id, logs)
+        return
+    try:
+        get_driver_pool().release(drv)
+        _log(logs, "Драйвер возвращён в пул")
+    except Exception as e:
+        _log(logs, f"Предупреждение: ошибка при возврате драйвера: {e!r}")
+        _close_driver_safely(drv, logs)
+
+
 # =============================================================================
 #     Google Ads → Campaigns/Asset groups CSV → INSERT/UPDATE + assets replace
 # =============================================================================
@@ -1163,7 +1214,7 @@ def _go_to_campaigns(drv, logs: List[str], timeout: float = 55.0) -> bool:
             """)
         except Exception:
             pass
-        time.sleep(0.45)  # чуть реже — меньше нагрузка на CDP
+        _nav_pause(drv, 0.45)  # чуть реже — меньше нагрузка на CDP; навигация будит раньше
 
     _log(logs, "Не дождался готовности страницы с кампаниями")
     return False
@@ -1199,7 +1250,7 @@ def _go_to_assetgroups(drv, logs: List[str], timeout: float = 55.0) -> bool:
                     return True
         except Exception:
             pass
-        time.sleep(0.4)
+        _nav_pause(drv, 0.4)
     _log(logs, "Не дождался готовности страницы assetgroup")
     return False
 
@@ -1533,13 +1584,20 @@ def _write_log_file(base_downloads: Path, user_email: str, profile_id: str, logs
 
 def _sync_one_profile(
     *, user_email: str, profile_id: str, headless: bool,
-    base_downloads: Path, google_email: Optional[str]
+    base_downloads: Path, google_email: Optional[str],
+    driver: Any = None, start_error: Optional[BaseException] = None,
+    start_logs: Optional[List[str]] = None, started: Optional[Set[str]] = None,
 ) -> SyncResult:
-    logs: List[str] = []
+    """
+    driver/start_error/start_logs/started — результат пакетного старта (api_sync_all): драйвер
+    уже арендован из пула, повторно не стартуем; started — профили, стартовавшие при аренде.
+    """
+    logs: List[str] = list(start_logs or [])
     download_dir = base_downloads.joinpath(user_email.replace("@", "_at_"), profile_id)
     download_dir.mkdir(parents=True, exist_ok=True)
 
     drv = None
+    started_pids: Set[str] = started if started is not None else set()
     t_start = time.time()
     inserted = 0
     skipped = 0
@@ -1566,7 +1624,11 @@ def _sync_one_profile(
     _db_ensure_campaign_stats_schema(logs)
     _log(logs, f"Начинаю синхронизацию профиля {profile_id}")
     try:
-        drv = _start_driver(profile_id, headless=headless, logs=logs)
+        if start_error is not None:
+            raise start_error
+        drv = driver if driver is not None else _lease_driver(
+            profile_id, headless=headless, logs=logs, started=started_pids,
+        )
         _enable_downloads(drv, download_dir, logs)
 
         # -------------------------- CAMPAIGNS CSV + UI STATUSES (ПАРАЛЛЕЛЬНО) --------------------------
@@ -1749,9 +1811,8 @@ def _sync_one_profile(
         error = f"{e.__class__.__name__}: {e}"
         _log(logs, f"Критическая ошибка: {error}")
     finally:
-        try: _close_driver_safely(drv, logs)
+        try: _release_driver(drv, profile_id, logs, started=str(profile_id) in started_pids)
         finally:
-            _stop_profile_safely(profile_id, logs)
             logs_file = _write_log_file(base_downloads, user_email, profile_id, logs)
 
     return SyncResult(
@@ -1896,27 +1957,37 @@ def init_gads_sync(app: Flask, settings: Settings) -> None:
                     continue
             to_run_pids.append(pid)
 
-        # Выполняем для оставшихся
+        # Выполняем для оставшихся: профили стартуют параллельно (адаптивный лимит AdsPower),
+        # синк профиля начинается, как только готов его браузер
         sem = threading.Semaphore(max(1, max_conc))
         fresh_results: List[SyncResult] = []
         lock = threading.Lock()
+        start_logs: Dict[str, List[str]] = {pid: [] for pid in to_run_pids}
+        started_pids: Set[str] = set()
 
-        def worker(pid: str) -> None:
+        def worker(pid: str, drv: Any, err: Optional[BaseException]) -> None:
             nonlocal fresh_results
             meta = acc_map.get(pid)
             g_email = (meta.email if meta else "") or ""
             with sem:
                 res = _sync_one_profile(
                     user_email=email, profile_id=pid, headless=headless,
-                    base_downloads=base_downloads, google_email=g_email
+                    base_downloads=base_downloads, google_email=g_email,
+                    driver=drv, start_error=err, start_logs=start_logs.get(pid), started=started_pids,
                 )
                 _cache_put(email, pid, headless, res)  # кладём в кэш вне зависимости от статуса
                 with lock:
                     fresh_results.append(res)
 
         threads: List[threading.Thread] = []
-        for pid in to_run_pids:
-            t = threading.Thread(target=worker, args=(pid,), name=f"gads-sync-{pid}", daemon=True)
+        ready = start_many(
+            to_run_pids,
+            lambda pid: _lease_driver(pid, headless=headless, logs=start_logs[pid], started=started_pids),
+            max_workers=max(1, max_conc),
+            cleanup=lambda d: get_driver_pool().release(d),
+        )
+        for pid, drv, err in ready:
+            t = threading.Thread(target=worker, args=(pid, drv, err), name=f"gads-sync-{pid}", daemon=True)
             threads.append(t)
             t.start()
 
@@ -23,6 +23,9 @@ except Exception:  # pragma: no cover
 # Удаление кампаний в GAds
 from ads_ai.web.bulk_remove import remove_campaigns_by_names, init_bulk_remove  # type: ignore
 
+# Общий keep-alive клиент локального API AdsPower
+from ads_ai.browser.adspower_client import http_get_json as _http_get_json
+
 
 # =============================================================================
 #                                ПУТЬ К БД
@@ -475,28 +478,6 @@ def _adsp_env() -> tuple[str, str]:
     return base, token
 
 
-def _http_get_json(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0) -> Tuple[int, Dict[str, Any]]:
-    try:
-        import requests  # type: ignore
-    except Exception:
-        requests = None  # type: ignore
-    if requests:
-        try:
-            r = requests.get(url, headers=headers or {}, timeout=timeout)  # type: ignore
-            return int(r.status_code), (r.json() if r.content else {})
-        except Exception:
-            return 0, {}
-    # stdlib fallback
-    import urllib.request, json as _json  # noqa: E401
-    req = urllib.request.Request(url, headers=headers or {})
-    try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
-            data = resp.read()
-            return int(resp.getcode() or 0), (_json.loads(data.decode("utf-8")) if data else {})
-    except Exception:
-        return 0, {}
-
-
 def _list_adspower_profiles(q: str = "", page: int = 1, page_size: int = 300) -> Dict[str, Any]:
     base, token = _adsp_env()
     headers = {"Authorization": token} if token else {}
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""
+preview_hub.py — живое превью браузера: один захват на драйвер, раздача всем зрителям.
+
+Зачем:
+  • раньше каждый открытый /api/preview, /campaigns/<id>/preview, /api/screenshot
+    запускал свой путь захвата — десять операторов = десять захватов;
+  • кадр ехал base64 → JSON → SSE отдельно для каждого клиента.
+
+Как теперь:
+  • PreviewChannel на драйвер: источник — CDP screencast (browser/screencast.py),
+    фолбэк — Page.captureScreenshot(jpeg) с умеренным fps в одном потоке; оба —
+    по фоновой DevTools-сессии (cdp.get_side_session), WebDriver — последний резерв;
+  • захват идёт, только пока есть подписчики (+ короткий grace на переподключение SSE);
+  • PreviewFrame кодирует base64/SSE-пакет один раз и отдаёт его всем подписчикам;
+  • бинарный транспорт multipart MJPEG (mjpeg_stream) рядом с SSE (sse_stream):
+    <img src="...mjpeg"> без base64 и JSON.
+
+Публичные объекты:
+    • PreviewFrame, PreviewChannel, PreviewHub
+    • get_preview_hub() -> PreviewHub
+    • sse_stream(channel, event, ...) / mjpeg_stream(channel, ...)
+    • MJPEG_MIMETYPE, MJPEG_IDLE_SEC
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+__all__ = [
+    "MJPEG_MIMETYPE",
+    "MJPEG_IDLE_SEC",
+    "PreviewFrame",
+    "PreviewChannel",
+    "PreviewHub",
+    "get_preview_hub",
+    "sse_stream",
+    "mjpeg_stream",
+]
+
+_BOUNDARY = "adsaiframe"
+MJPEG_MIMETYPE = f"multipart/x-mixed-replace; boundary={_BOUNDARY}"
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+# MJPEG без кадров нечего слать (в отличие от SSE-heartbeat), а без записи в сокет
+# отключившийся клиент не обнаружить — такой поток завершаем через MJPEG_IDLE_SEC.
+MJPEG_IDLE_SEC = _env_float("ADS_AI_PREVIEW_MJPEG_IDLE_SEC", 30.0)
+
+
+# ============================== Кадр ==============================
+
+class PreviewFrame:
+    """Кадр превью. Бинарь/base64/SSE-пакет считаются один раз на кадр, а не на клиента."""
+
+    __slots__ = ("seq", "fmt", "vw", "vh", "dpr", "scroll_x", "scroll_y", "ts", "_raw", "_b64", "_sse", "_lock")
+
+    def __init__(
+        self,
+        seq: int,
+        *,
+        raw: Optional[bytes] = None,
+        b64: Optional[str] = None,
+        fmt: str = "jpeg",
+        vw: int = 0,
+        vh: int = 0,
+        dpr: float = 1.0,
+        scroll_x: Optional[float] = None,
+        scroll_y: Optional[float] = None,
+    ) -> None:
+        self.seq = seq
+        self.fmt = fmt
+        self.vw = int(vw or 0)
+        self.vh = int(vh or 0)
+        self.dpr = float(dpr or 1.0)
+        self.scroll_x = scroll_x  # None — источник не знает скролл (поллинг)
+        self.scroll_y = scroll_y
+        self.ts = time.time()
+        self._raw = raw
+        self._b64 = b64
+        self._sse: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def mime(self) -> str:
+        return "image/png" if self.fmt == "png" else "image/jpeg"
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            with self._lock:
+                if self._raw is None:
+                    self._raw = base64.b64decode(self._b64 or "")
+        return self._raw
+
+    @property
+    def b64(self) -> str:
+        if self._b64 is None:
+            with self._lock:
+                if self._b64 is None:
+                    self._b64 = base64.b64encode(self._raw or b"").decode("ascii")
+        return self._b64
+
+    def sse(self, event: str) -> str:
+        """
+        SSE-пакет кадра (кэшируется по имени события). Поля — объединение форматов
+        прежних эндпоинтов: data/fmt/vw/vh/dpr (create_companies) и data/mime (campaigns).
+        """
+        pkt = self._sse.get(event)
+        if pkt is None:
+            payload = json.dumps({
+                "data": self.b64, "fmt": self.fmt, "mime": self.mime,
+                "vw": self.vw, "vh": self.vh, "dpr": self.dpr, "seq": self.seq,
+            })
+            pkt = f"id: {self.seq}\nevent: {event}\ndata: {payload}\n\n"
+            self._sse[event] = pkt
+        return pkt
+
+    def mjpeg_part(self) -> bytes:
+        head = f"--{_BOUNDARY}\r\nContent-Type: {self.mime}\r\nContent-Length: {len(self.raw)}\r\n\r\n"
+        return head.encode("ascii") + self.raw + b"\r\n"
+
+
+# ============================== Канал ==============================
+
+class PreviewChannel:
+    """
+    Один захват на драйвер. Поток захвата живёт, пока есть подписчики
+    (и ещё grace секунд после ухода последнего — на переподключение EventSource).
+    """
+
+    def __init__(self, driver: Any, *, fps: float = 8.0, grace: float = 3.0) -> None:
+        self.driver = driver
+        self.interval = 1.0 / max(0.5, float(fps))
+        self.grace = max(0.0, float(grace))
+        self._cond = threading.Condition()
+        self._latest: Optional[PreviewFrame] = None
+        self._seq = 0
+        self._subs = 0
+        self._idle_since = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.source = "none"  # 'screencast' | 'cdp' | 'driver' | 'none'
+
+    # ---- подписка --------------------------------------------------------
+
+    @property
+    def watchers(self) -> int:
+        with self._cond:
+            return self._subs
+
+    def latest(self) -> Optional[PreviewFrame]:
+        with self._cond:
+            return self._latest
+
+    def frames(
+        self,
+        *,
+        timeout: float = 2.0,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[Optional[PreviewFrame]]:
+        """
+        Подписка: отдаёт каждый новый кадр (None — за timeout новых кадров не было, пора слать heartbeat).
+        Отписка — при закрытии генератора (клиент отключился).
+        """
+        self._subscribe()
+        last = 0
+        try:
+            while not self._closed and not (stop and stop()):
+                fr = self._wait_next(last, timeout)
+                if fr is not None:
+                    last = fr.seq
+                yield fr
+        finally:
+            self._unsubscribe()
+
+    def snapshot(self, *, timeout: float = 1.5) -> Optional[PreviewFrame]:
+        """Разовый кадр (для /api/screenshot): краткая подписка, если захват не идёт."""
+        fr = self.latest()
+        if fr is not None and self.watchers > 0:
+            return fr
+        gen = self.frames(timeout=timeout)
+        try:
+            return next(gen) or fr
+        except StopIteration:
+            return fr
+        finally:
+            gen.close()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    # ---- внутренности ----------------------------------------------------
+
+    def _subscribe(self) -> None:
+        with self._cond:
+            self._subs += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=f"preview-hub-{id(self.driver)}", daemon=True
+                )
+                self._thread.start()
+
+    def _unsubscribe(self) -> None:
+        with self._cond:
+            self._subs = max(0, self._subs - 1)
+            if self._subs == 0:
+                self._idle_since = time.monotonic()
+            self._cond.notify_all()
+
+    def _wait_next(self, after_seq: int, timeout: float) -> Optional[PreviewFrame]:
+        end = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while True:
+                fr = self._latest
+                if fr is not None and fr.seq > after_seq:
+                    return fr
+                left = end - time.monotonic()
+                if left <= 0 or self._closed:
+                    return None
+                self._cond.wait(timeout=left)
+
+    def _publish(self, **kw: Any) -> None:
+        with self._cond:
+            self._seq += 1
+            self._latest = PreviewFrame(self._seq, **kw)
+            self._cond.notify_all()
+
+    def _idle(self) -> bool:
+        with self._cond:
+            if self._closed:
+                return True
+            return self._subs == 0 and (time.monotonic() - self._idle_since) >= self.grace
+
+    def _on_cast(self, fr: Any) -> None:
+        self._publish(b64=fr.data, fmt=fr.fmt, vw=fr.vw, vh=fr.vh, scroll_x=fr.scroll_x, scroll_y=fr.scroll_y)
+
+    def _run(self) -> None:
+        while True:
+            self._capture_until_idle()
+            with self._cond:
+                if self._closed or self._subs == 0:
+                    self._thread = None
+                    self.source = "none"
+                    return
+            # зритель пришёл, пока захват останавливался — запускаем заново
+
+    def _attach_screencast(self) -> Any:
+        try:
+            from ads_ai.browser.screencast import get_screencast
+            sc = get_screencast(self.driver)
+        except Exception:
+            sc = None
+        if sc is not None:
+            self.source = "screencast"
+            sc.subscribe(self._on_cast)
+            last = sc.latest()
+            if last is not None:
+                self._on_cast(last)
+        return sc
+
+    def _capture_until_idle(self) -> None:
+        sc = self._attach_screencast()
+        retry_ts = time.monotonic()
+        vp = (0, 0, 1.0)
+        vp_ts = 0.0
+        try:
+            while not self._idle():
+                if sc is not None and sc.alive:
+                    with self._cond:
+                        self._cond.wait(timeout=0.5)
+                    continue
+                if sc is not None:
+                    sc.unsubscribe(self._on_cast)
+                    sc = None
+                t0 = time.monotonic()
+                # вкладка сменилась/сессия оборвалась — пробуем поднять screencast заново
+                if t0 - retry_ts > 5.0:
+                    retry_ts = t0
+                    sc = self._attach_screencast()
+                    if sc is not None:
+                        continue
+                if t0 - vp_ts > 2.0:
+                    vp, vp_ts = _viewport(self.driver) or vp, t0
+                if not self._capture_once(vp):
+                    time.sleep(0.5)
+                time.sleep(max(0.0, self.interval - (time.monotonic() - t0)))
+        finally:
+            if sc is not None:
+                sc.unsubscribe(self._on_cast)
+                try:
+                    from ads_ai.browser.screencast import stop_screencast
+                    stop_screencast(self.driver)
+                except Exception:
+                    pass
+
+    def _capture_once(self, vp: Any) -> bool:
+        vw, vh, dpr = vp
+        # 1) фоновая DevTools-сессия — мимо канала WebDriver
+        try:
+            from ads_ai.browser.screencast import capture_screenshot
+            data = capture_screenshot(self.driver, fmt="jpeg", quality=75)
+        except Exception:
+            data = None
+        if data:
+            self.source = "cdp"
+            self._publish(b64=data, fmt="jpeg", vw=vw, vh=vh, dpr=dpr)
+            return True
+        # 2) прежние пути через WebDriver
+        try:
+            res = self.driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "jpeg", "quality": 75})
+            data = (res or {}).get("data")
+            if data:
+                self.source = "cdp"
+                self._publish(b64=data, fmt="jpeg", vw=vw, vh=vh, dpr=dpr)
+                return True
+        except Exception:
+            pass
+        try:
+            png = self.driver.get_screenshot_as_png()
+            if png:
+                self.source = "driver"
+                self._publish(raw=png, fmt="png", vw=vw, vh=vh, dpr=dpr)
+                return True
+        except Exception:
+            pass
+        return False
+
+
+def _viewport(driver: Any) -> Optional[tuple]:
+    d: Any = None
+    try:
+        from ads_ai.browser.screencast import viewport_metrics
+        d = viewport_metrics(driver)
+    except Exception:
+        d = None
+    try:
+        if d is None:
+            d = driver.execute_script(
+                "return {w: window.innerWidth||0, h: window.innerHeight||0, dpr: window.devicePixelRatio||1}"
+            ) or {}
+        return int(d.get("w") or 0), int(d.get("h") or 0), float(d.get("dpr") or 1.0)
+    except Exception:
+        return None
+
+
+# ============================== Хаб ==============================
+
+class PreviewHub:
+    """Каналы превью по драйверам (ключ — id(driver) + проверка ссылки)."""
+
+    def __init__(self, *, fps: float = 8.0, grace: float = 3.0) -> None:
+        self.fps = fps
+        self.grace = grace
+        self._guard = threading.Lock()
+        self._channels: Dict[int, PreviewChannel] = {}
+
+    def channel(self, driver: Any) -> PreviewChannel:
+        with self._guard:
+            ch = self._channels.get(id(driver))
+            if ch is None or ch.driver is not driver:
+                ch = PreviewChannel(driver, fps=self.fps, grace=self.grace)
+                self._channels[id(driver)] = ch
+            return ch
+
+    def forget(self, driver: Any) -> None:
+        """Драйвер закрывается/возвращается в пул: останавливаем захват и отпускаем зрителей."""
+        with self._guard:
+            ch = self._channels.pop(id(driver), None)
+        if ch is not None:
+            ch.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._guard:
+            chans = list(self._channels.values())
+        return {
+            "channels": len(chans),
+            "watchers": sum(c.watchers for c in chans),
+            "sources": [c.source for c in chans],
+        }
+
+
+_hub: Optional[PreviewHub] = None
+_hub_lock = threading.Lock()
+
+
+def get_preview_hub() -> PreviewHub:
+    """Хаб процесса. ENV: ADS_AI_PREVIEW_FALLBACK_FPS (8) — fps поллинга без screencast."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = PreviewHub(fps=_env_float("ADS_AI_PREVIEW_FALLBACK_FPS", 8.0))
+    return _hub
+
+
+# ============================== Транспорты ==============================
+
+def sse_stream(
+    channel: PreviewChannel,
+    event: str,
+    *,
+    retry_ms: int = 600,
+    stop: Optional[Callable[[], bool]] = None,
+) -> Iterator[str]:
+    """SSE: готовый пакет кадра (общий для всех клиентов) или heartbeat."""
+    yield f"retry: {int(retry_ms)}\n\n"
+    for fr in channel.frames(timeout=2.0, stop=stop):
+        yield fr.sse(event) if fr is not None else ":hb\n\n"
+
+
+def mjpeg_stream(
+    channel: PreviewChannel,
+    *,
+    stop: Optional[Callable[[], bool]] = None,
+    idle_timeout: float = MJPEG_IDLE_SEC,
+) -> Iterator[bytes]:
+    """
+    multipart/x-mixed-replace: бинарные кадры без base64/JSON; без новых кадров — повтор последнего
+    раз в 2 с (запись выявляет отключившихся). Ни одного кадра за idle_timeout — поток завершается.
+    """
+    last: Optional[PreviewFrame] = None
+    quiet_since = time.monotonic()
+    for fr in channel.frames(timeout=2.0, stop=stop):
+        fr = fr or last
+        if fr is None:
+            if time.monotonic() - quiet_since >= idle_timeout:
+                return
+            continue
+        last = fr
+        quiet_since = time.monotonic()
+        yield fr.mjpeg_part()